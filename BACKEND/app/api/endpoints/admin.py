@@ -5,7 +5,7 @@ import csv
 import os
 import time
 import requests
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query
 from typing import List, Dict, Any
 from pydantic import BaseModel
 import pandas as pd
@@ -17,14 +17,18 @@ from datetime import datetime, timezone
 
 from app.core.security import get_current_user
 from app.services import who_api_client
+from app.services.icd_mirror import icd_mirror
+from app.services.cache_service import translation_cache
+from app.services.terminology_graph import terminology_graph
+from app.util.json_response import FastJSONResponse, dumps as json_dumps, raw_json_response
 from scripts.discover_ai_mappings import discover_ai_mappings
 import re # Make sure to import 're' at the top of admin.py
 from app.db.session import get_db
 from app.db.models import ICD11Code, TraditionalTerm, Mapping, DiagnosisEvent, MappingAudit, ConceptMapElement, ConceptMapRelease
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func, case, cast, String, and_, text
+from sqlalchemy import func, case, cast, String, JSON, and_, text
 #from sqlalchemy.dialects.postgresql import json_agg
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.postgresql import JSONB, aggregate_order_by
 
 # --- Load Environment Variables & Configure APIs ---
 load_dotenv()
@@ -1040,11 +1044,15 @@ def get_completeness_stats(db: Session = Depends(get_db)):
 
 # (Find and replace the existing /all-suggestions endpoint with this one)
 @router.get("/all-suggestions")
-def get_all_suggestions(db: Session = Depends(get_db)):
+def get_all_suggestions(
+    nested: bool = Query(False, description="Return the per-system suggestions as JSON arrays instead of JSON-encoded strings"),
+    db: Session = Depends(get_db),
+):
     """
     DB-DRIVEN & CORRECTLY FORMATTED: Fetches all suggestions from the database,
     groups them by ICD-11 code, and casts the JSON suggestions to strings
-    to match the format expected by the frontend.
+    to match the format expected by the frontend. With ``nested=true`` the
+    suggestions are plain arrays, so clients need no second JSON.parse.
     """
     if DEEP_RESET_STATUS.get("state") == "running":
         return []
@@ -1069,31 +1077,32 @@ def get_all_suggestions(db: Session = Depends(get_db)):
             'ingestion_filename', Mapping.ingestion_filename
         ).label('term_object')
 
+        def system_suggestions(system_name: str):
+            suggestions = func.json_agg(term_json).filter(TraditionalTerm.system == system_name)
+            if nested:
+                return func.coalesce(suggestions, cast('[]', JSON)).label(f"{system_name}_suggestions")
+            return func.coalesce(cast(suggestions, String), '[]').label(f"{system_name}_suggestions")
+
         suggestions_query = (
             db.query(
                 ICD11Code.icd_name.label("suggested_icd_name"),
-                func.coalesce(
-                    cast(func.json_agg(term_json).filter(TraditionalTerm.system == 'ayurveda'), String),
-                    '[]'
-                ).label("ayurveda_suggestions"),
-                func.coalesce(
-                    cast(func.json_agg(term_json).filter(TraditionalTerm.system == 'siddha'), String),
-                    '[]'
-                ).label("siddha_suggestions"),
-                func.coalesce(
-                    cast(func.json_agg(term_json).filter(TraditionalTerm.system == 'unani'), String),
-                    '[]'
-                ).label("unani_suggestions"),
+                system_suggestions('ayurveda'),
+                system_suggestions('siddha'),
+                system_suggestions('unani'),
             )
             .join(Mapping, ICD11Code.id == Mapping.icd11_code_id)
             .join(TraditionalTerm, Mapping.traditional_term_id == TraditionalTerm.id)
             .filter(Mapping.status == 'suggested')
             .group_by(ICD11Code.icd_name)
-            .all()
+            .subquery()
         )
-        return [row._asdict() for row in suggestions_query]
+        # Postgres renders the whole response document; it is sent as is, without
+        # a decode/re-encode round trip through Python objects.
+        document = db.query(
+            func.coalesce(cast(func.json_agg(suggestions_query.table_valued()), String), '[]')
+        ).scalar()
+        return raw_json_response(document)
     # SQLite fallback path: emulate aggregation in Python.
-    import json as _json
     rows = (
         db.query(
             ICD11Code.icd_name.label('icd_name'),
@@ -1137,15 +1146,16 @@ def get_all_suggestions(db: Session = Depends(get_db)):
         }
         if r.system in g:
             g[r.system].append(payload)
+    encode = (lambda items: items) if nested else (lambda items: json_dumps(items).decode('utf-8'))
     out = []
     for icd_name, systems in grouped.items():
         out.append({
             'suggested_icd_name': icd_name,
-            'ayurveda_suggestions': _json.dumps(systems['ayurveda'], ensure_ascii=False) if systems['ayurveda'] else '[]',
-            'siddha_suggestions': _json.dumps(systems['siddha'], ensure_ascii=False) if systems['siddha'] else '[]',
-            'unani_suggestions': _json.dumps(systems['unani'], ensure_ascii=False) if systems['unani'] else '[]',
+            'ayurveda_suggestions': encode(systems['ayurveda']),
+            'siddha_suggestions': encode(systems['siddha']),
+            'unani_suggestions': encode(systems['unani']),
         })
-    return out
+    return FastJSONResponse(out)
 
 @router.get("/suggestions/metrics")
 def get_suggestions_metrics(db: Session = Depends(get_db)):
@@ -1560,7 +1570,10 @@ from sqlalchemy.dialects.postgresql import JSONB
 # Replace the temporary debug function with this permanent, corrected version.
 
 @router.get("/master-map-data")
-def get_master_map_data(db: Session = Depends(get_db)):
+def get_master_map_data(
+    nested: bool = Query(False, description="Return each *_mapping as a JSON object instead of a JSON-encoded string"),
+    db: Session = Depends(get_db),
+):
     """Return only curated mappings (staged + verified) for the Master Map.
 
     Newly promoted ingestion mappings now start as 'suggested' and are intentionally
@@ -1593,10 +1606,11 @@ def get_master_map_data(db: Session = Depends(get_db)):
             '[]', type_=JSONB
         )
         
-        return cast(func.jsonb_build_object(
+        mapping = func.jsonb_build_object(
             'primary', primary_term,
             'aliases', aliases_array
-        ), String).label(f'{system_name}_mapping')
+        )
+        return (mapping if nested else cast(mapping, String)).label(f'{system_name}_mapping')
 
     query_result = (
         db.query(
@@ -1611,11 +1625,16 @@ def get_master_map_data(db: Session = Depends(get_db)):
     # Exclude 'suggested' so fresh promotions do not appear prematurely
     .filter(Mapping.status.in_(['staged', 'verified']))
         .group_by(ICD11Code.icd_name)
-        .order_by(ICD11Code.icd_name)
-        .all()
+        .subquery()
     )
-    
-    return [row._asdict() for row in query_result]
+    # Rendered to a single JSON document by Postgres and passed through untouched
+    document = db.query(
+        func.coalesce(
+            cast(func.json_agg(aggregate_order_by(query_result.table_valued(), query_result.c.suggested_icd_name)), String),
+            '[]'
+        )
+    ).scalar()
+    return raw_json_response(document)
 
 @router.post("/undo-verification")
 def undo_verification(payload: UndoPayload, db: Session = Depends(get_db)):
@@ -1870,7 +1889,11 @@ def update_master_mapping(payload: MasterUpdatePayload, db: Session = Depends(ge
         mapping_to_delete = db.query(Mapping).get(mapping_id_to_delete)
         db.delete(mapping_to_delete)
 
+    touched_codes = [(system, t.get('code')) for t in incoming_terms_data if t.get('code')]
+    touched_codes += [(system, m.traditional_term.code) for m in existing_mappings if m.traditional_term]
     db.commit()
+    terminology_graph.mark_stale()
+    translation_cache.invalidate(icd_ids=[icd_code_obj.id], codes=touched_codes)
     return {"status": "success", "message": "Master map updated successfully."}
 
 
@@ -1975,6 +1998,8 @@ async def verify_mapping_with_ai(payload: AIVerifyPayload, db: Session = Depends
     except Exception as e:
         db.rollback()
         raise HTTPException(500, f"Failed to persist verification: {e}")
+    terminology_graph.mark_stale()
+    await translation_cache.ainvalidate(icd_ids=[icd_obj.id], codes=[(system, term_obj.code)])
 
     return {
         "status": "success",
@@ -2162,7 +2187,7 @@ def get_icd_master_list(db: Session = Depends(get_db)):
     # that FastAPI can easily handle.
     results = [row._asdict() for row in icd_list_query_result]
 
-    return results
+    return FastJSONResponse(results)
 
 
 @router.post("/enrich-icd-from-who")
@@ -2176,13 +2201,15 @@ def enrich_icd_from_who(payload: EnrichICDPayload, db: Session = Depends(get_db)
         raise HTTPException(status_code=404, detail="ICD name not found.")
 
     rel = payload.release
-    who_data = None
+    # Local ICD-11 mirror first; the live WHO API is only consulted on a miss
+    who_data = icd_mirror.lookup_title(payload.icd_name, 'mms', rel)
 
     # Prefer release-aware MMS search to get code directly
-    try:
-        who_data = who_api_client.mms_search_by_release(payload.icd_name, rel)
-    except Exception:
-        who_data = None
+    if not who_data:
+        try:
+            who_data = who_api_client.mms_search_by_release(payload.icd_name, rel)
+        except Exception:
+            who_data = None
 
     # Fallback: foundation search then linearized fetch for the release
     if not who_data:
@@ -2209,7 +2236,7 @@ def enrich_icd_from_who(payload: EnrichICDPayload, db: Session = Depends(get_db)
     ent_id = who_data.get("@id") or who_data.get("id")
 
     # If definition missing, fetch full entity details
-    if not definition and ent_id:
+    if not definition and ent_id and who_data.get("source") != "mirror":
         try:
             full_ent = who_api_client.get_entity_details(ent_id)
             if full_ent:
@@ -2241,6 +2268,20 @@ def enrich_icd_from_who(payload: EnrichICDPayload, db: Session = Depends(get_db)
 
 
 
+@router.post("/icd-mirror/reload")
+def reload_icd_mirror(db: Session = Depends(get_db)):
+    """Rebuild the in-memory ICD mirror index (e.g. after scripts/build_icd_mirror.py re-imported a release)."""
+    icd_mirror.load(db)
+    return icd_mirror.stats()
+
+
+@router.post("/terminology-graph/reload")
+def reload_terminology_graph(db: Session = Depends(get_db)):
+    """Recompile the in-memory terminology graph now (e.g. after editing terms or ICD rows directly in the DB)."""
+    terminology_graph.reload(db)
+    return terminology_graph.stats()
+
+
 @router.post("/add-icd-code")
 def add_icd_code(payload: ICDAddPayload, db: Session = Depends(get_db), user: Any = Depends(get_current_user)):
     """Create a new ICD-11 entry (DB authoritative).
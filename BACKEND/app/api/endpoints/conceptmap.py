@@ -1,9 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import select, func
 from typing import List, Optional
 from app.db.session import get_db
 from app.db import models
+from app.services.translation_table import build_translation_table
+from app.services.cache_service import translation_cache
+from app.services.release_registry import release_registry
+from app.services.terminology_graph import terminology_graph
+from app.services.release_snapshot import release_snapshots
+from app.util import http_cache
+from app.util.json_response import FastJSONResponse, dumps as json_dumps
 
 router = APIRouter(prefix="/conceptmap", tags=["conceptmap"])
 
@@ -27,13 +37,24 @@ def list_releases(db: Session = Depends(get_db)):
 
 @router.get("/releases/latest")
 def latest_release(db: Session = Depends(get_db)):
-    r = db.execute(select(models.ConceptMapRelease).order_by(models.ConceptMapRelease.created_at.desc())).scalars().first()
+    r = release_registry.latest()
     if not r:
         raise HTTPException(404, "No releases found")
     return {"version": r.version, "created_at": str(r.created_at), "published_at": str(r.published_at), "notes": r.notes}
 
+def _release_etag(request: Request, version: str) -> Optional[str]:
+    """ETag for a release-scoped read (release rows change only when the release is refreshed)."""
+    info = release_registry.get(version)
+    return http_cache.compute_etag(request, info.version, info.revision) if info else None
+
+
 @router.get("/releases/{version}/elements")
-def elements(version: str, icd_name: Optional[str] = None, system: Optional[str] = None, db: Session = Depends(get_db)):
+def elements(version: str, request: Request, response: Response, icd_name: Optional[str] = None,
+             system: Optional[str] = None, db: Session = Depends(get_db)):
+    etag = _release_etag(request, version)
+    if http_cache.etag_matches(request, etag):
+        return http_cache.not_modified(etag)
+    http_cache.set_cache_headers(response, etag)
     rel = db.execute(select(models.ConceptMapRelease).where(models.ConceptMapRelease.version == version)).scalar_one_or_none()
     if not rel:
         raise HTTPException(404, "Release not found")
@@ -192,37 +213,43 @@ def refresh_release(version: str, db: Session = Depends(get_db)):
         ))
         inserted += 1
 
+    changed_icds: set = set()
+    translation_rows = build_translation_table(db, rel, changed_icds)
     db.commit()
-    return {"version": version, "elements": inserted, "status": "refreshed"}
+    release_snapshots.write(db, rel)
+    release_registry.reload(db)
+    terminology_graph.mark_stale()
+    invalidated = translation_cache.invalidate(icd_ids=changed_icds)
+    return {"version": version, "elements": inserted, "translation_rows": translation_rows,
+            "cache_invalidated": invalidated, "status": "refreshed"}
 
 
-@router.get("/releases/{version}/fhir")
-def export_fhir_conceptmap(version: str, summary: bool = False, db: Session = Depends(get_db)):
-    """Export a ConceptMap release as a FHIR ConceptMap resource.
+ICD11_MMS_URI = "http://id.who.int/icd/release/11/mms"
+ELEMENT_COUNT_EXT = "https://ayur-sync.example/fhir/StructureDefinition/elementCount"
+TOTAL_ELEMENTS_EXT = "https://ayur-sync.example/fhir/StructureDefinition/totalElements"
+# Rows fetched per round trip from the server-side cursor, and bytes buffered per streamed chunk
+CONCEPTMAP_EXPORT_BATCH_SIZE = int(os.getenv("CONCEPTMAP_EXPORT_BATCH_SIZE", "2000"))
+CONCEPTMAP_EXPORT_CHUNK_BYTES = int(os.getenv("CONCEPTMAP_EXPORT_CHUNK_BYTES", str(64 * 1024)))
 
-    Parameters:
-      version: release version string
-      summary: if true, omit heavy group.element arrays (provides counts only)
-    """
-    rel = db.execute(select(models.ConceptMapRelease).where(models.ConceptMapRelease.version == version)).scalar_one_or_none()
-    if not rel:
-        raise HTTPException(404, "Release not found")
-    # Group elements by traditional system
-    rows = db.execute(select(models.ConceptMapElement).where(models.ConceptMapElement.release_id == rel.id)).scalars().all()
-    groups: dict[str, dict] = {}
-    for e in rows:
-        g = groups.setdefault(e.system, {"source": f"https://ayur-sync.example/fhir/CodeSystem/{e.system}", "target": "http://id.who.int/icd/release/11/mms", "element": []})
-        if not summary:
-            g["element"].append({
-                "code": e.term,
-                "display": e.term,
-                "target": [{
-                    "code": e.icd_code or e.icd_name,
-                    "display": e.icd_name,
-                    "equivalence": e.equivalence
-                }]
-            })
-    resource = {
+
+def _system_uri(system: str) -> str:
+    return f"https://ayur-sync.example/fhir/CodeSystem/{system}"
+
+
+def _fhir_element(term: str, icd_code: Optional[str], icd_name: str, equivalence: str) -> dict:
+    return {
+        "code": term,
+        "display": term,
+        "target": [{
+            "code": icd_code or icd_name,
+            "display": icd_name,
+            "equivalence": equivalence
+        }]
+    }
+
+
+def _conceptmap_header(rel: models.ConceptMapRelease, version: str) -> dict:
+    return {
         "resourceType": "ConceptMap",
         "id": f"namaste-to-icd11-{version}",
         "url": "https://ayur-sync.example/fhir/ConceptMap/namaste-to-icd11",
@@ -231,17 +258,124 @@ def export_fhir_conceptmap(version: str, summary: bool = False, db: Session = De
         "status": "active",
         "version": version,
         "date": str(rel.created_at) if rel.created_at else None,
-        "group": [
-            {"source": g["source"], "target": g["target"], "element": g.get("element", []) if not summary else [], "extension": [
-                {"url": "https://ayur-sync.example/fhir/StructureDefinition/elementCount", "valueInteger": len(g.get("element", []))}
-            ]} for g in groups.values()
-        ],
-        "extension": [
-            {"url": "https://ayur-sync.example/fhir/StructureDefinition/totalElements", "valueInteger": len(rows)}
-        ]
     }
+
+
+def _elements_by_system(db: Session, release_id: int):
+    """A release's element columns ordered by system, read through a server-side cursor in batches."""
+    E = models.ConceptMapElement
+    stmt = (
+        select(E.system, E.term, E.icd_code, E.icd_name, E.equivalence)
+        .where(E.release_id == release_id)
+        .order_by(E.system, E.id)
+        .execution_options(yield_per=CONCEPTMAP_EXPORT_BATCH_SIZE)
+    )
+    return db.execute(stmt)
+
+
+def _stream_conceptmap_json(bind, header: dict, release_id: int):
+    """Write the ConceptMap resource incrementally: one group per system, elements as they are read.
+
+    Runs after the endpoint has returned, so it reads through its own session on
+    ``bind`` (closed when the stream ends) instead of the request-scoped one.
+    """
+    buf = bytearray(json_dumps(header)[:-1] + b',"group":[')
+    current, count, total = None, 0, 0
+    with Session(bind=bind) as db:
+        for system, term, icd_code, icd_name, equivalence in _elements_by_system(db, release_id):
+            if system != current:
+                if current is not None:
+                    buf += b'],"extension":[' + json_dumps({"url": ELEMENT_COUNT_EXT, "valueInteger": count}) + b']},'
+                buf += json_dumps({"source": _system_uri(system), "target": ICD11_MMS_URI})[:-1] + b',"element":['
+                current, count = system, 0
+            elif count:
+                buf += b","
+            buf += json_dumps(_fhir_element(term, icd_code, icd_name, equivalence))
+            count += 1
+            total += 1
+            if len(buf) >= CONCEPTMAP_EXPORT_CHUNK_BYTES:
+                yield bytes(buf)
+                buf.clear()
+    if current is not None:
+        buf += b'],"extension":[' + json_dumps({"url": ELEMENT_COUNT_EXT, "valueInteger": count}) + b']}'
+    buf += b'],"extension":[' + json_dumps({"url": TOTAL_ELEMENTS_EXT, "valueInteger": total}) + b']}'
+    yield bytes(buf)
+
+
+def _stream_conceptmap_ndjson(bind, header: dict, release_id: int):
+    """NDJSON variant: the ConceptMap header on the first line, then one line per element."""
+    buf = bytearray(json_dumps(header) + b"\n")
+    with Session(bind=bind) as db:
+        for system, term, icd_code, icd_name, equivalence in _elements_by_system(db, release_id):
+            buf += json_dumps({"source": _system_uri(system), "target": ICD11_MMS_URI,
+                               "element": _fhir_element(term, icd_code, icd_name, equivalence)}) + b"\n"
+            if len(buf) >= CONCEPTMAP_EXPORT_CHUNK_BYTES:
+                yield bytes(buf)
+                buf.clear()
+    if buf:
+        yield bytes(buf)
+
+
+@router.get("/releases/{version}/fhir")
+def export_fhir_conceptmap(version: str, request: Request, response: Response, summary: bool = False,
+                           stream: bool = False,
+                           export_format: str = Query("json", alias="format", pattern="^(json|ndjson)$"),
+                           db: Session = Depends(get_db)):
+    """Export a ConceptMap release as a FHIR ConceptMap resource.
+
+    Parameters:
+      version: release version string
+      summary: if true, omit heavy group.element arrays (provides counts only)
+      stream: if true, write the resource incrementally while reading elements
+        through a server-side cursor (constant memory; groups ordered by system)
+      format: ``ndjson`` streams the ConceptMap header line followed by one
+        ``{"source", "target", "element"}`` line per element
+
+    Sends a strong ETag; a matching ``If-None-Match`` gets 304 without reading the release.
+    """
+    etag = _release_etag(request, version)
+    if http_cache.etag_matches(request, etag):
+        return http_cache.not_modified(etag)
+    http_cache.set_cache_headers(response, etag)
+    rel = db.execute(select(models.ConceptMapRelease).where(models.ConceptMapRelease.version == version)).scalar_one_or_none()
+    if not rel:
+        raise HTTPException(404, "Release not found")
+    headers = dict(response.headers)
+    if export_format == "ndjson":
+        return StreamingResponse(_stream_conceptmap_ndjson(db.get_bind(), _conceptmap_header(rel, version), rel.id),
+                                 media_type="application/fhir+ndjson", headers=headers)
+    if stream and not summary:
+        return StreamingResponse(_stream_conceptmap_json(db.get_bind(), _conceptmap_header(rel, version), rel.id),
+                                 media_type="application/json", headers=headers)
+    resource = _conceptmap_header(rel, version)
     if summary:
-        # Provide overall counts only
-        for g in resource["group"]:
-            g.pop("element", None)
-    return resource
+        # Counts only: aggregate in the database instead of loading the elements
+        E = models.ConceptMapElement
+        counts = db.execute(
+            select(E.system, func.count(E.id)).where(E.release_id == rel.id).group_by(E.system).order_by(func.min(E.id))
+        ).all()
+        resource["group"] = [
+            {"source": _system_uri(system), "target": ICD11_MMS_URI,
+             "extension": [{"url": ELEMENT_COUNT_EXT, "valueInteger": count}]}
+            for system, count in counts
+        ]
+        resource["extension"] = [{"url": TOTAL_ELEMENTS_EXT, "valueInteger": sum(count for _, count in counts)}]
+        return FastJSONResponse(resource, headers=headers)
+    # Group elements by traditional system
+    groups: dict[str, list] = {}
+    total = 0
+    for system, term, icd_code, icd_name, equivalence in db.execute(
+        select(models.ConceptMapElement.system, models.ConceptMapElement.term, models.ConceptMapElement.icd_code,
+               models.ConceptMapElement.icd_name, models.ConceptMapElement.equivalence)
+        .where(models.ConceptMapElement.release_id == rel.id)
+        .order_by(models.ConceptMapElement.id)
+    ):
+        groups.setdefault(system, []).append(_fhir_element(term, icd_code, icd_name, equivalence))
+        total += 1
+    resource["group"] = [
+        {"source": _system_uri(system), "target": ICD11_MMS_URI, "element": items,
+         "extension": [{"url": ELEMENT_COUNT_EXT, "valueInteger": len(items)}]}
+        for system, items in groups.items()
+    ]
+    resource["extension"] = [{"url": TOTAL_ELEMENTS_EXT, "valueInteger": total}]
+    return FastJSONResponse(resource, headers=headers)
@@ -1,15 +1,20 @@
 from datetime import datetime, timezone
 from typing import Optional, Dict, Any, List
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Header
+from fastapi import APIRouter, Depends, HTTPException, Query, Header, Request, Response
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import or_, and_
 
 from app.db.session import get_db
-from app.db.models import Mapping, TraditionalTerm, ICD11Code, DiagnosisEvent, ConceptMapRelease, ConceptMapElement
+from app.db.models import Mapping, TraditionalTerm, ICD11Code, DiagnosisEvent, ConceptMapElement
+from app.db.text_search import order_by_similarity
+from app.services.release_registry import release_registry
+from app.services.terminology_graph import terminology_graph
 from app.core.consent import require_consent
 from app.core.security import get_current_principal
 from app.util.fhir_outcome import outcome_not_found, outcome_validation, outcome_error
+from app.util import http_cache
+from app.util.search_keys import search_key
 
 router = APIRouter()
 
@@ -33,10 +38,21 @@ def system_key_to_uri(system_key: str) -> str:
     return f"{SYSTEM_URI_BASE}{system_key}"
 
 
-def pick_vernacular(t: TraditionalTerm) -> Optional[str]:
+def pick_vernacular(t) -> Optional[str]:
     return t.devanagari or t.tamil or t.arabic
 
 
+def terminology_etag(request: Request, release: Optional[str]) -> Optional[str]:
+    """ETag for a terminology read: graph content (+ the scoping release); None until the graph is built."""
+    graph = terminology_graph.current()
+    if graph is None:
+        return None
+    rel = release_registry.get(release) if release else None
+    if release and rel is None:
+        return None
+    return http_cache.compute_etag(request, graph.revision, rel.version if rel else "", rel.revision if rel else "")
+
+
 def append_audit_log(action: str, principal: Dict[str, Any], detail: Dict[str, Any]):
     try:
         entry = {
@@ -61,8 +77,8 @@ def append_audit_log(action: str, principal: Dict[str, Any], detail: Dict[str, A
 def capability_statement(principal: Dict[str, Any] = Depends(get_current_principal), db: Session = Depends(get_db)):
     """Enhanced CapabilityStatement advertising full implemented surface."""
     append_audit_log("fhir.metadata", principal, {})
-    latest_release = db.query(ConceptMapRelease).order_by(ConceptMapRelease.created_at.desc()).first()
-    releases = db.query(ConceptMapRelease).order_by(ConceptMapRelease.created_at.desc()).all()
+    latest_release = release_registry.latest()
+    releases = release_registry.all()
     current_version = latest_release.version if latest_release else None
     total_elements = 0
     if latest_release:
@@ -114,6 +130,8 @@ def capability_statement(principal: Dict[str, Any] = Depends(get_current_princip
 
 @router.get("/CodeSystem/$lookup")
 def codesystem_lookup(
+    request: Request,
+    response: Response,
     system: str = Query(..., description="CodeSystem URL or key (ayurveda|siddha|unani)"),
     code: str = Query(..., description="Code to look up (NAMASTE code)"),
     release: Optional[str] = Query(None, description="ConceptMap release version to scope (verified mappings snapshot)."),
@@ -123,11 +141,24 @@ def codesystem_lookup(
     key = system_param_to_key(system)
     if key not in {"ayurveda", "siddha", "unani"}:
         return outcome_not_found("Unknown CodeSystem")
-    # If release specified restrict to codes that participate in that snapshot
+    etag = terminology_etag(request, release)
+    if http_cache.etag_matches(request, etag):
+        append_audit_log("fhir.codesystem.lookup", principal, {"system": key, "code": code})
+        return http_cache.not_modified(etag, private=True)
+    http_cache.set_cache_headers(response, etag, private=True)
+    # If release specified restrict to codes that participate in that snapshot.
+    # The in-memory terminology graph answers unscoped and active-release lookups.
+    graph = terminology_graph.current()
+    rel = None
     if release:
-        rel = db.query(ConceptMapRelease).filter(ConceptMapRelease.version == release).first()
+        rel = release_registry.get(release)
         if not rel:
             return outcome_not_found("Unknown release version")
+    if graph is not None and rel is None:
+        term = graph.terms_by_code.get((key, code))
+    elif graph is not None and rel.id == graph.release_id:
+        term = graph.release_terms_by_code.get((key, code))
+    elif rel is not None:
         term = (
             db.query(TraditionalTerm)
             .join(Mapping, Mapping.traditional_term_id == TraditionalTerm.id)
@@ -248,11 +279,11 @@ def ingest_bundle(
     # Resolve release version for reproducibility
     rel_obj = None
     if release:
-        rel_obj = db.query(ConceptMapRelease).filter(ConceptMapRelease.version == release).first()
+        rel_obj = release_registry.get(release)
         if not rel_obj:
             raise HTTPException(400, f"Unknown release version: {release}")
     else:
-        rel_obj = db.query(ConceptMapRelease).order_by(ConceptMapRelease.created_at.desc()).first()
+        rel_obj = release_registry.latest()
     release_version = rel_obj.version if rel_obj else None
     total = 0
     valid = 0
@@ -356,6 +387,8 @@ def ingest_bundle(
 
 @router.get("/ValueSet/$expand")
 def valueset_expand(
+    request: Request,
+    response: Response,
     system: str = Query(..., description="CodeSystem URL or key (ayurveda|siddha|unani)"),
     filter: Optional[str] = Query(None, min_length=2, description="Text filter against term/description"),
     count: int = Query(25, ge=1, le=200),
@@ -364,27 +397,41 @@ def valueset_expand(
     principal: Dict[str, Any] = Depends(get_current_principal),
 ):
     key = system_param_to_key(system)
+    etag = terminology_etag(request, release)
+    if http_cache.etag_matches(request, etag):
+        append_audit_log("fhir.valueset.expand", principal, {"system": key, "filter": filter or ""})
+        return http_cache.not_modified(etag, private=True)
+    http_cache.set_cache_headers(response, etag, private=True)
     q = db.query(TraditionalTerm).join(Mapping).filter(TraditionalTerm.system == key, Mapping.status == "verified")
     if release:
-        rel = db.query(ConceptMapRelease).filter(ConceptMapRelease.version == release).first()
+        rel = release_registry.get(release)
         if not rel:
             return outcome_not_found("Unknown release version")
         # restrict to terms present in snapshot elements
         q = q.join(Mapping.icd11_code).join(ConceptMapElement, ConceptMapElement.icd_name == ICD11Code.icd_name).filter(ConceptMapElement.release_id == rel.id)
     if filter:
-        from sqlalchemy import or_
-
         like = f"%{filter.lower()}%"
+        key_like = f"%{search_key(filter) or filter.lower()}%"
         q = q.filter(
             or_(
                 TraditionalTerm.term.ilike(like),
                 TraditionalTerm.source_description.ilike(like),
                 TraditionalTerm.source_short_definition.ilike(like),
                 TraditionalTerm.source_long_definition.ilike(like),
+                # script-folded keys: ITRANS / IAST / vernacular spellings of the same term
+                TraditionalTerm.search_key.like(key_like),
+                TraditionalTerm.vernacular_search_key.like(key_like),
             )
         )
-    q = q.distinct(TraditionalTerm.id).limit(count)
-    items: List[TraditionalTerm] = q.all()
+    # Dedupe in a subquery so the expansion can be ranked by similarity to the filter
+    matched_ids = q.with_entities(TraditionalTerm.id).distinct().statement
+    items_q = db.query(TraditionalTerm).filter(TraditionalTerm.id.in_(matched_ids))
+    if filter:
+        items_q = order_by_similarity(
+            items_q, db, filter.lower(), TraditionalTerm.term, TraditionalTerm.source_description,
+            TraditionalTerm.source_short_definition, TraditionalTerm.source_long_definition,
+        )
+    items: List[TraditionalTerm] = items_q.order_by(TraditionalTerm.id).limit(count).all()
     contains = []
     for t in items:
         contains.append(
@@ -412,6 +459,36 @@ def valueset_expand(
 # ---- ConceptMap $translate ----
 
 
+def _graph_translate_source(graph, key: str, code: str, scoped: bool):
+    """(edge, fallback_used) from the in-memory graph; ``scoped`` limits to the graph's release."""
+    candidates = graph.edges_by_source.get((key, code), ())
+    if scoped:
+        candidates = [e for e in candidates if e.icd11_code.icd_name in graph.release_icd_names]
+    mapping = next((e for e in candidates if e.is_primary), None)
+    if mapping is None and candidates:
+        return candidates[0], True
+    return mapping, False
+
+
+def _sql_translate_source(db: Session, key: str, code: str, rel) -> tuple:
+    """(mapping, fallback_used) for a release the graph was not built for."""
+    # Find verified primary mapping for given source.
+    # Fallback: if no term has that code, allow passing the raw term (useful before codes are curated).
+    base_q = db.query(Mapping).join(TraditionalTerm).options(joinedload(Mapping.icd11_code), joinedload(Mapping.traditional_term)).filter(TraditionalTerm.system == key, Mapping.status == "verified", Mapping.is_primary == True, or_(TraditionalTerm.code == code, TraditionalTerm.term == code))
+    if rel:
+        base_q = base_q.join(Mapping.icd11_code).join(ConceptMapElement, ConceptMapElement.icd_name == ICD11Code.icd_name).filter(ConceptMapElement.release_id == rel.id)
+    mapping = base_q.first()
+    if mapping:
+        return mapping, False
+    # Option C: fallback to ANY verified mapping (prefer primary if one exists; otherwise first by id)
+    fallback_q = db.query(Mapping).join(TraditionalTerm).options(joinedload(Mapping.icd11_code), joinedload(Mapping.traditional_term)).filter(TraditionalTerm.system == key, Mapping.status == "verified", or_(TraditionalTerm.code == code, TraditionalTerm.term == code))
+    if rel:
+        fallback_q = fallback_q.join(Mapping.icd11_code).join(ConceptMapElement, ConceptMapElement.icd_name == ICD11Code.icd_name).filter(ConceptMapElement.release_id == rel.id)
+    mapping = fallback_q.order_by(Mapping.is_primary.desc(), Mapping.id.asc()).first()
+    return mapping, mapping is not None
+
+
+
 @router.get("/ConceptMap/$translate")
 def conceptmap_translate(
     system: str = Query(..., description="Source CodeSystem URL or key (ayurveda|siddha|unani)"),
@@ -424,24 +501,16 @@ def conceptmap_translate(
 ):
     key = system_param_to_key(system)
     target_uri = target or ICD11_SYSTEM_URI
-    # Find verified primary mapping for given source.
-    # Fallback: if no term has that code, allow passing the raw term (useful before codes are curated).
-    base_q = db.query(Mapping).join(TraditionalTerm).options(joinedload(Mapping.icd11_code), joinedload(Mapping.traditional_term)).filter(TraditionalTerm.system == key, Mapping.status == "verified", Mapping.is_primary == True, or_(TraditionalTerm.code == code, TraditionalTerm.term == code))
+    rel = None
     if release:
-        rel = db.query(ConceptMapRelease).filter(ConceptMapRelease.version == release).first()
+        rel = release_registry.get(release)
         if not rel:
             return outcome_not_found("Unknown release version")
-        base_q = base_q.join(Mapping.icd11_code).join(ConceptMapElement, ConceptMapElement.icd_name == ICD11Code.icd_name).filter(ConceptMapElement.release_id == rel.id)
-    mapping = base_q.first()
-    fallback_used = False
-    if not mapping:
-        # Option C: fallback to ANY verified mapping (prefer primary if one exists; otherwise first by id)
-        fallback_q = db.query(Mapping).join(TraditionalTerm).options(joinedload(Mapping.icd11_code), joinedload(Mapping.traditional_term)).filter(TraditionalTerm.system == key, Mapping.status == "verified", or_(TraditionalTerm.code == code, TraditionalTerm.term == code))
-        if release and rel:
-            fallback_q = fallback_q.join(Mapping.icd11_code).join(ConceptMapElement, ConceptMapElement.icd_name == ICD11Code.icd_name).filter(ConceptMapElement.release_id == rel.id)
-        mapping = fallback_q.order_by(Mapping.is_primary.desc(), Mapping.id.asc()).first()
-        if mapping:
-            fallback_used = True
+    graph = terminology_graph.current()
+    if graph is not None and (rel is None or rel.id == graph.release_id):
+        mapping, fallback_used = _graph_translate_source(graph, key, code, scoped=rel is not None)
+    else:
+        mapping, fallback_used = _sql_translate_source(db, key, code, rel)
     if not mapping:
         append_audit_log("fhir.conceptmap.translate", principal, {"system": key, "code": code, "result": False})
         return outcome_not_found("No verified mapping found (code or term)")
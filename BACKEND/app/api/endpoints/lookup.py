@@ -7,7 +7,12 @@ from sqlalchemy import or_, and_
 
 from app.db.session import get_db
 from app.core.security import get_current_principal
-from app.db.models import Mapping, TraditionalTerm, ICD11Code, ConceptMapElement, ConceptMapRelease
+from app.db.models import Mapping, TraditionalTerm, ICD11Code, ConceptMapElement
+from app.db.text_search import order_by_similarity
+from app.services.lookup_cache import lookup_cache
+from app.services.release_registry import release_registry
+from app.services.terminology_graph import terminology_graph
+from app.util.search_keys import search_key
 from typing import List, Optional
 from pydantic import BaseModel
 from collections import defaultdict
@@ -43,6 +48,40 @@ class LookupSuggestion(BaseModel):
     code: Optional[str] = None
     is_primary: Optional[bool] = None
 
+# --- In-memory matching via the graph's typeahead index (same match set as the ilike filters on the SQL path) ---
+
+def _system_filter(sys_key: str | None):
+    """``accept`` callback for mapping edges restricted to one system (None = any)."""
+    if sys_key is None:
+        return None
+    return lambda e: e.traditional_term.system == sys_key
+
+def _graph_mappings(graph, icd_ids) -> list:
+    """All verified edges of the given ICDs, in mapping id order (like the SQL expansion query)."""
+    return sorted((e for i in icd_ids for e in graph.edges_by_icd.get(i, ())), key=lambda e: e.id)
+
+def _sort_by_icd_rank(mappings: list, ranked_icd_ids) -> None:
+    """Group mappings by ICD in match-rank order (stable, so mapping id order is kept within an ICD)."""
+    position = {icd_id: n for n, icd_id in enumerate(ranked_icd_ids)}
+    mappings.sort(key=lambda m: position[m.icd11_code.id])
+
+def _graph_elements(graph, latest_rel, q_lower: str, q_key: str, exact_code: bool, system: str | None, limit: int):
+    """Matching snapshot elements from the graph, or None when it was built for another release."""
+    if graph is None or graph.release_id != latest_rel.id:
+        return None
+    accept = (lambda el: el.system == system) if system else None
+    return graph.suggest.elements.search(q_lower, limit, exact_code, accept, key=q_key)
+
+def _keep_candidates(candidates: dict, name: str, found: list, exact_code: bool, limit: int | None = None) -> None:
+    """Record ``found`` as the match set a longer query can filter, unless it may be incomplete: cut off by
+    ``limit``, or matched codes exactly (a longer fragment can still be a substring of codes this missed)."""
+    candidates[name] = None if exact_code or (limit is not None and len(found) >= limit) else found
+
+def _term_key_filter(q_key: str):
+    """Match on the stored search keys; they are folded at write time, so a plain LIKE needs no lower()."""
+    key_like = f"%{q_key}%"
+    return or_(TraditionalTerm.search_key.like(key_like), TraditionalTerm.vernacular_search_key.like(key_like))
+
 # --- Router Definition ---
 
 router = APIRouter()
@@ -59,12 +98,32 @@ async def lookup_term(
     Rules (requested behavior):
     1. If user types an Ayurvedic/Siddha/Unani primary or alias term (or its code), return that ICD anchor plus ALL system mappings (primary + aliases) for that ICD.
     2. If user types an ICD name or ICD code, return all system primary + alias terms bound to that ICD.
-    3. Matching considers: traditional.term, traditional.code, vernacular (devanagari|tamil|arabic), ICD name, ICD code.
+    3. Matching considers: traditional.term, traditional.code, vernacular (devanagari|tamil|arabic) and their script-folded search keys, ICD name, ICD code.
     4. If nothing in live verified mappings matches and snapshot fallback enabled, read latest ConceptMapRelease elements.
+    Served from the in-memory terminology graph, with answers cached per graph (app/services/lookup_cache.py);
+    the SQL queries in ``_lookup_term`` only run before the graph is built.
     """
+    graph = terminology_graph.current()
+    if graph is None:
+        return _lookup_term(db, None, query, system, use_snapshot_fallback, {})
+    q_lower = query.strip().lower()
+    q_key = search_key(query) or q_lower
+    scope = (system.lower() if system else None, release_registry.latest_version(), use_snapshot_fallback)
+    cached = lookup_cache.get(graph, "lookup", q_lower, scope)
+    if cached is not None:
+        return cached.result
+    candidates = lookup_cache.candidates(graph, "lookup", q_lower, q_key, scope)
+    result = _lookup_term(db, graph, query, system, use_snapshot_fallback, candidates)
+    lookup_cache.put(graph, "lookup", q_lower, scope, q_key, result, candidates)
+    return result
+
+def _lookup_term(db: Session, graph, query: str, system: str | None, use_snapshot_fallback: bool, candidates: dict):
+    """Body of ``/lookup``. ``candidates`` maps index name (``terms`` / ``icds``) to positions known to cover
+    every match; it is updated with this query's match sets for the cache."""
     import re
     q_raw = query.strip()
     q_lower = q_raw.lower()
+    q_key = search_key(q_raw) or q_lower
     like = f"%{q_lower}%"
 
     # Pattern hints
@@ -72,39 +131,62 @@ async def lookup_term(
     looks_like_tm_code = bool(re.match(r"^[A-Z]{1,6}[-_]?[0-9]{1,5}[A-Z0-9]*$", q_raw, flags=re.I))
 
     # 1. Try to resolve candidate ICD IDs via verified mappings
-    base_q = db.query(Mapping).join(TraditionalTerm).join(ICD11Code).filter(Mapping.status=='verified')
-    term_match_filter = or_(
-        TraditionalTerm.term.ilike(like),
-        TraditionalTerm.code.ilike(q_raw) if looks_like_tm_code else TraditionalTerm.code.ilike(like),
-        TraditionalTerm.devanagari.ilike(like),
-        TraditionalTerm.tamil.ilike(like),
-        TraditionalTerm.arabic.ilike(like),
-        ICD11Code.icd_name.ilike(like),
-        ICD11Code.icd_code.ilike(q_raw) if looks_like_icd_code else ICD11Code.icd_code.ilike(like)
-    )
-    if system:
-        term_match_filter = and_(term_match_filter, TraditionalTerm.system==system.lower())
-
-    candidate_mappings = base_q.filter(term_match_filter).options(
-        joinedload(Mapping.traditional_term), joinedload(Mapping.icd11_code)
-    ).all()
-
-    icd_ids = {m.icd11_code_id for m in candidate_mappings}
+    sys_key = system.lower() if system else None
+    if graph is not None:
+        accept = _system_filter(sys_key)
+        terms, icds = graph.suggest.terms, graph.suggest.icds
+        term_ns = terms.find(q_lower, None, looks_like_tm_code, accept, key=q_key, within=candidates.get("terms"))
+        icd_ns = icds.find(q_lower, None, looks_like_icd_code, within=candidates.get("icds"))
+        _keep_candidates(candidates, "terms", term_ns, looks_like_tm_code)
+        _keep_candidates(candidates, "icds", icd_ns, looks_like_icd_code)
+        # dict keeps the best-ranked position of each ICD
+        icd_ids = dict.fromkeys(terms.records[n].icd11_code.id for n in term_ns)
+        for icd in (icds.records[n] for n in icd_ns):
+            if icd.id not in icd_ids and any(accept is None or accept(e) for e in graph.edges_by_icd.get(icd.id, ())):
+                icd_ids[icd.id] = None
+    else:
+        base_q = db.query(Mapping).join(TraditionalTerm).join(ICD11Code).filter(Mapping.status=='verified')
+        term_match_filter = or_(
+            TraditionalTerm.term.ilike(like),
+            TraditionalTerm.code.ilike(q_raw) if looks_like_tm_code else TraditionalTerm.code.ilike(like),
+            TraditionalTerm.devanagari.ilike(like),
+            TraditionalTerm.tamil.ilike(like),
+            TraditionalTerm.arabic.ilike(like),
+            _term_key_filter(q_key),
+            ICD11Code.icd_name.ilike(like),
+            ICD11Code.icd_code.ilike(q_raw) if looks_like_icd_code else ICD11Code.icd_code.ilike(like)
+        )
+        if system:
+            term_match_filter = and_(term_match_filter, TraditionalTerm.system==sys_key)
+
+        candidate_mappings = order_by_similarity(
+            base_q.filter(term_match_filter), db, q_lower,
+            TraditionalTerm.term, TraditionalTerm.code, TraditionalTerm.devanagari, TraditionalTerm.tamil,
+            TraditionalTerm.arabic, ICD11Code.icd_name, ICD11Code.icd_code,
+        ).options(joinedload(Mapping.traditional_term), joinedload(Mapping.icd11_code)).all()
+
+        # dict keeps the best-ranked position of each ICD
+        icd_ids = dict.fromkeys(m.icd11_code_id for m in candidate_mappings)
 
     if not icd_ids and use_snapshot_fallback:
         # Fallback to latest snapshot release elements (acts as cached system mapping)
-        latest_rel = db.query(ConceptMapRelease).order_by(ConceptMapRelease.created_at.desc()).first()
+        latest_rel = release_registry.latest()
         if latest_rel:
-            el_q = db.query(ConceptMapElement).filter(ConceptMapElement.release_id==latest_rel.id)
-            # filter by term/code/system or icd
-            el_filters = [or_(
-                ConceptMapElement.icd_name.ilike(like),
-                ConceptMapElement.icd_code.ilike(q_raw) if looks_like_icd_code else ConceptMapElement.icd_code.ilike(like),
-                ConceptMapElement.term.ilike(like)
-            )]
-            if system:
-                el_filters.append(ConceptMapElement.system==system.lower())
-            snapshot_elements = el_q.filter(and_(*el_filters)).limit(200).all()
+            snapshot_elements = _graph_elements(graph, latest_rel, q_lower, q_key, looks_like_icd_code, sys_key, 200)
+            if snapshot_elements is None:
+                el_q = db.query(ConceptMapElement).filter(ConceptMapElement.release_id==latest_rel.id)
+                # filter by term/code/system or icd
+                el_filters = [or_(
+                    ConceptMapElement.icd_name.ilike(like),
+                    ConceptMapElement.icd_code.ilike(q_raw) if looks_like_icd_code else ConceptMapElement.icd_code.ilike(like),
+                    ConceptMapElement.term.ilike(like)
+                )]
+                if system:
+                    el_filters.append(ConceptMapElement.system==sys_key)
+                snapshot_elements = order_by_similarity(
+                    el_q.filter(and_(*el_filters)), db, q_lower,
+                    ConceptMapElement.icd_name, ConceptMapElement.term, ConceptMapElement.icd_code,
+                ).limit(200).all()
             if snapshot_elements:
                 # Build pseudo LookupResult objects from snapshot
                 grouped = defaultdict(lambda: defaultdict(list))  # icd -> system -> elements
@@ -134,12 +216,16 @@ async def lookup_term(
 
     # If we have candidate ICD IDs but limited mappings (e.g., match on term) expand to ALL verified mappings for those ICDs
 
-    all_mappings = db.query(Mapping).filter(Mapping.status=='verified', Mapping.icd11_code_id.in_(icd_ids)) \
-        .options(joinedload(Mapping.traditional_term), joinedload(Mapping.icd11_code)).all()
+    if graph is not None:
+        all_mappings = _graph_mappings(graph, icd_ids)
+    else:
+        all_mappings = db.query(Mapping).filter(Mapping.status=='verified', Mapping.icd11_code_id.in_(list(icd_ids))) \
+            .options(joinedload(Mapping.traditional_term), joinedload(Mapping.icd11_code)).order_by(Mapping.id).all()
+    _sort_by_icd_rank(all_mappings, icd_ids)
 
     results_dict = defaultdict(lambda: {"icd_description": None, "systems": defaultdict(lambda: {"primary": None, "aliases": []})})
 
-    def push_mapping(m: Mapping):
+    def push_mapping(m):
         icd = m.icd11_code
         td = m.traditional_term
         slot = results_dict[icd.icd_name]
@@ -177,23 +263,54 @@ async def lookup_suggest(
     db: Session = Depends(get_db),
     principal = Depends(get_current_principal)
 ):
+    graph = terminology_graph.current()
+    if graph is None:
+        return _lookup_suggest(db, None, q, system, limit, include_snapshot, {})
+    frag_lower = q.strip().lower()
+    frag_key = search_key(q) or frag_lower
+    scope = (system.lower() if system else None, release_registry.latest_version(), include_snapshot, limit)
+    cached = lookup_cache.get(graph, "suggest", frag_lower, scope)
+    if cached is not None:
+        return cached.result
+    candidates = lookup_cache.candidates(graph, "suggest", frag_lower, frag_key, scope)
+    result = _lookup_suggest(db, graph, q, system, limit, include_snapshot, candidates)
+    lookup_cache.put(graph, "suggest", frag_lower, scope, frag_key, result, candidates)
+    return result
+
+def _lookup_suggest(db: Session, graph, q: str, system: str | None, limit: int, include_snapshot: bool,
+                    candidates: dict):
+    """Body of ``/lookup/suggest``; ``candidates`` as in :func:`_lookup_term`."""
     frag = q.strip()
-    like = f"%{frag.lower()}%"
+    frag_lower = frag.lower()
+    frag_key = search_key(frag) or frag_lower
+    like = f"%{frag_lower}%"
     import re
     looks_like_icd_code = bool(re.match(r"^[A-TV-Z][0-9][0-9A-Z](?:\.[0-9A-Z]{1,4})?$", frag, flags=re.I))
     looks_like_tm_code = bool(re.match(r"^[A-Z]{1,6}[-_]?[0-9]{1,5}[A-Z0-9]*$", frag, flags=re.I))
 
+    sys_key = system.lower() if system else None
+
     # 1. Direct ICD match (code or name) => expand all its mappings as suggestions
-    icd_anchor_q = db.query(ICD11Code).filter(or_(
-        ICD11Code.icd_name.ilike(like),
-        ICD11Code.icd_code.ilike(frag if looks_like_icd_code else like)
-    )).limit(10).all()
+    if graph is not None:
+        icds = graph.suggest.icds
+        icd_ns = icds.find(frag_lower, 10, looks_like_icd_code, within=candidates.get("icds"))
+        _keep_candidates(candidates, "icds", icd_ns, looks_like_icd_code, 10)
+        icd_anchor_q = [icds.records[n] for n in icd_ns]
+    else:
+        icd_anchor_q = order_by_similarity(db.query(ICD11Code).filter(or_(
+            ICD11Code.icd_name.ilike(like),
+            ICD11Code.icd_code.ilike(frag if looks_like_icd_code else like)
+        )), db, frag_lower, ICD11Code.icd_name, ICD11Code.icd_code).limit(10).all()
 
     suggestions: list[LookupSuggestion] = []
     if icd_anchor_q:
         icd_ids = [c.id for c in icd_anchor_q]
-        mapped = db.query(Mapping).join(TraditionalTerm).filter(Mapping.status=='verified', Mapping.icd11_code_id.in_(icd_ids)).join(ICD11Code).options(joinedload(Mapping.traditional_term), joinedload(Mapping.icd11_code)).all()
-        by_icd: dict[str, list[Mapping]] = defaultdict(list)
+        if graph is not None:
+            mapped = _graph_mappings(graph, icd_ids)
+        else:
+            mapped = db.query(Mapping).join(TraditionalTerm).filter(Mapping.status=='verified', Mapping.icd11_code_id.in_(icd_ids)).join(ICD11Code).options(joinedload(Mapping.traditional_term), joinedload(Mapping.icd11_code)).order_by(Mapping.id).all()
+        _sort_by_icd_rank(mapped, icd_ids)
+        by_icd: dict[str, list] = defaultdict(list)
         for m in mapped: by_icd[m.icd11_code.icd_name].append(m)
         for icd_name, maps in by_icd.items():
             # Add ICD anchor suggestion (single) – user can choose it directly
@@ -207,17 +324,28 @@ async def lookup_suggest(
 
     # 2. Traditional term/code fragment (if not already captured above sufficiently)
     if len(suggestions) < limit:
-        tt_like = or_(
-            TraditionalTerm.term.ilike(like),
-            TraditionalTerm.devanagari.ilike(like),
-            TraditionalTerm.tamil.ilike(like),
-            TraditionalTerm.arabic.ilike(like),
-            TraditionalTerm.code.ilike(frag if looks_like_tm_code else like)
-        )
-        tt_filters = [Mapping.status=='verified', tt_like]
-        if system: tt_filters.append(TraditionalTerm.system==system.lower())
-        tt_rows = db.query(Mapping).join(TraditionalTerm).join(ICD11Code).filter(*tt_filters) \
-            .options(joinedload(Mapping.traditional_term), joinedload(Mapping.icd11_code)).limit(limit*2).all()
+        if graph is not None:
+            terms = graph.suggest.terms
+            term_ns = terms.find(frag_lower, limit*2, looks_like_tm_code, _system_filter(sys_key), key=frag_key,
+                                 within=candidates.get("terms"))
+            _keep_candidates(candidates, "terms", term_ns, looks_like_tm_code, limit*2)
+            tt_rows = [terms.records[n] for n in term_ns]
+        else:
+            tt_like = or_(
+                TraditionalTerm.term.ilike(like),
+                TraditionalTerm.devanagari.ilike(like),
+                TraditionalTerm.tamil.ilike(like),
+                TraditionalTerm.arabic.ilike(like),
+                _term_key_filter(frag_key),
+                TraditionalTerm.code.ilike(frag if looks_like_tm_code else like)
+            )
+            tt_filters = [Mapping.status=='verified', tt_like]
+            if system: tt_filters.append(TraditionalTerm.system==sys_key)
+            tt_rows = order_by_similarity(
+                db.query(Mapping).join(TraditionalTerm).join(ICD11Code).filter(*tt_filters), db, frag_lower,
+                TraditionalTerm.term, TraditionalTerm.code, TraditionalTerm.devanagari, TraditionalTerm.tamil,
+                TraditionalTerm.arabic,
+            ).options(joinedload(Mapping.traditional_term), joinedload(Mapping.icd11_code)).limit(limit*2).all()
         seen_tm: set[tuple[str,str|None]] = set()
         for m in tt_rows:
             td = m.traditional_term
@@ -230,13 +358,18 @@ async def lookup_suggest(
 
     # 3. Snapshot fallback if still empty
     if not suggestions and include_snapshot:
-        latest_rel = db.query(ConceptMapRelease).order_by(ConceptMapRelease.created_at.desc()).first()
+        latest_rel = release_registry.latest()
         if latest_rel:
-            el_q = db.query(ConceptMapElement).filter(ConceptMapElement.release_id==latest_rel.id)
-            el_filters = or_(ConceptMapElement.icd_name.ilike(like), ConceptMapElement.icd_code.ilike(like), ConceptMapElement.term.ilike(like))
-            if system:
-                el_q = el_q.filter(ConceptMapElement.system==system.lower())
-            els = el_q.filter(el_filters).limit(limit*2).all()
+            els = _graph_elements(graph, latest_rel, frag_lower, frag_key, False, sys_key, limit*2)
+            if els is None:
+                el_q = db.query(ConceptMapElement).filter(ConceptMapElement.release_id==latest_rel.id)
+                el_filters = or_(ConceptMapElement.icd_name.ilike(like), ConceptMapElement.icd_code.ilike(like), ConceptMapElement.term.ilike(like))
+                if system:
+                    el_q = el_q.filter(ConceptMapElement.system==sys_key)
+                els = order_by_similarity(
+                    el_q.filter(el_filters), db, frag_lower,
+                    ConceptMapElement.icd_name, ConceptMapElement.term, ConceptMapElement.icd_code,
+                ).limit(limit*2).all()
             seen: set[tuple[str,str,str]] = set()
             for el in els:
                 anchor_key = (el.icd_name, el.term, el.system)
@@ -245,4 +378,8 @@ async def lookup_suggest(
                 suggestions.append(LookupSuggestion(kind='snapshot', icd_name=el.icd_name, system=el.system, term=el.term, code=None, is_primary=el.is_primary))
                 if len(suggestions) >= limit:
                     break
-    return suggestions[:limit]
\ No newline at end of file
+    return suggestions[:limit]
+
+@router.get("/lookup/cache/stats")
+def lookup_cache_stats():
+    return lookup_cache.stats()
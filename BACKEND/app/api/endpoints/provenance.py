@@ -6,6 +6,8 @@ from typing import Optional
 
 from app.db.session import get_db
 from app.db import models
+from app.services.release_registry import release_registry
+from app.util.json_response import FastJSONResponse
 
 router = APIRouter(prefix="/provenance", tags=["Provenance"]) 
 
@@ -16,7 +18,7 @@ def provenance_for_mapping(
     db: Session = Depends(get_db)
 ):
     # Find latest release and one element for the given icd_name (+ optional system)
-    rel = db.execute(select(models.ConceptMapRelease).order_by(models.ConceptMapRelease.created_at.desc())).scalar_one_or_none()
+    rel = release_registry.latest()
     if not rel:
         raise HTTPException(404, "No ConceptMap release found")
     # Case-insensitive icd_name match
@@ -64,7 +66,7 @@ def provenance_for_mapping(
 
 @router.get("/conceptmap/release/{version}")
 def provenance_bundle_for_release(version: str, limit: int = Query(500, ge=1, le=2000), db: Session = Depends(get_db)):
-    rel = db.execute(select(models.ConceptMapRelease).where(models.ConceptMapRelease.version == version)).scalar_one_or_none()
+    rel = release_registry.get(version)
     if not rel:
         raise HTTPException(404, "Release not found")
     rows = db.execute(select(models.ConceptMapElement).where(models.ConceptMapElement.release_id == rel.id).limit(limit)).scalars().all()
@@ -82,7 +84,7 @@ def provenance_bundle_for_release(version: str, limit: int = Query(500, ge=1, le
                 "entity": [{"role": "source", "what": {"display": e.term}}]
             }
         })
-    return {"resourceType": "Bundle", "type": "collection", "total": len(entries), "entry": entries}
+    return FastJSONResponse({"resourceType": "Bundle", "type": "collection", "total": len(entries), "entry": entries})
 
 @router.get("/mapping/{mapping_id}")
 def provenance_for_mapping_id(mapping_id: int, db: Session = Depends(get_db)):
@@ -2,7 +2,9 @@ from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 from sqlalchemy import func, select
 from app.db.session import get_db
-from app.db.models import Mapping, ConceptMapRelease, ConceptMapElement, MappingAudit, IngestionBatch, IngestionRow
+from app.services.release_registry import release_registry
+from app.services.terminology_graph import terminology_graph
+from app.db.models import Mapping, ConceptMapElement, MappingAudit, IngestionBatch, IngestionRow
 
 router = APIRouter(tags=["Status"]) 
 
@@ -12,7 +14,7 @@ def system_status(db: Session = Depends(get_db)):
     verified = db.query(func.count(Mapping.id)).filter(Mapping.status == 'verified').scalar() or 0
     suggested = db.query(func.count(Mapping.id)).filter(Mapping.status == 'suggested').scalar() or 0
     staged = db.query(func.count(Mapping.id)).filter(Mapping.status == 'staged').scalar() or 0
-    release = db.query(ConceptMapRelease).order_by(ConceptMapRelease.created_at.desc()).first()
+    release = release_registry.latest()
     release_version = release.version if release else None
     elements = 0
     if release:
@@ -34,5 +36,6 @@ def system_status(db: Session = Depends(get_db)):
         "ingest_batches": batches,
         "ingest_rows_pending": pending_rows,
         "ingest_rows_promoted": promoted_rows,
-        "ingest_rows_rejected": rejected_rows
+        "ingest_rows_rejected": rejected_rows,
+        "terminology_graph": terminology_graph.stats()
     }
@@ -1,16 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+import asyncio
+import hashlib
+import os
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import and_
-from app.db.session import get_db
+from app.db.session import get_db, SessionLocal
 from app.core.security import get_current_principal
 from app.core.consent import require_consent
-from app.db.models import Mapping, TraditionalTerm, ICD11Code, ConceptMapRelease
+from app.db.models import Mapping, TraditionalTerm, ICD11Code
+from app.db.text_search import order_by_similarity
 from app.util.fhir_outcome import outcome_not_found, outcome_validation
+from app.util import http_cache
 from app.services.cache_service import translation_cache
-from app.services import who_api_client
+from app.services import who_api_client, who_async_client
+from app.services.icd_mirror import icd_mirror
+from app.services.release_registry import release_registry
+from app.services.enrichment_queue import enrichment_queue
+from app.services.terminology_graph import terminology_graph
+from app.services.release_snapshot import release_snapshots
+from app.services import translation_table
 from pydantic import BaseModel, Field
 from typing import List, Dict, Any, Optional
-from sqlalchemy import or_, func
+from sqlalchemy import or_
 
 # --- Pydantic Response Models ---
 
@@ -40,15 +51,29 @@ class TranslateResult(BaseModel):
     tm2: Optional[ICDEntry] = None
     release_version: Optional[str] = None
     direction: Optional[str] = None  # 'forward' or 'reverse'
+    enrichment_skipped: bool = False  # WHO circuit open: missing ICD/TM2 details were not fetched
+    enrichment_pending: List[str] = Field(default_factory=list)  # steps cut off by the latency budget ('icd', 'tm2')
+
+class BatchTranslateItem(BaseModel):
+    system: Optional[str] = None
+    code: Optional[str] = None
+    icd_name: Optional[str] = None
+
+class BatchTranslateRequest(BaseModel):
+    items: List[BatchTranslateItem]
+    release: Optional[str] = None
+    fhir: bool = False
 
 # --- Router Definition ---
 
 router = APIRouter()
 
-def _latest_release_version(db: Session) -> Optional[str]:
-    rel = db.query(ConceptMapRelease).order_by(ConceptMapRelease.created_at.desc()).first()
-    return rel.version if rel else None
+TRANSLATE_BATCH_MAX_ITEMS = int(os.getenv("TRANSLATE_BATCH_MAX_ITEMS", "5000"))
+TRANSLATE_BATCH_CONCURRENCY = int(os.getenv("TRANSLATE_BATCH_CONCURRENCY", "8"))
+# Deadline for one /translate call; WHO enrichment still running then finishes in the background (0 = no deadline)
+TRANSLATE_LATENCY_BUDGET_MS = float(os.getenv("TRANSLATE_LATENCY_BUDGET_MS", "500"))
 
+_background_tasks: set = set()
 
 def _to_fhir_parameters(result: TranslateResult) -> dict:
     """Convert internal TranslateResult into a FHIR Parameters resource."""
@@ -60,6 +85,10 @@ def _to_fhir_parameters(result: TranslateResult) -> dict:
             {"name": "direction", "valueString": result.direction or "forward"},
         ]
     }
+    if result.enrichment_skipped:
+        params["parameter"].append({"name": "enrichmentSkipped", "valueBoolean": True})
+    for step in result.enrichment_pending:
+        params["parameter"].append({"name": "enrichmentPending", "valueString": step})
     # ICD target
     if result.icd:
         params["parameter"].append({
@@ -94,196 +123,75 @@ def _to_fhir_parameters(result: TranslateResult) -> dict:
     return params
 
 
-@router.get("/translate", response_model=TranslateResult)
-async def translate_code(
-    system: Optional[str] = Query(None, description="The source traditional medicine system (e.g., 'ayurveda')."),
-    code: Optional[str] = Query(None, description="The source NAMASTE code (e.g., 'AKK-12')."),
-    icd_name: Optional[str] = Query(None, description="ICD-11 disease name to enrich via WHO; preferred for WHO lookups."),
-    release: Optional[str] = Query(None, description="ICD-11 linearization release to target (e.g., '2025-01')."),
-    fhir: bool = Query(False, description="If true, wrap successful response as FHIR Parameters resource."),
-    db: Session = Depends(get_db),
-    principal = Depends(get_current_principal),
-    _consent=Depends(require_consent('translation'))
-):
-    """
-    Translate endpoint behavior:
-    - If icd_name is provided: use it to fetch WHO ICD/TM2 details and assemble
-      traditional system mappings from VERIFIED DB for that ICD.
-    - Else: use (system, code) to locate the VERIFIED mapping, derive the ICD name,
-      then fetch WHO details for that ICD name.
+def _alt_terms(sys_map: Dict[str, SystemMappingEntry]) -> list[str]:
+    """Traditional term names for TM2 fallbacks (primary first, then aliases across systems)."""
+    alt_terms: list[str] = []
+    for entry in sys_map.values():
+        if entry and entry.primary and entry.primary.name:
+            alt_terms.append(entry.primary.name)
+        if entry:
+            for al in entry.aliases:
+                if al.name:
+                    alt_terms.append(al.name)
+    return alt_terms
+
+
+def _icd_entry_from_who(data: dict) -> ICDEntry:
+    def _val(x):
+        if isinstance(x, dict):
+            return x.get("@value") or x.get("value")
+        return x
+    return ICDEntry(
+        name=_val(data.get("title")),
+        code=data.get("code") or None,
+        description=_val(data.get("definition")),
+        icd_uri=data.get("@id") or data.get("id"),
+        extra={"source": data["source"]} if data.get("source") else {}
+    )
 
-    In all cases, WHO is queried with the ICD disease name, not the NAMASTE code.
-    """
-    icd_code: Optional[ICD11Code] = None
-    mapping: Optional[Mapping] = None
-    cache_id_parts: list[str] = []
 
-    if icd_name:
-        # Lookup by ICD name (disease-centric request)
-        icd_code = db.query(ICD11Code).filter(ICD11Code.icd_name == icd_name).first()
-        if not icd_code:
-            return outcome_not_found("ICD name not found")
-        has_verified = db.query(Mapping).filter(
-            Mapping.icd11_code_id == icd_code.id,
-            Mapping.status == 'verified'
-        ).first() is not None
-        if not has_verified:
-            return outcome_validation("Disease not verified")
-        cache_id_parts.append(icd_name)
-    else:
-        # Lookup by (system, code)
-        if not (system and code):
-            return outcome_validation("Provide either icd_name or (system and code)")
-        mapping = (
-            db.query(Mapping)
-            .join(TraditionalTerm)
-            .options(joinedload(Mapping.traditional_term), joinedload(Mapping.icd11_code))
-            .filter(
-                TraditionalTerm.system == system.lower(),
-                TraditionalTerm.code == code,
-                Mapping.status == 'verified',
-                Mapping.is_primary == True
-            )
-            .first()
-        )
-        if not mapping:
-            return outcome_not_found("No verified primary mapping found for the given NAMASTE code")
-        icd_code = mapping.icd11_code
-        cache_id_parts.append(f"{system}:{code}")
+def _tm2_chain_key(icd_name: str, alt_terms: list[str]) -> str:
+    digest = hashlib.sha1("\x1f".join(sorted(t.strip().lower() for t in alt_terms)).encode("utf-8")).hexdigest()[:12]
+    return f"{icd_name}|{digest}"
 
-    if not icd_code:
-        return outcome_not_found("ICD context not resolved")
 
-    # Cache lookup (forward direction)
-    active_release = release or _latest_release_version(db)
-    cache_key = "|".join(cache_id_parts + [active_release or 'latest'])
-    cached = translation_cache.get(active_release, 'forward', cache_key)
-    if cached:
-        if fhir and hasattr(cached, 'release_version'):
-            return _to_fhir_parameters(cached)  # type: ignore
-        return cached
+def _tm2_offline(icd_name: str, sys_map: Dict[str, SystemMappingEntry],
+                 release: Optional[str]) -> tuple[Optional[ICDEntry], bool]:
+    """TM2 from the ICD mirror / negative cache alone: ``(entry, settled)``; unsettled means only WHO can answer."""
+    alt_terms = _alt_terms(sys_map)
+    mirrored = icd_mirror.lookup_any_title([icd_name] + alt_terms, 'tm2', release)
+    if mirrored:
+        return _icd_entry_from_who(mirrored), True
+    return None, who_api_client.is_known_miss('chain', _tm2_chain_key(icd_name, alt_terms), 'tm2', release)
 
-    # 2. For the mapped ICD, pull the verified terms for each system (primary + aliases)
-    verified_mappings = (
-        db.query(Mapping)
-        .join(TraditionalTerm)
-        .filter(
-            Mapping.icd11_code_id == icd_code.id,
-            Mapping.status == 'verified',
-            # include both primary and aliases
-        ).all()
-    )
 
-    sys_map: Dict[str, SystemMappingEntry] = {}
-    for m in verified_mappings:
-        t = m.traditional_term
-        if t.system not in sys_map:
-            sys_map[t.system] = SystemMappingEntry(primary=None, aliases=[])
-        term_obj = SystemTerm(
-            name=t.term,
-            code=t.code,
-            description=t.source_description,
-            vernacular=t.devanagari or t.tamil or t.arabic,
-            extra={"source_row": t.source_row}
-        )
-        if m.is_primary and sys_map[t.system].primary is None:
-            sys_map[t.system].primary = term_obj
-        else:
-            sys_map[t.system].aliases.append(term_obj)
-
-    # 3. Use the helper to fetch live data from the WHO API for the mapped ICD code
-    # Prefer MMS search by release to fetch a code directly if available
-    who_data = None
-    mms_norm = None
-    try:
-        mms_norm = who_api_client.mms_search_by_release(icd_code.icd_name, release)
-    except Exception:
-        mms_norm = None
-    if mms_norm and (mms_norm.get("code") or mms_norm.get("title")):
-        who_data = mms_norm
-    else:
-        # Try foundation search -> release-specific linearized fetch to pull a code
-        ent_uri = who_api_client.search_foundation_uri(icd_code.icd_name)
-        ent_id = None
-        if ent_uri:
-            try:
-                ent_id = ent_uri.rstrip('/').split('/')[-1]
-            except Exception:
-                ent_id = None
-        if ent_id:
-            lin = who_api_client.fetch_linearized_entity_by_release(ent_id, 'mms', release)
-            if lin and (lin.get('code') or lin.get('title')):
-                who_data = lin
-            else:
-                who_data = who_api_client.search_and_fetch_entity(icd_code.icd_name)
-        else:
-            who_data = who_api_client.search_and_fetch_entity(icd_code.icd_name)
-
-    icd_entry: Optional[ICDEntry] = None
-    if who_data:
-        # Extract title/definition with tolerant handling of dict or string
-        def _val(x):
-            if isinstance(x, dict):
-                return x.get("@value") or x.get("value")
-            return x
-        title = _val(who_data.get("title"))
-        definition = _val(who_data.get("definition"))
-        # Only set code if WHO returns a code; otherwise leave None.
-        icd_code_val = who_data.get("code") or None
-        icd_uri = who_data.get("@id")
-
-        # If definition was not present in the initial normalized search result,
-        # fetch full entity details using the @id to obtain the definition.
-        if not definition and icd_uri:
-            try:
-                full_ent = who_api_client.get_entity_details(icd_uri)
-                if full_ent:
-                    title = _val(full_ent.get("title")) or title
-                    definition = _val(full_ent.get("definition")) or definition
-                    icd_code_val = full_ent.get("code") or icd_code_val
-            except Exception:
-                pass
+async def _resolve_tm2(icd_name: str, sys_map: Dict[str, SystemMappingEntry], release: Optional[str]) -> Optional[ICDEntry]:
+    """Best-effort TM2 enrichment for an ICD name via the WHO fallback chain.
 
-        # Persist WHO definition and ICD code into ICD table so it appears in ICD list
-        try:
-            dirty = False
-            if definition and (icd_code.description != definition):
-                icd_code.description = definition
-                dirty = True
-            # Save the WHO MMS/TM2 code if provided
-            if icd_code_val and getattr(icd_code, 'icd_code', None) != icd_code_val:
-                icd_code.icd_code = icd_code_val
-                dirty = True
-            if dirty:
-                db.add(icd_code)
-                db.commit()
-        except Exception:
-            db.rollback()
+    A full-chain miss is memoized per (icd_name, alt terms, release) in the WHO
+    negative cache, so repeated translations of TM2-less diseases skip the chain
+    (up to ~30 WHO calls) entirely, while a newly verified alias re-runs it.
+    Misses caused by WHO being unreachable are not memoized.
+    """
+    tm2_entry, settled = _tm2_offline(icd_name, sys_map, release)
+    if settled:
+        return tm2_entry
+    with who_api_client.upstream_trace() as failures:
+        tm2_entry = await _walk_tm2_chain(icd_name, sys_map, release)
+    if tm2_entry is None and not failures:
+        who_api_client.record_miss('chain', _tm2_chain_key(icd_name, _alt_terms(sys_map)), 'tm2', release)
+    return tm2_entry
 
-        icd_entry = ICDEntry(
-            name=title,
-            code=icd_code_val,
-            description=definition,
-            icd_uri=icd_uri,
-            extra={}
-        )
 
-    # 4. Try to fetch a TM2 entry (best-effort) via WHO API helper.
+async def _walk_tm2_chain(icd_name: str, sys_map: Dict[str, SystemMappingEntry], release: Optional[str]) -> Optional[ICDEntry]:
     tm2_entry: Optional[ICDEntry] = None
-    tm2_data = who_api_client.search_and_fetch_tm2(icd_code.icd_name)
+    tm2_data = await who_async_client.search_and_fetch_tm2(icd_name)
     # Fallback: try traditional term names (primary first, then aliases across systems)
+    alt_terms = _alt_terms(sys_map)
     if not tm2_data:
-        alt_terms: list[str] = []
-        for syskey, entry in sys_map.items():
-            if entry and entry.primary and entry.primary.name:
-                alt_terms.append(entry.primary.name)
-            if entry:
-                for al in entry.aliases:
-                    if al.name:
-                        alt_terms.append(al.name)
         if alt_terms:
             try:
-                tm2_data = who_api_client.search_tm2_by_terms(alt_terms[:10])  # cap to 10 variants
+                tm2_data = await who_async_client.search_tm2_by_terms(alt_terms[:10])  # cap to 10 variants
             except Exception:
                 tm2_data = None
     if tm2_data:
@@ -302,21 +210,13 @@ async def translate_code(
     if not tm2_entry:
         tm2_norm = None
         try:
-            tm2_norm = who_api_client.tm2_search_by_release(icd_code.icd_name, release)
+            tm2_norm = await who_async_client.tm2_search_by_release(icd_name, release)
         except Exception:
             tm2_norm = None
         if not tm2_norm:
-            alt_terms: list[str] = []
-            for entry in sys_map.values():
-                if entry and entry.primary and entry.primary.name:
-                    alt_terms.append(entry.primary.name)
-                if entry:
-                    for al in entry.aliases:
-                        if al.name:
-                            alt_terms.append(al.name)
             for t in alt_terms[:10]:
                 try:
-                    tm2_norm = who_api_client.tm2_search_by_release(t, release)
+                    tm2_norm = await who_async_client.tm2_search_by_release(t, release)
                     if tm2_norm:
                         break
                 except Exception:
@@ -331,7 +231,7 @@ async def translate_code(
             )
         else:
             # Foundation search then TM2 linearized for a specific release
-            ent_uri2 = who_api_client.search_foundation_uri(icd_code.icd_name)
+            ent_uri2 = await who_async_client.search_foundation_uri(icd_name)
             ent_id2 = None
             if ent_uri2:
                 try:
@@ -339,7 +239,7 @@ async def translate_code(
                 except Exception:
                     ent_id2 = None
             if ent_id2:
-                tm2_lin = who_api_client.fetch_linearized_entity_by_release(ent_id2, 'tm2', release)
+                tm2_lin = await who_async_client.fetch_linearized_entity_by_release(ent_id2, 'tm2', release)
                 if tm2_lin and (tm2_lin.get('code') or tm2_lin.get('title')):
                     tm2_entry = ICDEntry(
                         name=(tm2_lin.get("title") or {}).get("@value") if isinstance(tm2_lin.get("title"), dict) else tm2_lin.get("title"),
@@ -348,24 +248,561 @@ async def translate_code(
                         icd_uri=tm2_lin.get("@id") or tm2_lin.get("id"),
                         extra={}
                     )
+    return tm2_entry
 
-    # 5. Assemble the final response
-    result = TranslateResult(
+
+async def _fetch_mms_live(icd_name: str, release: Optional[str]) -> Optional[dict]:
+    # Prefer MMS search by release to fetch a code directly if available
+    mms_norm = None
+    try:
+        mms_norm = await who_async_client.mms_search_by_release(icd_name, release)
+    except Exception:
+        mms_norm = None
+    if mms_norm and (mms_norm.get("code") or mms_norm.get("title")):
+        return mms_norm
+    # Try foundation search -> release-specific linearized fetch to pull a code
+    ent_uri = await who_async_client.search_foundation_uri(icd_name)
+    ent_id = None
+    if ent_uri:
+        try:
+            ent_id = ent_uri.rstrip('/').split('/')[-1]
+        except Exception:
+            ent_id = None
+    if ent_id:
+        lin = await who_async_client.fetch_linearized_entity_by_release(ent_id, 'mms', release)
+        if lin and (lin.get('code') or lin.get('title')):
+            who_data = lin
+        else:
+            who_data = await who_async_client.search_and_fetch_entity(icd_name)
+    else:
+        who_data = await who_async_client.search_and_fetch_entity(icd_name)
+    return who_data
+
+
+def _cache_deps(payload: dict, system: Optional[str] = None, code: Optional[str] = None) -> dict:
+    """What a cached translation was built from: its ICD row and every NAMASTE code in it (plus the requested one)."""
+    codes = [
+        (sys_key, term["code"])
+        for sys_key, entry in (payload.get("systems") or {}).items()
+        for term in [entry.get("primary")] + list(entry.get("aliases") or [])
+        if term and term.get("code")
+    ]
+    if system and code:
+        codes.append((system, code))
+    return {"icd_ids": [payload["icd_id"]], "codes": codes}
+
+
+def _sys_map_from_payload(payload: dict) -> Dict[str, SystemMappingEntry]:
+    return {s: SystemMappingEntry(**entry) for s, entry in (payload.get("systems") or {}).items()}
+
+
+def _live_payload(db: Session, system: Optional[str], code: Optional[str], icd_name: Optional[str]) -> dict:
+    """Resolve a translate payload from the live mapping tables (or an OperationOutcome).
+
+    Used when the release translation table has no row, e.g. for mappings verified
+    after the last release refresh.
+    """
+    if icd_name:
+        # Lookup by ICD name (disease-centric request)
+        icd_code = db.query(ICD11Code).filter(ICD11Code.icd_name == icd_name).first()
+        if not icd_code:
+            return outcome_not_found("ICD name not found")
+    else:
+        # Lookup by (system, code)
+        mapping = (
+            db.query(Mapping)
+            .join(TraditionalTerm)
+            .options(joinedload(Mapping.traditional_term), joinedload(Mapping.icd11_code))
+            .filter(
+                TraditionalTerm.system == system.lower(),
+                TraditionalTerm.code == code,
+                Mapping.status == 'verified',
+                Mapping.is_primary == True
+            )
+            .first()
+        )
+        if not mapping:
+            return outcome_not_found("No verified primary mapping found for the given NAMASTE code")
+        icd_code = mapping.icd11_code
+        if not icd_code:
+            return outcome_not_found("ICD context not resolved")
+
+    # For the mapped ICD, pull the verified terms for each system (primary + aliases)
+    verified_mappings = (
+        db.query(Mapping)
+        .join(TraditionalTerm)
+        .filter(
+            Mapping.icd11_code_id == icd_code.id,
+            Mapping.status == 'verified',
+        )
+        .order_by(Mapping.id)
+        .all()
+    )
+    if not verified_mappings:
+        return outcome_validation("Disease not verified")
+    return translation_table.build_payload(icd_code, verified_mappings)
+
+
+def _graph_for(latest_release: Optional[str]):
+    """The compiled terminology graph when it was built for ``latest_release`` (else None: read the tables)."""
+    graph = terminology_graph.current()
+    return graph if graph is not None and graph.release_version == latest_release else None
+
+
+def _graph_payload(graph, system: Optional[str], code: Optional[str], icd_name: Optional[str]) -> dict:
+    """:func:`_live_payload` against the compiled graph (release translation rows first); no SQL."""
+    if icd_name:
+        payload = graph.icd_payload(icd_name)
+        if payload is None:
+            if icd_name in graph.icd_by_name:
+                return outcome_validation("Disease not verified")
+            return outcome_not_found("ICD name not found")
+        return payload
+    payload = graph.code_payload(system.lower(), code)
+    if payload is None:
+        return outcome_not_found("No verified primary mapping found for the given NAMASTE code")
+    return payload
+
+
+def _release_snapshot(version: Optional[str]):
+    """The mmapped snapshot for ``version`` if it was built from the release's current rows."""
+    snap = release_snapshots.get(version)
+    info = release_registry.get(version) if snap is not None else None
+    return snap if info is not None and snap.revision == info.revision else None
+
+
+def _resolve_payload(db: Session, latest_release: Optional[str], system: Optional[str], code: Optional[str],
+                     icd_name: Optional[str]) -> dict:
+    """Translate payload (or OperationOutcome): compiled graph, else the mmapped release
+    snapshot (or release table), else live tables."""
+    graph = _graph_for(latest_release)
+    if graph is not None:
+        return _graph_payload(graph, system, code, icd_name)
+    snap = _release_snapshot(latest_release)
+    if snap is not None:
+        payload = snap.icd_payload(icd_name) if icd_name else snap.code_payload(system.lower(), code)
+    elif icd_name:
+        payload = translation_table.lookup_icd(db, latest_release, icd_name)
+    else:
+        payload = translation_table.lookup_code(db, latest_release, system, code)
+    return payload if payload is not None else _live_payload(db, system, code, icd_name)
+
+
+def _translate_etag(request: Request) -> Optional[str]:
+    """ETag for a translate read: latest ConceptMap release + terminology graph content; None until the graph is built."""
+    latest = release_registry.latest()
+    graph = _graph_for(latest.version) if latest is not None else None
+    if graph is None:
+        return None
+    return http_cache.compute_etag(request, latest.version, latest.revision, graph.revision)
+
+
+def _forward_cache_key(icd_name: Optional[str], system: Optional[str], code: Optional[str],
+                       active_release: Optional[str]) -> str:
+    return "|".join([icd_name or f"{system}:{code}", active_release or 'latest'])
+
+
+async def _enrich_icd(payload: dict, release: Optional[str], use_stored: bool,
+                      who_down: bool) -> tuple[Optional[ICDEntry], bool]:
+    """ICD step of ``_enrich``: ``(entry, skipped)``."""
+    target_icd_name = payload["icd_name"]
+    icd_entry: Optional[ICDEntry] = ICDEntry(**payload["icd"]) if use_stored and payload.get("icd") else None
+    if icd_entry is not None:
+        return icd_entry, False
+    who_data = icd_mirror.lookup_title(target_icd_name, 'mms', release)
+    if not who_data:
+        if who_down:
+            return None, True
+        who_data = await _fetch_mms_live(target_icd_name, release)
+    if not who_data:
+        return None, False
+
+    # Extract title/definition with tolerant handling of dict or string
+    def _val(x):
+        if isinstance(x, dict):
+            return x.get("@value") or x.get("value")
+        return x
+    title = _val(who_data.get("title"))
+    definition = _val(who_data.get("definition"))
+    # Only set code if WHO returns a code; otherwise leave None.
+    icd_code_val = who_data.get("code") or None
+    icd_uri = who_data.get("@id")
+
+    # If definition was not present in the initial normalized search result,
+    # fetch full entity details using the @id to obtain the definition.
+    if not definition and icd_uri and who_data.get("source") != "mirror" and not who_down:
+        try:
+            full_ent = await who_async_client.get_entity_details(icd_uri)
+            if full_ent:
+                title = _val(full_ent.get("title")) or title
+                definition = _val(full_ent.get("definition")) or definition
+                icd_code_val = full_ent.get("code") or icd_code_val
+        except Exception:
+            pass
+
+    # Persist WHO definition and ICD code into the ICD table (so it appears in the
+    # ICD list) via the write-behind queue; the read path never commits
+    enrichment_queue.push(payload["icd_id"], code=icd_code_val, definition=definition)
+    return ICDEntry(name=title, code=icd_code_val, description=definition, icd_uri=icd_uri, extra={}), False
+
+
+async def _enrich_tm2(payload: dict, sys_map: Dict[str, SystemMappingEntry], release: Optional[str],
+                      use_stored: bool, who_down: bool) -> tuple[Optional[ICDEntry], bool]:
+    """TM2 step of ``_enrich``: stored entry, else best-effort fetch via the WHO fallback chain."""
+    if use_stored and payload.get("tm2"):
+        return ICDEntry(**payload["tm2"]), False
+    if who_down:
+        tm2_entry, settled = _tm2_offline(payload["icd_name"], sys_map, release)
+        return tm2_entry, not settled
+    return await _resolve_tm2(payload["icd_name"], sys_map, release), False
+
+
+def _enrich_steps(payload: dict, sys_map: Dict[str, SystemMappingEntry], release: Optional[str]) -> dict:
+    """The independent enrichment steps of a payload as ``{name: coroutine}`` (each yields ``(entry, skipped)``)."""
+    use_stored = release is None or release == payload.get("who_release")
+    who_down = who_api_client.who_unavailable()
+    return {
+        "icd": _enrich_icd(payload, release, use_stored, who_down),
+        "tm2": _enrich_tm2(payload, sys_map, release, use_stored, who_down),
+    }
+
+
+async def _enrich(payload: dict, sys_map: Dict[str, SystemMappingEntry],
+                  release: Optional[str]) -> tuple[Optional[ICDEntry], Optional[ICDEntry], bool]:
+    """ICD and TM2 entries for a translate payload, plus whether WHO enrichment was skipped.
+
+    Stored enrichment first (only when built for the requested ICD-11 release);
+    otherwise resolve the mapped ICD name against the local mirror and fall back
+    to the live WHO API only on a miss. The ICD and TM2 steps run concurrently.
+    While the WHO circuit breaker is open the live calls are skipped and the
+    third value is True.
+    """
+    (icd_entry, icd_skipped), (tm2_entry, tm2_skipped) = await asyncio.gather(
+        *_enrich_steps(payload, sys_map, release).values())
+    return icd_entry, tm2_entry, icd_skipped or tm2_skipped
+
+
+def _spawn(coro):
+    # Keep a reference so the event loop does not drop a running background task
+    task = asyncio.ensure_future(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+async def _traced(step) -> tuple[Optional[ICDEntry], bool, bool]:
+    """Run an enrichment step; returns ``(entry, skipped, failed)`` where failed means a WHO call errored."""
+    with who_api_client.upstream_trace() as failures:
+        entry, skipped = await step
+    return entry, skipped, bool(failures)
+
+
+async def _enrich_within(payload: dict, sys_map: Dict[str, SystemMappingEntry], release: Optional[str],
+                         timeout: float) -> tuple[Optional[ICDEntry], Optional[ICDEntry], bool, bool, dict]:
+    """``_enrich`` cut off after ``timeout`` seconds.
+
+    Returns ``(icd, tm2, skipped, failed, pending)``: entries of steps that did
+    not finish in time are None and their still-running tasks are in
+    ``pending`` (by step name). They are not cancelled. ``failed`` is True when
+    a finished step hit a WHO failure.
+    """
+    tasks = {name: _spawn(_traced(step)) for name, step in _enrich_steps(payload, sys_map, release).items()}
+    await asyncio.wait(tasks.values(), timeout=max(0.0, timeout))
+    done = {name: task.result() for name, task in tasks.items() if task.done()}
+    pending = {name: task for name, task in tasks.items() if not task.done()}
+    icd_entry, icd_skipped, icd_failed = done.get("icd", (None, False, False))
+    tm2_entry, tm2_skipped, tm2_failed = done.get("tm2", (None, False, False))
+    return icd_entry, tm2_entry, icd_skipped or tm2_skipped, icd_failed or tm2_failed, pending
+
+
+def _forward_result(sys_map: Dict[str, SystemMappingEntry], icd_entry: Optional[ICDEntry],
+                    tm2_entry: Optional[ICDEntry], active_release: Optional[str],
+                    enrichment_skipped: bool = False, enrichment_pending: Optional[List[str]] = None) -> TranslateResult:
+    return TranslateResult(
         ayurveda=sys_map.get('ayurveda'),
         siddha=sys_map.get('siddha'),
         unani=sys_map.get('unani'),
         icd=icd_entry,
         tm2=tm2_entry,
-        release_version=_latest_release_version(db),
-        direction='forward'
+        release_version=active_release,
+        direction='forward',
+        enrichment_skipped=enrichment_skipped,
+        enrichment_pending=enrichment_pending or []
     )
-    result.release_version = active_release
-    translation_cache.set(result.release_version, 'forward', cache_key, result)
+
+
+async def _finish_enrichment(pending: dict, icd_entry: Optional[ICDEntry], tm2_entry: Optional[ICDEntry],
+                             skipped: bool, failed: bool, sys_map: Dict[str, SystemMappingEntry],
+                             active_release: Optional[str], cache_key: str, deps: dict):
+    """Wait for enrichment steps cut off by the latency budget, then cache the result if it is complete.
+
+    Like ``_forward_refresher``, a result that hit a WHO failure (in any step)
+    or skipped WHO is not cached.
+    """
+    try:
+        finished = dict(zip(pending, await asyncio.gather(*pending.values())))
+    except Exception as e:
+        print(f"[TRANSLATE] background enrichment for {cache_key} failed: {e}")
+        return
+    if "icd" in finished:
+        icd_entry, icd_skipped, icd_failed = finished["icd"]
+        skipped, failed = skipped or icd_skipped, failed or icd_failed
+    if "tm2" in finished:
+        tm2_entry, tm2_skipped, tm2_failed = finished["tm2"]
+        skipped, failed = skipped or tm2_skipped, failed or tm2_failed
+    if not (skipped or failed):
+        result = _forward_result(sys_map, icd_entry, tm2_entry, active_release)
+        await translation_cache.aset(active_release, 'forward', cache_key, result, **deps)
+
+
+async def _compute_forward(db: Session, latest_release: Optional[str], active_release: Optional[str],
+                           system: Optional[str], code: Optional[str], icd_name: Optional[str],
+                           release: Optional[str], deadline: Optional[float] = None,
+                           cache_key: Optional[str] = None):
+    """Uncached forward translation: ``(TranslateResult, cache deps)`` or ``(OperationOutcome dict, None)``.
+
+    With a ``deadline`` (event-loop time) enrichment steps still running at the
+    deadline are listed in ``enrichment_pending`` and finish in the background,
+    caching the complete result under ``cache_key``.
+    """
+    # 1. In-memory graph / release translation table; live tables on a miss
+    payload = _resolve_payload(db, latest_release, system, code, icd_name)
+    if payload.get("resourceType") == "OperationOutcome":
+        return payload, None
+
+    # 2. Verified terms for each system (primary + aliases)
+    sys_map = _sys_map_from_payload(payload)
+    deps = _cache_deps(payload, system, code)
+
+    # 3./4. ICD and TM2 enrichment (WHO is queried with the mapped ICD name)
+    if deadline is None:
+        icd_entry, tm2_entry, skipped = await _enrich(payload, sys_map, release)
+        return _forward_result(sys_map, icd_entry, tm2_entry, active_release, skipped), deps
+    timeout = deadline - asyncio.get_running_loop().time()
+    icd_entry, tm2_entry, skipped, failed, pending = await _enrich_within(payload, sys_map, release, timeout)
+    if pending:
+        print(f"[TRANSLATE] latency budget exceeded for {cache_key}; finishing {', '.join(pending)} in the background")
+        _spawn(_finish_enrichment(pending, icd_entry, tm2_entry, skipped, failed, sys_map, active_release,
+                                  cache_key, deps))
+
+    # 5. Assemble the final response
+    return _forward_result(sys_map, icd_entry, tm2_entry, active_release, skipped, list(pending)), deps
+
+
+def _forward_refresher(system: Optional[str], code: Optional[str], icd_name: Optional[str],
+                       release: Optional[str], active_release: Optional[str]):
+    """Background rebuild of a stale forward cache entry (own DB session; None keeps the stale value).
+
+    A rebuild that hit a WHO failure (or skipped WHO because its circuit is open),
+    or that now resolves against a different ConceptMap release, counts as failed
+    rather than replacing a good entry.
+    """
+    async def refresh():
+        with who_api_client.upstream_trace() as failures:
+            with SessionLocal() as db:
+                latest_release = release_registry.latest_version()
+                if (release or latest_release) != active_release:
+                    return None
+                result, _ = await _compute_forward(db, latest_release, active_release, system, code, icd_name, release)
+        if failures or not isinstance(result, TranslateResult) or result.enrichment_skipped:
+            return None
+        return result
+    return refresh
+
+
+@router.get("/translate", response_model=TranslateResult)
+async def translate_code(
+    request: Request,
+    response: Response,
+    system: Optional[str] = Query(None, description="The source traditional medicine system (e.g., 'ayurveda')."),
+    code: Optional[str] = Query(None, description="The source NAMASTE code (e.g., 'AKK-12')."),
+    icd_name: Optional[str] = Query(None, description="ICD-11 disease name to enrich via WHO; preferred for WHO lookups."),
+    release: Optional[str] = Query(None, description="ICD-11 linearization release to target (e.g., '2025-01')."),
+    fhir: bool = Query(False, description="If true, wrap successful response as FHIR Parameters resource."),
+    db: Session = Depends(get_db),
+    principal = Depends(get_current_principal),
+    _consent=Depends(require_consent('translation'))
+):
+    """
+    Translate endpoint behavior:
+    - If icd_name is provided: use it to fetch WHO ICD/TM2 details and assemble
+      traditional system mappings from VERIFIED DB for that ICD.
+    - Else: use (system, code) to locate the VERIFIED mapping, derive the ICD name,
+      then fetch WHO details for that ICD name.
+
+    Mappings come from the latest release's precomputed translation rows, held in
+    the in-memory terminology graph (no SQL); ICD/TM2 enrichment stored there is used as-is, and only
+    missing enrichment is resolved via the ICD mirror / WHO API. While the WHO
+    circuit breaker is open the WHO calls are skipped and the result carries
+    ``enrichment_skipped: true``.
+    In all cases, WHO is queried with the ICD disease name, not the NAMASTE code.
+
+    The call is bounded by ``TRANSLATE_LATENCY_BUDGET_MS``: ICD and TM2
+    enrichment run concurrently, and a step not finished by then is left out
+    (listed in ``enrichment_pending``) and completes in the background to warm
+    the cache. Verified terms are always returned.
+
+    Responses carry a strong ETag (release + terminology revision + query);
+    a matching ``If-None-Match`` gets 304 before any DB or WHO work. Partial,
+    degraded or WHO-failed results are sent with ``Cache-Control: no-store``.
+    """
+    if not icd_name and not (system and code):
+        return outcome_validation("Provide either icd_name or (system and code)")
+    etag = _translate_etag(request)
+    if http_cache.etag_matches(request, etag):
+        return http_cache.not_modified(etag, private=True)
+    deadline = None
+    if TRANSLATE_LATENCY_BUDGET_MS > 0:
+        deadline = asyncio.get_running_loop().time() + TRANSLATE_LATENCY_BUDGET_MS / 1000
+
+    # Cache lookup (forward direction); only successful results are cached, so
+    # this can run before any mapping resolution
+    latest_release = release_registry.latest_version()
+    active_release = release or latest_release
+    cache_key = _forward_cache_key(icd_name, system, code, active_release)
+    refresh = _forward_refresher(system, code, icd_name, release, active_release)
+    cached = await translation_cache.aget(active_release, 'forward', cache_key, refresh=refresh)
+    if cached:
+        cached = TranslateResult.model_validate(cached)
+        http_cache.set_cache_headers(response, etag, private=True)
+        return _to_fhir_parameters(cached) if fhir else cached
+
+    with who_api_client.upstream_trace() as failures:
+        result, deps = await _compute_forward(db, latest_release, active_release, system, code, icd_name, release,
+                                              deadline=deadline, cache_key=cache_key)
+    complete = not (failures or (isinstance(result, TranslateResult)
+                                 and (result.enrichment_skipped or result.enrichment_pending)))
+    http_cache.set_cache_headers(response, etag if complete else None, private=True)
+    if not isinstance(result, TranslateResult):
+        return result
+    # A degraded (WHO circuit open) or WHO-failed result is served but not cached, so full enrichment
+    # follows recovery; a partial one (latency budget) is cached by its background completion
+    if complete:
+        await translation_cache.aset(result.release_version, 'forward', cache_key, result, **deps)
     return _to_fhir_parameters(result) if fhir else result
 
 
+def _batch_fhir_parameters(results: list, release_version: Optional[str]) -> dict:
+    """One ``item`` parameter per input (in order) holding its Parameters parts or OperationOutcome."""
+    params = {
+        "resourceType": "Parameters",
+        "parameter": [{"name": "releaseVersion", "valueString": release_version or "unknown"}],
+    }
+    for i, res in enumerate(results):
+        part = [{"name": "index", "valueInteger": i}]
+        if isinstance(res, TranslateResult):
+            part.extend(_to_fhir_parameters(res)["parameter"])
+        else:
+            part.append({"name": "outcome", "resource": res})
+        params["parameter"].append({"name": "item", "part": part})
+    return params
+
+
+@router.post("/translate/batch")
+async def translate_batch(
+    body: BatchTranslateRequest,
+    db: Session = Depends(get_db),
+    principal = Depends(get_current_principal),
+    _consent=Depends(require_consent('translation'))
+):
+    """
+    Forward-translate many (system, code) / icd_name items in one call.
+
+    Repeated items are resolved once, cached results are reused, mappings are
+    read from the in-memory terminology graph (set-based translation-table
+    queries when it is not built), and enrichment runs once per
+    distinct ICD with bounded concurrency. Results (TranslateResult or
+    OperationOutcome per item) come back in input order.
+    """
+    if not body.items:
+        return outcome_validation("Provide at least one item")
+    if len(body.items) > TRANSLATE_BATCH_MAX_ITEMS:
+        return outcome_validation(f"At most {TRANSLATE_BATCH_MAX_ITEMS} items per batch")
+
+    latest_release = release_registry.latest_version()
+    active_release = body.release or latest_release
+    resolved: Dict[str, Any] = {}  # cache key -> TranslateResult | OperationOutcome
+    by_code_key: Dict[str, tuple] = {}
+    by_icd_key: Dict[str, str] = {}
+    keys: List[Optional[str]] = []
+    for item in body.items:
+        if not item.icd_name and not (item.system and item.code):
+            keys.append(None)
+            continue
+        key = _forward_cache_key(item.icd_name, item.system, item.code, active_release)
+        keys.append(key)
+        if key in resolved or key in by_code_key or key in by_icd_key:
+            continue
+        refresh = _forward_refresher(item.system, item.code, item.icd_name, body.release, active_release)
+        cached = await translation_cache.aget(active_release, 'forward', key, refresh=refresh)
+        if cached:
+            resolved[key] = TranslateResult.model_validate(cached)
+        elif item.icd_name:
+            by_icd_key[key] = item.icd_name
+        else:
+            by_code_key[key] = (item.system.lower(), item.code)
+
+    # In-memory graph; otherwise set-based reads from the release translation table and live tables for the rest
+    payloads: Dict[str, dict] = {}
+    graph = _graph_for(latest_release)
+    if graph is not None:
+        for key, (sys_key, code) in by_code_key.items():
+            payloads[key] = _graph_payload(graph, sys_key, code, None)
+        for key, name in by_icd_key.items():
+            payloads[key] = _graph_payload(graph, None, None, name)
+    else:
+        snap = _release_snapshot(latest_release)
+        if snap is not None:
+            code_rows = {pair: snap.code_payload(*pair) for pair in by_code_key.values()}
+            icd_rows = {name: snap.icd_payload(name) for name in by_icd_key.values()}
+        else:
+            code_rows = translation_table.lookup_codes(db, latest_release, by_code_key.values())
+            icd_rows = translation_table.lookup_icds(db, latest_release, by_icd_key.values())
+        for key, (sys_key, code) in by_code_key.items():
+            payloads[key] = code_rows.get((sys_key, code)) or _live_payload(db, sys_key, code, None)
+        for key, name in by_icd_key.items():
+            payloads[key] = icd_rows.get(name) or _live_payload(db, None, None, name)
+
+    # Enrich each distinct ICD once; WHO misses run concurrently (bounded)
+    to_enrich: Dict[str, dict] = {}
+    for key, payload in payloads.items():
+        if payload.get("resourceType") == "OperationOutcome":
+            resolved[key] = payload
+        else:
+            to_enrich.setdefault(payload["icd_name"], payload)
+    sem = asyncio.Semaphore(TRANSLATE_BATCH_CONCURRENCY)
+
+    async def _enrich_bounded(payload: dict):
+        async with sem:
+            with who_api_client.upstream_trace() as failures:
+                enriched = await _enrich(payload, _sys_map_from_payload(payload), body.release)
+            return (*enriched, bool(failures))
+
+    names = list(to_enrich)
+    enriched = dict(zip(names, await asyncio.gather(*(_enrich_bounded(to_enrich[n]) for n in names))))
+
+    for key, payload in payloads.items():
+        if key in resolved:
+            continue
+        icd_entry, tm2_entry, skipped, failed = enriched[payload["icd_name"]]
+        result = _forward_result(_sys_map_from_payload(payload), icd_entry, tm2_entry, active_release, skipped)
+        if not (skipped or failed):
+            await translation_cache.aset(active_release, 'forward', key, result, **_cache_deps(payload, *by_code_key.get(key, (None, None))))
+        resolved[key] = result
+
+    results = [
+        resolved[k] if k else outcome_validation("Provide either icd_name or (system and code)")
+        for k in keys
+    ]
+    if body.fhir:
+        return _batch_fhir_parameters(results, active_release)
+    return {"release_version": active_release, "count": len(results), "results": results}
+
+
 @router.get("/translate/reverse", response_model=TranslateResult)
 async def reverse_translate(
+    request: Request,
+    response: Response,
     icd_name: str = Query(..., description="ICD-11 disease name to reverse translate into traditional systems."),
     release: Optional[str] = Query(None, description="Reserved: specific release version (ignored for now)."),
     fhir: bool = Query(False, description="If true, wrap successful response as FHIR Parameters resource."),
@@ -373,40 +810,22 @@ async def reverse_translate(
     principal = Depends(get_current_principal),
     _consent=Depends(require_consent('translation'))
 ):
+    etag = _translate_etag(request)
+    if http_cache.etag_matches(request, etag):
+        return http_cache.not_modified(etag, private=True)
+    http_cache.set_cache_headers(response, etag, private=True)
     cache_key = icd_name
-    latest_rel = release or _latest_release_version(db)
-    cached = translation_cache.get(latest_rel, 'reverse', cache_key)
+    latest_release = release_registry.latest_version()
+    latest_rel = release or latest_release
+    cached = await translation_cache.aget(latest_rel, 'reverse', cache_key)
     if cached:
-        if fhir and hasattr(cached, 'release_version'):
-            return _to_fhir_parameters(cached)  # type: ignore
-        return cached
-
-    icd_obj = db.query(ICD11Code).filter(ICD11Code.icd_name == icd_name).first()
-    if not icd_obj:
-        return outcome_not_found("ICD name not found")
-    verified = db.query(Mapping).join(TraditionalTerm).filter(
-        Mapping.icd11_code_id == icd_obj.id,
-        Mapping.status == 'verified'
-    ).all()
-    if not verified:
-        return outcome_validation("Disease not verified")
+        cached = TranslateResult.model_validate(cached)
+        return _to_fhir_parameters(cached) if fhir else cached
 
-    sys_map: Dict[str, SystemMappingEntry] = {}
-    for m in verified:
-        t = m.traditional_term
-        if t.system not in sys_map:
-            sys_map[t.system] = SystemMappingEntry(primary=None, aliases=[])
-        term_obj = SystemTerm(
-            name=t.term,
-            code=t.code,
-            description=t.source_description,
-            vernacular=t.devanagari or t.tamil or t.arabic,
-            extra={"source_row": t.source_row}
-        )
-        if m.is_primary and sys_map[t.system].primary is None:
-            sys_map[t.system].primary = term_obj
-        else:
-            sys_map[t.system].aliases.append(term_obj)
+    payload = _resolve_payload(db, latest_release, None, None, icd_name)
+    if payload.get("resourceType") == "OperationOutcome":
+        return payload
+    sys_map = _sys_map_from_payload(payload)
 
     result = TranslateResult(
         ayurveda=sys_map.get('ayurveda'),
@@ -417,7 +836,7 @@ async def reverse_translate(
         release_version=latest_rel,
         direction='reverse'
     )
-    translation_cache.set(result.release_version, 'reverse', cache_key, result)
+    await translation_cache.aset(result.release_version, 'reverse', cache_key, result, **_cache_deps(payload))
     return _to_fhir_parameters(result) if fhir else result
 
 @router.get("/translate/cache/stats")
@@ -446,14 +865,19 @@ def mapping_search(
     db: Session = Depends(get_db)
 ):
     like = f"%{q.lower()}%"
-    results = (
+    # ILIKE on the bare columns so the pg_trgm GIN indexes apply; best matches first
+    matches = (
         db.query(Mapping, TraditionalTerm, ICD11Code)
         .join(TraditionalTerm, Mapping.traditional_term_id == TraditionalTerm.id)
         .join(ICD11Code, Mapping.icd11_code_id == ICD11Code.id)
         .filter(
             Mapping.status == 'verified',
-            or_(func.lower(TraditionalTerm.term).like(like), func.lower(ICD11Code.icd_name).like(like))
+            or_(TraditionalTerm.term.ilike(like), ICD11Code.icd_name.ilike(like))
         )
+    )
+    results = (
+        order_by_similarity(matches, db, q.lower(), TraditionalTerm.term, ICD11Code.icd_name)
+        .order_by(Mapping.id)
         .limit(limit)
         .all()
     )
@@ -0,0 +1,182 @@
+"""Response compression (brotli or gzip) for large payloads.
+
+Responses at least ``COMPRESSION_MIN_SIZE_BYTES`` long are compressed with the
+best encoding the client accepts: ``br`` when the optional ``brotli`` package
+is installed, otherwise ``gzip``. Streaming responses are compressed chunk by
+chunk. Already-encoded bodies, partial content and binary media types pass
+through untouched. A compressed response carries ``Vary: Accept-Encoding`` and
+its ETag is marked weak (``W/``): the bytes differ from the identity
+representation while the content is the same, and ``If-None-Match`` uses weak
+comparison, so conditional GETs keep returning 304.
+
+The middleware is self-contained ASGI (it only uses Starlette's public header
+helpers), so it does not depend on the internals of ``GZipMiddleware``.
+"""
+import os
+import zlib
+from functools import partial
+from typing import Callable, Optional
+
+import anyio.to_thread
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+COMPRESSION_MIN_SIZE_BYTES = int(os.getenv("COMPRESSION_MIN_SIZE_BYTES", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+# Chunks at least this large are compressed in a worker thread instead of on the event loop
+COMPRESSION_THREAD_MIN_BYTES = 128 * 1024
+
+
+def negotiate_encoding(accept_encoding: str, brotli_available: bool = brotli is not None) -> Optional[str]:
+    """Pick ``br``, ``gzip`` or None (identity) from an Accept-Encoding header, honouring q-values."""
+    weights = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[coding.strip()] = q
+    wildcard = weights.get("*", 0.0)
+    candidates = ["br", "gzip"] if brotli_available else ["gzip"]
+    best, best_q = None, 0.0
+    for coding in candidates:  # server preference breaks ties
+        q = weights.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+# Already-compressed or streaming-event media types are sent as is
+EXCLUDED_MEDIA_TYPES = frozenset({
+    "application/gzip", "application/x-gzip", "application/zip", "application/grpc", "audio/*", "font/woff",
+    "font/woff2", "image/avif", "image/gif", "image/jpeg", "image/png", "image/webp", "text/event-stream", "video/*",
+})
+
+
+class _GzipCodec:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, body: bytes, more_body: bool) -> bytes:
+        out = self._compressor.compress(body)
+        return out + self._compressor.flush(zlib.Z_SYNC_FLUSH if more_body else zlib.Z_FINISH)
+
+
+class _BrotliCodec:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, body: bytes, more_body: bool) -> bytes:
+        out = self._compressor.process(body)
+        return out + (self._compressor.flush() if more_body else self._compressor.finish())
+
+
+class _Responder:
+    """Per-request send wrapper: holds the start message until the first body chunk decides the encoding."""
+
+    def __init__(self, app: ASGIApp, minimum_size: int, encoding: Optional[str], codec_factory: Optional[Callable]):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encoding = encoding
+        self.codec_factory = codec_factory
+        self.codec = None
+        self.send: Optional[Send] = None
+        self.start: Optional[Message] = None
+        self.passthrough = False
+        self.started = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    async def _compress(self, body: bytes, more_body: bool) -> bytes:
+        if self.codec is None:
+            self.codec = self.codec_factory()
+        if len(body) >= COMPRESSION_THREAD_MIN_BYTES:
+            return await anyio.to_thread.run_sync(self.codec.compress, body, more_body)
+        return self.codec.compress(body, more_body)
+
+    async def _send_start(self, body: Optional[bytes], more_body: bool):
+        headers = MutableHeaders(raw=self.start["headers"])
+        headers.add_vary_header("Accept-Encoding")
+        if body is not None:
+            headers["Content-Encoding"] = self.encoding
+            if more_body or self.start.get("trailers", False):
+                del headers["Content-Length"]
+            else:
+                headers["Content-Length"] = str(len(body))
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                headers["ETag"] = "W/" + etag
+        await self.send(self.start)
+
+    async def send_compressed(self, message: Message) -> None:
+        kind = message["type"]
+        if kind == "http.response.start":
+            # Held back until the first body chunk shows whether compression applies
+            self.start = message
+            headers = Headers(raw=message["headers"])
+            media_type = headers.get("content-type", "").partition(";")[0].strip().lower()
+            self.passthrough = (
+                "content-encoding" in headers or message["status"] == 206
+                or media_type in EXCLUDED_MEDIA_TYPES or media_type.partition("/")[0] + "/*" in EXCLUDED_MEDIA_TYPES
+            )
+            if self.passthrough:
+                await self.send(message)
+        elif self.passthrough or kind != "http.response.body":
+            if kind == "http.response.pathsend" and not self.passthrough:
+                await self.send(self.start)  # files are sent as is
+            await self.send(message)
+        elif not self.started:
+            self.started = True
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if self.encoding is None or (len(body) < self.minimum_size and not more_body):
+                await self._send_start(None, more_body)
+                await self.send(message)
+                if self.encoding is not None:
+                    self.passthrough = True
+                return
+            message["body"] = await self._compress(body, more_body)
+            await self._send_start(message["body"], more_body)
+            await self.send(message)
+        else:
+            if self.encoding is not None:
+                message["body"] = await self._compress(message.get("body", b""), message.get("more_body", False))
+            await self.send(message)
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MIN_SIZE_BYTES,
+                 gzip_level: int = COMPRESSION_GZIP_LEVEL, brotli_quality: int = COMPRESSION_BROTLI_QUALITY):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding == "br":
+            codec_factory = partial(_BrotliCodec, self.brotli_quality)
+        elif encoding == "gzip":
+            codec_factory = partial(_GzipCodec, self.gzip_level)
+        else:
+            # Still adds Vary: Accept-Encoding so caches keep identity and compressed copies apart
+            codec_factory = None
+        await _Responder(self.app, self.minimum_size, encoding, codec_factory)(scope, receive, send)
@@ -1,6 +1,8 @@
 # File: create_tables.py
 from app.db.session import engine
 from app.db.models import Base
+from app.db.text_search import ensure_trigram_indexes
+from app.util.search_keys import backfill_search_keys
 import os
 from dotenv import load_dotenv
 from sqlalchemy import text
@@ -29,6 +31,16 @@ def main():
             conn.execute(text(
                 "ALTER TABLE traditional_terms ADD COLUMN IF NOT EXISTS source_long_definition TEXT"
             ))
+            # Script-folded search keys (app/util/search_keys.py)
+            conn.execute(text(
+                "ALTER TABLE traditional_terms ADD COLUMN IF NOT EXISTS search_key VARCHAR(255)"
+            ))
+            conn.execute(text(
+                "ALTER TABLE traditional_terms ADD COLUMN IF NOT EXISTS vernacular_search_key TEXT"
+            ))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_traditional_terms_search_key ON traditional_terms (search_key)"
+            ))
             # TM2 enrichment columns (icd11_codes)
             conn.execute(text(
                 "ALTER TABLE icd11_codes ADD COLUMN IF NOT EXISTS tm2_code VARCHAR(50)"
@@ -50,6 +62,15 @@ def main():
             conn.execute(text(
                 "CREATE INDEX IF NOT EXISTS idx_diagnosis_events_geo ON diagnosis_events (latitude, longitude)"
             ))
+            # Streaming ConceptMap export walks (release_id, system, id)
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_concept_map_elements_release_system "
+                "ON concept_map_elements (release_id, system, id)"
+            ))
+            # Translation-table revision of each release (bumped on every rebuild)
+            conn.execute(text(
+                "ALTER TABLE concept_map_releases ADD COLUMN IF NOT EXISTS revision INTEGER NOT NULL DEFAULT 0"
+            ))
             # Provenance columns for mappings (added Sept 2024)
             conn.execute(text(
                 "ALTER TABLE mappings ADD COLUMN IF NOT EXISTS origin VARCHAR(30)"
@@ -58,13 +79,21 @@ def main():
                 "ALTER TABLE mappings ADD COLUMN IF NOT EXISTS ingestion_filename VARCHAR(255)"
             ))
             conn.commit()
-            print("Ensured new columns on traditional_terms (source_short_definition, source_long_definition).")
+            print("Ensured new columns on traditional_terms (source_short_definition, source_long_definition, search keys).")
             print("Ensured TM2 columns on icd11_codes (tm2_code, tm2_title, tm2_definition).")
             print("Ensured indexes on diagnosis_events (created_at, latitude/longitude).")
+            print("Ensured index on concept_map_elements (release_id, system, id).")
             print("Ensured provenance columns on mappings (origin, ingestion_filename).")
         except Exception as e:
             print(f"Warning: Could not apply column migrations: {e}")
 
+    filled = backfill_search_keys(engine)
+    print(f"Backfilled search keys for {filled} traditional terms.")
+
+    # pg_trgm + GIN trigram indexes for the ILIKE search paths (Postgres only)
+    if ensure_trigram_indexes(engine):
+        print("Ensured pg_trgm extension and trigram indexes for term / ICD / ConceptMap element search.")
+
     print("You can now run 'scripts/discover_ai_mappings.py' to populate them.")
 
 if __name__ == "__main__":
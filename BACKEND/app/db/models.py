@@ -1,9 +1,11 @@
 # FILE: app/db/models.py
 
-from sqlalchemy import Column, Integer, String, Text, Boolean, ForeignKey, TIMESTAMP, Float
+from sqlalchemy import Column, Integer, String, Text, Boolean, ForeignKey, TIMESTAMP, Float, UniqueConstraint, Index, event
 from sqlalchemy.orm import relationship, declarative_base
 from sqlalchemy.sql import func
 
+from app.util.search_keys import search_key, vernacular_search_key
+
 Base = declarative_base()
 
 class ICD11Code(Base):
@@ -35,9 +37,20 @@ class TraditionalTerm(Base):
     tamil = Column(Text)
     arabic = Column(Text)
     source_row = Column(Integer)
+    # Script-folded search keys (app/util/search_keys.py), kept in step with term / vernaculars on every write
+    search_key = Column(String(255), index=True)
+    vernacular_search_key = Column(Text)
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
     mappings = relationship("Mapping", back_populates="traditional_term")
 
+
+@event.listens_for(TraditionalTerm, "before_insert")
+@event.listens_for(TraditionalTerm, "before_update")
+def _fill_search_keys(mapper, connection, target):
+    key = search_key(target.term)
+    target.search_key = key[:255] if key else None
+    target.vernacular_search_key = vernacular_search_key(target.devanagari, target.tamil, target.arabic)
+
 class Mapping(Base):
     __tablename__ = "mappings"
     id = Column(Integer, primary_key=True, index=True)
@@ -92,10 +105,15 @@ class ConceptMapRelease(Base):
     notes = Column(Text)
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
     published_at = Column(TIMESTAMP(timezone=True))  # optional publish marker
+    revision = Column(Integer, nullable=False, default=0, server_default="0")  # bumped by every translation-table rebuild
 
 class ConceptMapElement(Base):
     """Individual mapping element captured inside a release."""
     __tablename__ = "concept_map_elements"
+    __table_args__ = (
+        # Streaming ConceptMap export reads a release's elements ordered by system
+        Index("ix_concept_map_elements_release_system", "release_id", "system", "id"),
+    )
     id = Column(Integer, primary_key=True)
     release_id = Column(Integer, ForeignKey("concept_map_releases.id", ondelete="CASCADE"), index=True, nullable=False)
     icd_name = Column(String(255), index=True, nullable=False)
@@ -107,6 +125,38 @@ class ConceptMapElement(Base):
     active = Column(Boolean, nullable=False, server_default='t')
     # future: justification, provenance link
 
+class TranslationEntry(Base):
+    """Denormalized translate payload for one release: one row per ICD name (system/code NULL)
+    and one per primary (system, code), built when the release is created or refreshed."""
+    __tablename__ = "translation_table"
+    __table_args__ = (
+        Index("ix_translation_table_code", "release_version", "system", "code"),
+        Index("ix_translation_table_icd", "release_version", "icd_name"),
+    )
+    id = Column(Integer, primary_key=True)
+    release_id = Column(Integer, ForeignKey("concept_map_releases.id", ondelete="CASCADE"), index=True, nullable=False)
+    release_version = Column(String(50), nullable=False)
+    icd11_code_id = Column(Integer, index=True)
+    icd_name = Column(String(255))
+    system = Column(String(50))
+    code = Column(String(100))
+    payload = Column(Text, nullable=False)  # JSON: systems (primary/aliases) + stored ICD/TM2 enrichment
+
+class ICDMirrorEntity(Base):
+    """Local copy of an ICD-11 linearization entity (MMS or TM2) for network-free lookups."""
+    __tablename__ = "icd_mirror_entities"
+    __table_args__ = (UniqueConstraint("linearization", "release", "entity_id", name="uq_icd_mirror_entity"),)
+    id = Column(Integer, primary_key=True)
+    entity_id = Column(String(100), nullable=False)  # linearization id tail, e.g. 1435254666 or 1435254666/unspecified
+    linearization = Column(String(10), nullable=False)  # mms|tm2
+    release = Column(String(20), nullable=False, index=True)  # e.g. 2025-01
+    code = Column(String(50), index=True)
+    title = Column(Text, nullable=False)
+    title_key = Column(String(512), nullable=False, index=True)  # case/space-folded title for exact lookups
+    definition = Column(Text)
+    parent_id = Column(String(100))
+    uri = Column(String(255))
+
 class MappingAudit(Base):
     """Simple audit trail for curation actions."""
     __tablename__ = "mapping_audit"
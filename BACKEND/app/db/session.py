@@ -5,6 +5,8 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
 
+from app.db import text_search  # noqa: F401  registers similarity() on SQLite connections
+
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
@@ -0,0 +1,123 @@
+"""Trigram-backed substring search and similarity ranking.
+
+The lookup, suggest, mapping search and ``ValueSet/$expand`` SQL paths filter
+with leading-wildcard ``ILIKE``, which a b-tree index cannot serve. On
+Postgres, :func:`ensure_trigram_indexes` enables ``pg_trgm`` and adds GIN
+``gin_trgm_ops`` indexes on the searched columns, so those filters become
+index scans. Matches are ranked with ``similarity()``.
+
+SQLite has no pg_trgm, so every SQLite connection gets a ``similarity()``
+function implemented here with the same trigram rules (lower-cased words,
+padded with two leading and one trailing space). The queries are the same on
+both databases; SQLite just scans and ranks in process.
+"""
+import re
+import sqlite3
+from functools import lru_cache
+from typing import Dict, FrozenSet, Optional
+
+from sqlalchemy import event, func, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Query, Session
+
+# (table, column) pairs that get a GIN trigram index on Postgres
+TRIGRAM_INDEXES = (
+    ("traditional_terms", "term"),
+    ("traditional_terms", "code"),
+    ("traditional_terms", "devanagari"),
+    ("traditional_terms", "tamil"),
+    ("traditional_terms", "arabic"),
+    ("traditional_terms", "search_key"),
+    ("traditional_terms", "vernacular_search_key"),
+    ("icd11_codes", "icd_name"),
+    ("icd11_codes", "icd_code"),
+    ("concept_map_elements", "term"),
+    ("concept_map_elements", "icd_name"),
+)
+
+_WORD_RE = re.compile(r"[^\W_]+")
+_trgm_available: Dict[str, bool] = {}  # engine URL -> pg_trgm installed
+
+
+@lru_cache(maxsize=4096)
+def trigrams(value: str) -> FrozenSet[str]:
+    grams = set()
+    for word in _WORD_RE.findall(value.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+def trigram_similarity(a: Optional[str], b: Optional[str]) -> float:
+    """pg_trgm ``similarity(a, b)``: shared trigrams over all distinct trigrams of both strings."""
+    if not a or not b:
+        return 0.0
+    ta, tb = trigrams(a), trigrams(b)
+    if not ta or not tb:
+        return 0.0
+    common = len(ta & tb)
+    return common / (len(ta) + len(tb) - common)
+
+
+@event.listens_for(Engine, "connect")
+def _register_sqlite_similarity(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.create_function("similarity", 2, trigram_similarity, deterministic=True)
+
+
+def index_name(table: str, column: str) -> str:
+    return f"ix_{table}_{column}_trgm"
+
+
+def ensure_trigram_indexes(engine) -> bool:
+    """Enable pg_trgm and create the GIN trigram indexes (idempotent). Returns False off Postgres or on failure."""
+    if engine.dialect.name != "postgresql":
+        return False
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            for table, column in TRIGRAM_INDEXES:
+                conn.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS {index_name(table, column)} "
+                    f"ON {table} USING gin ({column} gin_trgm_ops)"
+                ))
+    except Exception as e:
+        print(f"[TEXT-SEARCH] could not create trigram indexes: {e}")
+        _trgm_available.pop(str(engine.url), None)
+        return False
+    _trgm_available[str(engine.url)] = True
+    return True
+
+
+def similarity_available(db: Session) -> bool:
+    bind = db.get_bind()
+    dialect = bind.dialect.name
+    if dialect == "sqlite":
+        return True
+    if dialect != "postgresql":
+        return False
+    key = str(bind.engine.url)
+    if key not in _trgm_available:
+        try:
+            _trgm_available[key] = db.execute(
+                text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            ).first() is not None
+        except Exception:
+            _trgm_available[key] = False
+    return _trgm_available[key]
+
+
+def similarity_rank(db: Session, q: str, *columns):
+    """Best ``similarity()`` of ``q`` to any of ``columns`` (0 when all are NULL), or None when unavailable."""
+    if not similarity_available(db):
+        return None
+    scores = [func.similarity(column, q) for column in columns]
+    if len(scores) > 1:
+        scores = [func.greatest(*scores) if db.get_bind().dialect.name == "postgresql" else func.max(*scores)]
+    return func.coalesce(scores[0], 0.0)
+
+
+def order_by_similarity(query: Query, db: Session, q: str, *columns) -> Query:
+    """Order ``query`` best match first; unchanged where similarity() is not available."""
+    rank = similarity_rank(db, q, *columns)
+    return query.order_by(rank.desc()) if rank is not None else query
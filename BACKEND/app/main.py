@@ -5,16 +5,28 @@ from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.router import api_router
 from app.core.config import settings
-import time, json, os
+from app.core.compression import CompressionMiddleware
+from app.util.json_response import FastJSONResponse
+import time, json, os, threading
 from app.db.session import engine
-from app.db.models import Base, ConceptMapRelease, ConceptMapElement, Mapping, ICD11Code, TraditionalTerm
-from app.services import who_sync
+from app.db.text_search import ensure_trigram_indexes
+from app.util.search_keys import backfill_search_keys
+from app.db.models import Base, ConceptMapRelease, ConceptMapElement, Mapping, ICD11Code, TraditionalTerm, TranslationEntry
+from app.services import who_sync, who_api_client, who_async_client, who_response_store
+from app.services.icd_mirror import icd_mirror
+from app.services.enrichment_queue import enrichment_queue
+from app.services.cache_service import translation_cache
+from app.services.release_registry import release_registry
+from app.services.terminology_graph import terminology_graph
+from app.services.release_snapshot import release_snapshots, stamp as snapshot_stamp
+from app.services.translation_table import build_translation_table
 from sqlalchemy.orm import Session
 from sqlalchemy import select
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    default_response_class=FastJSONResponse,
 )
 
 # --- ROBUST CORS MIDDLEWARE CONFIGURATION ---
@@ -63,6 +75,9 @@ app.add_middleware(
     allow_headers=["*"], # Allows all headers
 )
 
+# Brotli/gzip for responses above COMPRESSION_MIN_SIZE_BYTES (suggestion lists, ConceptMap exports)
+app.add_middleware(CompressionMiddleware)
+
 
 @app.on_event("startup")
 def ensure_tables_exist_on_startup():
@@ -75,6 +90,15 @@ def ensure_tables_exist_on_startup():
             print(f"[STARTUP] Failed to ensure tables: {e}", flush=True)
         except Exception:
             pass
+    # Trigram indexes for the ILIKE search paths (Postgres only; no-op once created)
+    ensure_trigram_indexes(engine)
+    # Search keys for terms written before the columns existed (no-op once filled)
+    try:
+        filled = backfill_search_keys(engine)
+        if filled:
+            print(f"[SEARCH-KEYS] Backfilled search keys for {filled} traditional terms", flush=True)
+    except Exception as e:
+        print(f"[SEARCH-KEYS] Backfill skipped: {e}", flush=True)
     # Create initial ConceptMap release if none exists
     try:
         with Session(bind=engine) as db:
@@ -97,12 +121,41 @@ def ensure_tables_exist_on_startup():
                         is_primary=m.is_primary
                     ))
                     count += 1
+                build_translation_table(db, release)
                 db.commit()
+                release_snapshots.write(db, release)
                 print(f"[STARTUP] Created initial ConceptMap release v1-submission with {count} elements", flush=True)
             else:
                 print("[STARTUP] ConceptMap release already exists", flush=True)
+                # Releases created before the translation table existed: build it once for the latest
+                latest = db.execute(select(ConceptMapRelease).order_by(ConceptMapRelease.created_at.desc()).limit(1)).scalar_one()
+                if not db.execute(select(TranslationEntry.id).where(TranslationEntry.release_id == latest.id).limit(1)).first():
+                    rows = build_translation_table(db, latest)
+                    db.commit()
+                    print(f"[STARTUP] Built translation table for {latest.version} ({rows} rows)", flush=True)
+                # Only the first worker on a node writes the mmapped snapshot; the rest map the same file
+                snap = release_snapshots.get(latest.version, recheck=True)
+                if snap is None or snap.revision != snapshot_stamp(db, latest.id):
+                    release_snapshots.write(db, latest)
+            release_registry.reload(db)
     except Exception as e:
         print(f"[STARTUP] Failed to create initial ConceptMap release: {e}", flush=True)
+    # Warm the offline ICD-11 mirror indexes so translate never waits on the first load
+    try:
+        with Session(bind=engine) as db:
+            icd_mirror.load(db)
+        print(f"[STARTUP] ICD mirror loaded: {icd_mirror.stats()['entities']}", flush=True)
+    except Exception as e:
+        print(f"[STARTUP] ICD mirror load failed: {e}", flush=True)
+    # Compile the in-memory terminology graph in the background; until it lands, translate
+    # serves release payloads from the mmapped snapshot and lookups use the tables
+    threading.Thread(target=terminology_graph.refresh, name="terminology-graph", daemon=True).start()
+    # Pick up releases created or refreshed by other workers off the request path
+    release_registry.start()
+    # Drop translate cache entries past their stale window without waiting for a lookup
+    translation_cache.start_sweeper()
+    # Apply translate-path ICD enrichment in the background
+    enrichment_queue.start()
     # Start WHO sync scheduler if enabled
     try:
         who_sync.start_scheduler()
@@ -112,6 +165,16 @@ def ensure_tables_exist_on_startup():
         print(f"[STARTUP] WHO sync scheduler failed to start: {e}", flush=True)
 
 
+@app.on_event("shutdown")
+async def close_who_client_on_shutdown():
+    """Release pooled WHO keep-alive connections, flush buffered cache access times / enrichment and stop pollers."""
+    await who_async_client.aclose()
+    enrichment_queue.stop()
+    release_registry.stop()
+    if who_response_store.response_store:
+        who_response_store.response_store.flush()
+
+
 @app.middleware("http")
 async def access_log_middleware(request: Request, call_next):
     start = time.perf_counter()
@@ -152,7 +215,17 @@ app.include_router(api_router, prefix=settings.API_V1_STR)
 # Lightweight WHO sync status / trigger endpoints (under /api)
 @app.get(f"{settings.API_V1_STR}/admin/who-sync/status")
 def who_sync_status():
-    return who_sync.status()
+    return {
+        **who_sync.status(),
+        "who_api": who_api_client.breaker_stats(),
+        "upstream_cache": {
+            "response_store": who_response_store.response_store.stats() if who_response_store.response_store else {"enabled": False},
+            "negative_cache": who_api_client.negative_cache_stats(),
+            "single_flight": who_async_client.singleflight_stats(),
+            "icd_mirror": icd_mirror.stats(),
+        },
+        "enrichment_queue": enrichment_queue.stats(),
+    }
 
 @app.post(f"{settings.API_V1_STR}/admin/who-sync/trigger")
 def who_sync_trigger():
@@ -1,41 +1,619 @@
-from typing import Dict, Tuple, Any
+from collections import OrderedDict
+from typing import Dict, Iterable, Tuple, Any, Awaitable, Callable, Optional
+import asyncio
+import json
+import os
+import sqlite3
+import threading
 import time
 
+Refresher = Callable[[], Awaitable[Any]]
+
+TRANSLATION_CACHE_BACKEND = os.getenv("TRANSLATION_CACHE_BACKEND", "memory").lower()
+TRANSLATION_CACHE_PATH = os.getenv("TRANSLATION_CACHE_PATH", os.path.join("data", "translation_cache.sqlite3"))
+TRANSLATION_CACHE_MAX_ENTRIES = int(os.getenv("TRANSLATION_CACHE_MAX_ENTRIES", "20000"))
+TRANSLATION_CACHE_MAX_BYTES = int(os.getenv("TRANSLATION_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Buffered accessed_at updates (SQLite backend) are flushed after this many reads
+TRANSLATION_CACHE_TOUCH_BATCH = int(os.getenv("TRANSLATION_CACHE_TOUCH_BATCH", "100"))
+
+_COUNTERS = ("hits", "misses", "stale_hits", "refreshes", "refreshes_dropped", "refresh_failures", "evictions",
+             "expirations", "invalidations")
+
+
+def dependency_tags(icd_ids: Iterable[int] = (), codes: Iterable[Tuple[str, str]] = ()) -> list[str]:
+    """Tags an entry depends on: ``icd:<id>`` per ICD row and ``code:<system>:<code>`` per NAMASTE code."""
+    tags = {f"icd:{i}" for i in icd_ids if i is not None}
+    tags.update(f"code:{system.lower()}:{code}".lower() for system, code in codes if system and code)
+    return sorted(tags)
+
+
+def _encode(value: Any) -> bytes:
+    if hasattr(value, "model_dump_json"):
+        return value.model_dump_json().encode("utf-8")
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class MemoryCacheBackend:
+    """Per-process LRU of ``key -> (stored_at, bytes)`` bounded by entry count and bytes.
+
+    Each entry can carry dependency tags (see :func:`dependency_tags`);
+    ``invalidate`` drops every entry carrying any of the given tags.
+    """
+
+    name = "memory"
+    shared = False
+
+    def __init__(self, max_entries: int = TRANSLATION_CACHE_MAX_ENTRIES, max_bytes: int = TRANSLATION_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._store: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._tags: Dict[str, set] = {}  # tag -> keys
+        self._key_tags: Dict[str, Tuple[str, ...]] = {}
+
+    @staticmethod
+    def _size(k: str, blob: bytes) -> int:
+        return len(k) + len(blob)
+
+    def _pop(self, k: str) -> bool:
+        tup = self._store.pop(k, None)
+        if tup:
+            self._bytes -= self._size(k, tup[1])
+        for tag in self._key_tags.pop(k, ()):
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(k)
+                if not keys:
+                    del self._tags[tag]
+        return tup is not None
+
+    def get(self, k: str) -> Optional[Tuple[float, bytes]]:
+        with self._lock:
+            tup = self._store.get(k)
+            if tup:
+                self._store.move_to_end(k)
+            return tup
+
+    def put(self, k: str, stored_at: float, blob: bytes, tags: Optional[Iterable[str]] = None) -> int:
+        """Store an entry (``tags=None`` keeps the entry's current tags); returns how many LRU entries were evicted."""
+        evicted = 0
+        with self._lock:
+            tags = tuple(tags) if tags is not None else self._key_tags.get(k, ())
+            self._pop(k)
+            self._store[k] = (stored_at, blob)
+            self._bytes += self._size(k, blob)
+            if tags:
+                self._key_tags[k] = tags
+                for tag in tags:
+                    self._tags.setdefault(tag, set()).add(k)
+            while self._store and (len(self._store) > self.max_entries or self._bytes > self.max_bytes):
+                self._pop(next(iter(self._store)))
+                evicted += 1
+        return evicted
+
+    def replace(self, k: str, expected_stored_at: float, stored_at: float, blob: bytes) -> Optional[int]:
+        """Rewrite an entry only if it is still the one stored at ``expected_stored_at``.
+
+        Keeps the entry's tags. Returns None when the entry was invalidated or
+        overwritten in the meantime, else how many LRU entries were evicted.
+        """
+        with self._lock:
+            tup = self._store.get(k)
+            if not tup or tup[0] != expected_stored_at:
+                return None
+            self._bytes += self._size(k, blob) - self._size(k, tup[1])
+            self._store[k] = (stored_at, blob)
+            self._store.move_to_end(k)
+            evicted = 0
+            while self._store and (len(self._store) > self.max_entries or self._bytes > self.max_bytes):
+                self._pop(next(iter(self._store)))
+                evicted += 1
+        return evicted
+
+    def delete(self, k: str) -> bool:
+        with self._lock:
+            return self._pop(k)
+
+    def invalidate(self, tags: Iterable[str]) -> int:
+        with self._lock:
+            keys = set()
+            for tag in tags:
+                keys.update(self._tags.get(tag, ()))
+            for k in keys:
+                self._pop(k)
+        return len(keys)
+
+    def sweep(self, cutoff: float) -> int:
+        with self._lock:
+            expired = [k for k, (ts, _) in self._store.items() if ts < cutoff]
+            for k in expired:
+                self._pop(k)
+        return len(expired)
+
+    def clear(self):
+        with self._lock:
+            self._store.clear()
+            self._tags.clear()
+            self._key_tags.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        return {"entries": len(self._store), "bytes": self._bytes}
+
+
+class SQLiteCacheBackend:
+    """Node-local store shared by every worker process (SQLite file in WAL mode).
+
+    Same contract as :class:`MemoryCacheBackend`; LRU order follows
+    ``accessed_at``, whose updates are buffered so reads don't write. Hit/miss
+    counters pushed by each worker are summed in ``translation_cache_counters``
+    so stats are aggregate across processes.
+    """
+
+    name = "sqlite"
+    shared = True
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS translation_cache (
+            key TEXT PRIMARY KEY,
+            stored_at REAL NOT NULL,
+            accessed_at REAL NOT NULL,
+            body BLOB NOT NULL,
+            size INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS ix_translation_cache_accessed ON translation_cache (accessed_at);
+        CREATE TABLE IF NOT EXISTS translation_cache_deps (
+            tag TEXT NOT NULL,
+            key TEXT NOT NULL,
+            PRIMARY KEY (tag, key)
+        );
+        CREATE INDEX IF NOT EXISTS ix_translation_cache_deps_key ON translation_cache_deps (key);
+        CREATE TABLE IF NOT EXISTS translation_cache_counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+    """
+
+    def __init__(self, path: str, max_entries: int = TRANSLATION_CACHE_MAX_ENTRIES,
+                 max_bytes: int = TRANSLATION_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._writes_since_evict = 0
+        self._touched: Dict[str, float] = {}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(self._SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _flush_touches(self, conn: sqlite3.Connection):
+        touched, self._touched = self._touched, {}
+        if touched:
+            conn.executemany("UPDATE translation_cache SET accessed_at = ? WHERE key = ?",
+                             [(ts, k) for k, ts in touched.items()])
+
+    def get(self, k: str) -> Optional[Tuple[float, bytes]]:
+        try:
+            with self._lock:
+                row = self._connect().execute(
+                    "SELECT stored_at, body FROM translation_cache WHERE key = ?", (k,)
+                ).fetchone()
+                if row:
+                    self._touched[k] = time.time()
+                    if len(self._touched) >= TRANSLATION_CACHE_TOUCH_BATCH:
+                        self._flush_touches(self._conn)
+        except sqlite3.Error:
+            return None
+        return (row[0], bytes(row[1])) if row else None
+
+    def put(self, k: str, stored_at: float, blob: bytes, tags: Optional[Iterable[str]] = None) -> int:
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute("BEGIN")
+                try:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO translation_cache (key, stored_at, accessed_at, body, size) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (k, stored_at, time.time(), blob, len(k) + len(blob)),
+                    )
+                    if tags is not None:
+                        conn.execute("DELETE FROM translation_cache_deps WHERE key = ?", (k,))
+                        conn.executemany("INSERT OR IGNORE INTO translation_cache_deps (tag, key) VALUES (?, ?)",
+                                         [(tag, k) for tag in tags])
+                    conn.execute("COMMIT")
+                except sqlite3.Error:
+                    conn.execute("ROLLBACK")
+                    raise
+                self._writes_since_evict += 1
+                if self._writes_since_evict >= 50:
+                    self._writes_since_evict = 0
+                    return self._evict(conn)
+        except sqlite3.Error:
+            pass
+        return 0
+
+    def replace(self, k: str, expected_stored_at: float, stored_at: float, blob: bytes) -> Optional[int]:
+        """Compare-and-set on ``stored_at``; see :meth:`MemoryCacheBackend.replace`."""
+        try:
+            with self._lock:
+                conn = self._connect()
+                updated = conn.execute(
+                    "UPDATE translation_cache SET stored_at = ?, accessed_at = ?, body = ?, size = ? "
+                    "WHERE key = ? AND stored_at = ?",
+                    (stored_at, time.time(), blob, len(k) + len(blob), k, expected_stored_at),
+                ).rowcount
+                if not updated:
+                    return None
+                self._writes_since_evict += 1
+                if self._writes_since_evict >= 50:
+                    self._writes_since_evict = 0
+                    return self._evict(conn)
+        except sqlite3.Error:
+            return None
+        return 0
+
+    def _evict(self, conn: sqlite3.Connection) -> int:
+        self._flush_touches(conn)
+        count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM translation_cache").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return 0
+        # Walk from least recently accessed until both budgets are met
+        drop = 0
+        for (size,) in conn.execute("SELECT size FROM translation_cache ORDER BY accessed_at ASC"):
+            if count - drop <= self.max_entries and total <= self.max_bytes:
+                break
+            drop += 1
+            total -= size
+        if drop:
+            conn.execute(
+                "DELETE FROM translation_cache WHERE rowid IN "
+                "(SELECT rowid FROM translation_cache ORDER BY accessed_at ASC LIMIT ?)", (drop,)
+            )
+            self._drop_orphan_deps(conn)
+        return drop
+
+    @staticmethod
+    def _drop_orphan_deps(conn: sqlite3.Connection):
+        conn.execute("DELETE FROM translation_cache_deps WHERE key NOT IN (SELECT key FROM translation_cache)")
+
+    def delete(self, k: str) -> bool:
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute("DELETE FROM translation_cache_deps WHERE key = ?", (k,))
+                return conn.execute("DELETE FROM translation_cache WHERE key = ?", (k,)).rowcount > 0
+        except sqlite3.Error:
+            return False
+
+    def invalidate(self, tags: Iterable[str]) -> int:
+        tags = list(tags)
+        if not tags:
+            return 0
+        marks = ",".join("?" * len(tags))
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute("BEGIN")
+                try:
+                    removed = conn.execute(
+                        f"DELETE FROM translation_cache WHERE key IN "
+                        f"(SELECT key FROM translation_cache_deps WHERE tag IN ({marks}))", tags
+                    ).rowcount
+                    conn.execute(
+                        f"DELETE FROM translation_cache_deps WHERE key IN "
+                        f"(SELECT key FROM translation_cache_deps WHERE tag IN ({marks}))", tags
+                    )
+                    conn.execute("COMMIT")
+                except sqlite3.Error:
+                    conn.execute("ROLLBACK")
+                    raise
+                return removed
+        except sqlite3.Error:
+            return 0
+
+    def sweep(self, cutoff: float) -> int:
+        try:
+            with self._lock:
+                conn = self._connect()
+                self._flush_touches(conn)
+                removed = conn.execute("DELETE FROM translation_cache WHERE stored_at < ?", (cutoff,)).rowcount
+                if removed:
+                    self._drop_orphan_deps(conn)
+                return removed
+        except sqlite3.Error:
+            return 0
+
+    def clear(self):
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute("DELETE FROM translation_cache")
+                conn.execute("DELETE FROM translation_cache_deps")
+                conn.execute("DELETE FROM translation_cache_counters")
+        except sqlite3.Error:
+            pass
+
+    def add_counters(self, deltas: Dict[str, int]):
+        rows = [(name, value) for name, value in deltas.items() if value]
+        if not rows:
+            return
+        try:
+            with self._lock:
+                self._connect().executemany(
+                    "INSERT INTO translation_cache_counters (name, value) VALUES (?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value", rows
+                )
+        except sqlite3.Error:
+            pass
+
+    def counters(self) -> Dict[str, int]:
+        try:
+            with self._lock:
+                return dict(self._connect().execute("SELECT name, value FROM translation_cache_counters"))
+        except sqlite3.Error:
+            return {}
+
+    def stats(self) -> dict:
+        try:
+            with self._lock:
+                count, total = self._connect().execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM translation_cache"
+                ).fetchone()
+        except sqlite3.Error:
+            count, total = 0, 0
+        return {"entries": count, "bytes": total, "path": self.path}
+
+
 class TranslationCache:
-    def __init__(self):
-        self._store: Dict[str, Tuple[float, Any]] = {}
-        self.hits = 0
-        self.misses = 0
-        self.ttl_seconds = 3600
+    """Translate result cache with stale-while-revalidate over a pluggable backend.
+
+    Values are stored as compact JSON bytes (pydantic models are dumped; ``get``
+    returns the decoded JSON, so callers re-validate into their model). The
+    backend is an in-process LRU by default, or a SQLite file shared by all
+    workers on the node (``TRANSLATION_CACHE_BACKEND=sqlite``); either is
+    bounded by entry count and an approximate byte budget, and a sweeper
+    thread drops entries that are past their stale window. Async callers use
+    ``aget`` / ``aset`` so a shared backend's I/O runs off the event loop.
+
+    ``set`` records the ICD ids and (system, code) keys an entry was built
+    from; write paths call ``invalidate`` with what they changed so exactly
+    the affected entries are dropped instead of waiting out the TTL. A
+    background refresh only replaces the exact entry it was started for: if
+    that entry was invalidated (or overwritten) while the refresh ran, the
+    refreshed value is dropped rather than re-inserted without its tags.
+
+    Entries are fresh for ``ttl_seconds``. Past that, a ``get`` that passes a
+    ``refresh`` coroutine factory still returns the cached value for up to
+    ``stale_seconds`` more while a single background task (per process)
+    rebuilds it; a refresh that raises or returns None keeps the stale value
+    and is retried after a backoff, and the entry is dropped once
+    ``max_refresh_failures`` refreshes in a row have failed.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or MemoryCacheBackend()
+        self._lock = threading.Lock()
+        self.ttl_seconds = float(os.getenv("TRANSLATION_CACHE_TTL_SECONDS", "3600"))
+        self.stale_seconds = float(os.getenv("TRANSLATION_CACHE_STALE_SECONDS", "86400"))
+        self.sweep_seconds = float(os.getenv("TRANSLATION_CACHE_SWEEP_SECONDS", "300"))
+        self.max_refresh_failures = int(os.getenv("TRANSLATION_CACHE_MAX_REFRESH_FAILURES", "3"))
+        self.refresh_backoff_seconds = float(os.getenv("TRANSLATION_CACHE_REFRESH_BACKOFF_SECONDS", "30"))
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self._failures: Dict[str, Tuple[int, float]] = {}  # key -> (consecutive failures, retry at)
+        self._sweeper: Optional[threading.Thread] = None
+        self._counts: Dict[str, int] = dict.fromkeys(_COUNTERS, 0)
+        self._reported: Dict[str, int] = dict.fromkeys(_COUNTERS, 0)
+
+    @property
+    def max_entries(self) -> int:
+        return self.backend.max_entries
+
+    @max_entries.setter
+    def max_entries(self, value: int):
+        self.backend.max_entries = value
+
+    @property
+    def max_bytes(self) -> int:
+        return self.backend.max_bytes
+
+    @max_bytes.setter
+    def max_bytes(self, value: int):
+        self.backend.max_bytes = value
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self._counts[name] += n
 
     def _key(self, release: str | None, direction: str, identifier: str) -> str:
         return f"{release or 'none'}|{direction}|{identifier}".lower()
 
-    def get(self, release: str | None, direction: str, identifier: str):
-        k = self._key(release, direction, identifier)
-        tup = self._store.get(k)
+    def _read(self, k: str, can_refresh: bool) -> Tuple[Optional[bytes], Optional[float]]:
+        """Backend read plus expiry policy; returns (value bytes or None, stored_at of a stale entry to refresh)."""
+        tup = self.backend.get(k)
         if not tup:
-            self.misses += 1
-            return None
-        ts, val = tup
-        if time.time() - ts > self.ttl_seconds:
-            self._store.pop(k, None)
-            self.misses += 1
-            return None
-        self.hits += 1
-        return val
+            self._count("misses")
+            return None, None
+        ts, blob = tup
+        age = time.time() - ts
+        if age > self.ttl_seconds and (not can_refresh or age > self.ttl_seconds + self.stale_seconds):
+            self.backend.delete(k)
+            self._failures.pop(k, None)
+            self._count("expirations")
+            self._count("misses")
+            return None, None
+        if age > self.ttl_seconds:
+            self._count("stale_hits")
+            return blob, ts
+        self._count("hits")
+        return blob, None
 
-    def set(self, release: str | None, direction: str, identifier: str, value: Any):
+    def _write(self, k: str, value: Any, tags: Optional[list] = None):
+        evicted = self.backend.put(k, time.time(), _encode(value), tags)
+        self._failures.pop(k, None)
+        if evicted:
+            self._count("evictions", evicted)
+
+    def _replace(self, k: str, expected_stored_at: float, value: Any) -> bool:
+        evicted = self.backend.replace(k, expected_stored_at, time.time(), _encode(value))
+        self._failures.pop(k, None)
+        if evicted:
+            self._count("evictions", evicted)
+        return evicted is not None
+
+    def get(self, release: str | None, direction: str, identifier: str, refresh: Optional[Refresher] = None):
+        k = self._key(release, direction, identifier)
+        blob, stale_at = self._read(k, refresh is not None)
+        if stale_at is not None:
+            self._schedule_refresh(k, refresh, stale_at)
+        return json.loads(blob) if blob is not None else None
+
+    async def aget(self, release: str | None, direction: str, identifier: str, refresh: Optional[Refresher] = None):
+        k = self._key(release, direction, identifier)
+        if self.backend.shared:
+            blob, stale_at = await asyncio.to_thread(self._read, k, refresh is not None)
+        else:
+            blob, stale_at = self._read(k, refresh is not None)
+        if stale_at is not None:
+            self._schedule_refresh(k, refresh, stale_at)
+        return json.loads(blob) if blob is not None else None
+
+    def set(self, release: str | None, direction: str, identifier: str, value: Any,
+            icd_ids: Iterable[int] = (), codes: Iterable[Tuple[str, str]] = ()):
+        self._write(self._key(release, direction, identifier), value, dependency_tags(icd_ids, codes))
+
+    async def aset(self, release: str | None, direction: str, identifier: str, value: Any,
+                   icd_ids: Iterable[int] = (), codes: Iterable[Tuple[str, str]] = ()):
         k = self._key(release, direction, identifier)
-        self._store[k] = (time.time(), value)
+        tags = dependency_tags(icd_ids, codes)
+        if self.backend.shared:
+            await asyncio.to_thread(self._write, k, value, tags)
+        else:
+            self._write(k, value, tags)
+
+    def invalidate(self, icd_ids: Iterable[int] = (), codes: Iterable[Tuple[str, str]] = ()) -> int:
+        """Drop every entry built from any of these ICD rows or NAMASTE codes; returns how many."""
+        removed = self.backend.invalidate(dependency_tags(icd_ids, codes))
+        if removed:
+            self._count("invalidations", removed)
+        return removed
+
+    async def ainvalidate(self, icd_ids: Iterable[int] = (), codes: Iterable[Tuple[str, str]] = ()) -> int:
+        if self.backend.shared:
+            return await asyncio.to_thread(self.invalidate, list(icd_ids), list(codes))
+        return self.invalidate(icd_ids, codes)
+
+    def _schedule_refresh(self, k: str, refresh: Refresher, stored_at: float):
+        if k in self._refreshing:
+            return
+        failures = self._failures.get(k)
+        if failures and time.time() < failures[1]:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # sync caller: keep serving stale until an async caller refreshes
+        self._refreshing[k] = loop.create_task(self._refresh(k, refresh, stored_at))
+
+    async def _refresh(self, k: str, refresh: Refresher, stored_at: float):
+        try:
+            try:
+                value = await refresh()
+            except Exception as e:
+                print(f"[TRANSLATION-CACHE] refresh failed for {k}: {e}")
+                value = None
+            if value is not None:
+                if self.backend.shared:
+                    replaced = await asyncio.to_thread(self._replace, k, stored_at, value)
+                else:
+                    replaced = self._replace(k, stored_at, value)
+                self._count("refreshes" if replaced else "refreshes_dropped")
+                return
+            self._count("refresh_failures")
+            count = self._failures.get(k, (0, 0.0))[0] + 1
+            if count >= self.max_refresh_failures:
+                self._failures.pop(k, None)
+                if self.backend.shared:
+                    await asyncio.to_thread(self.backend.delete, k)
+                else:
+                    self.backend.delete(k)
+            else:
+                self._failures[k] = (count, time.time() + self.refresh_backoff_seconds * count)
+        finally:
+            self._refreshing.pop(k, None)
+
+    def sweep(self) -> int:
+        """Drop entries past their stale window; returns how many were removed."""
+        removed = self.backend.sweep(time.time() - self.ttl_seconds - self.stale_seconds)
+        if removed:
+            self._count("expirations", removed)
+        return removed
+
+    def _sync_counters(self):
+        """Push this process's counter deltas to a shared backend."""
+        with self._lock:
+            deltas = {name: self._counts[name] - self._reported[name] for name in _COUNTERS}
+            self._reported = dict(self._counts)
+        self.backend.add_counters(deltas)
+
+    def _sweep_loop(self):
+        while True:
+            time.sleep(self.sweep_seconds)
+            try:
+                self.sweep()
+                if self.backend.shared:
+                    self._sync_counters()
+            except Exception as e:
+                print(f"[TRANSLATION-CACHE] sweep failed: {e}")
+
+    def start_sweeper(self):
+        if self._sweeper and self._sweeper.is_alive():
+            return
+        self._sweeper = threading.Thread(target=self._sweep_loop, name="translation-cache-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def clear(self):
+        self.backend.clear()
+        self._failures.clear()
 
     def stats(self):
-        total = self.hits + self.misses
-        return {
-            "hits": self.hits,
-            "misses": self.misses,
-            "hit_ratio": (self.hits / total) if total else 0,
-            "entries": len(self._store)
+        with self._lock:
+            local = dict(self._counts)
+        counts = local
+        if self.backend.shared:
+            self._sync_counters()
+            counts = {name: self.backend.counters().get(name, 0) for name in _COUNTERS}
+        total = counts["hits"] + counts["misses"]
+        stats = {
+            "backend": self.backend.name,
+            "hits": counts["hits"],
+            "misses": counts["misses"],
+            "hit_ratio": (counts["hits"] / total) if total else 0,
+            **self.backend.stats(),
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            **{name: counts[name] for name in _COUNTERS if name not in ("hits", "misses")},
+            "refreshing": len(self._refreshing),
         }
+        if self.backend.shared:
+            stats["process"] = local  # this worker's share of the aggregate counters
+        return stats
+
+
+def _backend_from_env():
+    if TRANSLATION_CACHE_BACKEND == "sqlite":
+        return SQLiteCacheBackend(TRANSLATION_CACHE_PATH)
+    return MemoryCacheBackend()
+
 
-translation_cache = TranslationCache()
+translation_cache = TranslationCache(_backend_from_env())
@@ -0,0 +1,165 @@
+"""Write-behind queue for ICD enrichment learned on the translate path.
+
+Translate used to commit WHO definitions/codes into ``icd11_codes`` inline,
+i.e. a write transaction (and row locks) inside a public read endpoint. It now
+pushes ``(icd_id, code, definition)`` here and returns; a background thread
+coalesces updates per ICD and applies them in batches. Rows a curator holds
+locked are skipped (``SKIP LOCKED`` on PostgreSQL) and retried on a later
+flush instead of being waited on. Applied changes mark the terminology graph
+stale at most once per ``ENRICHMENT_GRAPH_STALE_SECONDS`` so a steady trickle
+of enrichment does not rebuild the graph after every batch.
+"""
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from app.db.models import ICD11Code
+from app.services.terminology_graph import terminology_graph
+
+ENRICHMENT_BATCH_SIZE = int(os.getenv("ENRICHMENT_BATCH_SIZE", "200"))
+ENRICHMENT_FLUSH_SECONDS = float(os.getenv("ENRICHMENT_FLUSH_SECONDS", "2"))
+ENRICHMENT_MAX_ATTEMPTS = 3
+ENRICHMENT_GRAPH_STALE_SECONDS = float(os.getenv("ENRICHMENT_GRAPH_STALE_SECONDS", "30"))
+
+_FIELDS = ("icd_code", "description")
+
+
+class EnrichmentQueue:
+    def __init__(self, session_factory: Optional[Callable] = None):
+        self.session_factory = session_factory
+        self._pending: Dict[int, dict] = {}  # icd_id -> {"icd_code"?, "description"?, "attempts"}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._graph_dirty = False
+        self._graph_marked_at = 0.0
+        self.enqueued = 0
+        self.coalesced = 0
+        self.applied = 0
+        self.skipped = 0
+        self.failed = 0
+
+    def push(self, icd_id: Optional[int], code: Optional[str] = None, definition: Optional[str] = None):
+        """Queue WHO-derived values for an ICD row; never touches the database."""
+        if not icd_id or not (code or definition):
+            return
+        with self._lock:
+            entry = self._pending.get(icd_id)
+            if entry is None:
+                entry = self._pending[icd_id] = {"attempts": 0}
+            else:
+                self.coalesced += 1
+            if code:
+                entry["icd_code"] = code
+            if definition:
+                entry["description"] = definition
+            self.enqueued += 1
+            full = len(self._pending) >= ENRICHMENT_BATCH_SIZE
+        if full:
+            self._wake.set()
+
+    def _requeue(self, batch: Dict[int, dict]):
+        with self._lock:
+            for icd_id, entry in batch.items():
+                entry["attempts"] += 1
+                if entry["attempts"] >= ENRICHMENT_MAX_ATTEMPTS:
+                    continue
+                newer = self._pending.get(icd_id)
+                # Values pushed since the batch was taken win over the retried ones
+                self._pending[icd_id] = {**entry, **newer} if newer else entry
+
+    def _mark_graph_stale(self, force: bool = False):
+        """Coalesce terminology graph invalidations across flushes."""
+        if not self._graph_dirty:
+            return
+        now = time.monotonic()
+        if not force and now - self._graph_marked_at < ENRICHMENT_GRAPH_STALE_SECONDS:
+            return
+        self._graph_dirty = False
+        self._graph_marked_at = now
+        terminology_graph.mark_stale()
+
+    def flush(self, force: bool = False) -> int:
+        """Apply queued updates in one transaction; returns the number of rows changed."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                self._mark_graph_stale(force)
+                return 0
+            if self.session_factory is None:
+                from app.db.session import SessionLocal
+                self.session_factory = SessionLocal
+            changed = 0
+            try:
+                with self.session_factory() as db:
+                    rows = (
+                        db.query(ICD11Code)
+                        .filter(ICD11Code.id.in_(list(batch)))
+                        .with_for_update(skip_locked=True)
+                        .all()
+                    )
+                    applied_ids = {icd.id for icd in rows}
+                    for icd in rows:
+                        entry = batch[icd.id]
+                        dirty = False
+                        for field in _FIELDS:
+                            value = entry.get(field)
+                            if value and getattr(icd, field, None) != value:
+                                setattr(icd, field, value)
+                                dirty = True
+                        changed += dirty
+                    db.commit()
+            except Exception as e:
+                self.failed += 1
+                print(f"[ENRICHMENT] flush failed: {e}")
+                self._requeue(batch)
+                return 0
+            # Only committed rows leave the batch; rows that were locked (or no
+            # longer exist) are retried a few times
+            retry = {icd_id: entry for icd_id, entry in batch.items() if icd_id not in applied_ids}
+            self.skipped += len(retry)
+            self._requeue(retry)
+            self.applied += changed
+            if changed:
+                self._graph_dirty = True
+            self._mark_graph_stale(force)
+            return changed
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(ENRICHMENT_FLUSH_SECONDS)
+            self._wake.clear()
+            self.flush()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="enrichment-queue", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the worker and apply whatever is still queued."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+            self._thread = None
+        self.flush(force=True)
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "enqueued": self.enqueued,
+            "coalesced": self.coalesced,
+            "applied": self.applied,
+            "skipped": self.skipped,
+            "failed": self.failed,
+        }
+
+
+enrichment_queue = EnrichmentQueue()
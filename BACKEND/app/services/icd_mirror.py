@@ -0,0 +1,201 @@
+"""Offline ICD-11 MMS/TM2 mirror.
+
+Entities loaded into ``icd_mirror_entities`` (see scripts/build_icd_mirror.py)
+are indexed in memory by folded title and by code, per linearization and
+release. Translate and enrichment resolve against it first and only call the
+live WHO API on a miss, so clinics keep getting codes when icd.who.int is
+slow or unreachable.
+
+Lookups return WHO-shaped dicts (``@id``, ``code``, ``title``/``definition``
+as ``{"@value": ...}``) so callers can treat a mirror hit like an API response.
+
+The index reloads itself when the table gains entities or releases (checked
+every ``ICD_MIRROR_CHECK_SECONDS``); ``POST /api/admin/icd-mirror/reload``
+forces a reload after re-importing existing entities.
+"""
+import os
+import re
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.db.models import ICDMirrorEntity
+
+LINEARIZATIONS = ("mms", "tm2")
+ICD_MIRROR_CHECK_SECONDS = float(os.getenv("ICD_MIRROR_CHECK_SECONDS", "300"))
+ICD_MIRROR_RETRY_SECONDS = float(os.getenv("ICD_MIRROR_RETRY_SECONDS", "60"))
+_WS_RE = re.compile(r"\s+")
+
+
+def title_key(title: str) -> str:
+    """Fold a title for exact index lookups (case, surrounding/duplicate whitespace, tabulation dashes)."""
+    t = (title or "").strip().lstrip("- ").strip()
+    return _WS_RE.sub(" ", t).casefold()
+
+
+class _Entry:
+    __slots__ = ("entity_id", "code", "title", "definition", "parent_id", "uri", "release")
+
+    def __init__(self, row: ICDMirrorEntity):
+        self.entity_id = row.entity_id
+        self.code = row.code or None
+        self.title = row.title
+        self.definition = row.definition or None
+        self.parent_id = row.parent_id or None
+        self.uri = row.uri or None
+        self.release = row.release
+
+    def as_who_entity(self, linearization: str) -> dict:
+        ent = {
+            "@id": self.uri or f"http://id.who.int/icd/release/11/{self.release}/{linearization}/{self.entity_id}",
+            "code": self.code,
+            "title": {"@value": self.title},
+            "source": "mirror",
+        }
+        if self.definition:
+            ent["definition"] = {"@value": self.definition}
+        if self.parent_id:
+            ent["parent"] = [f"http://id.who.int/icd/release/11/{self.release}/{linearization}/{self.parent_id}"]
+        return ent
+
+
+class ICDMirror:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._loaded = False
+        self._signature: Optional[tuple] = None
+        self._next_check = 0.0
+        # (linearization, release) -> {title_key: entry} / {code: entry}
+        self._by_title: Dict[Tuple[str, str], Dict[str, _Entry]] = {}
+        self._by_code: Dict[Tuple[str, str], Dict[str, _Entry]] = {}
+        self._latest: Dict[str, str] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _table_signature(db: Session) -> tuple:
+        return tuple(db.query(
+            func.count(ICDMirrorEntity.id), func.max(ICDMirrorEntity.id), func.max(ICDMirrorEntity.release)
+        ).one())
+
+    def load(self, db: Session):
+        """(Re)build the in-memory indexes from the mirror table."""
+        signature = self._table_signature(db)
+        by_title: Dict[Tuple[str, str], Dict[str, _Entry]] = {}
+        by_code: Dict[Tuple[str, str], Dict[str, _Entry]] = {}
+        latest: Dict[str, str] = {}
+        for row in db.query(ICDMirrorEntity).yield_per(5000):
+            entry = _Entry(row)
+            k = (row.linearization, row.release)
+            # First entity wins on duplicate titles (residual categories repeat parent titles)
+            by_title.setdefault(k, {}).setdefault(row.title_key, entry)
+            if entry.code:
+                by_code.setdefault(k, {}).setdefault(entry.code.upper(), entry)
+            if row.release > latest.get(row.linearization, ""):
+                latest[row.linearization] = row.release
+        with self._lock:
+            self._by_title, self._by_code, self._latest = by_title, by_code, latest
+            self._signature = signature
+            self._loaded = True
+            self._next_check = time.monotonic() + ICD_MIRROR_CHECK_SECONDS
+
+    def ensure_loaded(self):
+        """Load lazily and pick up new entities/releases; at most one thread checks at a time."""
+        if time.monotonic() < self._next_check:
+            return
+        if not self._load_lock.acquire(blocking=False):
+            return  # another request is (re)loading; serve the current index meanwhile
+        try:
+            if time.monotonic() < self._next_check:
+                return
+            from app.db.session import SessionLocal
+            try:
+                with SessionLocal() as db:
+                    if not self._loaded or self._table_signature(db) != self._signature:
+                        self.load(db)
+                    else:
+                        self._next_check = time.monotonic() + ICD_MIRROR_CHECK_SECONDS
+            except Exception as e:
+                # Missing table / DB hiccup: serve the current (possibly empty) index, retry after a backoff
+                self._next_check = time.monotonic() + ICD_MIRROR_RETRY_SECONDS
+                print(f"[ICD-MIRROR] load failed: {e}")
+        finally:
+            self._load_lock.release()
+
+    def latest_release(self, linearization: str) -> Optional[str]:
+        self.ensure_loaded()
+        return self._latest.get(linearization)
+
+    def _index_key(self, linearization: str, release: Optional[str]) -> Tuple[str, str]:
+        return (linearization, release or self._latest.get(linearization, ""))
+
+    def lookup_title(self, title: str, linearization: str, release: Optional[str] = None) -> Optional[dict]:
+        self.ensure_loaded()
+        entry = self._by_title.get(self._index_key(linearization, release), {}).get(title_key(title))
+        return self._hit(entry, linearization)
+
+    def lookup_code(self, code: str, linearization: str, release: Optional[str] = None) -> Optional[dict]:
+        self.ensure_loaded()
+        entry = self._by_code.get(self._index_key(linearization, release), {}).get((code or "").strip().upper())
+        return self._hit(entry, linearization)
+
+    def lookup_any_title(self, titles: Iterable[str], linearization: str, release: Optional[str] = None) -> Optional[dict]:
+        for t in titles:
+            hit = self.lookup_title(t, linearization, release)
+            if hit:
+                return hit
+        return None
+
+    def _hit(self, entry: Optional[_Entry], linearization: str) -> Optional[dict]:
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry.as_who_entity(linearization)
+
+    def stats(self) -> dict:
+        return {
+            "loaded": self._loaded,
+            "releases": dict(self._latest),
+            "entities": {f"{lin}:{rel}": len(idx) for (lin, rel), idx in self._by_title.items()},
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def upsert_entities(db: Session, linearization: str, release: str, rows: Iterable[dict]) -> int:
+    """Insert or update mirror rows; each row needs entity_id and title (code/definition/parent_id/uri optional)."""
+    if linearization not in LINEARIZATIONS:
+        raise ValueError(f"Unsupported linearization: {linearization}")
+    existing = {
+        e.entity_id: e for e in db.query(ICDMirrorEntity).filter(
+            ICDMirrorEntity.linearization == linearization, ICDMirrorEntity.release == release
+        )
+    }
+    count = 0
+    for r in rows:
+        entity_id = (r.get("entity_id") or "").strip()
+        title = (r.get("title") or "").strip().lstrip("- ").strip()
+        if not entity_id or not title:
+            continue
+        obj = existing.get(entity_id)
+        if obj is None:
+            obj = ICDMirrorEntity(entity_id=entity_id, linearization=linearization, release=release)
+            existing[entity_id] = obj
+            db.add(obj)
+        obj.code = (r.get("code") or "").strip() or None
+        obj.title = title
+        obj.title_key = title_key(title)[:512]
+        obj.definition = r.get("definition") or None
+        obj.parent_id = r.get("parent_id") or None
+        obj.uri = r.get("uri") or None
+        count += 1
+    db.commit()
+    return count
+
+
+icd_mirror = ICDMirror()
@@ -0,0 +1,117 @@
+"""Result cache for ``/lookup`` and ``/lookup/suggest``.
+
+Typeahead clients send "fe", "fev", "feve" within a few hundred milliseconds,
+and every request used to redo the full match-and-expand work. Entries are
+keyed by (endpoint, normalized query, scope), where the scope is the system
+filter, the latest release, the snapshot-fallback flag and any limit, and hold
+the response plus the positions of the matched records in the graph's
+typeahead indexes (app/services/suggest_index.py).
+
+A repeated query is answered from the entry. A query that extends a cached one
+(same scope, the old query and its search key contained in the new ones) reuses
+the old match set when it was complete: ``TextIndex.find(within=...)`` filters
+those candidates in memory and ranks them exactly as a full index walk would,
+since anything matching the longer fragment also matched the shorter one.
+
+Positions only mean something for the graph they were computed against, so the
+cache belongs to one graph at a time and empties itself when the store swaps
+in a new one: on release change, on mapping / term edits, and on the periodic
+rebuild. Only the graph path is cached; the SQL fallback runs before the first
+build and is left alone.
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+LOOKUP_CACHE_MAX_ENTRIES = int(os.getenv("LOOKUP_CACHE_MAX_ENTRIES", "5000"))
+# Shortest cached query a longer one may reuse (/lookup and /lookup/suggest need two characters)
+LOOKUP_CACHE_MIN_PREFIX = 2
+
+
+class LookupCacheEntry:
+    """A cached response and, per typeahead index, the complete match set it came from (None when truncated)."""
+    __slots__ = ("q_key", "result", "candidates")
+
+    def __init__(self, q_key: str, result: Any, candidates: Dict[str, Optional[list]]):
+        self.q_key = q_key
+        self.result = result
+        self.candidates = candidates
+
+
+class LookupCache:
+    """Per-process LRU of :class:`LookupCacheEntry`, scoped to one terminology graph."""
+
+    def __init__(self, max_entries: int = LOOKUP_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[Hashable, ...], LookupCacheEntry]" = OrderedDict()
+        self._graph = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.prefix_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _bind(self, graph) -> None:
+        # caller holds the lock
+        if graph is not self._graph:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._graph = graph
+
+    def get(self, graph, endpoint: str, q: str, scope: Tuple[Hashable, ...]) -> Optional[LookupCacheEntry]:
+        with self._lock:
+            self._bind(graph)
+            entry = self._entries.get((endpoint, q, scope))
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((endpoint, q, scope))
+            self.hits += 1
+            return entry
+
+    def candidates(self, graph, endpoint: str, q: str, q_key: str, scope: Tuple[Hashable, ...]) -> Dict[str, list]:
+        """Complete match sets of the longest cached query that ``q`` extends ({} when there is none)."""
+        with self._lock:
+            self._bind(graph)
+            for end in range(len(q) - 1, LOOKUP_CACHE_MIN_PREFIX - 1, -1):
+                entry = self._entries.get((endpoint, q[:end], scope))
+                if entry is None or entry.q_key not in q_key:
+                    continue
+                found = {name: ns for name, ns in entry.candidates.items() if ns is not None}
+                if found:
+                    self.prefix_hits += 1
+                    return found
+            return {}
+
+    def put(self, graph, endpoint: str, q: str, scope: Tuple[Hashable, ...], q_key: str, result: Any,
+            candidates: Dict[str, Optional[list]]) -> None:
+        with self._lock:
+            self._bind(graph)
+            key = (endpoint, q, scope)
+            self._entries[key] = LookupCacheEntry(q_key, result, candidates)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._graph = None
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "prefix_hits": self.prefix_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+lookup_cache = LookupCache()
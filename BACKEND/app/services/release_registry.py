@@ -0,0 +1,144 @@
+"""Process-wide registry of ConceptMap release metadata.
+
+Translate, lookup, FHIR, provenance and status all need "the latest release"
+(and sometimes a release by version) on every request. The registry loads the
+``concept_map_releases`` rows once and answers those from memory.
+
+Code that creates a release calls ``reload(db)`` after committing so this
+process sees it immediately; other workers notice within
+``RELEASE_REGISTRY_POLL_SECONDS`` via a cheap ``COUNT/MAX(id)/SUM(revision)`` check. In the
+server that check runs on a background poller thread (``start()``), so request
+handlers only read the in-memory tuple; without a poller (scripts, tests) the
+check runs inline when the interval has passed.
+
+Each release also carries a ``revision``: a counter that every rebuild of its
+translation rows bumps, so it changes when a release is refreshed in place
+under the same version. HTTP ETags use it (see ``app.util.http_cache``).
+"""
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.db.models import ConceptMapRelease
+
+RELEASE_REGISTRY_POLL_SECONDS = float(os.getenv("RELEASE_REGISTRY_POLL_SECONDS", "5"))
+
+
+@dataclass(frozen=True)
+class ReleaseInfo:
+    id: int
+    version: str
+    notes: Optional[str]
+    created_at: Optional[datetime]
+    published_at: Optional[datetime]
+    revision: int = 0
+
+
+class ReleaseRegistry:
+    def __init__(self, session_factory: Optional[Callable] = None, poll_seconds: float = RELEASE_REGISTRY_POLL_SECONDS):
+        self.session_factory = session_factory
+        self.poll_seconds = poll_seconds
+        self._lock = threading.Lock()
+        self._releases: Tuple[ReleaseInfo, ...] = ()  # newest first
+        self._by_version: Dict[str, ReleaseInfo] = {}
+        self._signature: Optional[tuple] = None
+        self._loaded = False
+        self._next_check = 0.0
+        self._stop = threading.Event()
+        self._poller: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _table_signature(db: Session) -> tuple:
+        # Refreshing a release rebuilds its translation rows without adding a release row,
+        # but always bumps its revision
+        return tuple(db.query(
+            func.count(ConceptMapRelease.id), func.max(ConceptMapRelease.id), func.sum(ConceptMapRelease.revision)
+        ).one())
+
+    def reload(self, db: Session):
+        """Re-read all release rows (call after creating a release)."""
+        signature = self._table_signature(db)
+        rows = db.query(ConceptMapRelease).order_by(ConceptMapRelease.created_at.desc(), ConceptMapRelease.id.desc()).all()
+        releases = tuple(ReleaseInfo(r.id, r.version, r.notes, r.created_at, r.published_at, r.revision or 0)
+                         for r in rows)
+        self._releases, self._by_version = releases, {r.version: r for r in releases}
+        self._signature = signature
+        self._loaded = True
+        self._next_check = time.monotonic() + self.poll_seconds
+
+    def poll(self, block: bool = True):
+        """Reload if another worker added or refreshed a release since the last check."""
+        if not self._lock.acquire(blocking=block):
+            return
+        try:
+            if self.session_factory is None:
+                from app.db.session import SessionLocal
+                self.session_factory = SessionLocal
+            try:
+                with self.session_factory() as db:
+                    if not self._loaded or self._table_signature(db) != self._signature:
+                        self.reload(db)
+                    else:
+                        self._next_check = time.monotonic() + self.poll_seconds
+            except Exception as e:
+                self._next_check = time.monotonic() + self.poll_seconds
+                print(f"[RELEASES] registry refresh failed: {e}")
+        finally:
+            self._lock.release()
+
+    def _ensure_fresh(self):
+        # The first load blocks (callers need an answer); after that a running
+        # poller owns the checks and readers never touch the database
+        if not self._loaded:
+            self.poll()
+            return
+        if self._poller is not None or time.monotonic() < self._next_check:
+            return
+        # Later inline polls never queue behind each other
+        self.poll(block=False)
+
+    def _run(self):
+        while not self._stop.wait(self.poll_seconds):
+            self.poll()
+
+    def start(self):
+        """Poll for other workers' release changes on a background thread."""
+        if self._poller and self._poller.is_alive():
+            return
+        if not self._loaded:
+            self.poll()
+        self._stop.clear()
+        self._poller = threading.Thread(target=self._run, name="release-registry", daemon=True)
+        self._poller.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._poller:
+            self._poller.join(timeout=5)
+            self._poller = None
+
+    def latest(self) -> Optional[ReleaseInfo]:
+        self._ensure_fresh()
+        releases = self._releases
+        return releases[0] if releases else None
+
+    def latest_version(self) -> Optional[str]:
+        latest = self.latest()
+        return latest.version if latest else None
+
+    def get(self, version: str) -> Optional[ReleaseInfo]:
+        self._ensure_fresh()
+        return self._by_version.get(version)
+
+    def all(self) -> Tuple[ReleaseInfo, ...]:
+        self._ensure_fresh()
+        return self._releases
+
+
+release_registry = ReleaseRegistry()
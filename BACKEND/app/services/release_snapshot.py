@@ -0,0 +1,227 @@
+"""Memory-mapped per-release translation snapshots.
+
+Every release build (startup release creation, ``refresh_release``, WHO sync
+``_rebuild_release``) also writes ``<RELEASE_SNAPSHOT_DIR>/<version>.snap``: the
+release's translation payloads in a compact, read-only binary file. Workers
+``mmap`` it instead of each loading the payload blobs into their own heap, so
+all processes on a node share the same physical pages and a freshly booted
+worker can answer translations before its terminology graph has compiled.
+
+File layout (little endian)::
+
+    header   magic "AYSNAP02", u32 entry count, u32 index slots,
+             u64 entries offset, u64 index offset, u32 version length,
+             u64 release revision the rows were built at (see ``stamp``)
+    version  UTF-8 release version
+    strings  keys and JSON payloads (identical payloads are stored once)
+    entries  per entry: u32 key offset, u32 key length, u32 value offset, u32 value length
+             (offsets relative to the strings section)
+    index    open-addressing hash table of u32 slots (entry number + 1, 0 = empty),
+             slot = crc32(key) & (slots - 1), linear probing
+
+Keys are ``c\\x1f<system>\\x1f<code>`` for primary NAMASTE codes and
+``i\\x1f<icd_name>`` for ICD rows. Files are replaced atomically, so readers
+holding an older mapping keep a consistent view. The snapshot records the
+``ConceptMapRelease.revision`` its rows were built at; readers only adopt a
+snapshot whose revision matches the release row (terminology graph) or the
+release registry (translate), so a file that lags behind, or was written for
+rows that were never committed, is ignored.
+"""
+import json
+import mmap
+import os
+import re
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.db.models import ConceptMapRelease, TranslationEntry
+
+RELEASE_SNAPSHOT_DIR = os.getenv("RELEASE_SNAPSHOT_DIR", os.path.join("data", "release_snapshots"))
+RELEASE_SNAPSHOT_CHECK_SECONDS = float(os.getenv("RELEASE_SNAPSHOT_CHECK_SECONDS", "5"))
+
+MAGIC = b"AYSNAP02"
+_HEADER = struct.Struct("<8sIIQQIQ")
+_ENTRY = struct.Struct("<IIII")
+_SLOT = struct.Struct("<I")
+_SAFE_RE = re.compile(r"[^A-Za-z0-9._-]")
+
+
+def code_key(system: str, code: str) -> bytes:
+    return f"c\x1f{system}\x1f{code}".encode("utf-8")
+
+
+def icd_key(icd_name: str) -> bytes:
+    return f"i\x1f{icd_name}".encode("utf-8")
+
+
+def snapshot_path(version: str, directory: Optional[str] = None) -> str:
+    return os.path.join(directory or RELEASE_SNAPSHOT_DIR, f"{_SAFE_RE.sub('_', version)}.snap")
+
+
+def stamp(db: Session, release_id: int) -> int:
+    """Current revision of a release's translation rows."""
+    return db.query(ConceptMapRelease.revision).filter(ConceptMapRelease.id == release_id).scalar() or 0
+
+
+def encode_snapshot(version: str, entries: Dict[bytes, bytes], revision: int = 0) -> bytes:
+    """Serialize ``{key: value}`` into the snapshot format."""
+    strings = bytearray()
+    value_offsets: Dict[bytes, int] = {}
+    table = []
+    for key, value in entries.items():
+        key_off = len(strings)
+        strings += key
+        val_off = value_offsets.get(value)
+        if val_off is None:
+            val_off = value_offsets[value] = len(strings)
+            strings += value
+        table.append((key, key_off, val_off, len(value)))
+
+    slots = 1
+    while slots < max(2 * len(table), 8):
+        slots <<= 1
+    index = [0] * slots
+    for n, (key, *_rest) in enumerate(table):
+        slot = zlib.crc32(key) & (slots - 1)
+        while index[slot]:
+            slot = (slot + 1) & (slots - 1)
+        index[slot] = n + 1
+
+    version_bytes = version.encode("utf-8")
+    strings_off = _HEADER.size + len(version_bytes)
+    entries_off = strings_off + len(strings)
+    index_off = entries_off + _ENTRY.size * len(table)
+    out = bytearray(_HEADER.pack(MAGIC, len(table), slots, entries_off, index_off, len(version_bytes), revision))
+    out += version_bytes
+    out += strings
+    for key, key_off, val_off, val_len in table:
+        out += _ENTRY.pack(key_off, len(key), val_off, val_len)
+    out += struct.pack(f"<{slots}I", *index)
+    return bytes(out)
+
+
+class ReleaseSnapshot:
+    """Read-only view over one mmapped snapshot file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, self.count, self._slots, self._entries_off, self._index_off, version_len,
+         self.revision) = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a release snapshot")
+        self.version = self._mm[_HEADER.size:_HEADER.size + version_len].decode("utf-8")
+        self._strings_off = _HEADER.size + version_len
+
+    def get(self, key: bytes) -> Optional[bytes]:
+        mask = self._slots - 1
+        slot = zlib.crc32(key) & mask
+        mm, strings = self._mm, self._strings_off
+        while True:
+            n = _SLOT.unpack_from(mm, self._index_off + slot * _SLOT.size)[0]
+            if not n:
+                return None
+            key_off, key_len, val_off, val_len = _ENTRY.unpack_from(mm, self._entries_off + (n - 1) * _ENTRY.size)
+            if key_len == len(key) and mm[strings + key_off:strings + key_off + key_len] == key:
+                return mm[strings + val_off:strings + val_off + val_len]
+            slot = (slot + 1) & mask
+
+    def _payload(self, key: bytes) -> Optional[dict]:
+        raw = self.get(key)
+        return json.loads(raw) if raw is not None else None
+
+    def code_payload(self, system: str, code: str) -> Optional[dict]:
+        return self._payload(code_key(system, code))
+
+    def icd_payload(self, icd_name: str) -> Optional[dict]:
+        return self._payload(icd_key(icd_name))
+
+    def __len__(self) -> int:
+        return self.count
+
+
+class ReleaseSnapshots:
+    """Writes snapshots and caches this process's open ones; re-opens a file after it is replaced."""
+
+    def __init__(self, directory: Optional[str] = None, check_seconds: float = RELEASE_SNAPSHOT_CHECK_SECONDS):
+        self.directory = directory
+        self.check_seconds = check_seconds
+        self._lock = threading.Lock()
+        # version -> (snapshot or None, file identity, next check)
+        self._open: Dict[str, Tuple[Optional[ReleaseSnapshot], Optional[tuple], float]] = {}
+
+    def get(self, version: Optional[str], recheck: bool = False) -> Optional[ReleaseSnapshot]:
+        """Open snapshot for ``version``; the file is re-stat'ed every check interval (or now with ``recheck``)."""
+        if not version:
+            return None
+        entry = self._open.get(version)
+        now = time.monotonic()
+        if entry is not None and now < entry[2] and not recheck:
+            return entry[0]
+        with self._lock:
+            path = snapshot_path(version, self.directory)
+            try:
+                st = os.stat(path)
+                identity = (st.st_ino, st.st_mtime_ns, st.st_size)
+            except OSError:
+                identity = None
+            snap = entry[0] if entry is not None and entry[1] == identity else None
+            if snap is None and identity is not None:
+                try:
+                    snap = ReleaseSnapshot(path)
+                except Exception as e:
+                    print(f"[SNAPSHOT] failed to open {path}: {e}")
+            self._open[version] = (snap, identity, now + self.check_seconds)
+            return snap
+
+    def write(self, db: Session, release) -> Optional[str]:
+        """Write the snapshot for ``release`` from its translation rows.
+
+        Call after the rows are committed: the file then never describes rows
+        that were rolled back, and until it lands readers see a revision mismatch
+        and use the translation table. Best-effort: on failure any older file
+        for the version is removed and translate keeps reading the table.
+        """
+        path = snapshot_path(release.version, self.directory)
+        try:
+            entries: Dict[bytes, bytes] = {}
+            for system, code, icd_name, blob in db.query(
+                TranslationEntry.system, TranslationEntry.code, TranslationEntry.icd_name, TranslationEntry.payload
+            ).filter(TranslationEntry.release_id == release.id).order_by(TranslationEntry.id):
+                key = icd_key(icd_name) if system is None else code_key(system, code)
+                entries.setdefault(key, blob.encode("utf-8"))
+            revision = stamp(db, release.id)
+            directory = os.path.dirname(path) or "."
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(encode_snapshot(release.version, entries, revision))
+                os.replace(tmp, path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+        except Exception as e:
+            print(f"[SNAPSHOT] failed to write snapshot for {release.version}: {e}")
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            self._open.pop(release.version, None)
+            return None
+        self._open.pop(release.version, None)  # re-open on next use
+        print(f"[SNAPSHOT] wrote {path} ({len(entries)} entries)")
+        return path
+
+    def stats(self) -> dict:
+        return {v: len(s) for v, (s, _, _) in self._open.items() if s is not None}
+
+
+release_snapshots = ReleaseSnapshots()
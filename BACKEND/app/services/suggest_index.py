@@ -0,0 +1,174 @@
+"""Typeahead index over the terminology graph.
+
+``/lookup/suggest`` (and the graph path of ``/lookup``) used to test every ICD,
+verified mapping and release element with ``in`` per keystroke. Each
+:class:`TextIndex` here covers one of those record lists and answers
+"which records contain this fragment" in three ranked tiers:
+
+1. the whole text (or code) starts with the fragment - sorted key array, bisect;
+2. a word inside the text starts with it - second sorted array of word suffixes;
+3. the fragment occurs anywhere - n-gram inverted index (bigrams for two
+   character fragments, trigrams otherwise); the shortest posting list is
+   walked and each candidate verified with a substring test.
+
+Every candidate is verified against the same rule as the old scan (substring
+of the folded text, code exact or substring), so the index only changes the
+order of results, never the match set. Within a tier records keep a static
+rank (primary mappings first, then shorter text, then id), and every tier
+stops as soon as ``limit`` records are collected.
+
+Term texts also carry the stored script-folded search keys
+(app/util/search_keys.py), and callers pass the query's key next to the
+lower-cased query; a record matches on either, which is how "vAtasa~jcayaH",
+"vātasañcayaḥ" and the Devanagari spelling find the same term.
+
+Indexes are compiled together with the graph they belong to. A graph is
+immutable and replaced whole when mappings or the active release change, so
+the index is rebuilt with it instead of being patched in place under readers.
+"""
+from array import array
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Longest key stored in the prefix arrays; longer fragments fall through to the n-gram tier
+SUGGEST_PREFIX_KEY_CHARS = 24
+_WORD_BREAKS = frozenset(" \x1f-_/,.;:()[]'\"")
+
+
+def _grams(text: str, n: int) -> Iterable[str]:
+    return (text[i:i + n] for i in range(len(text) - n + 1))
+
+
+def _start_keys(field: str) -> Iterable[str]:
+    return (part[:SUGGEST_PREFIX_KEY_CHARS] for part in field.split("\x1f") if part)
+
+
+def _word_keys(field: str) -> Iterable[str]:
+    return (field[i:i + SUGGEST_PREFIX_KEY_CHARS] for i in range(1, len(field))
+            if field[i - 1] in _WORD_BREAKS and field[i] not in _WORD_BREAKS)
+
+
+class TextIndex:
+    """Fragment index over ``records``, which must already be in rank order."""
+
+    def __init__(self, records: Sequence, text_of: Callable[[object], str], code_of: Callable[[object], Optional[str]]):
+        self.records = tuple(records)
+        self._texts: List[str] = []
+        self._codes: List[Optional[str]] = []
+        starts: List[Tuple[str, int]] = []
+        words: List[Tuple[str, int]] = []
+        postings: Dict[str, List[int]] = {}
+        for n, record in enumerate(self.records):
+            text, code = text_of(record) or "", code_of(record)
+            self._texts.append(text)
+            self._codes.append(code)
+            for field in (text, code):
+                if not field:
+                    continue
+                starts.extend((key, n) for key in _start_keys(field))
+                words.extend((key, n) for key in _word_keys(field))
+                for size in (2, 3):
+                    for gram in set(_grams(field, size)):
+                        ids = postings.setdefault(gram, [])
+                        if not ids or ids[-1] != n:
+                            ids.append(n)
+        starts.sort()
+        words.sort()
+        self._start_keys = [k for k, _ in starts]
+        self._start_ids = array("I", (n for _, n in starts))
+        self._word_keys = [k for k, _ in words]
+        self._word_ids = array("I", (n for _, n in words))
+        self._postings = {gram: array("I", ids) for gram, ids in postings.items()}
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def matches(self, n: int, q: str, exact_code: bool, key: Optional[str] = None) -> bool:
+        """The scan rule: fragment (or its search key) in the text, or the code matches (exactly when the query looks like a code)."""
+        if q in self._texts[n] or (key and key in self._texts[n]):
+            return True
+        code = self._codes[n]
+        if code is None:
+            return False
+        return code == q if exact_code else q in code
+
+    def _prefix_tier(self, keys: List[str], ids: array, q: str):
+        key = q[:SUGGEST_PREFIX_KEY_CHARS]
+        i = bisect_left(keys, key)
+        while i < len(keys) and keys[i].startswith(key):
+            yield ids[i]
+            i += 1
+
+    def _substring_tier(self, q: str):
+        if len(q) < 2:
+            return range(len(self.records))
+        size = 3 if len(q) >= 3 else 2
+        lists = [self._postings.get(gram) for gram in set(_grams(q, size))]
+        if any(ids is None for ids in lists):
+            return ()
+        return min(lists, key=len)
+
+    def _candidate_tiers(self, within: Sequence[int], fragments: Tuple[str, ...]) -> list:
+        """The tiers of :meth:`find` restricted to positions ``within``, in the order the full index walks them."""
+        fields = [(n, field) for n in within for field in (self._texts[n], self._codes[n]) if field]
+        tiers = []
+        for keys_of in (_start_keys, _word_keys):
+            for f in fragments:
+                key = f[:SUGGEST_PREFIX_KEY_CHARS]
+                tiers.append([n for _, n in sorted((k, n) for n, field in fields for k in keys_of(field)
+                                                   if k.startswith(key))])
+        tiers.extend(sorted(within) for _ in fragments)
+        return tiers
+
+    def find(self, q: str, limit: Optional[int] = None, exact_code: bool = False,
+             accept: Optional[Callable[[object], bool]] = None, key: Optional[str] = None,
+             within: Optional[Sequence[int]] = None) -> List[int]:
+        """Positions of the records :meth:`search` returns.
+
+        ``within`` restricts the walk to known candidates (e.g. the complete match
+        set of a query that ``q`` extends); the result is the same as without it
+        as long as every match is among them.
+        """
+        found: List[int] = []
+        seen = set()
+        fragments = (q,) if not key or key == q else (q, key)
+        if within is not None:
+            tiers = self._candidate_tiers(within, fragments)
+        else:
+            tiers = [self._prefix_tier(self._start_keys, self._start_ids, f) for f in fragments]
+            tiers += [self._prefix_tier(self._word_keys, self._word_ids, f) for f in fragments]
+            tiers += [self._substring_tier(f) for f in fragments]
+        for tier in tiers:
+            for n in tier:
+                if n in seen:
+                    continue
+                seen.add(n)
+                if not self.matches(n, q, exact_code, key):
+                    continue
+                if accept is not None and not accept(self.records[n]):
+                    continue
+                found.append(n)
+                if limit is not None and len(found) >= limit:
+                    return found
+        return found
+
+    def search(self, q: str, limit: Optional[int] = None, exact_code: bool = False,
+               accept: Optional[Callable[[object], bool]] = None, key: Optional[str] = None) -> list:
+        """Records matching folded fragment ``q`` or search key ``key``, best first; ``limit=None`` returns every match."""
+        return [self.records[n] for n in self.find(q, limit, exact_code, accept, key)]
+
+
+class SuggestIndex:
+    """The three typeahead indexes of one terminology graph."""
+
+    def __init__(self, graph):
+        self.icds = TextIndex(sorted(graph.icds, key=lambda c: (len(c.name_l), c.id)),
+                              lambda c: c.name_l, lambda c: c.code_l)
+        self.terms = TextIndex(
+            sorted(graph.edges, key=lambda e: (not e.is_primary, len(e.traditional_term.term or ""), e.id)),
+            lambda e: e.traditional_term.text_l, lambda e: e.traditional_term.code_l)
+        self.elements = TextIndex(sorted(graph.elements, key=lambda el: (not el.is_primary, len(el.term_l), el.id)),
+                                  lambda el: f"{el.icd_name_l}\x1f{el.term_l}\x1f{el.term_key}", lambda el: el.icd_code_l)
+
+    def stats(self) -> dict:
+        return {"icds": len(self.icds), "terms": len(self.terms), "elements": len(self.elements)}
@@ -0,0 +1,408 @@
+"""Compiled in-memory terminology graph.
+
+The public terminology reads (translate, reverse translate, lookup,
+lookup/suggest, ConceptMap $translate, CodeSystem $lookup) all resolve against
+the verified mapping set, which is small (tens of thousands of rows). Instead
+of multi-join ORM queries per request, the graph loads ICDs, NAMASTE terms,
+mappings and the active release's elements / translation rows once, links them
+into ``__slots__`` records with interned strings, and indexes them by
+(system, code), term and ICD name, plus a typeahead fragment index
+(app/services/suggest_index.py) for lookup and lookup/suggest.
+
+A graph is immutable once built; the store swaps in a freshly compiled one when
+the active release changes (release registry), when a write in this process
+calls ``mark_stale()``, when the mapping tables change shape (cheap aggregate
+checked every ``TERMINOLOGY_GRAPH_CHECK_SECONDS``), and at least every
+``TERMINOLOGY_GRAPH_MAX_AGE_SECONDS`` to pick up in-place edits made by other
+workers. Checks and rebuilds run on a background thread: ``current()`` never
+touches the database, and requests keep reading the previous graph while the
+next one compiles.
+
+Release translation payloads are read from the release's memory-mapped snapshot
+(app/services/release_snapshot.py) when one matching the table exists, so they
+are shared between workers instead of copied into every graph.
+"""
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, Optional, Tuple
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+from app.db.models import ConceptMapElement, ConceptMapRelease, ICD11Code, Mapping, TraditionalTerm, TranslationEntry
+from app.services import release_snapshot
+from app.services.suggest_index import SuggestIndex
+from app.services.translation_table import build_payload
+from app.util.search_keys import search_key, vernacular_search_key
+
+TERMINOLOGY_GRAPH_CHECK_SECONDS = float(os.getenv("TERMINOLOGY_GRAPH_CHECK_SECONDS", "5"))
+TERMINOLOGY_GRAPH_MAX_AGE_SECONDS = float(os.getenv("TERMINOLOGY_GRAPH_MAX_AGE_SECONDS", "300"))
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if value else value
+
+
+def _fold(value: Optional[str]) -> Optional[str]:
+    return value.lower() if value else None
+
+
+class GraphICD:
+    """ICD11Code row (same attribute names, so ``build_payload`` and endpoint code accept it)."""
+    __slots__ = ("id", "icd_name", "icd_code", "description", "tm2_code", "tm2_title", "tm2_definition",
+                 "name_l", "code_l")
+
+    def __init__(self, id, icd_name, icd_code, description, tm2_code, tm2_title, tm2_definition):
+        self.id = id
+        self.icd_name = _intern(icd_name)
+        self.icd_code = _intern(icd_code)
+        self.description = description
+        self.tm2_code = tm2_code
+        self.tm2_title = tm2_title
+        self.tm2_definition = tm2_definition
+        self.name_l = icd_name.lower()
+        self.code_l = _fold(icd_code)
+
+
+class GraphTerm:
+    """TraditionalTerm row; ``text_l`` joins the folded term, vernaculars and their search keys for substring search."""
+    __slots__ = ("id", "system", "term", "code", "source_description", "source_short_definition",
+                 "source_long_definition", "devanagari", "tamil", "arabic", "source_row", "code_l", "text_l")
+
+    def __init__(self, id, system, term, code, source_description, source_short_definition,
+                 source_long_definition, devanagari, tamil, arabic, source_row,
+                 term_key=None, vernacular_key=None):
+        self.id = id
+        self.system = _intern(system)
+        self.term = _intern(term)
+        self.code = _intern(code)
+        self.source_description = source_description
+        self.source_short_definition = source_short_definition
+        self.source_long_definition = source_long_definition
+        self.devanagari = devanagari
+        self.tamil = tamil
+        self.arabic = arabic
+        self.source_row = source_row
+        self.code_l = _fold(code)
+        # keys are stored at write time; rows written before the columns existed are folded here
+        keys = (term_key or search_key(term), vernacular_key or vernacular_search_key(devanagari, tamil, arabic))
+        parts = [v.lower() for v in (term, devanagari, tamil, arabic) if v]
+        parts += [k for key in keys if key for k in key.split("\x1f") if k not in parts]
+        self.text_l = "\x1f".join(parts)
+
+
+class GraphEdge:
+    """Verified Mapping row linking a term to its ICD."""
+    __slots__ = ("id", "icd11_code", "traditional_term", "is_primary")
+
+    def __init__(self, id, icd11_code: GraphICD, traditional_term: GraphTerm, is_primary: bool):
+        self.id = id
+        self.icd11_code = icd11_code
+        self.traditional_term = traditional_term
+        self.is_primary = is_primary
+
+
+class GraphElement:
+    """ConceptMapElement of the active release."""
+    __slots__ = ("id", "icd_name", "icd_code", "system", "term", "is_primary", "icd_name_l", "icd_code_l", "term_l",
+                 "term_key")
+
+    def __init__(self, id, icd_name, icd_code, system, term, is_primary):
+        self.id = id
+        self.icd_name = _intern(icd_name)
+        self.icd_code = icd_code
+        self.system = _intern(system)
+        self.term = _intern(term)
+        self.is_primary = bool(is_primary)
+        self.icd_name_l = icd_name.lower()
+        self.icd_code_l = _fold(icd_code)
+        self.term_l = term.lower()
+        self.term_key = search_key(term) or ""
+
+
+class TerminologyGraph:
+    """Immutable compiled snapshot; build with :func:`build_graph`."""
+
+    def __init__(self, release_id: Optional[int], release_version: Optional[str]):
+        self.release_id = release_id
+        self.release_version = release_version
+        self.icds: Tuple[GraphICD, ...] = ()  # every ICD row, by id
+        self.icd_by_name: Dict[str, GraphICD] = {}
+        self.terms_by_code: Dict[Tuple[str, str], GraphTerm] = {}  # first term per (system, code)
+        self.edges: Tuple[GraphEdge, ...] = ()  # verified mappings, by id
+        self.edges_by_icd: Dict[int, Tuple[GraphEdge, ...]] = {}
+        self.edges_by_source: Dict[Tuple[str, str], Tuple[GraphEdge, ...]] = {}  # (system, code or term)
+        self.primary_by_code: Dict[Tuple[str, str], GraphEdge] = {}
+        self.elements: Tuple[GraphElement, ...] = ()
+        self.release_icd_names: frozenset = frozenset()
+        self.release_terms_by_code: Dict[Tuple[str, str], GraphTerm] = {}
+        self.snapshot: Optional[release_snapshot.ReleaseSnapshot] = None
+        self._payload_by_code: Dict[Tuple[str, str], str] = {}
+        self._payload_by_icd: Dict[str, str] = {}
+        self.revision = ""  # digest of the compiled rows; moves on any edit, including in-place ones
+        self.suggest: Optional[SuggestIndex] = None  # typeahead indexes over icds / edges / elements
+
+    def _live_payload(self, icd: Optional[GraphICD]) -> Optional[dict]:
+        edges = self.edges_by_icd.get(icd.id) if icd is not None else None
+        return build_payload(icd, edges) if edges else None
+
+    def code_payload(self, system: str, code: str) -> Optional[dict]:
+        """Translate payload for a primary (system, code): release row first, else built from verified edges."""
+        if self.snapshot is not None:
+            payload = self.snapshot.code_payload(system, code)
+            if payload is not None:
+                return payload
+        blob = self._payload_by_code.get((system, code))
+        if blob is not None:
+            return json.loads(blob)
+        edge = self.primary_by_code.get((system, code))
+        return self._live_payload(edge.icd11_code) if edge else None
+
+    def icd_payload(self, icd_name: str) -> Optional[dict]:
+        if self.snapshot is not None:
+            payload = self.snapshot.icd_payload(icd_name)
+            if payload is not None:
+                return payload
+        blob = self._payload_by_icd.get(icd_name)
+        if blob is not None:
+            return json.loads(blob)
+        return self._live_payload(self.icd_by_name.get(icd_name))
+
+    def stats(self) -> dict:
+        return {
+            "release_version": self.release_version,
+            "icds": len(self.icds),
+            "terms": len(self.terms_by_code),
+            "edges": len(self.edges),
+            "elements": len(self.elements),
+            "release_payloads": len(self.snapshot) if self.snapshot is not None else len(self._payload_by_icd) + len(self._payload_by_code),
+            "snapshot": self.snapshot.path if self.snapshot is not None else None,
+            "suggest_index": self.suggest.stats() if self.suggest is not None else None,
+        }
+
+
+def build_graph(db: Session, release=None, snapshots=None) -> TerminologyGraph:
+    """Compile the graph from the current tables; ``release`` (id/version) scopes elements and payloads.
+
+    Release payloads come from the release's mmapped snapshot in ``snapshots``
+    when its stamp matches the translation rows, else they are loaded here.
+    """
+    graph = TerminologyGraph(release.id if release else None, release.version if release else None)
+    digest = hashlib.blake2b(digest_size=12)
+
+    icds: Dict[int, GraphICD] = {}
+    for row in db.query(ICD11Code.id, ICD11Code.icd_name, ICD11Code.icd_code, ICD11Code.description,
+                        ICD11Code.tm2_code, ICD11Code.tm2_title, ICD11Code.tm2_definition).order_by(ICD11Code.id):
+        digest.update(repr(tuple(row)).encode("utf-8"))
+        icds[row[0]] = GraphICD(*row)
+    terms: Dict[int, GraphTerm] = {}
+    terms_by_code: Dict[Tuple[str, str], GraphTerm] = {}
+    for row in db.query(TraditionalTerm.id, TraditionalTerm.system, TraditionalTerm.term, TraditionalTerm.code,
+                        TraditionalTerm.source_description, TraditionalTerm.source_short_definition,
+                        TraditionalTerm.source_long_definition, TraditionalTerm.devanagari, TraditionalTerm.tamil,
+                        TraditionalTerm.arabic, TraditionalTerm.source_row, TraditionalTerm.search_key,
+                        TraditionalTerm.vernacular_search_key).order_by(TraditionalTerm.id):
+        digest.update(repr(tuple(row)).encode("utf-8"))
+        t = terms[row[0]] = GraphTerm(*row)
+        if t.code:
+            terms_by_code.setdefault((t.system, t.code), t)
+
+    edges = []
+    mapped = []  # (term, icd) for mappings of any status; CodeSystem $lookup scopes by those
+    for mid, icd_id, term_id, status, is_primary in db.query(
+        Mapping.id, Mapping.icd11_code_id, Mapping.traditional_term_id, Mapping.status, Mapping.is_primary
+    ).order_by(Mapping.id):
+        digest.update(repr((mid, icd_id, term_id, status, is_primary)).encode("utf-8"))
+        icd, term = icds.get(icd_id), terms.get(term_id)
+        if icd is None or term is None:
+            continue
+        mapped.append((term, icd))
+        if status == 'verified':
+            edges.append(GraphEdge(mid, icd, term, bool(is_primary)))
+
+    by_icd = defaultdict(list)
+    by_source = defaultdict(list)
+    primary_by_code: Dict[Tuple[str, str], GraphEdge] = {}
+    for e in edges:
+        t = e.traditional_term
+        by_icd[e.icd11_code.id].append(e)
+        by_source[(t.system, t.term)].append(e)
+        if t.code and t.code != t.term:
+            by_source[(t.system, t.code)].append(e)
+        if e.is_primary and t.code:
+            primary_by_code.setdefault((t.system, t.code), e)
+
+    graph.icds = tuple(icds.values())
+    graph.icd_by_name = {icd.icd_name: icd for icd in graph.icds}
+    graph.terms_by_code = terms_by_code
+    graph.edges = tuple(edges)
+    graph.edges_by_icd = {k: tuple(v) for k, v in by_icd.items()}
+    graph.edges_by_source = {k: tuple(v) for k, v in by_source.items()}
+    graph.primary_by_code = primary_by_code
+    graph.revision = digest.hexdigest()
+
+    if release is not None:
+        _load_release(db, graph, release, mapped, snapshots)
+    graph.suggest = SuggestIndex(graph)
+    return graph
+
+
+def _load_release(db: Session, graph: TerminologyGraph, release, mapped, snapshots):
+    """Elements, release-scoped term codes and translation payloads of the active release."""
+    graph.elements = tuple(
+        GraphElement(*row) for row in db.query(
+            ConceptMapElement.id, ConceptMapElement.icd_name, ConceptMapElement.icd_code,
+            ConceptMapElement.system, ConceptMapElement.term, ConceptMapElement.is_primary,
+        ).filter(ConceptMapElement.release_id == release.id).order_by(ConceptMapElement.id)
+    )
+    graph.release_icd_names = frozenset(el.icd_name for el in graph.elements)
+    triples = {(el.icd_name, el.system, el.term) for el in graph.elements}
+    release_terms: Dict[Tuple[str, str], GraphTerm] = {}
+    for term, icd in sorted(mapped, key=lambda p: p[0].id):
+        if term.code and (icd.icd_name, term.system, term.term) in triples:
+            release_terms.setdefault((term.system, term.code), term)
+    graph.release_terms_by_code = release_terms
+    snap = snapshots.get(release.version, recheck=True) if snapshots is not None else None
+    if snap is not None and snap.revision == release_snapshot.stamp(db, release.id):
+        graph.snapshot = snap
+        return
+    for system, code, icd_name, blob in db.query(
+        TranslationEntry.system, TranslationEntry.code, TranslationEntry.icd_name, TranslationEntry.payload
+    ).filter(TranslationEntry.release_id == release.id).order_by(TranslationEntry.id):
+        if system is None:
+            graph._payload_by_icd.setdefault(icd_name, blob)
+        else:
+            graph._payload_by_code.setdefault((system, code), blob)
+
+
+class TerminologyGraphStore:
+    def __init__(self, session_factory: Optional[Callable] = None, registry=None, snapshots=None,
+                 check_seconds: float = TERMINOLOGY_GRAPH_CHECK_SECONDS,
+                 max_age_seconds: float = TERMINOLOGY_GRAPH_MAX_AGE_SECONDS):
+        self.session_factory = session_factory
+        self.registry = registry
+        self.snapshots = snapshots
+        self.check_seconds = check_seconds
+        self.max_age_seconds = max_age_seconds
+        self._graph: Optional[TerminologyGraph] = None
+        self._signature: Optional[tuple] = None
+        self._lock = threading.Lock()
+        self._stale_lock = threading.Lock()
+        self._stale = False
+        self._generation = 0  # bumped by mark_stale(); a build only clears what it has seen
+        self._worker: Optional[threading.Thread] = None
+        self._built_at = 0.0
+        self._next_check = 0.0
+        self._retry_at = 0.0
+        self.builds = 0
+        self.failures = 0
+        self.last_build_ms: Optional[float] = None
+
+    @staticmethod
+    def _table_signature(db: Session) -> tuple:
+        """Cheap aggregates that move when mappings are added/removed, (un)verified or re-primaried."""
+        mappings = db.query(
+            func.count(Mapping.id), func.max(Mapping.id),
+            func.sum(case((Mapping.status == 'verified', Mapping.id), else_=0)),
+            func.sum(case((Mapping.is_primary == True, Mapping.id), else_=0)),  # noqa: E712
+        ).one()
+        terms = db.query(func.count(TraditionalTerm.id), func.max(TraditionalTerm.id)).one()
+        icds = db.query(func.count(ICD11Code.id), func.max(ICD11Code.id)).one()
+        releases = db.query(func.count(ConceptMapRelease.id), func.sum(ConceptMapRelease.revision)).one()
+        return tuple(mappings) + tuple(terms) + tuple(icds) + tuple(releases)
+
+    def _latest_release(self):
+        if self.registry is None:
+            from app.services.release_registry import release_registry
+            self.registry = release_registry
+        return self.registry.latest()
+
+    def reload(self, db: Session, release=None) -> TerminologyGraph:
+        """Compile a new graph from ``db`` and swap it in."""
+        started = time.monotonic()
+        generation = self._generation
+        signature = self._table_signature(db)
+        snapshots = self.snapshots if self.snapshots is not None else release_snapshot.release_snapshots
+        graph = build_graph(db, release if release is not None else self._latest_release(), snapshots)
+        with self._stale_lock:
+            self._graph, self._signature = graph, signature
+            # A write that landed mid-build keeps the store stale for the next build
+            self._stale = self._generation != generation
+        self._built_at = time.monotonic()
+        self._next_check = self._built_at + self.check_seconds
+        self.builds += 1
+        self.last_build_ms = round((self._built_at - started) * 1000, 1)
+        return graph
+
+    def mark_stale(self):
+        """Rebuild soon (call after committing mapping/term/ICD changes)."""
+        with self._stale_lock:
+            self._generation += 1
+            self._stale = True
+
+    def _due(self, graph: Optional[TerminologyGraph]) -> bool:
+        now = time.monotonic()
+        if now < self._retry_at:
+            return False
+        if graph is None or self._stale or now >= self._next_check:
+            return True
+        latest = self._latest_release()
+        return (latest.id if latest else None) != graph.release_id
+
+    def current(self) -> Optional[TerminologyGraph]:
+        """The active graph without waiting; None until the first build has finished.
+
+        When a check or rebuild is due it is started on a background thread and
+        callers keep the current graph (or fall back to the snapshot / tables).
+        """
+        graph = self._graph
+        if self._due(graph):
+            with self._stale_lock:
+                if self._worker is None or not self._worker.is_alive():
+                    self._worker = threading.Thread(target=self.refresh, name="terminology-graph", daemon=True)
+                    self._worker.start()
+        return graph
+
+    def refresh(self) -> Optional[TerminologyGraph]:
+        """Run the staleness check, and a rebuild if needed, on the calling thread."""
+        with self._lock:
+            graph = self._graph
+            now = time.monotonic()
+            try:
+                latest = self._latest_release()
+                release_changed = graph is not None and (latest.id if latest else None) != graph.release_id
+                if self.session_factory is None:
+                    from app.db.session import SessionLocal
+                    self.session_factory = SessionLocal
+                with self.session_factory() as db:
+                    if (graph is None or release_changed or self._stale
+                            or now - self._built_at >= self.max_age_seconds
+                            or self._table_signature(db) != self._signature):
+                        self.reload(db, latest)
+                    else:
+                        self._next_check = time.monotonic() + self.check_seconds
+            except Exception as e:
+                self.failures += 1
+                self._retry_at = time.monotonic() + self.check_seconds
+                print(f"[TERMINOLOGY-GRAPH] build failed: {e}")
+        return self._graph
+
+    def stats(self) -> dict:
+        graph = self._graph
+        return {
+            "loaded": graph is not None,
+            **(graph.stats() if graph is not None else {}),
+            "builds": self.builds,
+            "failures": self.failures,
+            "last_build_ms": self.last_build_ms,
+            "age_seconds": round(time.monotonic() - self._built_at, 1) if graph is not None else None,
+            "stale": self._stale,
+        }
+
+
+terminology_graph = TerminologyGraphStore()
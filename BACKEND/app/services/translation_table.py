@@ -0,0 +1,222 @@
+"""Precomputed per-release translation table.
+
+Built from the verified mappings whenever a ConceptMap release is created or
+refreshed, so forward and reverse translate become a single indexed read
+instead of resolving the mapping, loading every verified mapping of the ICD
+and rebuilding the per-system entries on each call.
+
+Payload shape (JSON in ``translation_table.payload``)::
+
+    {"icd_id": 1, "icd_name": "...",
+     "systems": {"ayurveda": {"primary": {...}, "aliases": [...]}, ...},
+     "icd": {"name", "code", "description", "icd_uri", "extra"} | null,
+     "tm2": {...} | null}
+
+``icd`` / ``tm2`` hold enrichment already stored locally (ICD table columns or
+the offline ICD mirror) for the ICD-11 release recorded in ``who_release``;
+null means translate still has to resolve it. Rows are immutable snapshots:
+enrichment learned later is picked up by the next release build.
+"""
+import json
+from collections import defaultdict
+from typing import Iterable, Optional
+
+from sqlalchemy.orm import Session, joinedload
+
+from app.db.models import ConceptMapRelease, ICD11Code, Mapping, TranslationEntry
+from app.services.icd_mirror import icd_mirror
+
+
+def _term_payload(t) -> dict:
+    return {
+        "name": t.term,
+        "code": t.code,
+        "description": t.source_description,
+        "vernacular": t.devanagari or t.tamil or t.arabic,
+        "extra": {"source_row": t.source_row},
+    }
+
+
+def _who_payload(ent: dict) -> dict:
+    def _val(x):
+        if isinstance(x, dict):
+            return x.get("@value") or x.get("value")
+        return x
+    return {
+        "name": _val(ent.get("title")),
+        "code": ent.get("code") or None,
+        "description": _val(ent.get("definition")),
+        "icd_uri": ent.get("@id"),
+        "extra": {},
+    }
+
+
+def _stored_icd(icd: ICD11Code, who_release: Optional[str]) -> Optional[dict]:
+    """Complete MMS enrichment (code, definition and URI) or None so translate resolves it live."""
+    if not who_release:
+        return None
+    mirrored = icd_mirror.lookup_title(icd.icd_name, 'mms', who_release)
+    if not mirrored:
+        return None
+    entry = _who_payload(mirrored)
+    entry["description"] = entry["description"] or icd.description
+    if not (entry["code"] and entry["description"] and entry["icd_uri"]):
+        return None
+    return entry
+
+
+def _stored_tm2(icd: ICD11Code, who_release: Optional[str]) -> Optional[dict]:
+    if not who_release:
+        return None
+    if getattr(icd, 'tm2_code', None) and icd.tm2_title:
+        return {
+            "name": icd.tm2_title,
+            "code": icd.tm2_code,
+            "description": icd.tm2_definition,
+            "icd_uri": None,
+            "extra": {},
+        }
+    mirrored = icd_mirror.lookup_title(icd.icd_name, 'tm2', who_release)
+    return _who_payload(mirrored) if mirrored and mirrored.get("code") else None
+
+
+def build_payload(icd: ICD11Code, mappings: Iterable[Mapping]) -> dict:
+    """Assemble the translate payload for one ICD from its verified mappings (first primary per system wins)."""
+    systems: dict = {}
+    for m in mappings:
+        t = m.traditional_term
+        entry = systems.setdefault(t.system, {"primary": None, "aliases": []})
+        if m.is_primary and entry["primary"] is None:
+            entry["primary"] = _term_payload(t)
+        else:
+            entry["aliases"].append(_term_payload(t))
+    who_release = icd_mirror.latest_release('mms')
+    return {
+        "icd_id": icd.id,
+        "icd_name": icd.icd_name,
+        "systems": systems,
+        "who_release": who_release,
+        "icd": _stored_icd(icd, who_release),
+        "tm2": _stored_tm2(icd, who_release),
+    }
+
+
+def _dumps(payload: dict) -> str:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+
+
+def build_translation_table(db: Session, release: ConceptMapRelease, changed_icds: Optional[set] = None) -> int:
+    """(Re)build the rows of ``release`` from current verified mappings. Caller commits.
+
+    Bumps ``release.revision`` so caches, ETags and snapshots keyed on it move
+    even when the rebuild reuses the old row ids. When ``changed_icds`` is given, it receives the ids of ICDs whose payload was
+    added, removed or changed by the rebuild (for cache invalidation).
+    """
+    previous = {}
+    if changed_icds is not None:
+        previous = dict(
+            db.query(TranslationEntry.icd11_code_id, TranslationEntry.payload).filter(
+                TranslationEntry.release_id == release.id, TranslationEntry.system.is_(None)
+            )
+        )
+    db.query(TranslationEntry).filter(TranslationEntry.release_id == release.id).delete(synchronize_session=False)
+    mappings = (
+        db.query(Mapping)
+        .options(joinedload(Mapping.traditional_term), joinedload(Mapping.icd11_code))
+        .filter(Mapping.status == 'verified')
+        .order_by(Mapping.id)
+        .all()
+    )
+    by_icd: dict[int, list[Mapping]] = defaultdict(list)
+    for m in mappings:
+        if m.icd11_code and m.traditional_term:
+            by_icd[m.icd11_code_id].append(m)
+
+    rows = []
+    seen_codes = set()
+    for icd_id, ms in by_icd.items():
+        icd = ms[0].icd11_code
+        blob = _dumps(build_payload(icd, ms))
+        base = {"release_id": release.id, "release_version": release.version, "icd11_code_id": icd_id, "payload": blob}
+        rows.append({**base, "icd_name": icd.icd_name, "system": None, "code": None})
+        for m in ms:
+            t = m.traditional_term
+            key = (t.system, t.code)
+            if not m.is_primary or not t.code or key in seen_codes:
+                continue
+            seen_codes.add(key)
+            rows.append({**base, "icd_name": None, "system": t.system, "code": t.code})
+    if rows:
+        db.bulk_insert_mappings(TranslationEntry, rows)
+    release.revision = (release.revision or 0) + 1
+    if changed_icds is not None:
+        current = {r["icd11_code_id"]: r["payload"] for r in rows if r["system"] is None}
+        changed_icds.update(i for i in previous.keys() | current.keys() if previous.get(i) != current.get(i))
+    return len(rows)
+
+
+def lookup_code(db: Session, release_version: Optional[str], system: str, code: str) -> Optional[dict]:
+    if not release_version:
+        return None
+    row = db.query(TranslationEntry.payload).filter(
+        TranslationEntry.release_version == release_version,
+        TranslationEntry.system == system.lower(),
+        TranslationEntry.code == code,
+    ).first()
+    return json.loads(row[0]) if row else None
+
+
+def lookup_icd(db: Session, release_version: Optional[str], icd_name: str) -> Optional[dict]:
+    if not release_version:
+        return None
+    row = db.query(TranslationEntry.payload).filter(
+        TranslationEntry.release_version == release_version,
+        TranslationEntry.icd_name == icd_name,
+        TranslationEntry.system.is_(None),
+    ).first()
+    return json.loads(row[0]) if row else None
+
+
+
+_IN_CHUNK = 500  # stay well under SQLite's bound-parameter limit
+
+
+def _chunks(items: list, size: int = _IN_CHUNK):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def lookup_codes(db: Session, release_version: Optional[str], pairs: Iterable[tuple]) -> dict:
+    """Set-based :func:`lookup_code`: ``{(system, code): payload}`` for the (lowercased system, code) pairs found."""
+    wanted = {(s.lower(), c) for s, c in pairs}
+    if not release_version or not wanted:
+        return {}
+    found: dict = {}
+    for system in {s for s, _ in wanted}:
+        codes = sorted(c for s, c in wanted if s == system)
+        for chunk in _chunks(codes):
+            rows = db.query(TranslationEntry.code, TranslationEntry.payload).filter(
+                TranslationEntry.release_version == release_version,
+                TranslationEntry.system == system,
+                TranslationEntry.code.in_(chunk),
+            ).all()
+            for code, blob in rows:
+                found.setdefault((system, code), json.loads(blob))
+    return found
+
+
+def lookup_icds(db: Session, release_version: Optional[str], icd_names: Iterable[str]) -> dict:
+    """Set-based :func:`lookup_icd`: ``{icd_name: payload}`` for the names found."""
+    names = sorted(set(icd_names))
+    if not release_version or not names:
+        return {}
+    found: dict = {}
+    for chunk in _chunks(names):
+        rows = db.query(TranslationEntry.icd_name, TranslationEntry.payload).filter(
+            TranslationEntry.release_version == release_version,
+            TranslationEntry.icd_name.in_(chunk),
+            TranslationEntry.system.is_(None),
+        ).all()
+        for name, blob in rows:
+            found.setdefault(name, json.loads(blob))
+    return found
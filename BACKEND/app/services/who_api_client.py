@@ -1,10 +1,17 @@
 import requests
 import os
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
 from fastapi import HTTPException
 from cachetools import cached, TTLCache
+from cachetools.keys import hashkey
 import certifi  # For SSL certificate verification
 from typing import Optional
 
+from app.services import who_response_store
+from app.services.who_circuit_breaker import who_breaker
+
 # --- Configuration ---
 WHO_API_CLIENT_ID = os.getenv("WHO_API_CLIENT_ID")
 WHO_API_CLIENT_SECRET = os.getenv("WHO_API_CLIENT_SECRET")
@@ -13,6 +20,9 @@ WHO_ALLOW_INSECURE_ICDAPI = os.getenv("WHO_ALLOW_INSECURE_ICDAPI", "0").lower()
 WHO_LOCAL_NOAUTH = os.getenv("WHO_LOCAL_NOAUTH", "0").lower() in ("1", "true", "yes")
 WHO_ID_BASE = os.getenv("WHO_ID_BASE", "https://id.who.int").rstrip('/')
 WHO_ICD_BASE = os.getenv("WHO_ICD_BASE", "https://icd.who.int").rstrip('/')
+# Per-request timeouts shared by the sync and async clients
+WHO_HTTP_TIMEOUT_SECONDS = float(os.getenv("WHO_HTTP_TIMEOUT_SECONDS", "8"))
+WHO_HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv("WHO_HTTP_CONNECT_TIMEOUT_SECONDS", "4"))
 
 
 def _verify_param():
@@ -22,10 +32,14 @@ def _verify_param():
 
 
 # --- In-memory Cache Configuration ---
+# Per-process L1 in front of the persistent who_response_store (shared, survives restarts).
 token_cache = TTLCache(maxsize=1, ttl=3000)
 entity_cache = TTLCache(maxsize=500, ttl=86400)
 tm2_entity_cache = TTLCache(maxsize=500, ttl=86400)
 foundation_search_cache = TTLCache(maxsize=500, ttl=86400)
+# Confirmed "WHO has nothing for this" answers, kept apart from positive entries with their own TTL.
+WHO_NEGATIVE_TTL_SECONDS = int(os.getenv("WHO_NEGATIVE_TTL_SECONDS", str(6 * 3600)))
+negative_cache = TTLCache(maxsize=5000, ttl=WHO_NEGATIVE_TTL_SECONDS)
 
 
 @cached(token_cache)
@@ -40,35 +54,339 @@ def get_who_api_token():
         'grant_type': 'client_credentials',
         'scope': 'icdapi_access'
     }
+    if not who_breaker.allow(WHO_TOKEN_URL):
+        raise HTTPException(status_code=503, detail="Could not authenticate with WHO API.")
     try:
         r = requests.post(
             WHO_TOKEN_URL,
             data=payload,
             headers={'Content-Type': 'application/x-www-form-urlencoded'},
-            verify=_verify_param()
+            verify=_verify_param(),
+            timeout=(WHO_HTTP_CONNECT_TIMEOUT_SECONDS, WHO_HTTP_TIMEOUT_SECONDS)
         )
+    except requests.exceptions.RequestException as e:
+        who_breaker.record_failure(WHO_TOKEN_URL, type(e).__name__)
+        print(f"Error fetching WHO API token: {e}")
+        raise HTTPException(status_code=503, detail="Could not authenticate with WHO API.")
+    who_breaker.record_response(WHO_TOKEN_URL, r.status_code)
+    try:
         r.raise_for_status()
         return r.json().get('access_token')
-    except requests.exceptions.RequestException as e:
+    except (requests.exceptions.RequestException, ValueError) as e:
         print(f"Error fetching WHO API token: {e}")
         raise HTTPException(status_code=503, detail="Could not authenticate with WHO API.")
 
 
-def get_entity_details(entity_uri: str):
-    """Fetch the full details for a given ICD-11 entity URI (supports optional auth)."""
-    token = get_who_api_token()
+def _auth_headers(token: Optional[str]) -> dict:
+    """Standard ICD-API request headers, with a bearer token when one is available."""
     headers = {'Accept': 'application/json', 'API-Version': 'v2', 'Accept-Language': 'en'}
     if token:
         headers['Authorization'] = f'Bearer {token}'
+    return headers
+
+
+def _prefer_https(entity_uri: str) -> str:
+    # Prefer https only for who.int URIs to avoid breaking local http
+    if entity_uri.startswith("http://") and ("who.int" in entity_uri):
+        return "https://" + entity_uri[len("http://"):]
+    return entity_uri
+
+
+# --- URL variants (shared with the async client) ---
+
+def _linearized_urls(entity_id: str, linearization: str) -> list[str]:
+    """Candidate URLs for a linearized entity when no release is pinned.
+
+    The first ``SAME_ENTITY_VARIANTS['linearized']`` shapes address the exact
+    linearized entity; the foundation query and 2024-01 pinned shapes are
+    last-resort fallbacks.
+    """
+    return [
+        f"{WHO_ICD_BASE}/icdapi/release/11/{linearization}/entity/{entity_id}",
+        f"{WHO_ICD_BASE}/icdapi/release/11/{linearization}/entities/{entity_id}",
+        f"{WHO_ID_BASE}/icd/release/11/{linearization}/entity/{entity_id}",
+        f"{WHO_ID_BASE}/icd/release/11/{linearization}/entities/{entity_id}",
+        # Query-style linearization on id base
+        f"{WHO_ID_BASE}/icd/entity/{entity_id}?linearizationName={linearization}",
+        f"{WHO_ID_BASE}/icd/entity/{entity_id}?releaseId=2024-01&linearizationName={linearization}",
+        f"{WHO_ID_BASE}/icd/entity/{entity_id}?linearizationName={linearization}&releaseId=2024-01",
+    ]
+
+
+def _linearized_release_urls(entity_id: str, linearization: str, rel: str) -> list[str]:
+    """Candidate URLs for a linearized entity at a specific release.
+
+    Shapes addressing the exact entity come first; the ``/unspecified`` residual
+    children (a different entity and code) are last-resort fallbacks.
+    """
+    return [
+        # icdapi entity/entities variants
+        f"{WHO_ICD_BASE}/icdapi/release/11/{rel}/{linearization}/entity/{entity_id}",
+        f"{WHO_ICD_BASE}/icdapi/release/11/{rel}/{linearization}/entities/{entity_id}",
+        # Short-path variants (no 'entity') often used by ECT 'uri'
+        f"{WHO_ICD_BASE}/icdapi/release/11/{rel}/{linearization}/{entity_id}",
+        # id.who.int aliases
+        f"{WHO_ID_BASE}/icd/release/11/{rel}/{linearization}/entity/{entity_id}",
+        f"{WHO_ID_BASE}/icd/release/11/{rel}/{linearization}/entities/{entity_id}",
+        f"{WHO_ID_BASE}/icd/release/11/{rel}/{linearization}/{entity_id}",
+        # Residual category fallbacks
+        f"{WHO_ICD_BASE}/icdapi/release/11/{rel}/{linearization}/{entity_id}/unspecified",
+        f"{WHO_ID_BASE}/icd/release/11/{rel}/{linearization}/{entity_id}/unspecified",
+    ]
+
+
+def _release_search_urls(linearization: str, term: str, rel: str) -> list[str]:
+    """Candidate search URLs for a linearization (mms|tm2) at a specific release."""
+    return [
+        f"{WHO_ICD_BASE}/icdapi/release/11/{rel}/{linearization}/search?q={term}",
+        f"{WHO_ID_BASE}/icd/release/11/{rel}/{linearization}/search?q={term}",
+        # Single-language endpoint variant
+        f"{WHO_ICD_BASE}/icdapi/release/11/{rel}/{linearization}-sl/search?q={term}",
+    ]
+
+
+def _tm2_search_urls(term: str) -> list[str]:
+    return [
+        f"{WHO_ICD_BASE}/icdapi/release/11/tm2/sl/search?q={term}",
+        f"{WHO_ICD_BASE}/icdapi/release/11/tm2/search?q={term}",
+    ]
+
+
+# --- Learned endpoint ordering ---
+# WHO deployments answer on different URL shapes (icdapi vs id base, entity vs
+# entities, short paths). Remember which variant index answered last for each
+# (kind, linearization, release) so subsequent lookups try it first.
+# Only shapes that address the same entity (the leading entries of each URL
+# list) can become the preferred variant or be raced against each other.
+_preferred_variant: dict[tuple, int] = {}
+SAME_ENTITY_VARIANTS = {'linearized': 4, 'linearized_release': 6, 'search': 3}
+
+
+def _ordered_variants(kind: str, linearization: str, release: Optional[str], urls: list[str]) -> list[tuple[int, str]]:
+    """Return (variant index, url) pairs with the learned winner moved to the front."""
+    indexed = list(enumerate(urls))
+    pref = _preferred_variant.get((kind, linearization, release))
+    if pref is not None and 0 < pref < len(indexed):
+        indexed.insert(0, indexed.pop(pref))
+    return indexed
+
+
+def _remember_variant(kind: str, linearization: str, release: Optional[str], index: int):
+    if index < SAME_ENTITY_VARIANTS.get(kind, 0):
+        _preferred_variant[(kind, linearization, release)] = index
+
+
+def _has_preferred_variant(kind: str, linearization: str, release: Optional[str]) -> bool:
+    return (kind, linearization, release) in _preferred_variant
+
+
+# --- Negative (miss) memo ---
+# A lookup is only remembered as a miss when WHO actually answered (empty
+# results / 404). Transport errors and 5xx are tracked per lookup through
+# _upstream_failures so an outage is never cached as "not found".
+_upstream_failures: ContextVar[Optional[list]] = ContextVar("who_upstream_failures", default=None)
+
+
+def _note_upstream_failure(url: str):
+    failures = _upstream_failures.get()
+    if failures is not None:
+        failures.append(url)
+
+
+@contextmanager
+def upstream_trace():
+    """Collect upstream failures of the enclosed lookup (propagated to any enclosing trace)."""
+    parent = _upstream_failures.get()
+    failures: list = []
+    token = _upstream_failures.set(failures)
     try:
-        # Prefer https only for who.int URIs to avoid breaking local http
-        if entity_uri.startswith("http://") and ("who.int" in entity_uri):
-            entity_uri = "https://" + entity_uri[len("http://"):]
-        r = requests.get(entity_uri, headers=headers, verify=_verify_param())
-        r.raise_for_status()
-        return r.json()
-    except requests.exceptions.RequestException:
+        yield failures
+    finally:
+        _upstream_failures.reset(token)
+        if parent is not None:
+            parent.extend(failures)
+
+
+def _miss_key(kind: str, term: str, linearization: str, release: Optional[str]) -> tuple:
+    return (kind, (term or '').strip().lower(), linearization, release or '')
+
+
+def is_known_miss(kind: str, term: str, linearization: str, release: Optional[str] = None) -> bool:
+    return _miss_key(kind, term, linearization, release) in negative_cache
+
+
+def record_miss(kind: str, term: str, linearization: str, release: Optional[str] = None):
+    negative_cache[_miss_key(kind, term, linearization, release)] = True
+
+
+# --- Single-flight ---
+# Concurrent callers asking for the same lookup (function, term, release) share one
+# in-flight upstream call and its result instead of each hitting WHO (thundering herd
+# after a cache expiry). Followers inherit the leader's upstream failures so an
+# outage is still never cached as "not found" on their side.
+class _Flight:
+    __slots__ = ("done", "result", "failed")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.failed = False
+
+
+_inflight: dict[tuple, _Flight] = {}
+_inflight_lock = threading.Lock()
+singleflight_counters = {"leaders": 0, "coalesced": 0}
+
+
+def _single_flight(key: tuple, lookup):
+    with _inflight_lock:
+        flight = _inflight.get(key)
+        leader = flight is None
+        if leader:
+            flight = _inflight[key] = _Flight()
+            singleflight_counters["leaders"] += 1
+        else:
+            singleflight_counters["coalesced"] += 1
+    if not leader:
+        flight.done.wait()
+        if flight.failed:
+            _note_upstream_failure(f"single-flight:{key}")
+        return flight.result
+    flight.failed = True
+    try:
+        with upstream_trace() as failures:
+            flight.result = lookup()
+        flight.failed = bool(failures)
+        return flight.result
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+        flight.done.set()
+
+
+def _memo_miss(kind: str, term: str, linearization: str, release: Optional[str], lookup):
+    """Run ``lookup()`` unless (term, linearization, release) is a known miss; remember confirmed misses.
+
+    Concurrent identical lookups are coalesced into one upstream call (see ``_single_flight``).
+    """
+    if is_known_miss(kind, term, linearization, release):
+        return None
+    key = _miss_key(kind, term, linearization, release)
+    with upstream_trace() as failures:
+        result = _single_flight(key, lookup)
+    if result is None and not failures:
+        record_miss(kind, term, linearization, release)
+    return result
+
+
+def _cached_lookup(cache, key, lookup):
+    """Read-through for the L1 TTLCaches; a None caused by an upstream failure is not cached."""
+    if key in cache:
+        return cache[key]
+    with upstream_trace() as failures:
+        result = lookup()
+    if result is not None or not failures:
+        cache[key] = result
+    return result
+
+
+def who_unavailable() -> bool:
+    """True while the breaker short-circuits the ICD-API host or the token endpoint (live enrichment would fail fast)."""
+    if who_breaker.is_open(WHO_ICD_BASE):
+        return True
+    return bool(WHO_TOKEN_URL) and not WHO_LOCAL_NOAUTH and who_breaker.is_open(WHO_TOKEN_URL)
+
+
+def breaker_stats() -> dict:
+    return {"available": not who_unavailable(), **who_breaker.stats()}
+
+
+def negative_cache_stats() -> dict:
+    return {"entries": len(negative_cache), "ttl_seconds": WHO_NEGATIVE_TTL_SECONDS}
+
+
+def singleflight_stats() -> dict:
+    return {**singleflight_counters, "in_flight": len(_inflight)}
+
+
+def _first_coded_entity(ents: list) -> Optional[dict]:
+    """Return the first normalized search entity that carries a code."""
+    for e in ents:
+        norm = _normalize_search_entity(e)
+        if norm and norm.get('code'):
+            return norm
+    return None
+
+
+def _coded_or_titled(d: dict, fallback_id: Optional[str]) -> Optional[dict]:
+    code = d.get('code')
+    title = d.get('title')
+    if code or title:
+        return {'code': code, 'title': title, '@id': d.get('@id') or fallback_id}
+    return None
+
+
+def _serve_stale(store, entry, url: str, reason: str) -> dict:
+    """Fall back to a stored body whose revalidation failed (WHO down, 5xx or 429)."""
+    store.note_stale(url, reason)
+    return entry.body
+
+
+def _get_json(url: str, headers: dict) -> Optional[dict]:
+    """GET a WHO URL through the persistent response store.
+
+    Fresh stored bodies are returned without a network call; stale ones are
+    revalidated (304 keeps the stored body) and served as-is if WHO is
+    unreachable or answers 5xx / 429. Otherwise returns None on HTTP >= 400,
+    transport errors or non-JSON.
+    """
+    store = who_response_store.response_store
+    lang = headers.get('Accept-Language')
+    entry = store.lookup(url, lang) if store else None
+    if entry and entry.fresh:
+        return entry.body
+    if not who_breaker.allow(url):
+        # Circuit open: treat WHO as unreachable without waiting out a timeout
+        if entry:
+            return _serve_stale(store, entry, url, "circuit open")
+        _note_upstream_failure(url)
         return None
+    req_headers = dict(headers)
+    if entry:
+        req_headers.update(entry.conditional_headers())
+    try:
+        r = requests.get(url, headers=req_headers, verify=_verify_param(),
+                         timeout=(WHO_HTTP_CONNECT_TIMEOUT_SECONDS, WHO_HTTP_TIMEOUT_SECONDS))
+    except requests.exceptions.RequestException as e:
+        who_breaker.record_failure(url, type(e).__name__)
+        if entry:
+            return _serve_stale(store, entry, url, type(e).__name__)
+        _note_upstream_failure(url)
+        return None
+    who_breaker.record_response(url, r.status_code)
+    if r.status_code == 304 and entry:
+        store.mark_revalidated(url, lang)
+        return entry.body
+    if r.status_code >= 500 or r.status_code == 429:
+        if entry:
+            return _serve_stale(store, entry, url, f"HTTP {r.status_code}")
+        _note_upstream_failure(url)
+        return None
+    if r.status_code >= 400:
+        return None
+    try:
+        body = r.json()
+    except ValueError:
+        return None
+    if store and isinstance(body, dict):
+        store.store(url, lang, body, r.headers.get('ETag'), r.headers.get('Last-Modified'))
+    return body
+
+
+def get_entity_details(entity_uri: str):
+    """Fetch the full details for a given ICD-11 entity URI (supports optional auth)."""
+    url = _prefer_https(entity_uri)
+    return _single_flight(('details', url), lambda: _get_json(url, _auth_headers(get_who_api_token())))
 
 
 def _entity_id_from_uri(entity_uri: str) -> Optional[str]:
@@ -84,30 +402,18 @@ def fetch_linearized_entity(entity_id: str, linearization: str):
     Example: https://icd.who.int/icdapi/release/11/mms/entity/{id}
              https://icd.who.int/icdapi/release/11/tm2/entity/{id}
     """
-    token = get_who_api_token()
-    headers = {'Accept': 'application/json', 'API-Version': 'v2', 'Accept-Language': 'en'}
-    if token:
-        headers['Authorization'] = f'Bearer {token}'
-    # Try multiple URL patterns for better compatibility across WHO deployments
-    url_variants = [
-        f"{WHO_ICD_BASE}/icdapi/release/11/{linearization}/entity/{entity_id}",
-        f"{WHO_ICD_BASE}/icdapi/release/11/{linearization}/entities/{entity_id}",
-        f"{WHO_ID_BASE}/icd/release/11/{linearization}/entity/{entity_id}",
-        f"{WHO_ID_BASE}/icd/release/11/{linearization}/entities/{entity_id}",
-        # Query-style linearization on id base
-        f"{WHO_ID_BASE}/icd/entity/{entity_id}?linearizationName={linearization}",
-        f"{WHO_ID_BASE}/icd/entity/{entity_id}?releaseId=2024-01&linearizationName={linearization}",
-        f"{WHO_ID_BASE}/icd/entity/{entity_id}?linearizationName={linearization}&releaseId=2024-01",
-    ]
-    for url in url_variants:
-        try:
-            r = requests.get(url, headers=headers, verify=_verify_param())
-            if r.status_code >= 400:
-                continue
-            return r.json()
-        except requests.exceptions.RequestException:
-            continue
-    return None
+    headers = _auth_headers(get_who_api_token())
+
+    def lookup():
+        # Try multiple URL patterns for better compatibility across WHO deployments
+        for idx, url in _ordered_variants('linearized', linearization, None, _linearized_urls(entity_id, linearization)):
+            data = _get_json(url, headers)
+            if data is not None:
+                _remember_variant('linearized', linearization, None, idx)
+                return data
+        return None
+
+    return _memo_miss('linearized', entity_id, linearization, None, lookup)
 
 
 def _normalize_search_entity(ent: dict) -> Optional[dict]:
@@ -126,93 +432,39 @@ def _normalize_search_entity(ent: dict) -> Optional[dict]:
     return {'code': code, 'title': title_obj, '@id': ent_id}
 
 
-def mms_search_by_release(term: str, release: Optional[str] = None) -> Optional[dict]:
-    """Search MMS for a term at a specific release and return first normalized entity with code if available."""
-    token = get_who_api_token()
-    headers = {'Accept': 'application/json', 'API-Version': 'v2', 'Accept-Language': 'en'}
-    if token:
-        headers['Authorization'] = f'Bearer {token}'
+def _search_by_release(linearization: str, term: str, release: Optional[str]) -> Optional[dict]:
+    headers = _auth_headers(get_who_api_token())
     rel = release or "2025-01"
-    urls = [
-        f"{WHO_ICD_BASE}/icdapi/release/11/{rel}/mms/search?q={term}",
-        f"{WHO_ID_BASE}/icd/release/11/{rel}/mms/search?q={term}",
-        # Single-language endpoint variant
-        f"{WHO_ICD_BASE}/icdapi/release/11/{rel}/mms-sl/search?q={term}",
-    ]
-    for url in urls:
-        try:
-            r = requests.get(url, headers=headers, verify=_verify_param())
-            if r.status_code >= 400:
-                continue
-            data = r.json()
-            ents = data.get('destinationEntities', [])
-            if not ents:
-                continue
-            # Prefer an entity that actually has a code
-            for e in ents:
-                norm = _normalize_search_entity(e)
-                if norm and norm.get('code'):
-                    return norm
-            # If none had a code, follow the first entity id to fetch details (often returns code)
-            ent_id_url = ents[0].get('id') if ents else None
-            if ent_id_url:
-                try:
-                    rr = requests.get(ent_id_url, headers=headers, verify=_verify_param())
-                    if rr.status_code < 400:
-                        d = rr.json()
-                        code = d.get('code')
-                        title = d.get('title')
-                        if code or title:
-                            return {'code': code, 'title': title, '@id': d.get('@id') or ent_id_url}
-                except requests.exceptions.RequestException:
-                    pass
-        except requests.exceptions.RequestException:
+    for idx, url in _ordered_variants('search', linearization, rel, _release_search_urls(linearization, term, rel)):
+        data = _get_json(url, headers)
+        ents = (data or {}).get('destinationEntities', [])
+        if not ents:
             continue
+        # Prefer an entity that actually has a code
+        norm = _first_coded_entity(ents)
+        if norm:
+            _remember_variant('search', linearization, rel, idx)
+            return norm
+        # If none had a code, follow the first entity id to fetch details (often returns code)
+        ent_id_url = ents[0].get('id')
+        if ent_id_url:
+            d = _get_json(ent_id_url, headers)
+            found = _coded_or_titled(d, ent_id_url) if d else None
+            if found:
+                _remember_variant('search', linearization, rel, idx)
+                return found
     return None
 
 
+def mms_search_by_release(term: str, release: Optional[str] = None) -> Optional[dict]:
+    """Search MMS for a term at a specific release and return first normalized entity with code if available."""
+    return _memo_miss('search', term, 'mms', release or "2025-01", lambda: _search_by_release('mms', term, release))
+
+
 def tm2_search_by_release(term: str, release: Optional[str] = None) -> Optional[dict]:
     """Search TM2 for a term at a specific release and return first normalized entity with code if available."""
-    token = get_who_api_token()
-    headers = {'Accept': 'application/json', 'API-Version': 'v2', 'Accept-Language': 'en'}
-    if token:
-        headers['Authorization'] = f'Bearer {token}'
-    rel = release or "2025-01"
-    urls = [
-        f"{WHO_ICD_BASE}/icdapi/release/11/{rel}/tm2/search?q={term}",
-        f"{WHO_ID_BASE}/icd/release/11/{rel}/tm2/search?q={term}",
-        f"{WHO_ICD_BASE}/icdapi/release/11/{rel}/tm2-sl/search?q={term}",
-    ]
-    for url in urls:
-        try:
-            r = requests.get(url, headers=headers, verify=_verify_param())
-            if r.status_code >= 400:
-                continue
-            data = r.json()
-            ents = data.get('destinationEntities', [])
-            if not ents:
-                continue
-            for e in ents:
-                norm = _normalize_search_entity(e)
-                if norm and norm.get('code'):
-                    return norm
-            ent_id_url = ents[0].get('id') if ents else None
-            if ent_id_url:
-                try:
-                    rr = requests.get(ent_id_url, headers=headers, verify=_verify_param())
-                    if rr.status_code < 400:
-                        d = rr.json()
-                        code = d.get('code')
-                        title = d.get('title')
-                        if code or title:
-                            return {'code': code, 'title': title, '@id': d.get('@id') or ent_id_url}
-                except requests.exceptions.RequestException:
-                    pass
-        except requests.exceptions.RequestException:
-            continue
-    return None
+    return _memo_miss('search', term, 'tm2', release or "2025-01", lambda: _search_by_release('tm2', term, release))
 
-@cached(entity_cache)
 def search_and_fetch_entity(icd_name: str):
     """
     Searches for an ICD-11 entity and fetches its details.
@@ -220,10 +472,12 @@ def search_and_fetch_entity(icd_name: str):
     2) Fallback to icd.who.int mms-sl search
     Returns the full entity details JSON or None.
     """
-    token = get_who_api_token()
-    headers = {'Accept': 'application/json', 'API-Version': 'v2', 'Accept-Language': 'en'}
-    if token:
-        headers['Authorization'] = f'Bearer {token}'
+    return _cached_lookup(entity_cache, hashkey(icd_name), lambda: _memo_miss(
+        'entity', icd_name, 'mms', None, lambda: _search_and_fetch_entity(icd_name)))
+
+
+def _search_and_fetch_entity(icd_name: str):
+    headers = _auth_headers(get_who_api_token())
 
     search_urls = [
         f"{WHO_ID_BASE}/icd/entity/search?q={icd_name}",
@@ -231,49 +485,36 @@ def search_and_fetch_entity(icd_name: str):
     ]
 
     for url in search_urls:
-        try:
-            r = requests.get(url, headers=headers, verify=_verify_param())
-            r.raise_for_status()
-            data = r.json()
-            entities = data.get('destinationEntities', [])
-            if not entities:
-                continue
-            entity_uri = entities[0].get('id')
-            if not entity_uri:
-                continue
-            # Try MMS linearized form first to get an MMS code if available
-            ent_id = _entity_id_from_uri(entity_uri)
-            if ent_id:
-                mms_data = fetch_linearized_entity(ent_id, 'mms')
-                if mms_data and (mms_data.get('code') or mms_data.get('title')):
-                    return mms_data
-            # Fallback to foundation entity details
-            entity = get_entity_details(entity_uri)
-            if entity and (entity.get('code') or entity.get('title')):
-                return entity
-            # As a last resort, try the MMS search endpoint that often includes codes in results
-            try:
-                rr = requests.get(f"{WHO_ICD_BASE}/icdapi/release/11/mms-sl/search?q={icd_name}", headers=headers, verify=_verify_param())
-                rr.raise_for_status()
-                d2 = rr.json()
-                ents2 = d2.get('destinationEntities', [])
-                if ents2:
-                    norm = _normalize_search_entity(ents2[0])
-                    if norm:
-                        return norm
-            except requests.exceptions.RequestException:
-                pass
-            return None
-        except requests.exceptions.RequestException as e:
-            print(f"Error searching WHO API with URL {url}: {e}")
+        data = _get_json(url, headers)
+        if not data:
             continue
-        except Exception as e:
-            print(f"Unexpected error from WHO search {url}: {e}")
+        entities = data.get('destinationEntities', [])
+        if not entities:
+            continue
+        entity_uri = entities[0].get('id')
+        if not entity_uri:
             continue
+        # Try MMS linearized form first to get an MMS code if available
+        ent_id = _entity_id_from_uri(entity_uri)
+        if ent_id:
+            mms_data = fetch_linearized_entity(ent_id, 'mms')
+            if mms_data and (mms_data.get('code') or mms_data.get('title')):
+                return mms_data
+        # Fallback to foundation entity details
+        entity = get_entity_details(entity_uri)
+        if entity and (entity.get('code') or entity.get('title')):
+            return entity
+        # As a last resort, try the MMS search endpoint that often includes codes in results
+        d2 = _get_json(f"{WHO_ICD_BASE}/icdapi/release/11/mms-sl/search?q={icd_name}", headers)
+        ents2 = (d2 or {}).get('destinationEntities', [])
+        if ents2:
+            norm = _normalize_search_entity(ents2[0])
+            if norm:
+                return norm
+        return None
     return None
 
 
-@cached(tm2_entity_cache)
 def search_and_fetch_tm2(term: str):
     """
     Best-effort TM2 fetch:
@@ -281,70 +522,47 @@ def search_and_fetch_tm2(term: str):
     2) Fetch TM2 linearized entity by id (to get codes like SM31)
     3) Fallbacks are silently ignored if not available
     """
-    token = get_who_api_token()
-    headers = {'Accept': 'application/json', 'API-Version': 'v2', 'Accept-Language': 'en'}
-    if token:
-        headers['Authorization'] = f'Bearer {token}'
+    return _cached_lookup(tm2_entity_cache, hashkey(term), lambda: _memo_miss(
+        'entity', term, 'tm2', None, lambda: _search_and_fetch_tm2(term)))
+
+
+def _search_and_fetch_tm2(term: str):
+    headers = _auth_headers(get_who_api_token())
 
     # Step 1: Foundation search
-    try:
-        r = requests.get(f"{WHO_ID_BASE}/icd/entity/search?q={term}", headers=headers, verify=_verify_param())
-        r.raise_for_status()
-        data = r.json()
-        entities = data.get('destinationEntities', [])
-        if not entities:
-            # Fallback: TM2 linearization search endpoints
-            for url in [
-                f"{WHO_ICD_BASE}/icdapi/release/11/tm2/sl/search?q={term}",
-                f"{WHO_ICD_BASE}/icdapi/release/11/tm2/search?q={term}",
-            ]:
-                try:
-                    rr = requests.get(url, headers=headers, verify=_verify_param())
-                    rr.raise_for_status()
-                    d2 = rr.json()
-                    ents2 = d2.get('destinationEntities', [])
-                    if not ents2:
-                        continue
-                    ent_uri2 = ents2[0].get('id')
-                    ent_id2 = _entity_id_from_uri(ent_uri2 or '')
-                    if not ent_id2:
-                        continue
-                    tm2_data2 = fetch_linearized_entity(ent_id2, 'tm2')
-                    if tm2_data2 and (tm2_data2.get('code') or tm2_data2.get('title')):
-                        return tm2_data2
-                except requests.exceptions.RequestException:
-                    continue
-            return None
-        ent_uri = entities[0].get('id')
-        ent_id = _entity_id_from_uri(ent_uri or '')
-        if not ent_id:
-            return None
-        # Step 2: Fetch TM2 linearized
-        tm2_data = fetch_linearized_entity(ent_id, 'tm2')
-        if tm2_data and (tm2_data.get('code') or tm2_data.get('title')):
-            return tm2_data
-        # If linearized fetch didn't work, try tm2 search endpoints for a code
-        for url in [
-            f"{WHO_ICD_BASE}/icdapi/release/11/tm2/sl/search?q={term}",
-            f"{WHO_ICD_BASE}/icdapi/release/11/tm2/search?q={term}",
-        ]:
-            try:
-                rr = requests.get(url, headers=headers, verify=_verify_param())
-                rr.raise_for_status()
-                d2 = rr.json()
-                ents2 = d2.get('destinationEntities', [])
-                if ents2:
-                    norm = _normalize_search_entity(ents2[0])
-                    if norm:
-                        return norm
-            except requests.exceptions.RequestException:
+    data = _get_json(f"{WHO_ID_BASE}/icd/entity/search?q={term}", headers)
+    if data is None:
+        return None
+    entities = data.get('destinationEntities', [])
+    if not entities:
+        # Fallback: TM2 linearization search endpoints
+        for url in _tm2_search_urls(term):
+            d2 = _get_json(url, headers)
+            ents2 = (d2 or {}).get('destinationEntities', [])
+            if not ents2:
                 continue
-    except requests.exceptions.RequestException as e:
-        print(f"TM2 search failed: {e}")
+            ent_id2 = _entity_id_from_uri(ents2[0].get('id') or '')
+            if not ent_id2:
+                continue
+            tm2_data2 = fetch_linearized_entity(ent_id2, 'tm2')
+            if tm2_data2 and (tm2_data2.get('code') or tm2_data2.get('title')):
+                return tm2_data2
         return None
-    except Exception as e:
-        print(f"TM2 search unexpected error: {e}")
+    ent_id = _entity_id_from_uri(entities[0].get('id') or '')
+    if not ent_id:
         return None
+    # Step 2: Fetch TM2 linearized
+    tm2_data = fetch_linearized_entity(ent_id, 'tm2')
+    if tm2_data and (tm2_data.get('code') or tm2_data.get('title')):
+        return tm2_data
+    # If linearized fetch didn't work, try tm2 search endpoints for a code
+    for url in _tm2_search_urls(term):
+        d2 = _get_json(url, headers)
+        ents2 = (d2 or {}).get('destinationEntities', [])
+        if ents2:
+            norm = _normalize_search_entity(ents2[0])
+            if norm:
+                return norm
     return None
 
 
@@ -362,49 +580,28 @@ def fetch_linearized_entity_by_release(entity_id: str, linearization: str, relea
     Fetch a linearized entity (MMS/TM2) for a specific release by foundation entity id.
     Example: https://icd.who.int/icdapi/release/11/2025-01/mms/entity/{id}
     """
-    token = get_who_api_token()
-    headers = {'Accept': 'application/json', 'API-Version': 'v2', 'Accept-Language': 'en'}
-    if token:
-        headers['Authorization'] = f'Bearer {token}'
+    headers = _auth_headers(get_who_api_token())
     rel = release or "2025-01"
-    url_variants = [
-        # icdapi entity/entities variants
-        f"{WHO_ICD_BASE}/icdapi/release/11/{rel}/{linearization}/entity/{entity_id}",
-        f"{WHO_ICD_BASE}/icdapi/release/11/{rel}/{linearization}/entities/{entity_id}",
-        # Short-path variants (no 'entity') often used by ECT 'uri'
-        f"{WHO_ICD_BASE}/icdapi/release/11/{rel}/{linearization}/{entity_id}",
-        f"{WHO_ICD_BASE}/icdapi/release/11/{rel}/{linearization}/{entity_id}/unspecified",
-        # id.who.int aliases
-        f"{WHO_ID_BASE}/icd/release/11/{rel}/{linearization}/entity/{entity_id}",
-        f"{WHO_ID_BASE}/icd/release/11/{rel}/{linearization}/entities/{entity_id}",
-        f"{WHO_ID_BASE}/icd/release/11/{rel}/{linearization}/{entity_id}",
-        f"{WHO_ID_BASE}/icd/release/11/{rel}/{linearization}/{entity_id}/unspecified",
-    ]
-    for url in url_variants:
-        try:
-            r = requests.get(url, headers=headers, verify=_verify_param())
-            if r.status_code >= 400:
-                continue
-            return r.json()
-        except requests.exceptions.RequestException:
-            continue
-    return None
+
+    def lookup():
+        for idx, url in _ordered_variants('linearized_release', linearization, rel, _linearized_release_urls(entity_id, linearization, rel)):
+            data = _get_json(url, headers)
+            if data is not None:
+                _remember_variant('linearized_release', linearization, rel, idx)
+                return data
+        return None
+
+    return _memo_miss('linearized', entity_id, linearization, rel, lookup)
 
 
-@cached(foundation_search_cache)
 def search_foundation_uri(term: str) -> Optional[str]:
     """Return the first foundation entity URI for a search term (id base, optional auth)."""
-    token = get_who_api_token()
-    headers = {'Accept': 'application/json', 'API-Version': 'v2', 'Accept-Language': 'en'}
-    if token:
-        headers['Authorization'] = f'Bearer {token}'
-    try:
-        r = requests.get(f"{WHO_ID_BASE}/icd/entity/search?q={term}", headers=headers, verify=_verify_param())
-        r.raise_for_status()
-        data = r.json()
-        entities = data.get('destinationEntities', [])
+    def lookup():
+        data = _get_json(f"{WHO_ID_BASE}/icd/entity/search?q={term}", _auth_headers(get_who_api_token()))
+        entities = (data or {}).get('destinationEntities', [])
         if not entities:
             return None
         return entities[0].get('id')
-    except requests.exceptions.RequestException:
-        return None
\ No newline at end of file
+
+    return _cached_lookup(foundation_search_cache, hashkey(term), lambda: _memo_miss(
+        'search', term, 'foundation', None, lookup))
@@ -0,0 +1,493 @@
+"""Asyncio WHO ICD-API client used by the public translate endpoints.
+
+Mirrors the helpers in ``who_api_client`` (same names, same return shapes) but
+runs on a shared ``httpx.AsyncClient`` so a slow WHO lookup never blocks the
+uvicorn event loop, and TLS connections to icd.who.int / id.who.int are kept
+alive and reused across requests. Every request carries a timeout and goes
+through the shared per-host circuit breaker (``who_circuit_breaker``).
+
+Lookups that have several candidate URL shapes race the ones addressing the
+same entity concurrently and keep the highest-priority good answer (see
+``_race_variants``), so a cold lookup costs roughly one round trip instead of
+the sum of all of them.
+
+The sync module stays the implementation for threads and scripts
+(who_sync scheduler, admin tooling); URL variants, normalizers and the TTL
+caches are shared with it so both paths warm each other.
+"""
+import asyncio
+import contextvars
+import os
+import ssl
+from typing import Any, Awaitable, Callable, Optional
+
+import certifi
+import httpx
+from cachetools.keys import hashkey
+from fastapi import HTTPException
+
+from app.services import who_api_client as _sync
+from app.services import who_response_store
+from app.services.who_circuit_breaker import who_breaker
+
+WHO_HTTP_TIMEOUT_SECONDS = _sync.WHO_HTTP_TIMEOUT_SECONDS
+WHO_HTTP_CONNECT_TIMEOUT_SECONDS = _sync.WHO_HTTP_CONNECT_TIMEOUT_SECONDS
+WHO_HTTP_MAX_CONNECTIONS = int(os.getenv("WHO_HTTP_MAX_CONNECTIONS", "20"))
+WHO_HTTP_MAX_KEEPALIVE = int(os.getenv("WHO_HTTP_MAX_KEEPALIVE", "10"))
+WHO_HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("WHO_HTTP_KEEPALIVE_EXPIRY_SECONDS", "60"))
+
+# One pooled client per event loop (httpx connections are bound to the loop that opened them)
+_clients: dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+
+
+def _ssl_verify():
+    if _sync.WHO_ALLOW_INSECURE_ICDAPI:
+        return False
+    return ssl.create_default_context(cafile=certifi.where())
+
+
+def _prune_closed_loops():
+    # A client whose loop is gone can no longer be aclose()d; dropping the last
+    # reference lets its pool and sockets be garbage collected.
+    for loop in [l for l in _clients if l.is_closed()]:
+        del _clients[loop]
+
+
+def _get_client() -> httpx.AsyncClient:
+    """Return the pooled client for the running event loop (created lazily).
+
+    Each loop gets its own client (e.g. test clients that spin a loop per
+    request); clients of other live loops are kept, not replaced, so their
+    connections can still be closed on shutdown.
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        _prune_closed_loops()
+        client = _clients[loop] = httpx.AsyncClient(
+            verify=_ssl_verify(),
+            timeout=httpx.Timeout(WHO_HTTP_TIMEOUT_SECONDS, connect=WHO_HTTP_CONNECT_TIMEOUT_SECONDS),
+            limits=httpx.Limits(
+                max_connections=WHO_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=WHO_HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=WHO_HTTP_KEEPALIVE_EXPIRY_SECONDS,
+            ),
+            follow_redirects=True,
+        )
+    return client
+
+
+async def aclose():
+    """Close the pooled clients (called on application shutdown)."""
+    loop = asyncio.get_running_loop()
+    for other, client in list(_clients.items()):
+        if client.is_closed or other.is_closed():
+            continue
+        try:
+            if other is loop:
+                await client.aclose()
+            else:
+                asyncio.run_coroutine_threadsafe(client.aclose(), other)
+        except Exception:
+            pass
+    _clients.clear()
+
+
+async def _get_json(url: str, headers: dict, timeout: Optional[float] = None) -> Optional[dict]:
+    """GET a URL via the persistent response store and return its JSON body.
+
+    Same policy as the sync ``_get_json``: fresh stored bodies skip the network,
+    stale ones are revalidated (or served if WHO is unreachable or answers 5xx /
+    429). Otherwise returns None on transport error, timeout, HTTP >= 400 or a
+    non-JSON body.
+    """
+    store = who_response_store.response_store
+    lang = headers.get('Accept-Language')
+    # SQLite I/O (and its lock / busy wait) stays off the event loop
+    entry = await asyncio.to_thread(store.lookup, url, lang) if store else None
+    if entry and entry.fresh:
+        return entry.body
+    if not who_breaker.allow(url):
+        if entry:
+            return _sync._serve_stale(store, entry, url, "circuit open")
+        _sync._note_upstream_failure(url)
+        return None
+    req_headers = dict(headers)
+    if entry:
+        req_headers.update(entry.conditional_headers())
+    kwargs = {"headers": req_headers}
+    if timeout is not None:
+        kwargs["timeout"] = timeout
+    try:
+        r = await _get_client().get(url, **kwargs)
+    except httpx.HTTPError as e:
+        who_breaker.record_failure(url, type(e).__name__)
+        if entry:
+            return _sync._serve_stale(store, entry, url, type(e).__name__)
+        _sync._note_upstream_failure(url)
+        return None
+    except BaseException:
+        # Cancelled (race loser, client disconnect): no verdict on the host
+        who_breaker.release(url)
+        raise
+    who_breaker.record_response(url, r.status_code)
+    if r.status_code == 304 and entry:
+        await asyncio.to_thread(store.mark_revalidated, url, lang)
+        return entry.body
+    if r.status_code >= 500 or r.status_code == 429:
+        if entry:
+            return _sync._serve_stale(store, entry, url, f"HTTP {r.status_code}")
+        _sync._note_upstream_failure(url)
+        return None
+    if r.status_code >= 400:
+        return None
+    try:
+        body = r.json()
+    except ValueError:
+        return None
+    if store and isinstance(body, dict):
+        await asyncio.to_thread(store.store, url, lang, body, r.headers.get('ETag'), r.headers.get('Last-Modified'))
+    return body
+
+
+async def _first_by_priority(
+    variants: list[tuple[int, str]],
+    attempt: Callable[[str], Awaitable[Optional[Any]]],
+) -> tuple[Optional[Any], Optional[int]]:
+    """Send all variants concurrently but return the answer a sequential walk would.
+
+    A success is only accepted once every higher-priority variant has failed,
+    so racing changes latency, never which shape wins.
+    """
+    tasks = [(idx, asyncio.ensure_future(attempt(url))) for idx, url in variants]
+    try:
+        while True:
+            for idx, task in tasks:
+                if not task.done():
+                    break
+                if task.exception() is None and task.result() is not None:
+                    return task.result(), idx
+            else:
+                return None, None
+            await asyncio.wait([t for _, t in tasks if not t.done()], return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for _, task in tasks:
+            task.cancel()
+
+
+async def _race_variants(
+    kind: str,
+    linearization: str,
+    release: Optional[str],
+    urls: list[str],
+    attempt: Callable[[str], Awaitable[Optional[Any]]],
+) -> Optional[Any]:
+    """Resolve a lookup that has several candidate URL shapes.
+
+    If a shape already won for (kind, linearization, release) it is tried alone
+    first. Otherwise (or if it fails) the shapes addressing the same entity are
+    sent concurrently and the highest-priority answer wins and is remembered.
+    Fallback shapes (residual children, foundation query, pinned releases) are
+    only tried afterwards, one at a time, and never remembered.
+    """
+    variants = _sync._ordered_variants(kind, linearization, release, urls)
+    if _sync._has_preferred_variant(kind, linearization, release) and variants:
+        idx, url = variants[0]
+        result = await attempt(url)
+        if result is not None:
+            return result
+        variants = variants[1:]
+    same_entity = _sync.SAME_ENTITY_VARIANTS.get(kind, 0)
+    raced = [(idx, url) for idx, url in variants if idx < same_entity]
+    if raced:
+        result, idx = await _first_by_priority(raced, attempt)
+        if result is not None:
+            _sync._remember_variant(kind, linearization, release, idx)
+            return result
+    for idx, url in variants:
+        if idx < same_entity:
+            continue
+        result = await attempt(url)
+        if result is not None:
+            return result
+    return None
+
+
+# In-flight lookups of this event loop, keyed like ``who_api_client._single_flight``.
+_inflight: dict[tuple, asyncio.Task] = {}
+
+
+async def _lead(key: tuple, lookup: Callable[[], Awaitable[Optional[Any]]]) -> tuple[Optional[Any], bool]:
+    try:
+        with _sync.upstream_trace() as failures:
+            result = await lookup()
+        return result, bool(failures)
+    finally:
+        if _inflight.get(key) is asyncio.current_task():
+            del _inflight[key]
+
+
+async def _single_flight(key: tuple, lookup: Callable[[], Awaitable[Optional[Any]]]) -> Optional[Any]:
+    """Share one upstream call between concurrent identical lookups.
+
+    The lookup runs as its own task (in a fresh context, so failure tracing is
+    reported back explicitly), and callers await it through ``shield``: a caller
+    that is cancelled does not cancel the fetch the others are waiting on.
+    """
+    loop = asyncio.get_running_loop()
+    task = _inflight.get(key)
+    if task is None or task.done() or task.get_loop() is not loop:
+        task = loop.create_task(_lead(key, lookup), context=contextvars.Context())
+        _inflight[key] = task
+        _sync.singleflight_counters["leaders"] += 1
+    else:
+        _sync.singleflight_counters["coalesced"] += 1
+    result, failed = await asyncio.shield(task)
+    if failed:
+        _sync._note_upstream_failure(f"single-flight:{key}")
+    return result
+
+
+def singleflight_stats() -> dict:
+    """Shared leader/coalesced counters plus lookups currently in flight on either client."""
+    stats = _sync.singleflight_stats()
+    stats["in_flight"] += sum(1 for t in _inflight.values() if not t.done())
+    return stats
+
+
+async def _memo_miss(kind: str, term: str, linearization: str, release: Optional[str],
+                     lookup: Callable[[], Awaitable[Optional[Any]]]) -> Optional[Any]:
+    """Async counterpart of ``who_api_client._memo_miss`` (same negative cache, coalesced)."""
+    if _sync.is_known_miss(kind, term, linearization, release):
+        return None
+    key = _sync._miss_key(kind, term, linearization, release)
+    with _sync.upstream_trace() as failures:
+        result = await _single_flight(key, lookup)
+    if result is None and not failures:
+        _sync.record_miss(kind, term, linearization, release)
+    return result
+
+
+async def _cached_lookup(cache, key, lookup: Callable[[], Awaitable[Optional[Any]]]) -> Optional[Any]:
+    """Read-through for the shared L1 TTLCaches; a None caused by an upstream failure is not cached."""
+    if key in cache:
+        return cache[key]
+    with _sync.upstream_trace() as failures:
+        result = await lookup()
+    if result is not None or not failures:
+        cache[key] = result
+    return result
+
+
+async def get_who_api_token() -> Optional[str]:
+    """Async counterpart of ``who_api_client.get_who_api_token`` (shares its token cache)."""
+    key = hashkey()
+    if key in _sync.token_cache:
+        return _sync.token_cache[key]
+    if _sync.WHO_LOCAL_NOAUTH or not all([_sync.WHO_API_CLIENT_ID, _sync.WHO_API_CLIENT_SECRET, _sync.WHO_TOKEN_URL]):
+        token = None
+    else:
+        payload = {
+            'client_id': _sync.WHO_API_CLIENT_ID,
+            'client_secret': _sync.WHO_API_CLIENT_SECRET,
+            'grant_type': 'client_credentials',
+            'scope': 'icdapi_access'
+        }
+        if not who_breaker.allow(_sync.WHO_TOKEN_URL):
+            raise HTTPException(status_code=503, detail="Could not authenticate with WHO API.")
+        try:
+            r = await _get_client().post(
+                _sync.WHO_TOKEN_URL,
+                data=payload,
+                headers={'Content-Type': 'application/x-www-form-urlencoded'},
+            )
+        except httpx.HTTPError as e:
+            who_breaker.record_failure(_sync.WHO_TOKEN_URL, type(e).__name__)
+            print(f"Error fetching WHO API token: {e}")
+            raise HTTPException(status_code=503, detail="Could not authenticate with WHO API.")
+        except BaseException:
+            who_breaker.release(_sync.WHO_TOKEN_URL)
+            raise
+        who_breaker.record_response(_sync.WHO_TOKEN_URL, r.status_code)
+        try:
+            r.raise_for_status()
+            token = r.json().get('access_token')
+        except (httpx.HTTPError, ValueError) as e:
+            print(f"Error fetching WHO API token: {e}")
+            raise HTTPException(status_code=503, detail="Could not authenticate with WHO API.")
+    _sync.token_cache[key] = token
+    return token
+
+
+async def _headers() -> dict:
+    return _sync._auth_headers(await get_who_api_token())
+
+
+async def get_entity_details(entity_uri: str):
+    """Fetch the full details for a given ICD-11 entity URI (supports optional auth)."""
+    url = _sync._prefer_https(entity_uri)
+
+    async def lookup():
+        return await _get_json(url, await _headers())
+
+    return await _single_flight(('details', url), lookup)
+
+
+async def fetch_linearized_entity(entity_id: str, linearization: str):
+    """Fetch a linearized entity (MMS or TM2) by foundation entity id, trying each URL shape."""
+    headers = await _headers()
+    return await _memo_miss('linearized', entity_id, linearization, None, lambda: _race_variants(
+        'linearized', linearization, None,
+        _sync._linearized_urls(entity_id, linearization),
+        lambda url: _get_json(url, headers),
+    ))
+
+
+async def _search_by_release(linearization: str, term: str, release: Optional[str]) -> Optional[dict]:
+    headers = await _headers()
+    rel = release or "2025-01"
+
+    async def attempt(url: str) -> Optional[dict]:
+        data = await _get_json(url, headers)
+        ents = (data or {}).get('destinationEntities', [])
+        if not ents:
+            return None
+        norm = _sync._first_coded_entity(ents)
+        if norm:
+            return norm
+        # If none had a code, follow the first entity id to fetch details (often returns code)
+        ent_id_url = ents[0].get('id')
+        if ent_id_url:
+            d = await _get_json(ent_id_url, headers)
+            if d:
+                return _sync._coded_or_titled(d, ent_id_url)
+        return None
+
+    return await _race_variants('search', linearization, rel, _sync._release_search_urls(linearization, term, rel), attempt)
+
+
+async def mms_search_by_release(term: str, release: Optional[str] = None) -> Optional[dict]:
+    """Search MMS for a term at a specific release and return first normalized entity with code if available."""
+    return await _memo_miss('search', term, 'mms', release or "2025-01", lambda: _search_by_release('mms', term, release))
+
+
+async def tm2_search_by_release(term: str, release: Optional[str] = None) -> Optional[dict]:
+    """Search TM2 for a term at a specific release and return first normalized entity with code if available."""
+    return await _memo_miss('search', term, 'tm2', release or "2025-01", lambda: _search_by_release('tm2', term, release))
+
+
+async def search_and_fetch_entity(icd_name: str):
+    """Search for an ICD-11 entity and fetch its details (see the sync version for the fallback order)."""
+    return await _cached_lookup(_sync.entity_cache, hashkey(icd_name), lambda: _memo_miss(
+        'entity', icd_name, 'mms', None, lambda: _search_and_fetch_entity(icd_name)))
+
+
+async def _search_and_fetch_entity(icd_name: str):
+    headers = await _headers()
+    search_urls = [
+        f"{_sync.WHO_ID_BASE}/icd/entity/search?q={icd_name}",
+        f"{_sync.WHO_ICD_BASE}/icdapi/release/11/mms-sl/search?q={icd_name}",
+    ]
+    for url in search_urls:
+        data = await _get_json(url, headers)
+        if not data:
+            continue
+        entities = data.get('destinationEntities', [])
+        if not entities:
+            continue
+        entity_uri = entities[0].get('id')
+        if not entity_uri:
+            continue
+        # Try MMS linearized form first to get an MMS code if available
+        ent_id = _sync._entity_id_from_uri(entity_uri)
+        if ent_id:
+            mms_data = await fetch_linearized_entity(ent_id, 'mms')
+            if mms_data and (mms_data.get('code') or mms_data.get('title')):
+                return mms_data
+        # Fallback to foundation entity details
+        entity = await get_entity_details(entity_uri)
+        if entity and (entity.get('code') or entity.get('title')):
+            return entity
+        # As a last resort, try the MMS search endpoint that often includes codes in results
+        d2 = await _get_json(f"{_sync.WHO_ICD_BASE}/icdapi/release/11/mms-sl/search?q={icd_name}", headers)
+        ents2 = (d2 or {}).get('destinationEntities', [])
+        if ents2:
+            norm = _sync._normalize_search_entity(ents2[0])
+            if norm:
+                return norm
+        return None
+    return None
+
+
+async def search_and_fetch_tm2(term: str):
+    """Best-effort TM2 fetch: foundation search, then the TM2 linearized entity, then TM2 search."""
+    return await _cached_lookup(_sync.tm2_entity_cache, hashkey(term), lambda: _memo_miss(
+        'entity', term, 'tm2', None, lambda: _search_and_fetch_tm2(term)))
+
+
+async def _search_and_fetch_tm2(term: str):
+    headers = await _headers()
+    data = await _get_json(f"{_sync.WHO_ID_BASE}/icd/entity/search?q={term}", headers)
+    if data is None:
+        return None
+    entities = data.get('destinationEntities', [])
+    if not entities:
+        # Fallback: TM2 linearization search endpoints
+        for url in _sync._tm2_search_urls(term):
+            d2 = await _get_json(url, headers)
+            ents2 = (d2 or {}).get('destinationEntities', [])
+            if not ents2:
+                continue
+            ent_id2 = _sync._entity_id_from_uri(ents2[0].get('id') or '')
+            if not ent_id2:
+                continue
+            tm2_data2 = await fetch_linearized_entity(ent_id2, 'tm2')
+            if tm2_data2 and (tm2_data2.get('code') or tm2_data2.get('title')):
+                return tm2_data2
+        return None
+    ent_id = _sync._entity_id_from_uri(entities[0].get('id') or '')
+    if not ent_id:
+        return None
+    tm2_data = await fetch_linearized_entity(ent_id, 'tm2')
+    if tm2_data and (tm2_data.get('code') or tm2_data.get('title')):
+        return tm2_data
+    # If linearized fetch didn't work, try tm2 search endpoints for a code
+    for url in _sync._tm2_search_urls(term):
+        d2 = await _get_json(url, headers)
+        ents2 = (d2 or {}).get('destinationEntities', [])
+        if ents2:
+            norm = _sync._normalize_search_entity(ents2[0])
+            if norm:
+                return norm
+    return None
+
+
+async def search_tm2_by_terms(terms: list[str]):
+    """Try TM2 search for a list of alternative terms; return first matching entity-like dict."""
+    for t in terms:
+        res = await search_and_fetch_tm2(t)
+        if res:
+            return res
+    return None
+
+
+async def fetch_linearized_entity_by_release(entity_id: str, linearization: str, release: Optional[str] = None):
+    """Fetch a linearized entity (MMS/TM2) for a specific release by foundation entity id."""
+    headers = await _headers()
+    rel = release or "2025-01"
+    return await _memo_miss('linearized', entity_id, linearization, rel, lambda: _race_variants(
+        'linearized_release', linearization, rel,
+        _sync._linearized_release_urls(entity_id, linearization, rel),
+        lambda url: _get_json(url, headers),
+    ))
+
+
+async def search_foundation_uri(term: str) -> Optional[str]:
+    """Return the first foundation entity URI for a search term (id base, optional auth)."""
+    async def lookup():
+        data = await _get_json(f"{_sync.WHO_ID_BASE}/icd/entity/search?q={term}", await _headers())
+        entities = (data or {}).get('destinationEntities', [])
+        return entities[0].get('id') if entities else None
+
+    return await _cached_lookup(_sync.foundation_search_cache, hashkey(term), lambda: _memo_miss(
+        'search', term, 'foundation', None, lookup))
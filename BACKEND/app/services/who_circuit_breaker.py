@@ -0,0 +1,156 @@
+"""Per-host circuit breaker for WHO ICD-API calls.
+
+Both WHO clients (sync ``who_api_client`` and async ``who_async_client``) ask
+the breaker before each network call and report its outcome. After
+``WHO_BREAKER_FAILURE_THRESHOLD`` consecutive failures (transport error,
+timeout, 5xx or 429) a host's circuit opens: calls to it are short-circuited
+for ``WHO_BREAKER_OPEN_SECONDS`` instead of each waiting out a timeout. The
+circuit then goes half-open and admits ``WHO_BREAKER_HALF_OPEN_PROBES``
+probe calls; a success closes it again, a failure re-opens it.
+
+State is per process and keyed by URL host (icd.who.int, id.who.int, the
+token endpoint), so an outage of one host does not block the others.
+"""
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+from urllib.parse import urlsplit
+
+WHO_BREAKER_FAILURE_THRESHOLD = int(os.getenv("WHO_BREAKER_FAILURE_THRESHOLD", "5"))
+WHO_BREAKER_OPEN_SECONDS = float(os.getenv("WHO_BREAKER_OPEN_SECONDS", "30"))
+WHO_BREAKER_HALF_OPEN_PROBES = int(os.getenv("WHO_BREAKER_HALF_OPEN_PROBES", "1"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class _HostCircuit:
+    __slots__ = ("state", "failures", "open_until", "probes", "opened", "short_circuited", "last_error")
+
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0  # consecutive
+        self.open_until = 0.0
+        self.probes = 0  # half-open calls in flight
+        self.opened = 0
+        self.short_circuited = 0
+        self.last_error: Optional[str] = None
+
+
+def host_of(url: str) -> str:
+    return urlsplit(url).netloc.lower()
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = WHO_BREAKER_FAILURE_THRESHOLD,
+                 open_seconds: float = WHO_BREAKER_OPEN_SECONDS,
+                 half_open_probes: int = WHO_BREAKER_HALF_OPEN_PROBES,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = max(1, failure_threshold)
+        self.open_seconds = open_seconds
+        self.half_open_probes = max(1, half_open_probes)
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, _HostCircuit] = {}
+
+    def _circuit(self, url: str) -> _HostCircuit:
+        host = host_of(url)
+        circuit = self._hosts.get(host)
+        if circuit is None:
+            circuit = self._hosts.setdefault(host, _HostCircuit())
+        return circuit
+
+    def _advance(self, circuit: _HostCircuit):
+        if circuit.state == OPEN and self.clock() >= circuit.open_until:
+            circuit.state, circuit.probes = HALF_OPEN, 0
+
+    def allow(self, url: str) -> bool:
+        """Admit a call to ``url``'s host; every admitted call must end in record_* or release."""
+        with self._lock:
+            circuit = self._circuit(url)
+            self._advance(circuit)
+            if circuit.state == CLOSED:
+                return True
+            if circuit.state == HALF_OPEN and circuit.probes < self.half_open_probes:
+                circuit.probes += 1
+                return True
+            circuit.short_circuited += 1
+            return False
+
+    def record_success(self, url: str):
+        with self._lock:
+            circuit = self._circuit(url)
+            if circuit.state != CLOSED:
+                print(f"[WHO-BREAKER] {host_of(url)} recovered; circuit closed")
+            circuit.state, circuit.failures, circuit.probes = CLOSED, 0, 0
+
+    def record_failure(self, url: str, reason: str = "error"):
+        with self._lock:
+            circuit = self._circuit(url)
+            circuit.failures += 1
+            circuit.last_error = reason
+            if circuit.state == HALF_OPEN or (circuit.state == CLOSED and circuit.failures >= self.failure_threshold):
+                circuit.state, circuit.probes = OPEN, 0
+                circuit.open_until = self.clock() + self.open_seconds
+                circuit.opened += 1
+                print(f"[WHO-BREAKER] {host_of(url)} circuit open for {self.open_seconds:.0f}s "
+                      f"after {circuit.failures} failure(s): {reason}")
+
+    def record_response(self, url: str, status_code: int):
+        """5xx and 429 count as failures; any other status means the host is answering."""
+        if status_code >= 500 or status_code == 429:
+            self.record_failure(url, f"HTTP {status_code}")
+        else:
+            self.record_success(url)
+
+    def release(self, url: str):
+        """An admitted call ended without an outcome (e.g. a cancelled race loser)."""
+        with self._lock:
+            circuit = self._circuit(url)
+            if circuit.state == HALF_OPEN and circuit.probes:
+                circuit.probes -= 1
+
+    def state(self, url: str) -> str:
+        with self._lock:
+            circuit = self._circuit(url)
+            self._advance(circuit)
+            return circuit.state
+
+    def is_open(self, url: str) -> bool:
+        """True while calls to ``url``'s host would be short-circuited (does not take a probe slot)."""
+        with self._lock:
+            circuit = self._hosts.get(host_of(url))
+            if circuit is None:
+                return False
+            self._advance(circuit)
+            return circuit.state == OPEN or (circuit.state == HALF_OPEN and circuit.probes >= self.half_open_probes)
+
+    def reset(self):
+        with self._lock:
+            self._hosts.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            now = self.clock()
+            hosts = {}
+            for host, circuit in self._hosts.items():
+                self._advance(circuit)
+                hosts[host] = {
+                    "state": circuit.state,
+                    "consecutive_failures": circuit.failures,
+                    "retry_in_seconds": round(max(0.0, circuit.open_until - now), 1) if circuit.state == OPEN else 0.0,
+                    "times_opened": circuit.opened,
+                    "short_circuited": circuit.short_circuited,
+                    "last_error": circuit.last_error,
+                }
+        return {
+            "failure_threshold": self.failure_threshold,
+            "open_seconds": self.open_seconds,
+            "half_open_probes": self.half_open_probes,
+            "hosts": hosts,
+        }
+
+
+who_breaker = CircuitBreaker()
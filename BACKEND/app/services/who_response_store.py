@@ -0,0 +1,276 @@
+"""Persistent WHO ICD-API response cache shared by all workers on a node.
+
+Backs both WHO clients: every GET goes through ``lookup`` / ``store`` so a
+restarted process (or a sibling uvicorn worker) answers translate requests
+from warm data instead of re-querying icd.who.int.
+
+- SQLite file (WAL mode) so several processes can read/write concurrently.
+- Keyed by normalized URL + ICD release + Accept-Language.
+- Entries younger than ``WHO_CACHE_FRESH_SECONDS`` are served without a
+  network call; older ones are revalidated with If-None-Match /
+  If-Modified-Since when WHO provided an ETag / Last-Modified. If WHO cannot
+  be reached or answers 5xx / 429, the stale body is served instead.
+- Size bounded: least recently used rows are evicted once the entry count or
+  the total body size exceeds the configured limits. Reads do not write:
+  access times are buffered in memory and flushed in one batch.
+
+The async client calls into the store via ``asyncio.to_thread`` so SQLite I/O
+never runs on the event loop.
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+WHO_CACHE_ENABLED = os.getenv("WHO_CACHE_ENABLED", "1").lower() in ("1", "true", "yes")
+WHO_CACHE_PATH = os.getenv("WHO_CACHE_PATH", os.path.join("data", "who_response_cache.sqlite3"))
+WHO_CACHE_FRESH_SECONDS = int(os.getenv("WHO_CACHE_FRESH_SECONDS", str(86400)))
+WHO_CACHE_MAX_ENTRIES = int(os.getenv("WHO_CACHE_MAX_ENTRIES", "20000"))
+WHO_CACHE_MAX_BYTES = int(os.getenv("WHO_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Buffered accessed_at updates are flushed after this many reads or seconds
+WHO_CACHE_TOUCH_BATCH = int(os.getenv("WHO_CACHE_TOUCH_BATCH", "100"))
+WHO_CACHE_TOUCH_FLUSH_SECONDS = float(os.getenv("WHO_CACHE_TOUCH_FLUSH_SECONDS", "30"))
+
+_RELEASE_RE = re.compile(r"/release/11/(\d{4}-\d{2})/|[?&]releaseId=(\d{4}-\d{2})")
+
+
+def normalize_url(url: str) -> str:
+    """Canonical cache key for a WHO URL (https for who.int, lower-case host, sorted query, no trailing slash)."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    if scheme == "http" and netloc.endswith("who.int"):
+        scheme = "https"
+    path = parts.path.rstrip("/") or "/"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+
+def release_of(url: str) -> str:
+    m = _RELEASE_RE.search(url)
+    if not m:
+        return ""
+    return m.group(1) or m.group(2) or ""
+
+
+@dataclass
+class CachedResponse:
+    body: dict
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: float
+    fresh_seconds: int
+
+    @property
+    def fresh(self) -> bool:
+        return time.time() - self.fetched_at < self.fresh_seconds
+
+    def conditional_headers(self) -> dict:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class WhoResponseStore:
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS who_responses (
+            url_key TEXT NOT NULL,
+            release TEXT NOT NULL,
+            language TEXT NOT NULL,
+            body TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            etag TEXT,
+            last_modified TEXT,
+            fetched_at REAL NOT NULL,
+            accessed_at REAL NOT NULL,
+            PRIMARY KEY (url_key, release, language)
+        );
+        CREATE INDEX IF NOT EXISTS ix_who_responses_accessed ON who_responses (accessed_at);
+    """
+
+    def __init__(self, path: str, fresh_seconds: int = WHO_CACHE_FRESH_SECONDS,
+                 max_entries: int = WHO_CACHE_MAX_ENTRIES, max_bytes: int = WHO_CACHE_MAX_BYTES):
+        self.path = path
+        self.fresh_seconds = fresh_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._writes_since_evict = 0
+        self._touched: dict[tuple, float] = {}
+        self._last_touch_flush = time.time()
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale_served = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(self._SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _key(self, url: str, language: Optional[str]) -> tuple[str, str, str]:
+        return normalize_url(url), release_of(url), (language or "en").lower()
+
+    def lookup(self, url: str, language: Optional[str] = "en") -> Optional[CachedResponse]:
+        key = self._key(url, language)
+        try:
+            with self._lock:
+                conn = self._connect()
+                row = conn.execute(
+                    "SELECT body, etag, last_modified, fetched_at FROM who_responses "
+                    "WHERE url_key = ? AND release = ? AND language = ?", key
+                ).fetchone()
+                if row:
+                    self._touch(conn, key)
+        except sqlite3.Error:
+            return None
+        if not row:
+            self.misses += 1
+            return None
+        entry = CachedResponse(json.loads(row[0]), row[1], row[2], row[3], self.fresh_seconds)
+        if entry.fresh:
+            self.hits += 1
+        return entry
+
+    def store(self, url: str, language: Optional[str], body: dict,
+              etag: Optional[str] = None, last_modified: Optional[str] = None):
+        key = self._key(url, language)
+        payload = json.dumps(body, ensure_ascii=False, separators=(",", ":"))
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT OR REPLACE INTO who_responses "
+                    "(url_key, release, language, body, size, etag, last_modified, fetched_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (*key, payload, len(payload), etag, last_modified, now, now),
+                )
+                self._writes_since_evict += 1
+                if self._writes_since_evict >= 50:
+                    self._writes_since_evict = 0
+                    self._evict(conn)
+        except sqlite3.Error:
+            pass
+
+    def _touch(self, conn: sqlite3.Connection, key: tuple):
+        """Buffer an access time; written in one batch instead of a write per read."""
+        now = time.time()
+        self._touched[key] = now
+        if len(self._touched) >= WHO_CACHE_TOUCH_BATCH or now - self._last_touch_flush >= WHO_CACHE_TOUCH_FLUSH_SECONDS:
+            self._flush_touches(conn)
+
+    def _flush_touches(self, conn: sqlite3.Connection):
+        touched, self._touched = self._touched, {}
+        self._last_touch_flush = time.time()
+        if not touched:
+            return
+        conn.execute("BEGIN")
+        try:
+            conn.executemany(
+                "UPDATE who_responses SET accessed_at = ? WHERE url_key = ? AND release = ? AND language = ?",
+                [(ts, *key) for key, ts in touched.items()],
+            )
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+
+    def flush(self):
+        try:
+            with self._lock:
+                self._flush_touches(self._connect())
+        except sqlite3.Error:
+            pass
+
+    def mark_revalidated(self, url: str, language: Optional[str]):
+        """A 304 confirmed the stored body; restart its freshness window."""
+        key = self._key(url, language)
+        now = time.time()
+        self.revalidated += 1
+        try:
+            with self._lock:
+                self._connect().execute(
+                    "UPDATE who_responses SET fetched_at = ?, accessed_at = ? "
+                    "WHERE url_key = ? AND release = ? AND language = ?",
+                    (now, now, *key),
+                )
+        except sqlite3.Error:
+            pass
+
+    def note_stale(self, url: str, reason: str):
+        """Revalidation failed and the stored body is served past its freshness window."""
+        self.stale_served += 1
+        print(f"[WHO-CACHE] Serving stale response for {url} ({reason})", flush=True)
+
+    def _evict(self, conn: sqlite3.Connection):
+        self._flush_touches(conn)
+        count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM who_responses").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        # Walk from least recently accessed until both budgets are met
+        drop = 0
+        for (size,) in conn.execute("SELECT size FROM who_responses ORDER BY accessed_at ASC"):
+            if count - drop <= self.max_entries and total <= self.max_bytes:
+                break
+            drop += 1
+            total -= size
+        if drop:
+            conn.execute(
+                "DELETE FROM who_responses WHERE rowid IN "
+                "(SELECT rowid FROM who_responses ORDER BY accessed_at ASC LIMIT ?)", (drop,)
+            )
+            self.evictions += drop
+
+    def evict(self):
+        try:
+            with self._lock:
+                self._evict(self._connect())
+        except sqlite3.Error:
+            pass
+
+    def clear(self):
+        try:
+            with self._lock:
+                self._connect().execute("DELETE FROM who_responses")
+        except sqlite3.Error:
+            pass
+
+    def stats(self) -> dict:
+        try:
+            with self._lock:
+                count, total = self._connect().execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM who_responses"
+                ).fetchone()
+        except sqlite3.Error:
+            count, total = 0, 0
+        return {
+            "path": self.path,
+            "entries": count,
+            "bytes": total,
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "stale_served": self.stale_served,
+        }
+
+
+response_store: Optional[WhoResponseStore] = WhoResponseStore(WHO_CACHE_PATH) if WHO_CACHE_ENABLED else None
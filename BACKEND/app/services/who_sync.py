@@ -10,6 +10,9 @@ from app.db.session import SessionLocal
 from app.db import models
 from app.core.config import settings
 from app.services import who_api_client
+from app.services.translation_table import build_translation_table
+from app.services.release_registry import release_registry
+from app.services.release_snapshot import release_snapshots
 
 _running_flag = False
 _last_status = {
@@ -40,7 +43,10 @@ def _rebuild_release(db: Session, version: str):
             equivalence='equivalent',
             is_primary=m.is_primary
         ))
+    build_translation_table(db, rel)
     db.commit()
+    release_snapshots.write(db, rel)
+    release_registry.reload(db)
     return rel.version
 
 
@@ -1,5 +1,80 @@
 import sys, os
+
+import pytest
 # Ensure project root (BACKEND) parent is on path so 'app' package can be imported when running from BACKEND directory
 root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../'))
 if root not in sys.path:
     sys.path.insert(0, root)
+
+
+@pytest.fixture
+def env(tmp_path, monkeypatch):
+    """Isolated database + mirror so seeded rows never leak into the shared test DB.
+
+    Seeds one ICD with three NAMASTE terms and release ``tt-1`` (translation table
+    built), and swaps fresh cache/registry/snapshot/graph singletons into the
+    endpoint modules. Yields ``(engine, db)``. App modules are imported here so
+    each test file can set DATABASE_URL/SECRET_KEY before the app is loaded.
+    """
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from app.main import app
+    from app.api.endpoints import admin, conceptmap, fhir, lookup, translate
+    from app.db.models import Base, ConceptMapRelease, ICD11Code, Mapping, TraditionalTerm
+    from app.db.session import get_db
+    from app.services import translation_table
+    from app.services.cache_service import TranslationCache
+    from app.services.icd_mirror import ICDMirror, upsert_entities
+    from app.services.release_registry import ReleaseRegistry
+    from app.services.release_snapshot import ReleaseSnapshots
+    from app.services.terminology_graph import TerminologyGraphStore
+    from app.services.translation_table import build_translation_table
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'translate.db'}", connect_args={'check_same_thread': False})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    upsert_entities(db, 'mms', '2025-01', [
+        {'entity_id': '1', 'code': 'ME01', 'title': 'Abdominal distension', 'definition': 'Swelling of the abdomen.',
+         'uri': 'http://id.who.int/icd/release/11/2025-01/mms/1'},
+    ])
+    upsert_entities(db, 'tm2', '2025-01', [{'entity_id': '2', 'code': 'SM31', 'title': 'Abdominal distension'}])
+    mirror = ICDMirror()
+    mirror.load(db)
+    monkeypatch.setattr(translation_table, 'icd_mirror', mirror)
+    monkeypatch.setattr(translate, 'icd_mirror', mirror)
+
+    icd = ICD11Code(icd_name='Abdominal distension', status='Mapped')
+    db.add(icd); db.flush()
+    for system, code, term, primary in [('ayurveda', 'AY-1', 'Adhmana', True), ('ayurveda', 'AY-2', 'Anaha', False),
+                                        ('siddha', 'SD-1', 'Vayu', True)]:
+        t = TraditionalTerm(system=system, code=code, term=term)
+        db.add(t); db.flush()
+        db.add(Mapping(icd11_code_id=icd.id, traditional_term_id=t.id, status='verified', is_primary=primary))
+    rel = ConceptMapRelease(version='tt-1')
+    db.add(rel); db.flush()
+    build_translation_table(db, rel)
+    db.commit()
+
+    def override_get_db():
+        s = Session()
+        try:
+            yield s
+        finally:
+            s.close()
+    monkeypatch.setitem(app.dependency_overrides, get_db, override_get_db)
+    cache = TranslationCache()
+    for module in (translate, conceptmap, admin):
+        monkeypatch.setattr(module, 'translation_cache', cache)
+    registry = ReleaseRegistry(session_factory=Session)
+    for module in (translate, lookup, fhir, conceptmap):
+        monkeypatch.setattr(module, 'release_registry', registry)
+    snapshots = ReleaseSnapshots(directory=str(tmp_path / 'snapshots'))
+    for module in (translate, conceptmap):
+        monkeypatch.setattr(module, 'release_snapshots', snapshots)
+    graph = TerminologyGraphStore(session_factory=Session, registry=registry, snapshots=snapshots, check_seconds=3600)
+    for module in (translate, lookup, fhir, conceptmap, admin):
+        monkeypatch.setattr(module, 'terminology_graph', graph)
+    yield engine, db
+    db.close()
@@ -0,0 +1,60 @@
+import asyncio, json, os
+os.environ.setdefault('DATABASE_URL', 'sqlite:///./test_unified.db')
+os.environ.setdefault('SECRET_KEY', 'a_very_secret_key_for_development_change_me')
+
+import pytest
+from fastapi import Request, Response
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+
+from app.main import app
+from app.api.endpoints import conceptmap
+from app.db.models import ConceptMapElement, ConceptMapRelease
+
+
+def test_conceptmap_export_streams_json_and_ndjson(env, monkeypatch):
+    _, db = env
+    rel = db.query(ConceptMapRelease).filter_by(version='tt-1').one()
+    for system, term in [('siddha', 'Vayu'), ('ayurveda', 'Adhmana'), ('ayurveda', 'Anaha')]:
+        db.add(ConceptMapElement(release_id=rel.id, icd_name='Abdominal distension', icd_code='ME01', system=system,
+                                 term=term, equivalence='equivalent'))
+    db.commit()
+    monkeypatch.setattr(conceptmap, 'CONCEPTMAP_EXPORT_BATCH_SIZE', 1)
+    monkeypatch.setattr(conceptmap, 'CONCEPTMAP_EXPORT_CHUNK_BYTES', 1)  # one chunk per element
+    client = TestClient(app)
+    path = '/api/admin/conceptmap/releases/tt-1/fhir'
+
+    full = client.get(path).json()
+    assert [g['source'].rsplit('/', 1)[1] for g in full['group']] == ['siddha', 'ayurveda']
+    streamed = client.get(path, params={'stream': 'true'})
+    assert streamed.status_code == 200 and streamed.headers['etag']
+    body = streamed.json()
+    assert body['group'] == sorted(full['group'], key=lambda g: g['source'])
+    assert {k: v for k, v in body.items() if k != 'group'} == {k: v for k, v in full.items() if k != 'group'}
+
+    summary = client.get(path, params={'summary': 'true'}).json()
+    assert [g['extension'][0]['valueInteger'] for g in summary['group']] == [1, 2]
+    assert 'element' not in summary['group'][0] and summary['extension'][0]['valueInteger'] == 3
+
+    nd = client.get(path, params={'format': 'ndjson'})
+    assert nd.headers['content-type'] == 'application/fhir+ndjson'
+    header, *lines = [json.loads(line) for line in nd.text.splitlines()]
+    assert header['resourceType'] == 'ConceptMap' and 'group' not in header
+    assert [(line['source'].rsplit('/', 1)[1], line['element']['code']) for line in lines] == [
+        ('ayurveda', 'Adhmana'), ('ayurveda', 'Anaha'), ('siddha', 'Vayu')]
+    assert client.get(path, params={'format': 'xml'}).status_code == 422
+
+
+def test_conceptmap_stream_outlives_the_request_session(env):
+    engine, other = env
+    request = Request({'type': 'http', 'method': 'GET', 'path': '/api/admin/conceptmap/releases/tt-1/fhir',
+                       'headers': [], 'query_string': b'format=ndjson'})
+    db = sessionmaker(bind=engine)()
+    resp = conceptmap.export_fhir_conceptmap('tt-1', request, Response(), export_format='ndjson', db=db)
+    db.close()  # the request-scoped session is gone before the body is sent
+    db.execute = lambda *args, **kwargs: pytest.fail('stream used the request session')
+
+    async def body():
+        return b''.join([chunk async for chunk in resp.body_iterator])
+    header, *lines = [json.loads(line) for line in asyncio.run(body()).splitlines()]
+    assert header['version'] == 'tt-1' and len(lines) == other.query(ConceptMapElement).count()
@@ -0,0 +1,81 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.models import Base, ICD11Code
+from app.services import enrichment_queue as enrichment_module
+from app.services.enrichment_queue import EnrichmentQueue
+
+
+def make_queue(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'enrich.db'}")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    return EnrichmentQueue(session_factory=Session), Session
+
+
+def test_updates_are_coalesced_and_applied_in_one_flush(tmp_path):
+    queue, Session = make_queue(tmp_path)
+    with Session() as db:
+        db.add_all([ICD11Code(icd_name='Fever', status='Mapped'), ICD11Code(icd_name='Cough', status='Mapped',
+                                                                          description='Same')])
+        db.commit()
+        fever, cough = [i.id for i in db.query(ICD11Code).order_by(ICD11Code.id)]
+
+    queue.push(fever, code='MG26')
+    queue.push(fever, definition='Raised body temperature.')
+    queue.push(cough, definition='Same')
+    queue.push(cough)  # nothing to write
+    assert queue.stats()['pending'] == 2 and queue.stats()['coalesced'] == 1
+
+    assert queue.flush() == 1  # Cough already had the definition
+    with Session() as db:
+        row = db.get(ICD11Code, fever)
+        assert (row.icd_code, row.description) == ('MG26', 'Raised body temperature.')
+    assert queue.stats()['pending'] == 0
+
+
+def test_missing_rows_are_retried_then_dropped(tmp_path):
+    queue, _ = make_queue(tmp_path)
+    queue.push(999, code='X1')
+    for _ in range(3):
+        queue.flush()
+    assert queue.stats()['pending'] == 0 and queue.stats()['skipped'] == 3
+
+
+def test_failed_commit_requeues_the_whole_batch(tmp_path):
+    queue, Session = make_queue(tmp_path)
+    with Session() as db:
+        db.add(ICD11Code(icd_name='Fever', status='Mapped'))
+        db.commit()
+        fever = db.query(ICD11Code.id).scalar()
+
+    def failing_session():
+        db = Session()
+        db.commit = lambda: (_ for _ in ()).throw(RuntimeError('database is locked'))
+        return db
+
+    queue.session_factory = failing_session
+    queue.push(fever, code='MG26')
+    assert queue.flush() == 0
+    assert queue.stats()['pending'] == 1 and queue.stats()['failed'] == 1
+    queue.session_factory = Session
+    assert queue.flush() == 1
+
+
+def test_graph_invalidation_is_coalesced_across_flushes(tmp_path, monkeypatch):
+    queue, Session = make_queue(tmp_path)
+    marks = []
+    monkeypatch.setattr(enrichment_module.terminology_graph, 'mark_stale', lambda: marks.append(1))
+    with Session() as db:
+        db.add_all([ICD11Code(icd_name=f'ICD {i}', status='Mapped') for i in range(3)])
+        db.commit()
+        ids = [i for (i,) in db.query(ICD11Code.id).order_by(ICD11Code.id)]
+
+    for i, icd_id in enumerate(ids):
+        queue.push(icd_id, code=f'C{i}')
+        assert queue.flush() == 1
+    assert len(marks) == 1
+    queue.flush()
+    assert len(marks) == 1
+    queue.flush(force=True)
+    assert len(marks) == 2
@@ -0,0 +1,73 @@
+import os
+os.environ.setdefault('DATABASE_URL', 'sqlite:///./test_unified.db')
+os.environ.setdefault('SECRET_KEY', 'a_very_secret_key_for_development_change_me')
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.main import app
+from app.api.endpoints import translate
+from app.db.models import ICD11Code, Mapping, TraditionalTerm
+
+HEADERS = {'Authorization': 'Bearer ABHA_tester'}
+
+
+def test_release_scoped_reads_answer_if_none_match_with_304_before_any_work(env, monkeypatch):
+    engine, db = env
+    translate.terminology_graph.refresh()
+    client = TestClient(app)
+    fwd_params = {'system': 'ayurveda', 'code': 'AY-1'}
+    reads = [
+        ('/api/public/translate', fwd_params, 'private'),
+        ('/api/public/translate/reverse', {'icd_name': 'Abdominal distension'}, 'private'),
+        ('/api/fhir/CodeSystem/$lookup', {'system': 'ayurveda', 'code': 'AY-2'}, 'private'),
+        ('/api/admin/conceptmap/releases/tt-1/elements', {}, 'public'),
+        ('/api/admin/conceptmap/releases/tt-1/fhir', {'summary': 'true'}, 'public'),
+    ]
+    etags = {}
+    for path, params, scope in reads:
+        r = client.get(path, params=params, headers=HEADERS)
+        assert r.status_code == 200, r.text
+        assert r.headers['etag'].startswith('"') and r.headers['cache-control'].startswith(scope)
+        etags[path] = r.headers['etag']
+    assert len(set(etags.values())) == len(reads)
+    other = client.get('/api/public/translate', params={'system': 'siddha', 'code': 'SD-1'}, headers=HEADERS)
+    assert other.headers['etag'] != etags['/api/public/translate']
+
+    async def no_enrich(*args):
+        raise AssertionError('enrichment must not run for a 304')
+
+    monkeypatch.setattr(translate, '_enrich', no_enrich)
+    statements = []
+
+    def capture(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        for path, params, _ in reads:
+            r = client.get(path, params=params, headers={**HEADERS, 'If-None-Match': f'W/{etags[path]}, "other"'})
+            assert r.status_code == 304 and r.headers['etag'] == etags[path] and not r.content
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+    assert statements == []
+
+    # Refreshing the release under the same version changes its revision, so old tags stop matching
+    icd = ICD11Code(icd_name='Fever', status='Mapped')
+    db.add(icd); db.flush()
+    term = TraditionalTerm(system='unani', code='UN-1', term='Humma')
+    db.add(term); db.flush()
+    db.add(Mapping(icd11_code_id=icd.id, traditional_term_id=term.id, status='verified', is_primary=True))
+    db.commit()
+    client.post('/api/admin/conceptmap/releases/tt-1/refresh', headers=HEADERS)
+    elements_path = '/api/admin/conceptmap/releases/tt-1/elements'
+    r = client.get(elements_path, headers={'If-None-Match': etags[elements_path]})
+    assert r.status_code == 200 and r.json()['count'] == 4
+    # An in-place term edit moves the terminology revision
+    db.query(TraditionalTerm).filter_by(code='AY-2').update({'source_short_definition': 'Flatulence'})
+    db.commit()
+    translate.terminology_graph.mark_stale()
+    translate.terminology_graph.refresh()
+    r = client.get('/api/fhir/CodeSystem/$lookup', params={'system': 'ayurveda', 'code': 'AY-2'},
+                   headers={**HEADERS, 'If-None-Match': etags['/api/fhir/CodeSystem/$lookup']})
+    assert r.status_code == 200 and r.headers['etag'] != etags['/api/fhir/CodeSystem/$lookup']
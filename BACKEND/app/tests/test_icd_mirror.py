@@ -0,0 +1,90 @@
+import os
+import time
+os.environ.setdefault('DATABASE_URL', 'sqlite:///./test_unified.db')
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.models import Base
+from app.services.icd_mirror import ICDMirror, upsert_entities
+
+
+def make_session(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'mirror.db'}")
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)()
+
+
+def test_lookup_by_title_and_code(tmp_path):
+    db = make_session(tmp_path)
+    upsert_entities(db, 'mms', '2025-01', [
+        {'entity_id': '1435254666', 'code': '8A8Z', 'title': 'Headache disorders, unspecified', 'definition': 'Pain in the head.'},
+        {'entity_id': '588616678', 'code': 'ME05.0', 'title': '- Abdominal distension', 'parent_id': '1435254666'},
+    ])
+    mirror = ICDMirror()
+    mirror.load(db)
+
+    hit = mirror.lookup_title('  abdominal   DISTENSION ', 'mms')
+    assert hit['code'] == 'ME05.0'
+    assert hit['title'] == {'@value': 'Abdominal distension'}
+    assert hit['parent'] == ['http://id.who.int/icd/release/11/2025-01/mms/1435254666']
+    assert mirror.lookup_code('8a8z', 'mms', '2025-01')['definition'] == {'@value': 'Pain in the head.'}
+    assert mirror.lookup_title('Abdominal distension', 'tm2') is None
+    assert mirror.lookup_title('Abdominal distension', 'mms', '2024-01') is None
+
+
+def test_latest_release_is_default_and_upsert_is_idempotent(tmp_path):
+    db = make_session(tmp_path)
+    upsert_entities(db, 'tm2', '2024-01', [{'entity_id': '1', 'code': 'SM30', 'title': 'Vata disorder'}])
+    upsert_entities(db, 'tm2', '2025-01', [{'entity_id': '1', 'code': 'SM31', 'title': 'Vata disorder'}])
+    upsert_entities(db, 'tm2', '2025-01', [{'entity_id': '1', 'code': 'SM31', 'title': 'Vata pattern disorder'}])
+    mirror = ICDMirror()
+    mirror.load(db)
+
+    assert mirror.lookup_title('Vata pattern disorder', 'tm2')['code'] == 'SM31'
+    assert mirror.lookup_title('Vata disorder', 'tm2', '2024-01')['code'] == 'SM30'
+    assert mirror.stats()['entities'] == {'tm2:2024-01': 1, 'tm2:2025-01': 1}
+
+
+def test_lookups_are_fast(tmp_path):
+    db = make_session(tmp_path)
+    upsert_entities(db, 'mms', '2025-01', [
+        {'entity_id': str(i), 'code': f'X{i}', 'title': f'Condition {i}'} for i in range(5000)
+    ])
+    mirror = ICDMirror()
+    mirror.load(db)
+    start = time.perf_counter()
+    for i in range(1000):
+        assert mirror.lookup_title(f'condition {i}', 'mms')['code'] == f'X{i}'
+    assert (time.perf_counter() - start) / 1000 < 0.01
+
+
+def test_failed_load_backs_off_and_new_entities_are_picked_up(tmp_path, monkeypatch):
+    from app.db import session as db_session
+    calls = []
+
+    class Broken:
+        def __enter__(self):
+            calls.append(1)
+            raise RuntimeError('no such table')
+
+        def __exit__(self, *exc):
+            return False
+
+    monkeypatch.setattr(db_session, 'SessionLocal', Broken)
+    mirror = ICDMirror()
+    assert mirror.lookup_title('Vata disorder', 'tm2') is None
+    assert mirror.lookup_title('Vata disorder', 'tm2') is None
+    assert len(calls) == 1  # retry waits for the backoff instead of re-querying every lookup
+
+    db = make_session(tmp_path)
+    Session = sessionmaker(bind=db.get_bind())
+    monkeypatch.setattr(db_session, 'SessionLocal', Session)
+    mirror._next_check = 0.0
+    upsert_entities(db, 'tm2', '2025-01', [{'entity_id': '1', 'code': 'SM31', 'title': 'Vata disorder'}])
+    assert mirror.lookup_title('Vata disorder', 'tm2')['code'] == 'SM31'
+
+    upsert_entities(db, 'tm2', '2025-01', [{'entity_id': '2', 'code': 'SM32', 'title': 'Pitta disorder'}])
+    assert mirror.lookup_title('Pitta disorder', 'tm2') is None  # within the check interval
+    mirror._next_check = 0.0
+    assert mirror.lookup_title('Pitta disorder', 'tm2')['code'] == 'SM32'
@@ -0,0 +1,47 @@
+import os
+os.environ.setdefault('DATABASE_URL', 'sqlite:///./test_unified.db')
+os.environ.setdefault('SECRET_KEY', 'a_very_secret_key_for_development_change_me')
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.api.endpoints import lookup
+from app.db.models import ICD11Code, Mapping, TraditionalTerm
+from app.services.lookup_cache import LookupCache
+
+HEADERS = {'Authorization': 'Bearer ABHA_tester'}
+
+
+def test_lookup_cache_reuses_shorter_queries_and_resets_with_the_graph(env, monkeypatch):
+    _, db = env
+    cache = LookupCache()
+    monkeypatch.setattr(lookup, 'lookup_cache', cache)
+    client = TestClient(app)
+
+    def fresh(path, params):
+        cache.clear()
+        return client.get(path, params=params, headers=HEADERS).json()
+
+    expected = {(path, q): fresh(path, {key: q}) for path, key in [('/api/public/lookup', 'query'),
+                                                                   ('/api/public/lookup/suggest', 'q')]
+                for q in ('ad', 'adh', 'adhm', 'ab')}
+    cache = LookupCache()
+    monkeypatch.setattr(lookup, 'lookup_cache', cache)
+    for (path, q), body in expected.items():
+        key = 'query' if path.endswith('/lookup') else 'q'
+        assert client.get(path, params={key: q}, headers=HEADERS).json() == body, (path, q)
+    stats = cache.stats()
+    # 'adh' extends 'ad' and 'adhm' extends 'adh', per endpoint; 'ab' has no cached prefix
+    assert (stats['prefix_hits'], stats['misses'], stats['hits']) == (4, 8, 0)
+    assert client.get('/api/public/lookup', params={'query': 'ADH '}, headers=HEADERS).json() == expected[('/api/public/lookup', 'adh')]
+    assert cache.stats()['hits'] == 1
+
+    term = TraditionalTerm(system='unani', code='UN-9', term='Adhmana-e-shikam')
+    db.add(term); db.flush()
+    db.add(Mapping(icd11_code_id=db.query(ICD11Code).one().id, traditional_term_id=term.id, status='verified'))
+    db.commit()
+    lookup.terminology_graph.mark_stale()
+    lookup.terminology_graph.refresh()
+    sugg = client.get('/api/public/lookup/suggest', params={'q': 'adhm'}, headers=HEADERS).json()
+    assert 'Adhmana-e-shikam' in [s['term'] for s in sugg]
+    assert cache.stats()['invalidations'] == 1
@@ -0,0 +1,88 @@
+import os
+os.environ.setdefault('DATABASE_URL', 'sqlite:///./test_unified.db')
+
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.db.models import Base, ConceptMapRelease
+from app.services.release_registry import ReleaseRegistry
+
+
+def make_sessions(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'releases.db'}")
+    Base.metadata.create_all(bind=engine)
+    return engine, sessionmaker(bind=engine)
+
+
+def add_release(Session, version, minutes_ago):
+    with Session() as db:
+        db.add(ConceptMapRelease(version=version, created_at=datetime.now(timezone.utc) - timedelta(minutes=minutes_ago)))
+        db.commit()
+
+
+def test_latest_and_by_version_are_served_from_memory(tmp_path):
+    engine, Session = make_sessions(tmp_path)
+    add_release(Session, 'v1', 10)
+    add_release(Session, 'v2', 5)
+    registry = ReleaseRegistry(session_factory=Session, poll_seconds=60)
+    assert registry.latest_version() == 'v2'
+
+    statements = []
+    event.listen(engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+    for _ in range(100):
+        assert registry.latest().version == 'v2'
+        assert registry.get('v1').version == 'v1'
+    assert registry.get('missing') is None
+    assert [r.version for r in registry.all()] == ['v2', 'v1']
+    assert statements == []
+
+
+def test_other_workers_converge_by_polling_and_writers_reload(tmp_path):
+    _, Session = make_sessions(tmp_path)
+    add_release(Session, 'v1', 10)
+    registry = ReleaseRegistry(session_factory=Session, poll_seconds=60)
+    assert registry.latest_version() == 'v1'
+
+    add_release(Session, 'v2', 0)  # created by another worker
+    assert registry.latest_version() == 'v1'  # within the poll interval
+    registry._next_check = 0.0
+    assert registry.latest_version() == 'v2'
+
+    add_release(Session, 'v3', -1)
+    with Session() as db:
+        registry.reload(db)  # the creating worker sees it immediately
+    assert registry.latest_version() == 'v3'
+
+
+def test_background_poller_keeps_readers_off_the_database(tmp_path):
+    import threading, time
+    engine, Session = make_sessions(tmp_path)
+    add_release(Session, 'v1', 10)
+    registry = ReleaseRegistry(session_factory=Session, poll_seconds=0.05)
+    registry.start()
+    try:
+        add_release(Session, 'v2', 0)  # created by another worker
+        reader_statements = []
+        event.listen(engine, 'before_cursor_execute',
+                     lambda *args: reader_statements.append(args[2]) if threading.current_thread() is threading.main_thread() else None)
+        deadline = time.monotonic() + 5
+        while registry.latest_version() != 'v2' and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert registry.latest_version() == 'v2'
+        assert reader_statements == []
+    finally:
+        registry.stop()
+
+
+def test_refreshing_a_release_in_place_moves_its_revision(tmp_path):
+    _, Session = make_sessions(tmp_path)
+    add_release(Session, 'v1', 10)
+    registry = ReleaseRegistry(session_factory=Session, poll_seconds=60)
+    revision = registry.get('v1').revision
+    with Session() as db:
+        db.query(ConceptMapRelease).filter_by(version='v1').one().revision += 1  # as build_translation_table does
+        db.commit()
+    registry._next_check = 0.0
+    assert registry.get('v1').revision == revision + 1
@@ -0,0 +1,149 @@
+import os
+os.environ.setdefault('DATABASE_URL', 'sqlite:///./test_unified.db')
+os.environ.setdefault('SECRET_KEY', 'a_very_secret_key_for_development_change_me')
+
+import json
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.main import app
+from app.api.endpoints import translate
+from app.db.models import Base, ConceptMapRelease, ICD11Code, Mapping, TraditionalTerm, TranslationEntry
+from app.services.release_snapshot import ReleaseSnapshot, ReleaseSnapshots, encode_snapshot, icd_key, snapshot_path
+from app.services.terminology_graph import build_graph
+from app.services.translation_table import build_translation_table, lookup_code
+
+HEADERS = {'Authorization': 'Bearer ABHA_tester'}
+
+
+def test_snapshot_round_trip(tmp_path):
+    entries = {icd_key(f'Condition {i}'): json.dumps({'n': i}).encode() for i in range(5000)}
+    entries[icd_key('ज्वर')] = json.dumps({'n': 'unicode'}, ensure_ascii=False).encode()
+    path = tmp_path / 'r.snap'
+    path.write_bytes(encode_snapshot('r1', entries, 7))
+    snap = ReleaseSnapshot(str(path))
+    assert snap.version == 'r1' and len(snap) == 5001 and snap.revision == 7
+    assert snap.icd_payload('Condition 4321') == {'n': 4321}
+    assert snap.icd_payload('ज्वर') == {'n': 'unicode'}
+    assert snap.icd_payload('Condition 5000') is None
+    assert snap.code_payload('ayurveda', 'Condition 1') is None
+
+
+def test_identical_payloads_are_stored_once(tmp_path):
+    blob = b'{"icd_name": "Fever"}' * 50
+    one = encode_snapshot('r1', {icd_key('Fever'): blob})
+    many = encode_snapshot('r1', {icd_key('Fever'): blob, b'c\x1fayurveda\x1fA-1': blob, b'c\x1fsiddha\x1fS-1': blob})
+    assert len(many) - len(one) < len(blob)
+
+
+def add_alias(db):
+    icd = db.query(ICD11Code).filter_by(icd_name='Fever').one()
+    term = TraditionalTerm(system='unani', code='UN-2', term='Tap')
+    db.add(term); db.flush()
+    db.add(Mapping(icd11_code_id=icd.id, traditional_term_id=term.id, status='verified', is_primary=False))
+
+
+def make_release(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'snap.db'}")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    icd = ICD11Code(icd_name='Fever', status='Mapped')
+    db.add(icd); db.flush()
+    term = TraditionalTerm(system='unani', code='UN-1', term='Humma')
+    db.add(term); db.flush()
+    db.add(Mapping(icd11_code_id=icd.id, traditional_term_id=term.id, status='verified', is_primary=True))
+    rel = ConceptMapRelease(version='r/1')
+    db.add(rel); db.flush()
+    build_translation_table(db, rel)
+    db.commit()
+    return db, rel
+
+
+def test_written_snapshot_matches_the_translation_table_and_is_reopened_after_rewrite(tmp_path):
+    db, rel = make_release(tmp_path)
+    snapshots = ReleaseSnapshots(directory=str(tmp_path / 'snaps'), check_seconds=3600)
+    path = snapshots.write(db, rel)
+    assert path == snapshot_path('r/1', str(tmp_path / 'snaps')) and path.endswith('r_1.snap')
+    snap = snapshots.get('r/1')
+    assert snap.code_payload('unani', 'UN-1') == lookup_code(db, 'r/1', 'unani', 'UN-1')
+    assert snap.icd_payload('Fever')['systems']['unani']['primary']['name'] == 'Humma'
+    assert snapshots.get('r/1') is snap
+
+    add_alias(db)
+    build_translation_table(db, rel)  # refresh
+    db.commit()
+    snapshots.write(db, rel)
+    assert snapshots.get('r/1') is not snap
+    assert snapshots.get('missing') is None
+
+
+def test_graph_maps_a_matching_snapshot_instead_of_loading_payloads(tmp_path):
+    db, rel = make_release(tmp_path)
+    snapshots = ReleaseSnapshots(directory=str(tmp_path / 'snaps'))
+    snapshots.write(db, rel)
+    graph = build_graph(db, rel, snapshots)
+    assert graph.snapshot is not None and not graph._payload_by_icd
+    assert graph.icd_payload('Fever')['icd_name'] == 'Fever'
+
+    # Rows rebuilt by another worker whose snapshot has not landed yet: the stale file is ignored
+    add_alias(db)
+    build_translation_table(db, rel)
+    db.commit()
+    graph = build_graph(db, rel, snapshots)
+    assert graph.snapshot is None
+    assert [a['name'] for a in graph.code_payload('unani', 'UN-1')['systems']['unani']['aliases']] == ['Tap']
+
+
+def test_identical_rebuild_reusing_row_ids_still_moves_the_revision(tmp_path):
+    db, rel = make_release(tmp_path)
+    snapshots = ReleaseSnapshots(directory=str(tmp_path / 'snaps'))
+    snapshots.write(db, rel)
+    before = rel.revision
+    build_translation_table(db, rel)  # same rows; SQLite hands out the deleted row ids again
+    db.commit()
+    assert rel.revision == before + 1
+    assert snapshots.get('r/1', recheck=True).revision == before
+    assert build_graph(db, rel, snapshots).snapshot is None
+
+
+def test_refresh_writes_a_snapshot_that_serves_translate_before_the_graph_is_built(env, monkeypatch):
+    engine, _ = env
+    client = TestClient(app)
+    client.post('/api/admin/conceptmap/releases/tt-1/refresh', headers=HEADERS)
+    snap = translate.release_snapshots.get('tt-1')
+    assert snap is not None and snap.code_payload('ayurveda', 'AY-1')['icd_name'] == 'Abdominal distension'
+    monkeypatch.setattr(translate.terminology_graph, 'current', lambda: None)  # still compiling
+    statements = []
+
+    def capture(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        r = client.get('/api/public/translate/reverse', params={'icd_name': 'Abdominal distension'}, headers=HEADERS)
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+    assert r.json()['siddha']['primary']['code'] == 'SD-1'
+    assert statements == []
+
+
+def test_translate_ignores_a_snapshot_that_lags_behind_the_release(env, monkeypatch):
+    _, db = env
+    client = TestClient(app)
+    client.post('/api/admin/conceptmap/releases/tt-1/refresh', headers=HEADERS)
+    assert translate._release_snapshot('tt-1') is not None
+    # Another worker rebuilt the rows; its snapshot has not been written yet
+    row = db.query(TranslationEntry).filter_by(system=None, icd_name='Abdominal distension').one()
+    payload = json.loads(row.payload)
+    payload['systems']['siddha']['primary']['code'] = 'SD-1b'
+    row.payload = json.dumps(payload)
+    db.query(ConceptMapRelease).filter_by(version='tt-1').one().revision += 1  # as build_translation_table does
+    db.commit()
+    translate.release_registry.reload(db)
+    monkeypatch.setattr(translate.terminology_graph, 'current', lambda: None)  # still compiling
+    assert translate._release_snapshot('tt-1') is None
+    r = client.get('/api/public/translate/reverse', params={'icd_name': 'Abdominal distension'}, headers=HEADERS)
+    assert r.json()['siddha']['primary']['code'] == 'SD-1b'
@@ -0,0 +1,138 @@
+import gzip, json, os
+os.environ.setdefault('DATABASE_URL', 'sqlite:///./test_unified.db')
+os.environ.setdefault('SECRET_KEY', 'a_very_secret_key_for_development_change_me')
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.compression import CompressionMiddleware, negotiate_encoding
+from app.db.models import Base, ICD11Code, TraditionalTerm, Mapping
+from app.db.session import get_db
+from app.main import app
+from app.util.json_response import FastJSONResponse
+
+HEADERS = {'Authorization': 'Bearer ABHA_tester'}
+BIG = {'rows': [{'term': f'term-{i}', 'display': 'Abdominal distension'} for i in range(200)]}
+
+
+def make_app():
+    demo = FastAPI(default_response_class=FastJSONResponse)
+    demo.add_middleware(CompressionMiddleware, minimum_size=1024)
+
+    @demo.get('/big')
+    def big():
+        return FastJSONResponse(BIG, headers={'ETag': '"abc"'})
+
+    @demo.get('/small')
+    def small():
+        return {'ok': True}
+
+    @demo.get('/encoded')
+    def encoded():
+        return PlainTextResponse(gzip.compress(b'x' * 4096), headers={'Content-Encoding': 'gzip', 'ETag': '"enc"'})
+
+    @demo.get('/image')
+    def image():
+        return Response(b'\x89PNG' + b'\0' * 4096, media_type='image/png')
+
+    @demo.get('/partial')
+    def partial():
+        return PlainTextResponse('x' * 4096, status_code=206)
+
+    @demo.get('/stream')
+    def stream():
+        return StreamingResponse((json.dumps(row) + '\n' for row in BIG['rows']), media_type='application/x-ndjson')
+
+    return TestClient(demo)
+
+
+def test_negotiate_encoding_honours_q_values():
+    assert negotiate_encoding('gzip, deflate, br', brotli_available=True) == 'br'
+    assert negotiate_encoding('gzip, deflate, br', brotli_available=False) == 'gzip'
+    assert negotiate_encoding('br;q=0.5, gzip;q=0.8', brotli_available=True) == 'gzip'
+    assert negotiate_encoding('gzip;q=0, identity', brotli_available=True) is None
+    assert negotiate_encoding('*', brotli_available=False) == 'gzip'
+    assert negotiate_encoding('', brotli_available=True) is None
+
+
+def test_large_json_is_gzipped_with_vary_and_a_weak_etag():
+    client = make_app()
+    r = client.get('/big', headers={'Accept-Encoding': 'gzip'})
+    assert r.headers['content-encoding'] == 'gzip'
+    assert r.headers['vary'] == 'Accept-Encoding'
+    assert r.headers['etag'] == 'W/"abc"'
+    assert r.json() == BIG  # httpx decodes gzip transparently
+    assert int(r.headers['content-length']) < len(json.dumps(BIG)) // 4
+
+    r = client.get('/big', headers={'Accept-Encoding': 'identity'})
+    assert 'content-encoding' not in r.headers and r.headers['etag'] == '"abc"'
+    assert r.headers['vary'] == 'Accept-Encoding'
+
+
+def test_small_and_already_encoded_bodies_pass_through():
+    client = make_app()
+    r = client.get('/small', headers={'Accept-Encoding': 'gzip'})
+    assert 'content-encoding' not in r.headers and r.content == b'{"ok":true}'
+    r = client.get('/encoded', headers={'Accept-Encoding': 'gzip'})
+    assert r.headers['etag'] == '"enc"' and r.content == b'x' * 4096  # compressed once, by the app
+
+
+def test_binary_media_and_partial_content_pass_through():
+    client = make_app()
+    r = client.get('/image', headers={'Accept-Encoding': 'gzip'})
+    assert 'content-encoding' not in r.headers and 'vary' not in r.headers and len(r.content) == 4100
+    r = client.get('/partial', headers={'Accept-Encoding': 'gzip'})
+    assert 'content-encoding' not in r.headers and r.text == 'x' * 4096
+
+
+def test_streaming_responses_are_compressed_chunk_by_chunk():
+    r = make_app().get('/stream', headers={'Accept-Encoding': 'gzip'})
+    assert r.headers['content-encoding'] == 'gzip' and 'content-length' not in r.headers
+    assert [json.loads(line) for line in r.text.splitlines()] == BIG['rows']
+
+
+def test_brotli_is_preferred_when_installed():
+    brotli = pytest.importorskip('brotli')
+    with make_app() as client:
+        with client.stream('GET', '/big', headers={'Accept-Encoding': 'gzip, br'}) as r:
+            raw = b''.join(r.iter_raw())
+    assert r.headers['content-encoding'] == 'br'
+    assert json.loads(brotli.decompress(raw)) == BIG
+
+
+@pytest.fixture
+def suggestions_db(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'suggestions.db'}", connect_args={'check_same_thread': False})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    icd = ICD11Code(icd_name='Abdominal distension', status='Orphaned')
+    term = TraditionalTerm(system='ayurveda', code='AY-1', term='Ādhmāna', devanagari='आध्मान')
+    db.add_all([icd, term]); db.flush()
+    db.add(Mapping(icd11_code_id=icd.id, traditional_term_id=term.id, status='suggested', ai_confidence=80))
+    db.commit(); db.close()
+
+    def override_get_db():
+        s = Session()
+        try:
+            yield s
+        finally:
+            s.close()
+    monkeypatch.setitem(app.dependency_overrides, get_db, override_get_db)
+
+
+def test_all_suggestions_keeps_string_fields_and_offers_nested_json(suggestions_db):
+    client = TestClient(app)
+    r = client.get('/api/admin/all-suggestions', headers=HEADERS)
+    assert r.status_code == 200 and r.headers['content-type'] == 'application/json'
+    row = r.json()[0]
+    assert row['siddha_suggestions'] == '[]'
+    legacy = json.loads(row['ayurveda_suggestions'])  # the admin panels JSON.parse these strings
+    assert legacy[0]['term'] == 'Ādhmāna' and legacy[0]['devanagari'] == 'आध्मान'
+
+    nested = client.get('/api/admin/all-suggestions', params={'nested': 'true'}, headers=HEADERS).json()[0]
+    assert nested['ayurveda_suggestions'] == legacy and nested['siddha_suggestions'] == []
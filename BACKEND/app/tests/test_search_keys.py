@@ -0,0 +1,96 @@
+import os
+os.environ.setdefault('DATABASE_URL', 'sqlite:///./test_unified.db')
+os.environ.setdefault('SECRET_KEY', 'a_very_secret_key_for_development_change_me')
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.main import app
+from app.api.endpoints import lookup
+from app.db.models import Base, ICD11Code, TraditionalTerm, Mapping
+from app.db.session import get_db
+from app.services.suggest_index import SuggestIndex
+from app.services.terminology_graph import GraphEdge, GraphICD, GraphTerm, TerminologyGraph
+from app.util.search_keys import backfill_search_keys, search_key, vernacular_search_key
+
+HEADERS = {'Authorization': 'Bearer ABHA_tester'}
+
+
+def test_romanizations_and_scripts_fold_to_one_key():
+    spellings = ['vAtasa~jcayaH', 'Vātasañcayaḥ', 'VATASANCAYAH', 'vaatasa~nchayah', 'वातसञ्चयः']
+    assert {search_key(s) for s in spellings} == {'vatasancayah'}
+    assert search_key('Śiroroga') == search_key('shiroroga') == 'shiroroga'
+    assert search_key('R^itu') == search_key('ṛtu') == 'ritu'
+    assert search_key('ज्वर') == 'jvara' and search_key('சுரம்') == 'suram'
+    assert search_key('حُمَّى') == search_key('حمى') == 'حمي'  # harakat dropped, alef maqsura unified
+    assert search_key('ｊｖａｒａ  ') == 'jvara'  # NFKC + whitespace
+    assert search_key('ज्वर', transliterate=False) == 'ज्वर'
+    assert search_key('') is None and search_key(None) is None
+    assert vernacular_search_key('ज्वर', None, 'حمى') == 'ज्वर\x1fjvara\x1fحمي'
+
+
+def test_graph_terms_match_on_search_keys_as_well_as_text():
+    graph = TerminologyGraph(1, 'v1')
+    graph.icds = (GraphICD(1, 'Fever', 'MG26', None, None, None, None),)
+    terms = [
+        GraphTerm(1, 'ayurveda', 'Vātasañcayaḥ', 'AY-1', None, None, None, 'वातसञ्चयः', None, None, None),
+        GraphTerm(2, 'ayurveda', 'Jvara', 'AY-2', None, None, None, None, None, None, None),
+    ]
+    graph.edges = tuple(GraphEdge(10 + t.id, graph.icds[0], t, True) for t in terms)
+    index = SuggestIndex(graph).terms
+    for q in ('vAtasa~jca', 'vatasanc', 'वातस'):
+        assert [e.traditional_term.id for e in index.search(q.lower(), key=search_key(q))] == [1], q
+    # the plain lower-cased text still matches on its own
+    assert [e.traditional_term.id for e in index.search('vātasañ')] == [1]
+    assert index.search('vatasa~jca') == []  # ITRANS markers only match through the query's key
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'keys.db'}", connect_args={'check_same_thread': False})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    s = Session()
+    icd = ICD11Code(icd_name='Accumulation of vata', status='Mapped')
+    term = TraditionalTerm(system='ayurveda', term='Vātasañcayaḥ', code='AY-7', devanagari='वातसञ्चयः')
+    s.add_all([icd, term]); s.flush()
+    s.add(Mapping(icd11_code_id=icd.id, traditional_term_id=term.id, status='verified', is_primary=True))
+    s.commit()
+
+    def override_get_db():
+        session = Session()
+        try:
+            yield session
+        finally:
+            session.close()
+    monkeypatch.setitem(app.dependency_overrides, get_db, override_get_db)
+    monkeypatch.setattr(lookup.terminology_graph, 'current', lambda: None)  # exercise the SQL paths
+    yield s
+    s.close()
+
+
+def test_keys_are_written_with_the_term_and_backfilled(db):
+    term = db.query(TraditionalTerm).one()
+    assert (term.search_key, term.vernacular_search_key) == ('vatasancayah', 'वातसञ्चयः\x1fvatasancayah')
+    term.term = 'Vātasañcaya'
+    db.commit()
+    assert db.execute(text('SELECT search_key FROM traditional_terms')).scalar() == 'vatasancaya'
+
+    db.execute(text('UPDATE traditional_terms SET search_key = NULL, vernacular_search_key = NULL'))
+    db.commit()
+    assert backfill_search_keys(db.get_bind()) == 1
+    assert backfill_search_keys(db.get_bind()) == 0
+    assert db.execute(text('SELECT search_key FROM traditional_terms')).scalar() == 'vatasancaya'
+
+
+def test_sql_paths_match_any_spelling(db):
+    client = TestClient(app)
+    for q in ('vAtasa~jcayaH', 'vatasancayah', 'वातसञ्चयः'):
+        res = client.get('/api/public/lookup', params={'query': q}, headers=HEADERS).json()
+        assert [r['icd_name'] for r in res] == ['Accumulation of vata'], q
+        sugg = client.get('/api/public/lookup/suggest', params={'q': q}, headers=HEADERS).json()
+        assert [s['term'] for s in sugg if s['kind'] == 'traditional'] == ['Vātasañcayaḥ'], q
+        exp = client.get('/api/fhir/ValueSet/$expand', params={'system': 'ayurveda', 'filter': q}, headers=HEADERS).json()
+        assert [c['display'] for c in exp['expansion']['contains']] == ['Vātasañcayaḥ'], q
@@ -0,0 +1,75 @@
+import random
+
+from app.services.suggest_index import SuggestIndex, TextIndex
+from app.services.terminology_graph import GraphEdge, GraphICD, GraphTerm, TerminologyGraph
+
+ICD_NAMES = ['Fever', 'Fever of unknown origin', 'Relapsing fever', 'Abdominal distension', 'Chronic cough',
+             'Acute fever with rash', 'Cough', 'Dengue fever', 'Distension of bladder']
+
+
+def make_graph():
+    graph = TerminologyGraph(1, 'v1')
+    graph.icds = tuple(GraphICD(i, name, f'{chr(65 + i)}{i}0', None, None, None, None) for i, name in enumerate(ICD_NAMES, 1))
+    terms = [
+        GraphTerm(1, 'ayurveda', 'Jvara', 'AY-1', None, None, None, 'ज्वर', None, None, None),
+        GraphTerm(2, 'ayurveda', 'Vishama jvara', 'AY-12', None, None, None, None, None, None, None),
+        GraphTerm(3, 'siddha', 'Suram', 'SD-1', None, None, None, None, 'சுரம்', None, None),
+        GraphTerm(4, 'unani', 'Humma', 'UN-1', None, None, None, None, None, 'حمى', None),
+        GraphTerm(5, 'ayurveda', 'Adhmana', 'AY-2', None, None, None, None, None, None, None),
+    ]
+    anchors = [0, 0, 0, 0, 3]
+    graph.edges = tuple(GraphEdge(10 + t.id, graph.icds[a], t, t.id != 2) for t, a in zip(terms, anchors))
+    return graph
+
+
+def brute_force(index: TextIndex, q: str, exact_code: bool):
+    return {id(r) for n, r in enumerate(index.records) if index.matches(n, q, exact_code)}
+
+
+def test_index_returns_the_same_matches_as_a_scan_best_first():
+    graph = make_graph()
+    index = SuggestIndex(graph)
+    icds = index.icds
+    assert [c.icd_name for c in icds.search('fever', 3)] == ['Fever', 'Fever of unknown origin', 'Dengue fever']
+    # tiers: whole-name prefix, then word prefix, then plain substring
+    assert [c.icd_name for c in icds.search('ev')] == ['Fever', 'Dengue fever', 'Relapsing fever',
+                                                       'Acute fever with rash', 'Fever of unknown origin']
+    assert [c.icd_name for c in icds.search('dist')] == ['Distension of bladder', 'Abdominal distension']
+
+    rng = random.Random(7)
+    corpus = ' '.join(ICD_NAMES).lower()
+    for _ in range(300):
+        start = rng.randrange(len(corpus) - 4)
+        q = corpus[start:start + rng.randint(1, 30)].strip()
+        if q:
+            assert {id(c) for c in icds.search(q)} == brute_force(icds, q, False), q
+
+
+def test_terms_match_vernaculars_codes_and_system_filter():
+    index = SuggestIndex(make_graph())
+    terms = index.terms
+    assert [e.traditional_term.term for e in terms.search('jvara')] == ['Jvara', 'Vishama jvara']
+    assert [e.traditional_term.term for e in terms.search('ज्व')] == ['Jvara']
+    assert [e.traditional_term.term for e in terms.search('சுர')] == ['Suram']
+    assert [e.traditional_term.term for e in terms.search('حمى')] == ['Humma']
+    # a code-looking query only matches codes exactly
+    assert [e.traditional_term.code for e in terms.search('ay-1', exact_code=True)] == ['AY-1']
+    assert {e.traditional_term.code for e in terms.search('ay-1')} == {'AY-1', 'AY-12'}
+    siddha = terms.search('u', accept=lambda e: e.traditional_term.system == 'siddha')
+    assert [e.traditional_term.term for e in siddha] == ['Suram']
+    assert terms.search('zzz') == [] and len(terms.search('a', limit=2)) == 2
+
+
+def test_find_within_a_shorter_querys_matches_equals_a_full_walk():
+    index = SuggestIndex(make_graph())
+    rng = random.Random(11)
+    corpus = ' '.join(ICD_NAMES).lower()
+    for _ in range(200):
+        start = rng.randrange(len(corpus) - 6)
+        q = corpus[start:start + rng.randint(1, 4)]
+        longer = corpus[start:start + len(q) + rng.randint(1, 6)]
+        within = index.icds.find(q)
+        for limit in (None, 2):
+            assert index.icds.find(longer, limit, within=within) == index.icds.find(longer, limit), (q, longer)
+    within = index.terms.find('j')
+    assert index.terms.find('jva', within=within) == index.terms.find('jva')
@@ -0,0 +1,114 @@
+import os
+os.environ.setdefault('DATABASE_URL', 'sqlite:///./test_unified.db')
+os.environ.setdefault('SECRET_KEY', 'a_very_secret_key_for_development_change_me')
+
+import threading, time
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.main import app
+from app.api.endpoints import translate
+from app.db.models import Base, ICD11Code, Mapping, TraditionalTerm
+from app.services import terminology_graph as graph_module
+from app.services.terminology_graph import TerminologyGraphStore
+
+HEADERS = {'Authorization': 'Bearer ABHA_tester'}
+
+
+class NoReleases:
+    def latest(self):
+        return None
+
+
+def test_current_never_waits_for_a_rebuild_and_stays_stale_until_the_swap(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'graph.db'}")
+    Base.metadata.create_all(bind=engine)
+    store = TerminologyGraphStore(session_factory=sessionmaker(bind=engine), registry=NoReleases(), check_seconds=3600)
+    first = store.refresh()
+    assert first is not None and not store.stats()['stale']
+
+    started, gate = threading.Event(), threading.Event()
+    real_build = graph_module.build_graph
+
+    def slow_build(*args):
+        started.set()
+        gate.wait(5)
+        return real_build(*args)
+
+    monkeypatch.setattr(graph_module, 'build_graph', slow_build)
+    store.mark_stale()
+    t0 = time.monotonic()
+    assert store.current() is first  # rebuild kicked off in the background
+    assert time.monotonic() - t0 < 1
+    assert started.wait(5)
+    store.mark_stale()  # a write lands while the build is running
+    assert store.current() is first and store.stats()['stale']
+    gate.set()
+    store._worker.join(5)
+
+    assert store.current() is not first
+    assert store.stats()['stale']  # the mid-build write still needs a rebuild
+    store._worker.join(5)
+    assert not store.stats()['stale'] and store.builds == 3
+
+
+def test_terminology_reads_run_without_sql_once_the_graph_is_built(env, monkeypatch):
+    engine, _ = env
+    assert translate.terminology_graph.refresh().release_version == 'tt-1'
+    statements = []
+
+    def capture(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    client = TestClient(app)
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        fwd = client.get('/api/public/translate', params={'system': 'ayurveda', 'code': 'AY-1'}, headers=HEADERS)
+        rev = client.get('/api/public/translate/reverse', params={'icd_name': 'Abdominal distension'}, headers=HEADERS)
+        found = client.get('/api/public/lookup', params={'query': 'anaha'}, headers=HEADERS)
+        suggest = client.get('/api/public/lookup/suggest', params={'q': 'abdominal'}, headers=HEADERS)
+        cm = client.get('/api/fhir/ConceptMap/translate', params={'system': 'siddha', 'code': 'Vayu'}, headers=HEADERS)
+        cs = client.get('/api/fhir/CodeSystem/$lookup', params={'system': 'ayurveda', 'code': 'AY-2'}, headers=HEADERS)
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+    assert fwd.json()['ayurveda']['primary']['code'] == 'AY-1'
+    assert rev.json()['siddha']['primary']['name'] == 'Vayu'
+    [hit] = found.json()
+    assert hit['icd_name'] == 'Abdominal distension'
+    assert {m['system'] for m in hit['system_mappings']} == {'ayurveda', 'siddha'}
+    assert [s['kind'] for s in suggest.json()] == ['icd', 'traditional', 'traditional', 'traditional']
+    match = next(p for p in cm.json()['parameter'] if p['name'] == 'match')
+    assert match['part'][1]['valueCoding']['display'] == 'Abdominal distension'
+    assert cs.json()['parameter'][0]['valueString'] == 'Anaha'
+    assert statements == []
+
+
+def test_graph_rebuilds_when_mappings_change(env, monkeypatch):
+    _, db = env
+
+    async def no_who(*args):
+        return None
+
+    monkeypatch.setattr(translate, '_fetch_mms_live', no_who)
+    monkeypatch.setattr(translate, '_resolve_tm2', no_who)
+    graph = translate.terminology_graph
+    client = TestClient(app)
+    assert client.get('/api/public/lookup', params={'query': 'humma'}, headers=HEADERS).json() == []
+    icd = ICD11Code(icd_name='Fever', status='Mapped')
+    db.add(icd); db.flush()
+    term = TraditionalTerm(system='unani', code='UN-1', term='Humma')
+    db.add(term); db.flush()
+    db.add(Mapping(icd11_code_id=icd.id, traditional_term_id=term.id, status='verified', is_primary=True))
+    db.commit()
+    builds = graph.builds
+    graph.check_seconds = 0
+    graph.refresh()  # the background check spots the new mapping rows
+    graph.check_seconds = 3600
+    assert graph.builds == builds + 1
+    [hit] = client.get('/api/public/lookup', params={'query': 'humma'}, headers=HEADERS).json()
+    assert hit['icd_name'] == 'Fever'
+    # Not in the tt-1 translation table: forward translate builds the payload from the graph's verified edges
+    r = client.get('/api/public/translate', params={'system': 'unani', 'code': 'UN-1'}, headers=HEADERS)
+    assert r.json()['unani']['primary']['name'] == 'Humma'
@@ -0,0 +1,70 @@
+import os
+os.environ.setdefault('DATABASE_URL', 'sqlite:///./test_unified.db')
+os.environ.setdefault('SECRET_KEY', 'a_very_secret_key_for_development_change_me')
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.main import app
+from app.api.endpoints import lookup
+from app.db.models import Base, ICD11Code, TraditionalTerm, Mapping
+from app.db.session import get_db
+from app.db.text_search import ensure_trigram_indexes, trigram_similarity
+
+HEADERS = {'Authorization': 'Bearer ABHA_tester'}
+
+
+def test_similarity_follows_pg_trgm():
+    # values from the pg_trgm documentation / psql
+    assert trigram_similarity('word', 'two words') == pytest.approx(0.363636, abs=1e-6)
+    assert trigram_similarity('Fever', 'fever') == 1.0
+    assert trigram_similarity('jvara', None) == 0.0
+    assert trigram_similarity('--', 'x') == 0.0
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'search.db'}", connect_args={'check_same_thread': False})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    s = Session()
+    for n, (icd_name, term, code) in enumerate([
+        ('Relapsing fever with chills', 'Vishama jvara', 'AY-10'),
+        ('Fever', 'Jvara', 'AY-1'),
+        ('Dengue fever', 'Dandaka jvara', 'AY-11'),
+    ]):
+        icd = ICD11Code(icd_name=icd_name, status='Mapped')
+        t = TraditionalTerm(system='ayurveda', term=term, code=code)
+        s.add_all([icd, t]); s.flush()
+        s.add(Mapping(icd11_code_id=icd.id, traditional_term_id=t.id, status='verified', is_primary=True))
+    s.commit()
+
+    def override_get_db():
+        session = Session()
+        try:
+            yield session
+        finally:
+            session.close()
+    monkeypatch.setitem(app.dependency_overrides, get_db, override_get_db)
+    monkeypatch.setattr(lookup.terminology_graph, 'current', lambda: None)  # exercise the SQL paths
+    yield s
+    s.close()
+
+
+def test_sqlite_connections_rank_with_in_process_similarity(db):
+    assert not ensure_trigram_indexes(db.get_bind())  # pg_trgm is Postgres only
+    assert db.execute(text("SELECT similarity('word', 'two words')")).scalar() == pytest.approx(0.363636, abs=1e-6)
+    client = TestClient(app)
+
+    found = client.get('/api/public/mapping-search', params={'q': 'fever'}).json()['suggestions']
+    assert [s['icd_name'] for s in found] == ['Fever', 'Dengue fever', 'Relapsing fever with chills']
+
+    sugg = client.get('/api/public/lookup/suggest', params={'q': 'fever'}, headers=HEADERS).json()
+    assert [s['icd_name'] for s in sugg if s['kind'] == 'icd'] == ['Fever', 'Dengue fever', 'Relapsing fever with chills']
+    res = client.get('/api/public/lookup', params={'query': 'jvara'}, headers=HEADERS).json()
+    assert [r['icd_name'] for r in res][0] == 'Fever'
+
+    exp = client.get('/api/fhir/ValueSet/$expand', params={'system': 'ayurveda', 'filter': 'jvara'}, headers=HEADERS).json()
+    assert [c['display'] for c in exp['expansion']['contains']] == ['Jvara', 'Vishama jvara', 'Dandaka jvara']
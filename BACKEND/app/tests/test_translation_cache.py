@@ -0,0 +1,171 @@
+import asyncio, os
+os.environ.setdefault('DATABASE_URL', 'sqlite:///./test_unified.db')
+os.environ.setdefault('SECRET_KEY', 'a_very_secret_key_for_development_change_me')
+
+from app.services.cache_service import TranslationCache
+
+
+def expire(cache, seconds_past_ttl=1):
+    if cache.backend.shared:
+        cache.backend._connect().execute('UPDATE translation_cache SET stored_at = stored_at - ?',
+                                         (cache.ttl_seconds + seconds_past_ttl,))
+        return
+    for k, (ts, val) in list(cache.backend._store.items()):
+        cache.backend._store[k] = (ts - cache.ttl_seconds - seconds_past_ttl, val)
+
+
+def test_stale_entry_is_served_while_one_refresh_rebuilds_it():
+    cache = TranslationCache()
+    cache.set('v1', 'forward', 'k', 'old')
+    expire(cache)
+    calls = []
+
+    async def refresh():
+        calls.append(1)
+        await asyncio.sleep(0)
+        return 'new'
+
+    async def run():
+        assert cache.get('v1', 'forward', 'k', refresh=refresh) == 'old'
+        assert cache.get('v1', 'forward', 'k', refresh=refresh) == 'old'  # refresh already in flight
+        await asyncio.gather(*cache._refreshing.values())
+        return cache.get('v1', 'forward', 'k', refresh=refresh)
+
+    assert asyncio.run(run()) == 'new'
+    assert len(calls) == 1
+    assert cache.stats()['stale_hits'] == 2 and cache.stats()['refreshes'] == 1
+
+
+def test_entry_is_dropped_after_repeated_refresh_failures_or_past_the_stale_window():
+    cache = TranslationCache()
+    cache.max_refresh_failures = 2
+    cache.refresh_backoff_seconds = 0
+    cache.set('v1', 'forward', 'k', 'old')
+    expire(cache)
+
+    async def failing():
+        raise RuntimeError('WHO down')
+
+    async def run():
+        for _ in range(2):
+            assert cache.get('v1', 'forward', 'k', refresh=failing) == 'old'
+            await asyncio.gather(*cache._refreshing.values())
+        return cache.get('v1', 'forward', 'k', refresh=failing)
+
+    assert asyncio.run(run()) is None
+    assert cache.stats()['refresh_failures'] == 2
+
+    cache.set('v1', 'forward', 'k', 'old')
+    expire(cache, cache.stale_seconds + 1)
+    assert cache.get('v1', 'forward', 'k', refresh=failing) is None
+    # Without a refresher (sync callers) an expired entry is a miss, as before
+    cache.set('v1', 'forward', 'k', 'old')
+    expire(cache)
+    assert cache.get('v1', 'forward', 'k') is None
+
+
+def test_lru_is_bounded_by_entries_and_bytes():
+    cache = TranslationCache()
+    cache.max_entries = 3
+    for i in range(4):
+        cache.set('v1', 'forward', f'k{i}', {'i': i})
+    assert cache.get('v1', 'forward', 'k0') is None
+    assert cache.get('v1', 'forward', 'k1') == {'i': 1}  # now most recently used
+    cache.set('v1', 'forward', 'k4', {'i': 4})
+    assert cache.get('v1', 'forward', 'k2') is None and cache.get('v1', 'forward', 'k1') == {'i': 1}
+    assert cache.stats()['evictions'] == 2 and cache.stats()['entries'] == 3
+
+    cache.max_bytes = 100
+    cache.set('v1', 'forward', 'big', {'blob': 'x' * 50})
+    assert cache.stats()['bytes'] <= cache.max_bytes
+    assert cache.get('v1', 'forward', 'big') == {'blob': 'x' * 50}
+    assert cache.stats()['entries'] == 2 and cache.stats()['evictions'] == 4
+
+
+def test_values_are_stored_as_bytes_and_swept_after_the_stale_window():
+    from app.api.endpoints.translate import TranslateResult
+    cache = TranslationCache()
+    cache.set('v1', 'forward', 'k', TranslateResult(release_version='v1', direction='forward'))
+    ts, blob = cache.backend._store['v1|forward|k']
+    assert isinstance(blob, bytes)
+    assert TranslateResult.model_validate(cache.get('v1', 'forward', 'k')).release_version == 'v1'
+    cache.set('v1', 'forward', 'fresh', {'ok': True})
+    cache.backend._store['v1|forward|k'] = (ts - cache.ttl_seconds - cache.stale_seconds - 1, blob)
+    assert cache.sweep() == 1
+    assert cache.stats()['expirations'] == 1 and cache.stats()['entries'] == 1
+    assert cache.stats()['bytes'] == len('v1|forward|fresh') + len(b'{"ok":true}')
+
+
+def test_sqlite_backend_shares_entries_and_stats_across_workers(tmp_path):
+    from app.services.cache_service import SQLiteCacheBackend
+    path = str(tmp_path / 'translation_cache.sqlite3')
+    worker_a = TranslationCache(SQLiteCacheBackend(path))
+    worker_b = TranslationCache(SQLiteCacheBackend(path))
+
+    assert worker_a.get('v1', 'forward', 'k') is None
+    worker_a.set('v1', 'forward', 'k', {'icd': 'ME01'})
+    assert worker_b.get('v1', 'forward', 'k') == {'icd': 'ME01'}
+    assert asyncio.run(worker_b.aget('v1', 'forward', 'k')) == {'icd': 'ME01'}
+
+    worker_b.stats()  # each worker pushes its counters when reporting (or on its sweep)
+    stats = worker_a.stats()
+    assert stats['backend'] == 'sqlite' and stats['entries'] == 1
+    assert (stats['hits'], stats['misses']) == (2, 1)
+    assert stats['process'] == {**stats['process'], 'hits': 0, 'misses': 1}
+
+    worker_b.backend.max_entries = 1
+    worker_b.backend._writes_since_evict = 49
+    worker_b.set('v1', 'forward', 'k2', {'icd': 'ME02'})
+    assert worker_a.get('v1', 'forward', 'k') is None and worker_a.stats()['entries'] == 1
+
+
+def test_invalidate_drops_exactly_the_dependent_entries(tmp_path):
+    from app.services.cache_service import SQLiteCacheBackend
+    for cache in (TranslationCache(), TranslationCache(SQLiteCacheBackend(str(tmp_path / 'deps.sqlite3')))):
+        cache.set('v1', 'forward', 'ayurveda:AY-1', {'n': 1}, icd_ids=[1], codes=[('ayurveda', 'AY-1'), ('siddha', 'SD-1')])
+        cache.set('v1', 'reverse', 'Fever', {'n': 2}, icd_ids=[2], codes=[('ayurveda', 'AY-2')])
+        cache.set('v1', 'forward', 'untagged', {'n': 3})
+
+        assert cache.invalidate(codes=[('Siddha', 'sd-1')]) == 1
+        assert cache.get('v1', 'forward', 'ayurveda:AY-1') is None
+        assert cache.get('v1', 'reverse', 'Fever') == {'n': 2}
+        assert cache.invalidate(icd_ids=[2]) == 1 and cache.invalidate(icd_ids=[2]) == 0
+        assert cache.get('v1', 'forward', 'untagged') == {'n': 3}
+        assert cache.stats()['invalidations'] == 2
+
+
+def test_refresh_racing_an_invalidation_is_dropped(tmp_path):
+    from app.services.cache_service import SQLiteCacheBackend
+    for cache in (TranslationCache(), TranslationCache(SQLiteCacheBackend(str(tmp_path / 'race.sqlite3')))):
+        cache.set('v1', 'forward', 'racing', 'old', icd_ids=[7])
+        cache.set('v1', 'forward', 'other', 'old', icd_ids=[7])
+        expire(cache)
+
+        async def run():
+            gate = asyncio.Event()
+
+            async def refresh():
+                await gate.wait()
+                return 'rebuilt from the old mapping'
+
+            assert cache.get('v1', 'forward', 'racing', refresh=refresh) == 'old'
+            await asyncio.sleep(0)
+            assert cache.invalidate(icd_ids=[7]) == 2
+            gate.set()
+            await asyncio.gather(*cache._refreshing.values())
+
+        asyncio.run(run())
+        assert cache.get('v1', 'forward', 'racing') is None
+        assert cache.stats()['refreshes_dropped'] == 1
+
+        # A refresh that lands untouched keeps the entry's dependency tags
+        cache.set('v1', 'forward', 'settled', 'old', icd_ids=[7])
+        expire(cache)
+
+        async def refresh_settled():
+            cache.get('v1', 'forward', 'settled', refresh=lambda: asyncio.sleep(0, 'new'))
+            await asyncio.gather(*cache._refreshing.values())
+
+        asyncio.run(refresh_settled())
+        assert cache.get('v1', 'forward', 'settled') == 'new'
+        assert cache.invalidate(icd_ids=[7]) == 1
@@ -0,0 +1,274 @@
+import asyncio, os
+os.environ.setdefault('DATABASE_URL', 'sqlite:///./test_unified.db')
+os.environ.setdefault('SECRET_KEY', 'a_very_secret_key_for_development_change_me')
+
+from fastapi import Request, Response
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+from app.main import app
+from app.api.endpoints import translate
+from app.db.models import ICD11Code, TraditionalTerm, Mapping, TranslationEntry
+from app.services.translation_table import lookup_code, lookup_icd
+
+HEADERS = {'Authorization': 'Bearer ABHA_tester'}
+
+
+def test_table_holds_one_row_per_icd_and_primary_code(env):
+    _, db = env
+    assert db.query(TranslationEntry).count() == 3
+    payload = lookup_code(db, 'tt-1', 'Ayurveda', 'AY-1')
+    assert payload['icd_name'] == 'Abdominal distension'
+    assert payload['systems']['ayurveda']['primary']['name'] == 'Adhmana'
+    assert [a['name'] for a in payload['systems']['ayurveda']['aliases']] == ['Anaha']
+    assert payload['who_release'] == '2025-01'
+    assert payload['icd']['code'] == 'ME01' and payload['icd']['icd_uri']
+    assert payload['tm2']['code'] == 'SM31'
+    # Alias codes are not forward-translatable, same as the live path
+    assert lookup_code(db, 'tt-1', 'ayurveda', 'AY-2') is None
+    assert lookup_icd(db, 'tt-1', 'Abdominal distension')['systems']['siddha']['primary']['code'] == 'SD-1'
+
+
+def test_translate_reads_the_table_without_touching_mapping_tables(env):
+    engine, _ = env
+    translate.terminology_graph.refresh()  # compiled at startup
+    statements = []
+
+    def capture(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        client = TestClient(app)
+        r = client.get('/api/public/translate', params={'system': 'ayurveda', 'code': 'AY-1'}, headers=HEADERS)
+        r2 = client.get('/api/public/translate/reverse', params={'icd_name': 'Abdominal distension'}, headers=HEADERS)
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+    assert r.status_code == 200, r.text
+    body = r.json()
+    assert body['icd']['code'] == 'ME01'
+    assert body['tm2']['code'] == 'SM31'
+    assert body['siddha']['primary']['code'] == 'SD-1'
+    assert r2.json()['ayurveda']['primary']['name'] == 'Adhmana'
+    assert not [s for s in statements if 'FROM mappings' in s or 'FROM traditional_terms' in s]
+
+
+def test_stored_enrichment_is_ignored_for_another_release(env, monkeypatch):
+    seen = []
+
+    async def no_live(name, release):
+        seen.append(release)
+        return None
+
+    async def no_tm2(name, sys_map, release):
+        return None
+
+    monkeypatch.setattr(translate, '_fetch_mms_live', no_live)
+    monkeypatch.setattr(translate, '_resolve_tm2', no_tm2)
+    r = TestClient(app).get('/api/public/translate', params={'system': 'ayurveda', 'code': 'AY-1', 'release': '2024-01'},
+                            headers=HEADERS)
+    assert r.status_code == 200, r.text
+    assert r.json()['icd'] is None and r.json()['tm2'] is None
+    assert seen == ['2024-01']
+
+
+def test_open_who_circuit_skips_enrichment_and_is_not_cached(env, monkeypatch):
+    from app.services import who_api_client
+    from app.services.who_circuit_breaker import CircuitBreaker
+    breaker = CircuitBreaker(failure_threshold=1, open_seconds=3600)
+    monkeypatch.setattr(who_api_client, 'who_breaker', breaker)
+    breaker.record_failure(who_api_client.WHO_ICD_BASE, 'ConnectTimeout')
+    calls = []
+
+    async def live(name, release):
+        calls.append(name)
+        return None
+
+    async def no_tm2(name, sys_map, release):
+        calls.append(name)
+        return None
+
+    monkeypatch.setattr(translate, '_fetch_mms_live', live)
+    monkeypatch.setattr(translate, '_resolve_tm2', no_tm2)
+    client = TestClient(app)
+    params = {'system': 'ayurveda', 'code': 'AY-1', 'release': '2024-01'}
+    r = client.get('/api/public/translate', params=params, headers=HEADERS)
+    assert r.status_code == 200, r.text
+    body = r.json()
+    assert body['enrichment_skipped'] is True
+    assert body['ayurveda']['primary']['code'] == 'AY-1' and body['icd'] is None
+    assert calls == []
+    fhir_params = translate._to_fhir_parameters(translate.TranslateResult(**body))['parameter']
+    assert {'name': 'enrichmentSkipped', 'valueBoolean': True} in fhir_params
+
+    # Stored enrichment for the table's own ICD release needs no WHO call, so nothing is skipped
+    r2 = client.get('/api/public/translate', params={'system': 'ayurveda', 'code': 'AY-1'}, headers=HEADERS)
+    assert r2.json()['enrichment_skipped'] is False and r2.json()['icd']['code'] == 'ME01'
+
+    # The degraded answer was not cached: once WHO recovers the next request enriches live
+    breaker.record_success(who_api_client.WHO_ICD_BASE)
+    r3 = client.get('/api/public/translate', params=params, headers=HEADERS)
+    assert r3.json()['enrichment_skipped'] is False
+    assert calls == ['Abdominal distension', 'Abdominal distension']
+
+
+def test_latency_budget_returns_partial_result_and_finishes_in_background(env, monkeypatch):
+    _, db = env
+    monkeypatch.setattr(translate, 'TRANSLATE_LATENCY_BUDGET_MS', 100)
+
+    async def live(name, release):
+        return {'@id': 'http://id.who.int/icd/release/11/2024-01/mms/1', 'code': 'ME01', 'source': 'mirror',
+                'title': {'@value': name}}
+
+    async def slow_tm2(name, sys_map, release):
+        await asyncio.sleep(0.5)
+        return translate.ICDEntry(name=name, code='SM31', description=None, icd_uri=None)
+
+    monkeypatch.setattr(translate, '_fetch_mms_live', live)
+    monkeypatch.setattr(translate, '_resolve_tm2', slow_tm2)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        request = Request({'type': 'http', 'method': 'GET', 'path': '/api/public/translate', 'headers': [],
+                           'query_string': b'system=ayurveda&code=AY-1&release=2024-01'})
+        response = Response()
+        result = await translate.translate_code(request, response, system='ayurveda', code='AY-1', icd_name=None,
+                                                release='2024-01', fhir=False, db=db, principal=None, _consent=None)
+        assert response.headers['Cache-Control'] == 'no-store'
+        elapsed = loop.time() - start
+        key = translate._forward_cache_key(None, 'ayurveda', 'AY-1', '2024-01')
+        cached_early = await translate.translation_cache.aget('2024-01', 'forward', key)
+        await asyncio.gather(*list(translate._background_tasks))
+        return result, elapsed, cached_early, await translate.translation_cache.aget('2024-01', 'forward', key)
+
+    result, elapsed, cached_early, cached = asyncio.run(run())
+    assert elapsed < 0.4
+    assert result.ayurveda.primary.code == 'AY-1' and result.icd.code == 'ME01'
+    assert result.tm2 is None and result.enrichment_pending == ['tm2']
+    assert cached_early is None  # the partial answer is never cached
+    cached = translate.TranslateResult.model_validate(cached)
+    assert cached.tm2.code == 'SM31' and cached.enrichment_pending == []
+
+
+def test_results_that_hit_a_who_failure_are_not_cached(env, monkeypatch):
+    _, db = env
+    from app.services import who_api_client
+
+    async def live(name, release):
+        return {'code': 'ME01', 'title': {'@value': name}}
+
+    async def failing_tm2(name, sys_map, release):
+        await asyncio.sleep(0.3)
+        who_api_client._note_upstream_failure('https://id.who.int/icd/entity/search')
+        return None
+
+    monkeypatch.setattr(translate, '_fetch_mms_live', live)
+    monkeypatch.setattr(translate, '_resolve_tm2', failing_tm2)
+    key = translate._forward_cache_key(None, 'ayurveda', 'AY-1', '2024-01')
+
+    async def run(budget_ms):
+        monkeypatch.setattr(translate, 'TRANSLATE_LATENCY_BUDGET_MS', budget_ms)
+        request = Request({'type': 'http', 'method': 'GET', 'path': '/api/public/translate', 'headers': [],
+                           'query_string': b'system=ayurveda&code=AY-1&release=2024-01'})
+        await translate.translate_code(request, Response(), system='ayurveda', code='AY-1', icd_name=None,
+                                       release='2024-01', fhir=False, db=db, principal=None, _consent=None)
+        await asyncio.gather(*list(translate._background_tasks))
+        return await translate.translation_cache.aget('2024-01', 'forward', key)
+
+    assert asyncio.run(run(100)) is None  # TM2 failed after the budget, in the background
+    assert asyncio.run(run(0)) is None  # TM2 failed in the foreground
+
+
+def test_batch_translate_dedups_and_keeps_input_order(env, monkeypatch):
+    enriched = []
+    real_enrich = translate._enrich
+
+    async def counting_enrich(payload, sys_map, release):
+        enriched.append(payload['icd_name'])
+        return await real_enrich(payload, sys_map, release)
+
+    monkeypatch.setattr(translate, '_enrich', counting_enrich)
+    items = [{'system': 'ayurveda', 'code': 'AY-1'}, {'system': 'siddha', 'code': 'SD-404'},
+             {'icd_name': 'Abdominal distension'}, {'system': 'Ayurveda', 'code': 'AY-1'}, {'code': 'AY-1'}]
+    client = TestClient(app)
+    r = client.post('/api/public/translate/batch', json={'items': items}, headers=HEADERS)
+    assert r.status_code == 200, r.text
+    results = r.json()['results']
+    assert r.json()['count'] == 5
+    assert results[0]['icd']['code'] == 'ME01' and results[0]['siddha']['primary']['code'] == 'SD-1'
+    assert results[1]['resourceType'] == 'OperationOutcome'
+    assert results[2]['ayurveda']['primary']['name'] == 'Adhmana'
+    assert results[3] == results[0]
+    assert results[4]['resourceType'] == 'OperationOutcome'
+    assert enriched == ['Abdominal distension']  # one enrichment for the shared ICD
+
+    # Second call is served from the translation cache; FHIR output wraps each item
+    r2 = client.post('/api/public/translate/batch', json={'items': items[:2], 'fhir': True}, headers=HEADERS)
+    params = r2.json()['parameter']
+    assert enriched == ['Abdominal distension']
+    assert [p['name'] for p in params] == ['releaseVersion', 'item', 'item']
+    assert params[2]['part'][1]['resource']['resourceType'] == 'OperationOutcome'
+
+
+def test_batch_translate_rejects_oversized_batches(env, monkeypatch):
+    monkeypatch.setattr(translate, 'TRANSLATE_BATCH_MAX_ITEMS', 2)
+    r = TestClient(app).post('/api/public/translate/batch', json={'items': [{'icd_name': 'x'}] * 3}, headers=HEADERS)
+    assert r.json()['resourceType'] == 'OperationOutcome'
+
+
+def test_translate_queues_who_enrichment_instead_of_committing(env, monkeypatch):
+    from app.services.enrichment_queue import EnrichmentQueue
+    engine, db = env
+    queue = EnrichmentQueue(session_factory=sessionmaker(bind=engine))
+    monkeypatch.setattr(translate, 'enrichment_queue', queue)
+
+    async def live(name, release):
+        return {'@id': 'http://id.who.int/icd/release/11/2024-01/mms/1', 'code': 'ME01.1', 'source': 'mirror',
+                'title': {'@value': name}, 'definition': {'@value': 'Older definition.'}}
+
+    async def no_tm2(name, sys_map, release):
+        return None
+
+    monkeypatch.setattr(translate, '_fetch_mms_live', live)
+    monkeypatch.setattr(translate, '_resolve_tm2', no_tm2)
+    commits = []
+
+    def capture(conn):
+        commits.append(1)
+
+    event.listen(engine, 'commit', capture)
+    try:
+        r = TestClient(app).get('/api/public/translate', params={'system': 'ayurveda', 'code': 'AY-1', 'release': '2024-01'},
+                                headers=HEADERS)
+    finally:
+        event.remove(engine, 'commit', capture)
+    assert r.json()['icd']['code'] == 'ME01.1'
+    assert not commits
+    assert queue.stats()['pending'] == 1
+    assert queue.flush() == 1
+    db.expire_all()
+    assert db.query(ICD11Code).filter_by(icd_name='Abdominal distension').one().icd_code == 'ME01.1'
+
+
+def test_release_refresh_invalidates_only_changed_translations(env):
+    _, db = env
+    client = TestClient(app)
+    client.get('/api/public/translate/reverse', params={'icd_name': 'Abdominal distension'}, headers=HEADERS)
+    other = ICD11Code(icd_name='Fever', status='Mapped')
+    db.add(other); db.flush()
+    term = TraditionalTerm(system='unani', code='UN-1', term='Humma')
+    db.add(term); db.flush()
+    db.add(Mapping(icd11_code_id=other.id, traditional_term_id=term.id, status='verified', is_primary=True))
+    db.commit()
+    translate.terminology_graph.mark_stale()  # as after an admin write in this worker
+    translate.terminology_graph.refresh()  # what the background rebuild does
+    client.get('/api/public/translate/reverse', params={'icd_name': 'Fever'}, headers=HEADERS)
+    assert translate.translation_cache.stats()['entries'] == 2
+
+    # Fever has no row in the tt-1 table yet; adding it invalidates only Fever's cached reverse entry
+    r = client.post('/api/admin/conceptmap/releases/tt-1/refresh', headers=HEADERS)
+    assert r.json()['cache_invalidated'] == 1
+    assert translate.translation_cache.get('tt-1', 'reverse', 'Abdominal distension') is not None
+    assert translate.translation_cache.get('tt-1', 'reverse', 'Fever') is None
@@ -0,0 +1,310 @@
+import asyncio, os, time
+os.environ.setdefault('DATABASE_URL', 'sqlite:///./test_unified.db')
+os.environ.setdefault('SECRET_KEY', 'a_very_secret_key_for_development_change_me')
+
+import httpx
+from cachetools.keys import hashkey
+
+from app.services import who_api_client, who_async_client, who_response_store
+from cachetools import TTLCache
+from app.services.who_circuit_breaker import CircuitBreaker
+
+
+def use_transport(monkeypatch, handler):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(who_async_client, '_get_client', lambda: client)
+    monkeypatch.setattr(who_api_client, '_preferred_variant', {})
+    monkeypatch.setattr(who_response_store, 'response_store', None)
+    monkeypatch.setattr(who_api_client, 'negative_cache', TTLCache(maxsize=100, ttl=60))
+    breaker = CircuitBreaker(failure_threshold=1000)
+    monkeypatch.setattr(who_api_client, 'who_breaker', breaker)
+    monkeypatch.setattr(who_async_client, 'who_breaker', breaker)
+    # Skip OAuth: behave like WHO_LOCAL_NOAUTH
+    who_api_client.token_cache[hashkey()] = None
+    return client
+
+
+def test_release_search_falls_through_url_variants(monkeypatch):
+    seen = []
+
+    def handler(request: httpx.Request):
+        seen.append(str(request.url))
+        if '/mms-sl/' in request.url.path:
+            return httpx.Response(200, json={'destinationEntities': [
+                {'id': 'http://id.who.int/icd/entity/1', 'title': 'Headache', 'code': '8A8Z'}
+            ]})
+        return httpx.Response(404)
+
+    use_transport(monkeypatch, handler)
+    res = asyncio.run(who_async_client.mms_search_by_release('Headache', '2025-01'))
+    assert res == {'code': '8A8Z', 'title': {'@value': 'Headache'}, '@id': 'http://id.who.int/icd/entity/1'}
+    assert len(seen) == 3
+
+
+def test_slow_lookups_do_not_serialize(monkeypatch):
+    async def handler(request: httpx.Request):
+        await asyncio.sleep(0.2)
+        return httpx.Response(200, json={'destinationEntities': [{'id': 'x', 'title': 't', 'code': 'C1'}]})
+
+    use_transport(monkeypatch, handler)
+
+    async def run():
+        start = time.perf_counter()
+        results = await asyncio.gather(*[who_async_client.mms_search_by_release(f'term{i}') for i in range(5)])
+        return results, time.perf_counter() - start
+
+    results, elapsed = asyncio.run(run())
+    assert all(r and r['code'] == 'C1' for r in results)
+    assert elapsed < 0.6
+
+
+def test_transport_errors_return_none(monkeypatch):
+    def handler(request: httpx.Request):
+        raise httpx.ConnectTimeout('timed out', request=request)
+
+    use_transport(monkeypatch, handler)
+    assert asyncio.run(who_async_client.fetch_linearized_entity_by_release('123', 'tm2')) is None
+    assert asyncio.run(who_async_client.search_foundation_uri('never-cached-term')) is None
+    assert hashkey('never-cached-term') not in who_api_client.foundation_search_cache
+
+
+def test_clients_are_per_loop_and_closed_on_shutdown(monkeypatch):
+    monkeypatch.setattr(who_async_client, '_clients', {})
+
+    async def get():
+        return who_async_client._get_client()
+
+    first = asyncio.run(get())
+    second = asyncio.run(get())
+    assert first is not second
+    # The finished loop's client was dropped, not leaked alongside the new one
+    assert list(who_async_client._clients.values()) == [second]
+
+    async def get_and_shutdown():
+        client = who_async_client._get_client()
+        await who_async_client.aclose()
+        return client
+
+    assert asyncio.run(get_and_shutdown()).is_closed
+    assert not who_async_client._clients
+
+
+def test_sync_requests_carry_a_timeout(monkeypatch):
+    seen = {}
+
+    def fake_get(url, headers=None, **kw):
+        seen.update(kw)
+        raise who_api_client.requests.exceptions.ConnectTimeout()
+
+    use_transport(monkeypatch, lambda r: httpx.Response(404))
+    monkeypatch.setattr(who_api_client.requests, 'get', fake_get)
+    assert who_api_client.get_entity_details('http://id.who.int/icd/entity/1') is None
+    assert seen['timeout'] == (who_api_client.WHO_HTTP_CONNECT_TIMEOUT_SECONDS, who_api_client.WHO_HTTP_TIMEOUT_SECONDS)
+
+
+def test_sync_lookups_do_not_cache_an_outage(monkeypatch):
+    def fake_get(url, headers=None, **kw):
+        raise who_api_client.requests.exceptions.ConnectionError()
+
+    use_transport(monkeypatch, lambda r: httpx.Response(404))
+    monkeypatch.setattr(who_api_client.requests, 'get', fake_get)
+    assert who_api_client.search_and_fetch_entity('Sync outage') is None
+    assert who_api_client.search_foundation_uri('Sync outage') is None
+    assert hashkey('Sync outage') not in who_api_client.entity_cache
+    assert hashkey('Sync outage') not in who_api_client.foundation_search_cache
+
+
+def test_who_sync_status_reports_upstream_caches():
+    from fastapi.testclient import TestClient
+    from app.main import app
+    body = TestClient(app).get('/api/admin/who-sync/status').json()
+    upstream = body['upstream_cache']
+    assert {'entries', 'ttl_seconds'} <= set(upstream['negative_cache'])
+    assert {'leaders', 'coalesced', 'in_flight'} <= set(upstream['single_flight'])
+    assert 'hits' in upstream['response_store'] and 'loaded' in upstream['icd_mirror']
+
+
+def test_who_sync_status_reports_a_disabled_response_store(monkeypatch):
+    from fastapi.testclient import TestClient
+    from app.main import app
+    monkeypatch.setattr(who_response_store, 'response_store', None)
+    r = TestClient(app).get('/api/admin/who-sync/status')
+    assert r.status_code == 200
+    assert r.json()['upstream_cache']['response_store'] == {'enabled': False}
+
+
+def test_variants_race_and_winner_is_tried_first_next_time(monkeypatch):
+    seen = []
+
+    async def handler(request: httpx.Request):
+        seen.append(str(request.url))
+        if request.url.host == 'id.who.int' and request.url.path.endswith('/tm2/entity/555'):
+            await asyncio.sleep(0.1)
+            return httpx.Response(200, json={'code': 'SM31', 'title': {'@value': 'Abdominal distension'}})
+        if request.url.host == 'icd.who.int':
+            await asyncio.sleep(0.05)
+            return httpx.Response(404)
+        await asyncio.sleep(0.3)
+        return httpx.Response(404)
+
+    use_transport(monkeypatch, handler)
+    start = time.perf_counter()
+    res = asyncio.run(who_async_client.fetch_linearized_entity_by_release('555', 'tm2', '2025-01'))
+    assert res['code'] == 'SM31'
+    # Slow lower-priority losers were cancelled instead of being awaited one after another
+    assert time.perf_counter() - start < 0.25
+    # Only the same-entity shapes were raced; /unspecified residuals were never requested
+    assert len(seen) == 6
+    assert not [u for u in seen if u.endswith('/unspecified')]
+
+    seen.clear()
+    asyncio.run(who_async_client.fetch_linearized_entity_by_release('777', 'tm2', '2025-01'))
+    assert seen[0] == 'https://id.who.int/icd/release/11/2025-01/tm2/entity/777'
+
+
+def test_confirmed_miss_short_circuits_repeat_lookups(monkeypatch):
+    seen = []
+
+    def handler(request: httpx.Request):
+        seen.append(str(request.url))
+        return httpx.Response(200, json={'destinationEntities': []})
+
+    use_transport(monkeypatch, handler)
+    assert asyncio.run(who_async_client.tm2_search_by_release('Vataja jvara', '2025-01')) is None
+    first = len(seen)
+    assert first == 3
+    assert asyncio.run(who_async_client.tm2_search_by_release('vataja jvara ', '2025-01')) is None
+    assert len(seen) == first
+    # Other releases are keyed separately
+    asyncio.run(who_async_client.tm2_search_by_release('Vataja jvara', '2024-01'))
+    assert len(seen) == first + 3
+
+
+def test_outage_is_not_remembered_as_miss(monkeypatch):
+    calls = []
+
+    def handler(request: httpx.Request):
+        calls.append(1)
+        return httpx.Response(503)
+
+    use_transport(monkeypatch, handler)
+    assert asyncio.run(who_async_client.mms_search_by_release('Fever', '2025-01')) is None
+    assert not who_api_client.is_known_miss('search', 'Fever', 'mms', '2025-01')
+    asyncio.run(who_async_client.mms_search_by_release('Fever', '2025-01'))
+    assert len(calls) == 6
+
+
+def test_concurrent_identical_lookups_share_one_upstream_call(monkeypatch):
+    calls = []
+
+    async def handler(request: httpx.Request):
+        calls.append(str(request.url))
+        await asyncio.sleep(0.1)
+        if '/mms/search' in request.url.path:
+            return httpx.Response(200, json={'destinationEntities': [{'id': 'x', 'title': 'Headache', 'code': '8A8Z'}]})
+        return httpx.Response(404)
+
+    use_transport(monkeypatch, handler)
+
+    async def run():
+        return await asyncio.gather(*[who_async_client.mms_search_by_release('Headache', '2025-01') for _ in range(20)])
+
+    results = asyncio.run(run())
+    assert all(r['code'] == '8A8Z' for r in results)
+    # One leader raced the 3 URL variants; the other 19 callers waited on it
+    assert len(calls) == 3
+    assert not who_async_client._inflight
+
+
+def test_coalesced_callers_do_not_memoize_an_outage(monkeypatch):
+    async def handler(request: httpx.Request):
+        await asyncio.sleep(0.05)
+        return httpx.Response(503)
+
+    use_transport(monkeypatch, handler)
+
+    async def run():
+        return await asyncio.gather(*[who_async_client.search_foundation_uri('Outage term') for _ in range(5)])
+
+    assert asyncio.run(run()) == [None] * 5
+    assert hashkey('Outage term') not in who_api_client.foundation_search_cache
+    assert not who_api_client.is_known_miss('search', 'Outage term', 'foundation')
+
+
+def test_sync_client_coalesces_threads(monkeypatch):
+    import threading
+
+    calls = []
+
+    class Resp:
+        status_code = 200
+        headers = {}
+
+        def json(self):
+            return {'destinationEntities': [{'id': 'x', 'title': 'Fever', 'code': 'MG26'}]}
+
+    def fake_get(url, headers=None, **kw):
+        calls.append(url)
+        time.sleep(0.1)
+        return Resp()
+
+    use_transport(monkeypatch, lambda r: httpx.Response(404))
+    monkeypatch.setattr(who_api_client.requests, 'get', fake_get)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(who_api_client.mms_search_by_release('Fever', '2025-01'))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert [r['code'] for r in results] == ['MG26'] * 8
+    assert len(calls) == 1
+
+
+def test_race_returns_the_highest_priority_answer(monkeypatch):
+    async def handler(request: httpx.Request):
+        path = request.url.path
+        if request.url.host == 'icd.who.int' and path.endswith('/mms/entity/9'):
+            await asyncio.sleep(0.1)
+            return httpx.Response(200, json={'code': 'PRIMARY'})
+        if path.endswith('/unspecified'):
+            return httpx.Response(200, json={'code': 'RESIDUAL'})
+        return httpx.Response(200, json={'code': 'ALIAS'})
+
+    use_transport(monkeypatch, handler)
+    res = asyncio.run(who_async_client.fetch_linearized_entity_by_release('9', 'mms', '2025-01'))
+    assert res['code'] == 'PRIMARY'
+    assert who_api_client._preferred_variant[('linearized_release', 'mms', '2025-01')] == 0
+
+
+def test_fallback_shapes_are_tried_but_not_remembered(monkeypatch):
+    def handler(request: httpx.Request):
+        if 'releaseId=2024-01' in str(request.url):
+            return httpx.Response(200, json={'code': 'PINNED'})
+        return httpx.Response(404)
+
+    use_transport(monkeypatch, handler)
+    assert asyncio.run(who_async_client.fetch_linearized_entity('10', 'mms'))['code'] == 'PINNED'
+    assert ('linearized', 'mms', None) not in who_api_client._preferred_variant
+
+
+def test_tm2_chain_miss_is_keyed_by_alias_terms(monkeypatch):
+    from app.api.endpoints import translate
+    from app.services.icd_mirror import ICDMirror
+    monkeypatch.setattr(who_api_client, 'negative_cache', TTLCache(maxsize=100, ttl=60))
+    monkeypatch.setattr(translate, 'icd_mirror', ICDMirror())
+    monkeypatch.setattr(translate.icd_mirror, '_next_check', float('inf'))
+    walks = []
+
+    async def walk(icd_name, sys_map, release):
+        walks.append(translate._alt_terms(sys_map))
+        return None
+
+    monkeypatch.setattr(translate, '_walk_tm2_chain', walk)
+    term = translate.SystemTerm(name='Adhmana', code='AY-1', description=None)
+    sys_map = {'ayurveda': translate.SystemMappingEntry(primary=term, aliases=[])}
+    asyncio.run(translate._resolve_tm2('Bloating', sys_map, None))
+    asyncio.run(translate._resolve_tm2('Bloating', sys_map, None))
+    assert len(walks) == 1
+    sys_map['ayurveda'].aliases.append(translate.SystemTerm(name='Anaha', code='AY-2', description=None))
+    asyncio.run(translate._resolve_tm2('Bloating', sys_map, None))
+    assert walks[-1] == ['Adhmana', 'Anaha']
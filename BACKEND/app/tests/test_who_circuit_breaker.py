@@ -0,0 +1,126 @@
+import asyncio, os
+os.environ.setdefault('DATABASE_URL', 'sqlite:///./test_unified.db')
+os.environ.setdefault('SECRET_KEY', 'a_very_secret_key_for_development_change_me')
+
+import httpx
+import pytest
+from cachetools import TTLCache
+from cachetools.keys import hashkey
+from fastapi import HTTPException
+
+from app.services import who_api_client, who_async_client, who_response_store
+from app.services.who_circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+ICD = 'https://icd.who.int/icd/entity/1'
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_opens_after_threshold_then_half_open_probe_decides():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=3, open_seconds=30, half_open_probes=1, clock=clock)
+    for _ in range(2):
+        assert breaker.allow(ICD)
+        breaker.record_failure(ICD, 'ConnectTimeout')
+    assert breaker.state(ICD) == CLOSED
+    breaker.record_failure(ICD, 'HTTP 503')
+    assert breaker.state(ICD) == OPEN and breaker.is_open(ICD)
+    assert not breaker.allow(ICD)
+
+    clock.now += 30
+    assert breaker.state(ICD) == HALF_OPEN and not breaker.is_open(ICD)
+    assert breaker.allow(ICD)          # the single probe
+    assert not breaker.allow(ICD)      # everyone else waits for it
+    breaker.record_failure(ICD, 'ConnectTimeout')
+    assert breaker.state(ICD) == OPEN  # failed probe re-opens immediately
+
+    clock.now += 30
+    assert breaker.allow(ICD)
+    breaker.record_success(ICD)
+    assert breaker.state(ICD) == CLOSED and breaker.allow(ICD)
+    stats = breaker.stats()['hosts']['icd.who.int']
+    assert stats['times_opened'] == 2 and stats['short_circuited'] == 2 and stats['consecutive_failures'] == 0
+
+
+def test_hosts_are_tracked_separately_and_cancelled_probes_free_their_slot():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, open_seconds=5, clock=clock)
+    breaker.record_failure('https://id.who.int/icd/entity/1')
+    assert breaker.is_open('https://id.who.int/x') and not breaker.is_open(ICD)
+    clock.now += 5
+    assert breaker.allow('https://id.who.int/x')
+    breaker.release('https://id.who.int/x')
+    assert breaker.allow('https://id.who.int/x')
+    breaker.record_response('https://id.who.int/x', 404)  # an answer, even a 404, means the host is up
+    assert breaker.state('https://id.who.int/x') == CLOSED
+
+
+def use_breaker(monkeypatch, breaker, handler):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(who_async_client, '_get_client', lambda: client)
+    monkeypatch.setattr(who_api_client, '_preferred_variant', {})
+    monkeypatch.setattr(who_response_store, 'response_store', None)
+    monkeypatch.setattr(who_api_client, 'negative_cache', TTLCache(maxsize=100, ttl=60))
+    monkeypatch.setattr(who_api_client, 'entity_cache', TTLCache(maxsize=100, ttl=60))
+    monkeypatch.setattr(who_api_client, 'who_breaker', breaker)
+    monkeypatch.setattr(who_async_client, 'who_breaker', breaker)
+    who_api_client.token_cache[hashkey()] = None
+
+
+def test_open_circuit_short_circuits_async_calls(monkeypatch):
+    hits = []
+
+    def handler(request: httpx.Request):
+        hits.append(str(request.url))
+        raise httpx.ConnectTimeout('timed out', request=request)
+
+    breaker = CircuitBreaker(failure_threshold=2, open_seconds=3600)
+    use_breaker(monkeypatch, breaker, handler)
+
+    async def run():
+        with who_api_client.upstream_trace() as failures:
+            for i in range(5):
+                assert await who_async_client._get_json(f'https://icd.who.int/icd/entity/{i}', {}) is None
+        return failures
+
+    failures = asyncio.run(run())
+    assert len(hits) == 2
+    assert len(failures) == 5  # short-circuited calls still count as outages, so they are never memoized as misses
+    assert who_api_client.who_unavailable()
+    assert who_api_client.breaker_stats()['available'] is False
+
+
+def test_token_request_has_a_timeout_and_respects_the_breaker(monkeypatch):
+    seen = []
+
+    def fake_post(url, **kw):
+        seen.append(kw)
+        raise who_api_client.requests.exceptions.ConnectTimeout()
+
+    breaker = CircuitBreaker(failure_threshold=1, open_seconds=3600)
+    monkeypatch.setattr(who_api_client, 'who_breaker', breaker)
+    monkeypatch.setattr(who_api_client, 'WHO_LOCAL_NOAUTH', False)
+    monkeypatch.setattr(who_api_client, 'WHO_API_CLIENT_ID', 'id')
+    monkeypatch.setattr(who_api_client, 'WHO_API_CLIENT_SECRET', 'secret')
+    monkeypatch.setattr(who_api_client, 'WHO_TOKEN_URL', 'https://icdaccessmanagement.who.int/connect/token')
+    monkeypatch.setattr(who_api_client.requests, 'post', fake_post)
+    who_api_client.token_cache.clear()
+    for _ in range(2):
+        with pytest.raises(HTTPException):
+            who_api_client.get_who_api_token()
+    assert len(seen) == 1
+    assert seen[0]['timeout'] == (who_api_client.WHO_HTTP_CONNECT_TIMEOUT_SECONDS, who_api_client.WHO_HTTP_TIMEOUT_SECONDS)
+    assert who_api_client.who_unavailable()
+
+
+def test_who_sync_status_reports_breaker_state():
+    from fastapi.testclient import TestClient
+    from app.main import app
+    body = TestClient(app).get('/api/admin/who-sync/status').json()
+    assert {'available', 'failure_threshold', 'open_seconds', 'hosts'} <= set(body['who_api'])
@@ -0,0 +1,122 @@
+import asyncio, time
+
+import httpx
+from cachetools.keys import hashkey
+
+from app.services import who_api_client, who_async_client, who_response_store
+from app.services.who_circuit_breaker import CircuitBreaker
+from app.services.who_response_store import WhoResponseStore, normalize_url
+
+URL = 'https://icd.who.int/icdapi/release/11/2025-01/mms/search?q=Headache'
+
+
+def make_store(tmp_path, **kw):
+    return WhoResponseStore(str(tmp_path / 'who.sqlite3'), **kw)
+
+
+def use_transport(monkeypatch, store, handler):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(who_async_client, '_get_client', lambda: client)
+    monkeypatch.setattr(who_response_store, 'response_store', store)
+    breaker = CircuitBreaker(failure_threshold=1000)
+    monkeypatch.setattr(who_api_client, 'who_breaker', breaker)
+    monkeypatch.setattr(who_async_client, 'who_breaker', breaker)
+    who_api_client.token_cache[hashkey()] = None
+
+
+def test_normalized_key_ignores_scheme_and_query_order():
+    assert normalize_url('http://ID.who.int/icd/entity/1/?b=2&a=1') == normalize_url('https://id.who.int/icd/entity/1?a=1&b=2')
+
+
+def test_entries_survive_a_new_store_instance(tmp_path):
+    make_store(tmp_path).store(URL, 'en', {'destinationEntities': []}, etag='"v1"')
+    entry = make_store(tmp_path).lookup(URL, 'en')
+    assert entry and entry.fresh and entry.etag == '"v1"'
+    assert make_store(tmp_path).lookup(URL, 'fr') is None
+
+
+def test_stale_entry_is_revalidated_with_etag(tmp_path, monkeypatch):
+    store = make_store(tmp_path, fresh_seconds=0)
+    store.store(URL, 'en', {'destinationEntities': [{'id': 'x', 'title': 'Headache', 'code': '8A8Z'}]}, etag='"v1"')
+    seen = []
+
+    def handler(request: httpx.Request):
+        seen.append(request.headers.get('If-None-Match'))
+        return httpx.Response(304)
+
+    use_transport(monkeypatch, store, handler)
+    body = asyncio.run(who_async_client._get_json(URL, {'Accept-Language': 'en'}))
+    assert body['destinationEntities'][0]['code'] == '8A8Z'
+    assert seen == ['"v1"']
+    assert store.stats()['revalidated'] == 1
+
+
+def test_fresh_entry_skips_network_and_stale_served_when_down(tmp_path, monkeypatch):
+    store = make_store(tmp_path)
+    store.store(URL, 'en', {'ok': True})
+
+    def handler(request: httpx.Request):
+        raise httpx.ConnectError('down', request=request)
+
+    use_transport(monkeypatch, store, handler)
+    assert asyncio.run(who_async_client._get_json(URL, {'Accept-Language': 'en'})) == {'ok': True}
+    store.fresh_seconds = 0
+    assert asyncio.run(who_async_client._get_json(URL, {'Accept-Language': 'en'})) == {'ok': True}
+
+
+def test_stale_entry_is_served_when_revalidation_gets_5xx_or_429(tmp_path, monkeypatch):
+    store = make_store(tmp_path, fresh_seconds=0)
+    store.store(URL, 'en', {'ok': True}, etag='"v1"')
+    use_transport(monkeypatch, store, lambda r: httpx.Response(503))
+    with who_api_client.upstream_trace() as failures:
+        assert asyncio.run(who_async_client._get_json(URL, {'Accept-Language': 'en'})) == {'ok': True}
+    assert failures == []
+
+    class Resp:
+        status_code = 429
+        headers = {}
+
+    monkeypatch.setattr(who_api_client.requests, 'get', lambda url, **kw: Resp())
+    assert who_api_client._get_json(URL, {'Accept-Language': 'en'}) == {'ok': True}
+    assert store.stats()['stale_served'] == 2
+
+
+def test_eviction_drops_least_recently_used(tmp_path):
+    store = make_store(tmp_path, max_entries=3)
+    for i in range(5):
+        store.store(f'https://id.who.int/icd/entity/{i}', 'en', {'i': i})
+        time.sleep(0.001)
+    store.lookup('https://id.who.int/icd/entity/0', 'en')
+    store.evict()
+    assert store.stats()['entries'] == 3
+    assert store.lookup('https://id.who.int/icd/entity/0', 'en') is not None
+    assert store.lookup('https://id.who.int/icd/entity/1', 'en') is None
+
+
+def test_reads_buffer_access_times_instead_of_writing(tmp_path):
+    store = make_store(tmp_path)
+    store.store(URL, 'en', {'ok': True})
+    conn = store._connect()
+    before = conn.execute('SELECT accessed_at FROM who_responses').fetchone()[0]
+    time.sleep(0.01)
+    for _ in range(5):
+        assert store.lookup(URL, 'en')
+    assert conn.execute('SELECT accessed_at FROM who_responses').fetchone()[0] == before
+    store.flush()
+    assert conn.execute('SELECT accessed_at FROM who_responses').fetchone()[0] > before
+
+
+def test_async_client_does_store_io_off_the_event_loop(tmp_path, monkeypatch):
+    import threading
+    store = make_store(tmp_path)
+    threads = []
+    real_lookup = store.lookup
+
+    def lookup(*args):
+        threads.append(threading.current_thread())
+        return real_lookup(*args)
+
+    monkeypatch.setattr(store, 'lookup', lookup)
+    use_transport(monkeypatch, store, lambda r: httpx.Response(200, json={'ok': True}))
+    asyncio.run(who_async_client._get_json(URL, {'Accept-Language': 'en'}))
+    assert threads and threads[0] is not threading.main_thread()
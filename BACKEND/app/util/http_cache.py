@@ -0,0 +1,50 @@
+"""Strong ETags and conditional GETs for release-scoped read endpoints.
+
+An ETag hashes the endpoint path, its query parameters and the revision of
+the data the response is built from: the release version plus its revision
+from the release registry, and for endpoints that also read live tables the
+terminology graph's content digest. All of these are in memory, so a matching
+``If-None-Match`` is answered with 304 before any DB or WHO work.
+"""
+import hashlib
+import json
+import os
+from typing import Optional
+
+from fastapi import Request, Response
+
+RELEASE_CACHE_MAX_AGE_SECONDS = int(os.getenv("RELEASE_CACHE_MAX_AGE_SECONDS", "300"))
+
+
+def compute_etag(request: Request, *revision) -> str:
+    query = sorted(request.query_params.multi_items())
+    raw = json.dumps([request.url.path, query, [str(part) for part in revision]], separators=(",", ":"))
+    return '"' + hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def etag_matches(request: Request, etag: Optional[str]) -> bool:
+    """``If-None-Match`` check (weak comparison, as RFC 9110 prescribes for it)."""
+    header = request.headers.get("if-none-match")
+    if not header or not etag:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+def cache_control(private: bool) -> str:
+    # Authenticated endpoints are private so shared proxies never answer for another client
+    return f"{'private' if private else 'public'}, max-age={RELEASE_CACHE_MAX_AGE_SECONDS}"
+
+
+def not_modified(etag: str, private: bool = False) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control(private)})
+
+
+def set_cache_headers(response: Response, etag: Optional[str], private: bool = False):
+    """Mark a response cacheable under ``etag``; without one (degraded or unversioned data) it is not stored."""
+    if etag is None:
+        response.headers["Cache-Control"] = "no-store"
+        return
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control(private)
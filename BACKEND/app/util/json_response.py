@@ -0,0 +1,30 @@
+"""orjson-backed JSON responses.
+
+``FastJSONResponse`` is the app's default response class, replacing the
+stdlib ``json.dumps`` render step. Endpoints that return large payloads
+build a ``FastJSONResponse`` themselves, which also skips FastAPI's
+``jsonable_encoder`` walk over every nested value. When the database has
+already rendered the whole document, ``raw_json_response`` sends that text
+as is.
+"""
+from typing import Optional
+
+import orjson
+from fastapi import Response
+from fastapi.responses import JSONResponse
+
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, option=_ORJSON_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def raw_json_response(document, headers: Optional[dict] = None) -> Response:
+    """Serve JSON text that is already serialized (e.g. built by Postgres json_agg)."""
+    return Response(content=document, media_type="application/json", headers=headers)
@@ -0,0 +1,197 @@
+"""Script-folded search keys for NAMASTE terms.
+
+Terms reach us as ITRANS-style romanizations ("vAtasa~jcayaH"), IAST
+("vātasañcayaḥ"), plain ASCII ("vatasancayah"), Devanagari, Tamil and Arabic.
+:func:`search_key` folds all of these to one comparable form:
+
+1. NFKC;
+2. Devanagari and Tamil transliterated to Latin (``SEARCH_KEY_TRANSLITERATE``,
+   on by default), Arabic reduced to its bare letters (harakat and tatweel
+   dropped, alef / ya / ta marbuta variants unified);
+3. case folding;
+4. IAST sibilants and vocalic r/l spelled out (ś ṣ -> sh, ṛ -> ri, ḷ -> li),
+   then diacritics stripped from Latin letters;
+5. ITRANS folded to ASCII: ~n / ~j -> n, .n / .m -> n / m, r^i / rri -> ri,
+   ch / chh -> c, ee -> i, oo -> u, doubled a / i / u collapsed;
+6. whitespace collapsed.
+
+The keys are computed when a term is written (``traditional_terms.search_key``
+and ``vernacular_search_key``, see app/db/models.py) and compared against the
+query's key, so lookups need no runtime ``lower()`` and every spelling of a
+term meets at the same key. Callers keep matching the plain lower-cased text
+as well; the keys only add matches.
+"""
+import os
+import re
+import unicodedata
+from typing import Dict, Optional
+
+from sqlalchemy import text
+
+SEARCH_KEY_TRANSLITERATE = os.getenv("SEARCH_KEY_TRANSLITERATE", "1").lower() not in ("0", "false", "no")
+SEPARATOR = "\x1f"
+
+
+class _Abugida:
+    """Transliterates one Brahmic script: consonants carry an inherent ``a`` unless a sign or virama follows."""
+
+    def __init__(self, vowels: Dict[int, str], consonants: Dict[int, str], signs: Dict[int, str],
+                 virama: int, others: Dict[int, str], digits: int):
+        self.vowels = vowels
+        self.consonants = consonants
+        self.signs = signs
+        self.virama = virama
+        self.others = others
+        self.digits = digits
+
+    def owns(self, ch: str) -> bool:
+        cp = ord(ch)
+        return (cp in self.vowels or cp in self.consonants or cp in self.signs or cp in self.others
+                or cp == self.virama or self.digits <= cp < self.digits + 10)
+
+    def transliterate(self, text: str) -> str:
+        out = []
+        i, n = 0, len(text)
+        while i < n:
+            cp = ord(text[i])
+            if cp in self.consonants:
+                out.append(self.consonants[cp])
+                nxt = ord(text[i + 1]) if i + 1 < n else None
+                while nxt in self.others and self.others[nxt] == "":  # nukta and other silent marks
+                    i += 1
+                    nxt = ord(text[i + 1]) if i + 1 < n else None
+                if nxt == self.virama:
+                    i += 1
+                elif nxt in self.signs:
+                    out.append(self.signs[nxt])
+                    i += 1
+                else:
+                    out.append("a")
+            elif cp in self.vowels:
+                out.append(self.vowels[cp])
+            elif cp in self.signs:
+                out.append(self.signs[cp])
+            elif cp in self.others:
+                out.append(self.others[cp])
+            elif self.digits <= cp < self.digits + 10:
+                out.append(str(cp - self.digits))
+            elif cp != self.virama:
+                out.append(text[i])
+            i += 1
+        return "".join(out)
+
+
+def _table(start: int, values: str) -> Dict[int, str]:
+    """Consecutive code points from ``start``; ``values`` is space separated, ``-`` marks an unassigned slot."""
+    return {start + k: v for k, v in enumerate(values.split()) if v != "-"}
+
+
+DEVANAGARI = _Abugida(
+    vowels={**_table(0x0905, "a a i i u u ri li e e e ai o o o au"), 0x0960: "ri", 0x0961: "li"},
+    consonants={
+        **_table(0x0915, "k kh g gh n ch chh j jh n t th d dh n t th d dh n n p ph b bh m y r r l l l v sh sh s h"),
+        **_table(0x0958, "k kh g z r rh f y"),
+    },
+    signs={**_table(0x093E, "a i i u u ri ri e e e ai o o o au"), 0x0962: "li", 0x0963: "li"},
+    virama=0x094D,
+    others={0x0901: "n", 0x0902: "m", 0x0903: "h", 0x093C: "", 0x093D: "", 0x0950: "om", 0x0964: " ", 0x0965: " "},
+    digits=0x0966,
+)
+
+TAMIL = _Abugida(
+    vowels={**_table(0x0B85, "a a i i u u - - - e e ai - o o au")},
+    consonants={
+        0x0B95: "k", 0x0B99: "n", 0x0B9A: "s", 0x0B9C: "j", 0x0B9E: "n", 0x0B9F: "t", 0x0BA3: "n", 0x0BA4: "t",
+        0x0BA8: "n", 0x0BA9: "n", 0x0BAA: "p", 0x0BAE: "m", 0x0BAF: "y", 0x0BB0: "r", 0x0BB1: "r", 0x0BB2: "l",
+        0x0BB3: "l", 0x0BB4: "l", 0x0BB5: "v", 0x0BB6: "sh", 0x0BB7: "sh", 0x0BB8: "s", 0x0BB9: "h",
+    },
+    signs={**_table(0x0BBE, "a i i u u - - - e e ai - o o au")},
+    virama=0x0BCD,
+    others={0x0B83: "h", 0x0BD7: ""},
+    digits=0x0BE6,
+)
+
+_ARABIC_MARKS = re.compile("[ً-ٰٟـ]")
+_ARABIC_LETTERS = str.maketrans({"أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا", "ى": "ي", "ئ": "ي", "ؤ": "و", "ة": "ه"})
+_IAST = str.maketrans({"ś": "sh", "ṣ": "sh", "ṛ": "ri", "ṝ": "ri", "ḷ": "li", "ḹ": "li"})
+_ITRANS_RULES = (
+    (re.compile(r"[rl]\^i|rri|lli"), lambda m: m.group(0)[0] + "i"),
+    (re.compile(r"~[nj]"), "n"),
+    (re.compile(r"[~^]"), ""),
+    (re.compile(r"(?<=[a-z])\.([nm])"), r"\1"),
+    (re.compile(r"(?<=[a-z])\.[ha]"), ""),
+    (re.compile(r"chh?"), "c"),
+    (re.compile(r"shh"), "sh"),
+    (re.compile(r"e{2,}"), "i"),
+    (re.compile(r"o{2,}"), "u"),
+    (re.compile(r"([aiu])\1+"), r"\1"),
+)
+_SPACES = re.compile(r"\s+")
+
+
+def _is_latin(ch: str) -> bool:
+    cp = ord(ch)
+    return 0x00C0 <= cp <= 0x024F or 0x1E00 <= cp <= 0x1EFF
+
+
+def _strip_latin_diacritics(text: str) -> str:
+    out = []
+    for ch in text:
+        if _is_latin(ch):
+            out.append("".join(c for c in unicodedata.normalize("NFD", ch) if not unicodedata.combining(c)))
+        else:
+            out.append(ch)
+    return "".join(out)
+
+
+def _transliterate(text: str) -> str:
+    for script in (DEVANAGARI, TAMIL):
+        if any(script.owns(ch) for ch in text):
+            text = script.transliterate(text)
+    return text
+
+
+def search_key(value: Optional[str], transliterate: Optional[bool] = None) -> Optional[str]:
+    """The folded key of ``value`` (None for empty input)."""
+    if not value:
+        return None
+    text = unicodedata.normalize("NFKC", value)
+    if SEARCH_KEY_TRANSLITERATE if transliterate is None else transliterate:
+        text = _transliterate(text)
+    text = _ARABIC_MARKS.sub("", text).translate(_ARABIC_LETTERS)
+    text = _strip_latin_diacritics(text.casefold().translate(_IAST))
+    for pattern, replacement in _ITRANS_RULES:
+        text = pattern.sub(replacement, text)
+    return _SPACES.sub(" ", text).strip() or None
+
+
+def vernacular_search_key(*values: Optional[str]) -> Optional[str]:
+    """Keys of a term's vernacular spellings, in script and (when enabled) transliterated, joined by SEPARATOR."""
+    keys = []
+    for value in values:
+        for key in (search_key(value, transliterate=False), search_key(value)):
+            if key and key not in keys:
+                keys.append(key)
+    return SEPARATOR.join(keys) or None
+
+
+def backfill_search_keys(engine, batch_size: int = 1000) -> int:
+    """Fill the keys of traditional_terms rows written before the columns existed (or by raw SQL). Returns rows updated."""
+    select_missing = text(
+        "SELECT id, term, devanagari, tamil, arabic FROM traditional_terms "
+        "WHERE search_key IS NULL AND id > :after ORDER BY id LIMIT :n"
+    )
+    update = text("UPDATE traditional_terms SET search_key = :key, vernacular_search_key = :vkey WHERE id = :id")
+    updated, after = 0, 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(select_missing, {"after": after, "n": batch_size}).all()
+            if not rows:
+                return updated
+            conn.execute(update, [
+                {"id": row[0], "key": (search_key(row[1]) or "")[:255] or None,
+                 "vkey": vernacular_search_key(*row[2:])}
+                for row in rows
+            ])
+        updated += len(rows)
+        after = rows[-1][0]
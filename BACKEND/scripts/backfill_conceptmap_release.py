@@ -5,6 +5,7 @@ from sqlalchemy.orm import Session
 from app.db.session import SessionLocal
 from app.db import models
 from sqlalchemy import select
+from app.services.translation_table import build_translation_table
 
 RELEASE_VERSION = "v1-submission"
 
@@ -39,6 +40,7 @@ def build_release(db: Session):
             is_primary=m.is_primary,
         ))
         count += 1
+    build_translation_table(db, release)
     db.commit()
     print(f"Created release {RELEASE_VERSION} with {count} elements.")
     return release
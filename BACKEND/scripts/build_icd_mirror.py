@@ -0,0 +1,129 @@
+"""Build / refresh the offline ICD-11 mirror (icd_mirror_entities).
+
+Sources:
+  --tabulation FILE   WHO release SimpleTabulation export (tab-separated; columns
+                      "Linearization URI", "Code", "Title", "DepthInKind"...).
+                      Parents are derived from the leading "- " depth markers.
+  --csv FILE          Crawl cache in the scripts/test_tm2.py format
+                      ("Serial No,Title,ICD Code,URI").
+  --crawl ROOT_ID     Walk a linearization from ROOT_ID via the WHO API, following
+                      `child` links (e.g. 562274788 for the TM2 chapter).
+
+Run with:
+  python -m scripts.build_icd_mirror --linearization mms --release 2025-01 --tabulation SimpleTabulation-ICD-11-MMS-en.txt
+  python -m scripts.build_icd_mirror --linearization tm2 --release 2025-01 --crawl 562274788 --limit 2000
+"""
+import argparse
+import csv
+import os
+import sys
+from collections import deque
+
+sys.path.append(os.getcwd())
+
+from app.db.session import SessionLocal
+from app.services.icd_mirror import upsert_entities
+
+
+def _tail(uri: str) -> str:
+    """Entity id relative to the linearization (keeps residual suffixes like /other, /unspecified)."""
+    uri = (uri or "").strip().rstrip("/")
+    for marker in ("/mms/", "/tm2/"):
+        if marker in uri:
+            return uri.split(marker, 1)[1]
+    return uri.split("/")[-1]
+
+
+def rows_from_tabulation(path: str):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f, delimiter="\t")
+        stack: list[tuple[int, str]] = []  # (depth, entity_id)
+        for r in reader:
+            raw_title = r.get("Title") or ""
+            depth = len(raw_title) - len(raw_title.lstrip("- ")) if raw_title.startswith("-") else 0
+            entity_id = _tail(r.get("Linearization URI") or r.get("Linearization (release) URI") or "")
+            if not entity_id:
+                continue
+            while stack and stack[-1][0] >= depth:
+                stack.pop()
+            parent_id = stack[-1][1] if stack else None
+            stack.append((depth, entity_id))
+            yield {
+                "entity_id": entity_id,
+                "code": r.get("Code"),
+                "title": raw_title,
+                "definition": r.get("Definition") or None,
+                "parent_id": parent_id,
+                "uri": r.get("Linearization URI"),
+            }
+
+
+def rows_from_crawl_csv(path: str):
+    with open(path, newline="", encoding="utf-8") as f:
+        for r in csv.DictReader(f):
+            yield {
+                "entity_id": _tail(r.get("URI") or ""),
+                "code": r.get("ICD Code") if r.get("ICD Code") not in (None, "", "N/A") else None,
+                "title": r.get("Title"),
+                "uri": r.get("URI"),
+            }
+
+
+def rows_from_crawl(root_id: str, linearization: str, release: str, limit: int):
+    from app.services import who_api_client
+
+    def _val(x):
+        if isinstance(x, dict):
+            return x.get("@value") or x.get("value")
+        return x
+
+    queue = deque([(root_id, None)])
+    seen = set()
+    while queue and len(seen) < limit:
+        entity_id, parent_id = queue.popleft()
+        if entity_id in seen:
+            continue
+        seen.add(entity_id)
+        ent = who_api_client.fetch_linearized_entity_by_release(entity_id, linearization, release)
+        if not ent:
+            print(f"  [WARN] no data for {entity_id}")
+            continue
+        yield {
+            "entity_id": entity_id,
+            "code": ent.get("code"),
+            "title": _val(ent.get("title")),
+            "definition": _val(ent.get("definition")),
+            "parent_id": parent_id,
+            "uri": ent.get("@id"),
+        }
+        for child in ent.get("child") or []:
+            queue.append((_tail(child), entity_id))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Load ICD-11 entities into the offline mirror")
+    ap.add_argument("--linearization", choices=["mms", "tm2"], required=True)
+    ap.add_argument("--release", default=os.getenv("WHO_RELEASE", "2025-01"))
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--tabulation")
+    src.add_argument("--csv")
+    src.add_argument("--crawl")
+    ap.add_argument("--limit", type=int, default=5000, help="Max entities to fetch when crawling")
+    args = ap.parse_args()
+
+    if args.tabulation:
+        rows = rows_from_tabulation(args.tabulation)
+    elif args.csv:
+        rows = rows_from_crawl_csv(args.csv)
+    else:
+        rows = rows_from_crawl(args.crawl, args.linearization, args.release, args.limit)
+
+    with SessionLocal() as db:
+        count = upsert_entities(db, args.linearization, args.release, rows)
+    print(f"Mirrored {count} {args.linearization} entities for release {args.release}")
+    print("Running servers pick up new entities within ICD_MIRROR_CHECK_SECONDS; "
+          "POST /api/admin/icd-mirror/reload to apply updated ones immediately.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Enable pg_trgm and add the GIN trigram indexes used by the search endpoints.
+
+The lookup, suggest, mapping-search and ValueSet/$expand filters are
+leading-wildcard ILIKEs; with these indexes Postgres serves them from a bitmap
+index scan instead of a sequential scan (see app/db/text_search.py). The app
+also creates them at startup; this script is for running the migration ahead
+of a deploy and for measuring its effect.
+
+Usage:
+  python -m scripts.migrate_add_trigram_indexes
+  python -m scripts.migrate_add_trigram_indexes --benchmark              # time searches before and after
+  python -m scripts.migrate_add_trigram_indexes --benchmark --drop-first # start from an unindexed table
+
+The benchmark runs, per indexed column, the endpoints' query shape
+(ILIKE '%fragment%' ORDER BY similarity() DESC LIMIT 20) for fragments taken
+from the data, and prints the median latency before and after the migration.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.getcwd())
+
+from sqlalchemy import text
+
+from app.db.session import engine
+from app.db.text_search import TRIGRAM_INDEXES, ensure_trigram_indexes, index_name
+
+
+def sample_fragments(conn, table: str, column: str, count: int) -> list:
+    rows = conn.execute(text(
+        f"SELECT {column} FROM {table} WHERE {column} IS NOT NULL AND length({column}) >= 5 LIMIT :n"
+    ), {"n": count}).scalars().all()
+    return [value[1:4].lower() for value in rows] + [value[:5].lower() for value in rows]
+
+
+def time_queries(conn, table: str, column: str, fragments: list, repeat: int) -> float:
+    match = f"{column} ILIKE :like" if engine.dialect.name == "postgresql" else f"lower({column}) LIKE :like"
+    sql = text(f"SELECT {column} FROM {table} WHERE {match} ORDER BY similarity({column}, :q) DESC LIMIT 20")
+    samples = []
+    for q in fragments:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            conn.execute(sql, {"q": q, "like": f"%{q}%"}).all()
+            samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples) if samples else 0.0
+
+
+def benchmark(fragments: dict, repeat: int) -> dict:
+    with engine.connect() as conn:
+        return {key: time_queries(conn, *key, frags, repeat) for key, frags in fragments.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--benchmark", action="store_true", help="time the search queries before and after")
+    parser.add_argument("--drop-first", action="store_true", help="drop existing trigram indexes before measuring")
+    parser.add_argument("--samples", type=int, default=10, help="rows sampled per column for query fragments")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per fragment")
+    args = parser.parse_args()
+
+    if engine.dialect.name != "postgresql":
+        print(f"[TEXT-SEARCH] {engine.dialect.name} has no pg_trgm; search falls back to in-process similarity().")
+    if args.drop_first and engine.dialect.name == "postgresql":
+        with engine.begin() as conn:
+            for table, column in TRIGRAM_INDEXES:
+                conn.execute(text(f"DROP INDEX IF EXISTS {index_name(table, column)}"))
+        print("Dropped existing trigram indexes.")
+
+    fragments = {}
+    before = {}
+    if args.benchmark:
+        if engine.dialect.name == "postgresql":
+            with engine.begin() as conn:
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))  # similarity() for the baseline run
+        with engine.connect() as conn:
+            fragments = {(table, column): sample_fragments(conn, table, column, args.samples)
+                         for table, column in TRIGRAM_INDEXES}
+        before = benchmark(fragments, args.repeat)
+
+    if ensure_trigram_indexes(engine):
+        with engine.begin() as conn:
+            for table in sorted({table for table, _ in TRIGRAM_INDEXES}):
+                conn.execute(text(f"ANALYZE {table}"))
+        print(f"Ensured pg_trgm and {len(TRIGRAM_INDEXES)} trigram indexes.")
+
+    if args.benchmark:
+        after = benchmark(fragments, args.repeat)
+        print(f"{'table.column':40} {'fragments':>9} {'before ms':>10} {'after ms':>10} {'speedup':>8}")
+        for key, frags in fragments.items():
+            b, a = before[key], after[key]
+            speedup = f"{b / a:.1f}x" if a else "-"
+            print(f"{'.'.join(key):40} {len(frags):>9} {b:>10.2f} {a:>10.2f} {speedup:>8}")
+
+
+if __name__ == "__main__":
+    main()